@@ -0,0 +1,271 @@
+#!/usr/bin/env python
+# This file is part of coadd_utils.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Measure the throughput of the coadd_utils pixel kernels.
+
+``addToCoadd``, ``copyGoodPixels`` and ``setCoaddEdgeBits`` are run on
+synthetic images (no afwdata needed) for every instantiated pixel type,
+over a range of overlap fractions and bad-pixel densities. ``addToCoadd`` and
+``copyGoodPixels`` are timed for both their MaskedImage overloads (bad pixels
+flagged in the mask) and their Image overloads (bad pixels set to NaN, which
+integer images cannot represent); ``--planes`` selects one. For each case
+the best of ``--repeat`` timings is reported in Mpix/s (overlapping pixels
+processed per second) and GB/s (bytes read plus bytes written per second,
+counting each pixel plane the kernel touches once).
+
+Results are printed as a table and, with ``--output``, written as JSON so
+that builds can be compared; ``--baseline`` adds a column with the speedup
+relative to an earlier results file::
+
+    python benchmarks/benchmarkCoaddKernels.py --output before.json
+    python benchmarks/benchmarkCoaddKernels.py --baseline before.json
+"""
+
+import argparse
+import itertools
+import json
+import platform
+import sys
+import time
+
+import numpy as np
+
+import lsst.geom as geom
+import lsst.afw.image as afwImage
+import lsst.coadd.utils as coaddUtils
+
+# afw image and masked image classes for each instantiated pixel type
+IMAGE_TYPES = {
+    "D": (afwImage.ImageD, afwImage.MaskedImageD, np.float64),
+    "F": (afwImage.ImageF, afwImage.MaskedImageF, np.float32),
+    "I": (afwImage.ImageI, afwImage.MaskedImageI, np.int32),
+    "U": (afwImage.ImageU, afwImage.MaskedImageU, np.uint16),
+}
+COADD_TYPES = ("D", "F")
+WEIGHT_TYPES = ("D", "F", "I", "U")
+
+MASK_BYTES = np.dtype(np.int32).itemsize  # MaskPixel
+VARIANCE_BYTES = np.dtype(np.float32).itemsize  # VariancePixel
+
+BAD = 0x1
+OTHER = 0x2
+
+
+def makeMaskedImage(typeName, bbox, badFraction, rng):
+    """Make a synthetic masked image with a fraction of its pixels flagged bad.
+    """
+    _, maskedImageType, dtype = IMAGE_TYPES[typeName]
+    maskedImage = maskedImageType(bbox)
+    shape = maskedImage.image.array.shape
+    if np.issubdtype(dtype, np.floating):
+        maskedImage.image.array[:, :] = rng.normal(100, 10, size=shape)
+    else:
+        maskedImage.image.array[:, :] = rng.randint(0, 1000, size=shape)
+    maskedImage.variance.array[:, :] = rng.uniform(50, 150, size=shape)
+    mask = np.where(rng.uniform(size=shape) < badFraction, BAD, 0)
+    maskedImage.mask.array[:, :] = mask | np.where(rng.uniform(size=shape) < 0.01, OTHER, 0)
+    return maskedImage
+
+
+def makeInputImage(maskedImage):
+    """Return the image plane of maskedImage, with its bad pixels set to NaN.
+    """
+    image = maskedImage.image
+    if np.issubdtype(image.array.dtype, np.floating):
+        image.array[(maskedImage.mask.array & BAD) != 0] = np.nan
+    return image
+
+
+def makeInputBBox(coaddBBox, overlapFraction):
+    """Return a bbox the size of coaddBBox, shifted along x so that
+    overlapFraction of it overlaps coaddBBox.
+    """
+    shift = int(round(coaddBBox.getWidth()*(1 - overlapFraction)))
+    inputMin = geom.Point2I(coaddBBox.getMinX() + shift, coaddBBox.getMinY())
+    return geom.Box2I(inputMin, coaddBBox.getDimensions())
+
+
+def timeCall(func, repeat):
+    """Return the shortest of repeat timings of func(), in seconds.
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def benchAddToCoadd(coaddTypeName, weightTypeName, planes, coaddBBox, overlapFraction, badFraction, repeat,
+                    rng):
+    coadd = makeMaskedImage(coaddTypeName, coaddBBox, 0, rng)
+    weightMap = IMAGE_TYPES[weightTypeName][0](coaddBBox)
+    maskedImage = makeMaskedImage(coaddTypeName, makeInputBBox(coaddBBox, overlapFraction), badFraction, rng)
+    weight = IMAGE_TYPES[weightTypeName][2](1).item()
+    coaddBytes = np.dtype(IMAGE_TYPES[coaddTypeName][2]).itemsize
+    weightBytes = np.dtype(IMAGE_TYPES[weightTypeName][2]).itemsize
+
+    if planes == "masked":
+        def run():
+            return coaddUtils.addToCoadd(coadd, weightMap, maskedImage, BAD, weight)
+        # input planes read; coadd planes and weight map read and written
+        bytesPerPixel = (coaddBytes + MASK_BYTES + VARIANCE_BYTES
+                         + 2*(coaddBytes + MASK_BYTES + VARIANCE_BYTES + weightBytes))
+    else:
+        coaddImage = coadd.image
+        image = makeInputImage(maskedImage)
+
+        def run():
+            return coaddUtils.addToCoadd(coaddImage, weightMap, image, weight)
+        # input image read; coadd image and weight map read and written
+        bytesPerPixel = coaddBytes + 2*(coaddBytes + weightBytes)
+    overlapBBox = run()
+    seconds = timeCall(run, repeat)
+    return overlapBBox.getArea(), bytesPerPixel, seconds
+
+
+def benchCopyGoodPixels(typeName, planes, coaddBBox, overlapFraction, badFraction, repeat, rng):
+    dest = makeMaskedImage(typeName, coaddBBox, 0, rng)
+    src = makeMaskedImage(typeName, makeInputBBox(coaddBBox, overlapFraction), badFraction, rng)
+    imageBytes = np.dtype(IMAGE_TYPES[typeName][2]).itemsize
+
+    overlapBBox = geom.Box2I(coaddBBox)
+    overlapBBox.clip(src.getBBox())
+    if planes == "masked":
+        def run():
+            return coaddUtils.copyGoodPixels(dest, src, BAD)
+        # source planes read; destination planes read and written
+        bytesPerPixel = 3*(imageBytes + MASK_BYTES + VARIANCE_BYTES)
+    else:
+        destImage = dest.image
+        srcImage = makeInputImage(src)
+
+        def run():
+            return coaddUtils.copyGoodPixels(destImage, srcImage)
+        # source image read; destination image read and written
+        bytesPerPixel = 3*imageBytes
+    seconds = timeCall(run, repeat)
+    return overlapBBox.getArea(), bytesPerPixel, seconds
+
+
+def benchSetCoaddEdgeBits(weightTypeName, coaddBBox, overlapFraction, badFraction, repeat, rng):
+    # the weight map is zero on the bad pixels and outside the overlap
+    mask = afwImage.Mask(coaddBBox)
+    weightMap = IMAGE_TYPES[weightTypeName][0](coaddBBox)
+    inputBBox = makeInputBBox(coaddBBox, overlapFraction)
+    inputBBox.clip(coaddBBox)
+    weightView = weightMap[inputBBox].array
+    weightView[:, :] = np.where(rng.uniform(size=weightView.shape) < badFraction, 0, 1)
+
+    # weight map read; mask read and written
+    bytesPerPixel = np.dtype(IMAGE_TYPES[weightTypeName][2]).itemsize + 2*MASK_BYTES
+    seconds = timeCall(lambda: coaddUtils.setCoaddEdgeBits(mask, weightMap), repeat)
+    return coaddBBox.getArea(), bytesPerPixel, seconds
+
+
+def makeCases(args):
+    """Yield (kernel, types, planes, function) for each kernel, type and planes combination.
+    """
+    if "addToCoadd" in args.kernels:
+        for coaddType, weightType, planes in itertools.product(COADD_TYPES, WEIGHT_TYPES, args.planes):
+            yield ("addToCoadd", coaddType + weightType, planes,
+                   lambda *a, c=coaddType, w=weightType, p=planes: benchAddToCoadd(c, w, p, *a))
+    if "copyGoodPixels" in args.kernels:
+        for imageType, planes in itertools.product(WEIGHT_TYPES, args.planes):
+            yield ("copyGoodPixels", imageType, planes,
+                   lambda *a, t=imageType, p=planes: benchCopyGoodPixels(t, p, *a))
+    if "setCoaddEdgeBits" in args.kernels:
+        for weightType in WEIGHT_TYPES:
+            yield ("setCoaddEdgeBits", weightType, "mask",
+                   lambda *a, t=weightType: benchSetCoaddEdgeBits(t, *a))
+
+
+def getCaseKey(result):
+    """Return the key identifying the case of a result, for comparing runs.
+
+    Results files written before the planes were recorded only timed the
+    MaskedImage overloads (and the mask, for setCoaddEdgeBits).
+    """
+    planes = result.get("planes", "mask" if result["kernel"] == "setCoaddEdgeBits" else "masked")
+    return (result["kernel"], result["types"], planes, result["overlap"], result["bad"], result["pixels"])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size", type=int, default=4096, help="width and height of the coadd, in pixels")
+    parser.add_argument("--overlap", type=float, nargs="+", default=[1.0, 0.5, 0.1],
+                        help="fractions of the coadd overlapped by the input")
+    parser.add_argument("--bad", type=float, nargs="+", default=[0.0, 0.1, 0.5],
+                        help="fractions of the input pixels flagged bad")
+    parser.add_argument("--kernels", nargs="+", default=["addToCoadd", "copyGoodPixels", "setCoaddEdgeBits"],
+                        choices=["addToCoadd", "copyGoodPixels", "setCoaddEdgeBits"])
+    parser.add_argument("--planes", nargs="+", default=["masked", "image"], choices=["masked", "image"],
+                        help="overloads of addToCoadd and copyGoodPixels to time: "
+                        "MaskedImage and/or Image")
+    parser.add_argument("--repeat", type=int, default=5, help="timings per case; the best is reported")
+    parser.add_argument("--threads", type=int, default=None, help="passed to setNumThreads")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="write the results to this JSON file")
+    parser.add_argument("--baseline", default=None, help="JSON results file to report speedups against")
+    args = parser.parse_args(argv)
+
+    if args.threads is not None:
+        coaddUtils.setNumThreads(args.threads)
+    rng = np.random.RandomState(args.seed)
+    coaddBBox = geom.Box2I(geom.Point2I(0, 0), geom.Extent2I(args.size, args.size))
+
+    baseline = {}
+    if args.baseline is not None:
+        with open(args.baseline) as f:
+            for result in json.load(f)["results"]:
+                baseline[getCaseKey(result)] = result["seconds"]
+
+    results = []
+    print(f"{'kernel':<18}{'types':<7}{'planes':<8}{'overlap':>8}{'bad':>6}"
+          f"{'ms':>10}{'Mpix/s':>10}{'GB/s':>8}"
+          + (f"{'speedup':>9}" if baseline else ""))
+    for kernel, types, planes, bench in makeCases(args):
+        for overlapFraction, badFraction in itertools.product(args.overlap, args.bad):
+            numPixels, bytesPerPixel, seconds = bench(coaddBBox, overlapFraction, badFraction,
+                                                      args.repeat, rng)
+            mpixPerSec = numPixels/seconds/1e6
+            gbPerSec = numPixels*bytesPerPixel/seconds/1e9
+            result = dict(kernel=kernel, types=types, planes=planes, overlap=overlapFraction, bad=badFraction,
+                          pixels=numPixels, bytesPerPixel=bytesPerPixel, seconds=seconds,
+                          mpixPerSec=mpixPerSec, gbPerSec=gbPerSec)
+            results.append(result)
+            line = (f"{kernel:<18}{types:<7}{planes:<8}{overlapFraction:>8.2f}{badFraction:>6.2f}"
+                    f"{seconds*1e3:>10.2f}{mpixPerSec:>10.1f}{gbPerSec:>8.2f}")
+            if getCaseKey(result) in baseline:
+                line += f"{baseline[getCaseKey(result)]/seconds:>9.2f}"
+            print(line)
+
+    if args.output is not None:
+        metadata = dict(size=args.size, repeat=args.repeat, numThreads=coaddUtils.getNumThreads(),
+                        python=sys.version.split()[0], platform=platform.platform(),
+                        processor=platform.processor(), time=time.strftime("%Y-%m-%dT%H:%M:%S%z"))
+        with open(args.output, "w") as f:
+            json.dump(dict(metadata=metadata, results=results), f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
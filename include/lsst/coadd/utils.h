@@ -28,3 +28,9 @@
 #include "lsst/coadd/utils/copyGoodPixels.h"
 #include "lsst/coadd/utils/addToCoadd.h"
 #include "lsst/coadd/utils/setCoaddEdgeBits.h"
+#include "lsst/coadd/utils/parallel.h"
+#include "lsst/coadd/utils/finalizeCoadd.h"
+#include "lsst/coadd/utils/arrayKernels.h"
+#include "lsst/coadd/utils/removeFromCoadd.h"
+#include "lsst/coadd/utils/GoodPixelSpans.h"
+#include "lsst/coadd/utils/kernelStats.h"
@@ -0,0 +1,127 @@
+// -*- LSST-C++ -*-
+/*
+ * This file is part of coadd_utils.
+ *
+ * Developed for the LSST Data Management System.
+ * This product includes software developed by the LSST Project
+ * (https://www.lsst.org).
+ * See the COPYRIGHT file at the top-level directory of this distribution
+ * for details of code ownership.
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <https://www.gnu.org/licenses/>.
+ */
+
+#ifndef LSST_COADD_UTILS_GOODPIXELSPANS_H
+#define LSST_COADD_UTILS_GOODPIXELSPANS_H
+/**
+ * @file
+ */
+#include <algorithm>
+#include <cstddef>
+#include <cstdint>
+#include <vector>
+
+#include "lsst/geom.h"
+#include "lsst/afw/image.h"
+
+namespace lsst {
+namespace coadd {
+namespace utils {
+
+/**
+ * @brief run-length index of the good pixels of an image
+ *
+ * Each row of the image is stored as a list of spans of consecutive good pixels,
+ * so that kernels given a GoodPixelSpans can copy or add whole spans
+ * instead of testing every pixel, and skip runs of bad pixels entirely.
+ * This pays off when the same mask is applied more than once (e.g. to several coadds,
+ * or in several passes), and on heavily masked images.
+ *
+ * A GoodPixelSpans is immutable once constructed, so it may be shared between threads.
+ */
+class GoodPixelSpans final {
+public:
+    /// A span of good pixels [beginX, endX) in one row; x is relative to the parent image
+    struct Span {
+        int beginX;
+        int endX;
+    };
+
+    /**
+     * @brief index the good pixels of a mask: those for which mask & badPixelMask == 0
+     */
+    GoodPixelSpans(lsst::afw::image::Mask<lsst::afw::image::MaskPixel> const &mask,  ///< mask to index
+                   lsst::afw::image::MaskPixel const badPixelMask  ///< pixel is bad if mask & badPixelMask != 0
+    );
+
+    /**
+     * @brief index the good pixels of an image: those that are not NaN (thus they do include +/- inf)
+     */
+    template <typename ImagePixelT>
+    explicit GoodPixelSpans(lsst::afw::image::Image<ImagePixelT> const &image  ///< image to index
+    );
+
+    GoodPixelSpans(GoodPixelSpans const &) = default;
+    GoodPixelSpans(GoodPixelSpans &&) = default;
+    GoodPixelSpans &operator=(GoodPixelSpans const &) = default;
+    GoodPixelSpans &operator=(GoodPixelSpans &&) = default;
+    ~GoodPixelSpans() = default;
+
+    /// Return the bounding box of the indexed image, relative to the parent image
+    lsst::geom::Box2I getBBox() const { return _bbox; }
+
+    /// Return the total number of spans
+    std::size_t getNumSpans() const { return _spans.size(); }
+
+    /// Return the total number of good pixels
+    std::int64_t getNumGoodPixels() const { return _numGoodPixels; }
+
+    /// Return a pointer to the first span of row y (relative to the parent image)
+    Span const *beginRow(int y) const { return _spans.data() + _rowBegin[y - _bbox.getMinY()]; }
+
+    /// Return a pointer just past the last span of row y (relative to the parent image)
+    Span const *endRow(int y) const { return _spans.data() + _rowBegin[y - _bbox.getMinY() + 1]; }
+
+    /**
+     * @brief call func(spanBeginX, spanEndX) for each span of row y, clipped to [beginX, endX)
+     *
+     * Spans that lie entirely outside [beginX, endX) are skipped.
+     */
+    template <typename Func>
+    void forEachSpan(int y, int beginX, int endX, Func func) const {
+        for (Span const *span = beginRow(y), *end = endRow(y); span != end; ++span) {
+            int const spanBeginX = std::max(span->beginX, beginX);
+            int const spanEndX = std::min(span->endX, endX);
+            if (spanBeginX < spanEndX) {
+                func(spanBeginX, spanEndX);
+            }
+        }
+    }
+
+private:
+    /// Index the rows of an image plane, for which isGood(pixel) is true for good pixels
+    template <typename ImageT, typename IsGood>
+    void _indexRows(ImageT const &image, IsGood isGood);
+
+    lsst::geom::Box2I _bbox;
+    std::vector<Span> _spans;             ///< spans of all rows, in order of increasing y then x
+    std::vector<std::size_t> _rowBegin;   ///< index in _spans of the first span of each row, and the end
+    std::int64_t _numGoodPixels;
+};
+
+}  // namespace utils
+}  // namespace coadd
+}  // namespace lsst
+
+#endif  // !defined(LSST_COADD_UTILS_GOODPIXELSPANS_H)
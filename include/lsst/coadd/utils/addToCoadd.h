@@ -29,8 +29,14 @@
  *
  * @author Russell Owen
  */
+#include <cstdint>
+#include <memory>
+#include <utility>
+#include <vector>
+
 #include "lsst/geom.h"
 #include "lsst/afw/image.h"
+#include "lsst/coadd/utils/GoodPixelSpans.h"
 
 namespace lsst {
 namespace coadd {
@@ -45,6 +51,11 @@ namespace utils {
  * for all good image pixels that overlap a coadd pixel.
  * Good pixels are those that are not NaN (thus they do include +/- inf).
  *
+ * Integer weight maps saturate at the limits of their type rather than overflowing
+ * (as do the weight maps of all the functions in this file): a weight map pixel equal to
+ * std::numeric_limits<WeightPixelT>::max() (or, for signed types, min()) is saturated
+ * and keeps that value from then on. Use countSaturatedWeights to check for saturation.
+ *
  * @return overlapBBox: overlapping bounding box, relative to parent image (hence xy0 is taken into account)
  *
  * @throw pexExcept::InvalidParameterError if coadd and weightMap dimensions or xy0 do not match.
@@ -88,6 +99,375 @@ lsst::geom::Box2I addToCoadd(
         WeightPixelT weight    ///< relative weight of this image
 );
 
+/**
+ * @brief add good pixels from an image to a coadd and associated weight map,
+ *        weighting each pixel individually
+ *
+ * The images are assumed to be registered to the same wcs and parent origin, thus:
+ * coadd[i+coadd.x0, j+coadd.y0] += image[i+image.x0, j+image.y0] * weightImage[i+image.x0, j+image.y0]
+ * weightMap[i+weightMap.x0, j+weightMap.y0] += weightImage[i+image.x0, j+image.y0]
+ * for all good image pixels that overlap a coadd pixel.
+ * Good pixels are those that are not NaN (thus they do include +/- inf).
+ *
+ * @return overlapBBox: overlapping bounding box, relative to parent image (hence xy0 is taken into account)
+ *
+ * @throw pexExcept::InvalidParameterError if coadd and weightMap dimensions or xy0 do not match,
+ *        or if image and weightImage dimensions or xy0 do not match.
+ */
+template <typename CoaddPixelT, typename WeightPixelT>
+lsst::geom::Box2I addToCoadd(
+        lsst::afw::image::Image<CoaddPixelT> &coadd,  ///< [in,out] coadd to be modified
+        lsst::afw::image::Image<WeightPixelT> &
+                weightMap,  ///< [in,out] weight map to be modified;
+                            ///< this is the sum of weights of all images contributing each pixel of the coadd
+        lsst::afw::image::Image<CoaddPixelT> const &image,  ///< image to add to coadd
+        lsst::afw::image::Image<WeightPixelT> const &weightImage  ///< weight of each pixel of image
+);
+
+/**
+ * @brief add good pixels from a masked image to a coadd image and associated weight map,
+ *        weighting each pixel individually
+ *
+ * The images are assumed to be registered to the same wcs and parent origin, thus:
+ * coadd[i+coadd.x0, j+coadd.y0] += image[i+image.x0, j+image.y0] * weightImage[i+image.x0, j+image.y0]
+ * weightMap[i+weightMap.x0, j+weightMap.y0] += weightImage[i+image.x0, j+image.y0]
+ * for all good image pixels that overlap a coadd pixel.
+ * The variance plane of the coadd is incremented by variance * weight^2.
+ * Good pixels are those for which mask & badPixelMask == 0.
+ *
+ * @return overlapBBox: overlapping bounding box, relative to parent image (hence xy0 is taken into account)
+ *
+ * @throw pexExcept::InvalidParameterError if coadd and weightMap dimensions or xy0 do not match,
+ *        or if maskedImage and weightImage dimensions or xy0 do not match.
+ */
+template <typename CoaddPixelT, typename WeightPixelT>
+lsst::geom::Box2I addToCoadd(
+        lsst::afw::image::MaskedImage<CoaddPixelT, lsst::afw::image::MaskPixel,
+                                      lsst::afw::image::VariancePixel>
+                &coadd,  ///< [in,out] coadd to be modified
+        lsst::afw::image::Image<WeightPixelT> &
+                weightMap,  ///< [in,out] weight map to be modified;
+                            ///< this is the sum of weights of all images contributing each pixel of the coadd
+        lsst::afw::image::MaskedImage<CoaddPixelT, lsst::afw::image::MaskPixel,
+                                      lsst::afw::image::VariancePixel> const
+                &maskedImage,  ///< masked image to add to coadd
+        lsst::afw::image::MaskPixel const
+                badPixelMask,  ///< skip input pixel if input mask & badPixelMask !=0
+        lsst::afw::image::Image<WeightPixelT> const &weightImage  ///< weight of each pixel of maskedImage
+);
+
+/**
+ * @brief add the pixels of an image listed in a GoodPixelSpans to a coadd and associated weight map
+ *
+ * This is addToCoadd, except that the good pixels are those in goodPixelSpans,
+ * which are added a whole span at a time without testing each pixel.
+ * Build goodPixelSpans once per input (e.g. GoodPixelSpans(image)) and reuse it
+ * whenever the same input is added again.
+ *
+ * @return overlapBBox: overlapping bounding box, relative to parent image (hence xy0 is taken into account)
+ *
+ * @throw pexExcept::InvalidParameterError if coadd and weightMap dimensions or xy0 do not match,
+ *        or if image and goodPixelSpans bounding boxes do not match.
+ */
+template <typename CoaddPixelT, typename WeightPixelT>
+lsst::geom::Box2I addToCoadd(
+        lsst::afw::image::Image<CoaddPixelT> &coadd,  ///< [in,out] coadd to be modified
+        lsst::afw::image::Image<WeightPixelT> &
+                weightMap,  ///< [in,out] weight map to be modified;
+                            ///< this is the sum of weights of all images contributing each pixel of the coadd
+        lsst::afw::image::Image<CoaddPixelT> const &image,  ///< image to add to coadd
+        GoodPixelSpans const &goodPixelSpans,               ///< good pixels of image
+        WeightPixelT weight                                 ///< relative weight of this image
+);
+
+/**
+ * @brief add the pixels of a masked image listed in a GoodPixelSpans to a coadd image
+ *        and associated weight map
+ *
+ * This is addToCoadd, except that the good pixels are those in goodPixelSpans,
+ * which are added a whole span at a time without testing each pixel.
+ * Build goodPixelSpans once per input and bad pixel mask
+ * (GoodPixelSpans(*maskedImage.getMask(), badPixelMask)) and reuse it
+ * whenever the same input is added again.
+ *
+ * @return overlapBBox: overlapping bounding box, relative to parent image (hence xy0 is taken into account)
+ *
+ * @throw pexExcept::InvalidParameterError if coadd and weightMap dimensions or xy0 do not match,
+ *        or if maskedImage and goodPixelSpans bounding boxes do not match.
+ */
+template <typename CoaddPixelT, typename WeightPixelT>
+lsst::geom::Box2I addToCoadd(
+        lsst::afw::image::MaskedImage<CoaddPixelT, lsst::afw::image::MaskPixel,
+                                      lsst::afw::image::VariancePixel>
+                &coadd,  ///< [in,out] coadd to be modified
+        lsst::afw::image::Image<WeightPixelT> &
+                weightMap,  ///< [in,out] weight map to be modified;
+                            ///< this is the sum of weights of all images contributing each pixel of the coadd
+        lsst::afw::image::MaskedImage<CoaddPixelT, lsst::afw::image::MaskPixel,
+                                      lsst::afw::image::VariancePixel> const
+                &maskedImage,                      ///< masked image to add to coadd
+        GoodPixelSpans const &goodPixelSpans,      ///< good pixels of maskedImage
+        WeightPixelT weight                        ///< relative weight of this image
+);
+
+/**
+ * @brief add good pixels from a masked image to a coadd image and associated weight map,
+ *        weighting each pixel by the inverse of its variance
+ *
+ * This is equivalent to addToCoadd with a weight image of weight / variance,
+ * but the weight is computed as each pixel is added, so no weight image need be made.
+ * Good pixels are those for which mask & badPixelMask == 0 and whose variance is positive and finite.
+ *
+ * @return overlapBBox: overlapping bounding box, relative to parent image (hence xy0 is taken into account)
+ *
+ * @throw pexExcept::InvalidParameterError if coadd and weightMap dimensions or xy0 do not match.
+ */
+template <typename CoaddPixelT, typename WeightPixelT>
+lsst::geom::Box2I addToCoaddInverseVariance(
+        lsst::afw::image::MaskedImage<CoaddPixelT, lsst::afw::image::MaskPixel,
+                                      lsst::afw::image::VariancePixel>
+                &coadd,  ///< [in,out] coadd to be modified
+        lsst::afw::image::Image<WeightPixelT> &
+                weightMap,  ///< [in,out] weight map to be modified;
+                            ///< this is the sum of weights of all images contributing each pixel of the coadd
+        lsst::afw::image::MaskedImage<CoaddPixelT, lsst::afw::image::MaskPixel,
+                                      lsst::afw::image::VariancePixel> const
+                &maskedImage,  ///< masked image to add to coadd
+        lsst::afw::image::MaskPixel const
+                badPixelMask,  ///< skip input pixel if input mask & badPixelMask !=0
+        WeightPixelT weight    ///< relative weight of this image; each pixel is weighted by weight / variance
+);
+
+/**
+ * @brief add good pixels from a masked image to a coadd image and associated weight map,
+ *        using compensated summation for the coadd image
+ *
+ * This is addToCoadd, except that the rounding error of each sum of the coadd image is accumulated
+ * in the compensation image (Neumaier's variant of Kahan summation), so that coadd image + compensation
+ * is accurate to about the precision of CoaddPixelT regardless of the number of inputs.
+ * This allows a float coadd to be accumulated as accurately as a double coadd;
+ * add the compensation to the coadd image before normalizing it.
+ * The compensation of a pixel is left unchanged where its sum is not finite,
+ * so coadd image + compensation is the infinite sum rather than NaN.
+ *
+ * @return overlapBBox: overlapping bounding box, relative to parent image (hence xy0 is taken into account)
+ *
+ * @throw pexExcept::InvalidParameterError if coadd, compensation and weightMap dimensions
+ *        or xy0 do not match.
+ */
+template <typename CoaddPixelT, typename WeightPixelT>
+lsst::geom::Box2I addToCoaddCompensated(
+        lsst::afw::image::MaskedImage<CoaddPixelT, lsst::afw::image::MaskPixel,
+                                      lsst::afw::image::VariancePixel>
+                &coadd,  ///< [in,out] coadd to be modified
+        lsst::afw::image::Image<CoaddPixelT> &compensation,  ///< [in,out] compensation of coadd image;
+                                                             ///< initially zero
+        lsst::afw::image::Image<WeightPixelT> &
+                weightMap,  ///< [in,out] weight map to be modified;
+                            ///< this is the sum of weights of all images contributing each pixel of the coadd
+        lsst::afw::image::MaskedImage<CoaddPixelT, lsst::afw::image::MaskPixel,
+                                      lsst::afw::image::VariancePixel> const
+                &maskedImage,  ///< masked image to add to coadd
+        lsst::afw::image::MaskPixel const
+                badPixelMask,  ///< skip input pixel if input mask & badPixelMask !=0
+        WeightPixelT weight    ///< relative weight of this image
+);
+
+/**
+ * @brief add good pixels from an image to a coadd and associated weight map,
+ *        recording which inputs contributed to each coadd pixel
+ *
+ * This is addToCoadd, but as each good pixel is added the corresponding pixel of countMap
+ * (if not null) is incremented and bit inputIndex of the corresponding pixel of provenanceMap
+ * (if not null) is set, in the same pass over the image.
+ * A provenance map records up to 64 inputs; use one map per 64 inputs for more,
+ * passing inputIndex % 64 to map inputIndex / 64.
+ *
+ * @return overlapBBox: overlapping bounding box, relative to parent image (hence xy0 is taken into account)
+ *
+ * @throw pexExcept::InvalidParameterError if coadd, weightMap, countMap and provenanceMap
+ *        dimensions or xy0 do not match, or if provenanceMap is not null and inputIndex is not in [0, 64).
+ */
+template <typename CoaddPixelT, typename WeightPixelT>
+lsst::geom::Box2I addToCoaddWithProvenance(
+        lsst::afw::image::Image<CoaddPixelT> &coadd,  ///< [in,out] coadd to be modified
+        lsst::afw::image::Image<WeightPixelT> &
+                weightMap,  ///< [in,out] weight map to be modified;
+                            ///< this is the sum of weights of all images contributing each pixel of the coadd
+        lsst::afw::image::Image<CoaddPixelT> const &image,  ///< image to add to coadd
+        WeightPixelT weight,                                ///< relative weight of this image
+        lsst::afw::image::Image<int> *countMap,  ///< [in,out] number of inputs contributing each pixel;
+                                                 ///< may be null
+        lsst::afw::image::Image<std::uint64_t> *provenanceMap,  ///< [in,out] bitset of inputs contributing
+                                                                ///< each pixel; may be null
+        int inputIndex  ///< bit of provenanceMap to set for this image
+);
+
+/**
+ * @brief add good pixels from a masked image to a coadd image and associated weight map,
+ *        recording which inputs contributed to each coadd pixel
+ *
+ * This is addToCoadd, but as each good pixel is added the corresponding pixel of countMap
+ * (if not null) is incremented and bit inputIndex of the corresponding pixel of provenanceMap
+ * (if not null) is set, in the same pass over the masked image.
+ * A provenance map records up to 64 inputs; use one map per 64 inputs for more,
+ * passing inputIndex % 64 to map inputIndex / 64.
+ *
+ * @return overlapBBox: overlapping bounding box, relative to parent image (hence xy0 is taken into account)
+ *
+ * @throw pexExcept::InvalidParameterError if coadd, weightMap, countMap and provenanceMap
+ *        dimensions or xy0 do not match, or if provenanceMap is not null and inputIndex is not in [0, 64).
+ */
+template <typename CoaddPixelT, typename WeightPixelT>
+lsst::geom::Box2I addToCoaddWithProvenance(
+        lsst::afw::image::MaskedImage<CoaddPixelT, lsst::afw::image::MaskPixel,
+                                      lsst::afw::image::VariancePixel>
+                &coadd,  ///< [in,out] coadd to be modified
+        lsst::afw::image::Image<WeightPixelT> &
+                weightMap,  ///< [in,out] weight map to be modified;
+                            ///< this is the sum of weights of all images contributing each pixel of the coadd
+        lsst::afw::image::MaskedImage<CoaddPixelT, lsst::afw::image::MaskPixel,
+                                      lsst::afw::image::VariancePixel> const
+                &maskedImage,  ///< masked image to add to coadd
+        lsst::afw::image::MaskPixel const
+                badPixelMask,  ///< skip input pixel if input mask & badPixelMask !=0
+        WeightPixelT weight,   ///< relative weight of this image
+        lsst::afw::image::Image<int> *countMap,  ///< [in,out] number of inputs contributing each pixel;
+                                                 ///< may be null
+        lsst::afw::image::Image<std::uint64_t> *provenanceMap,  ///< [in,out] bitset of inputs contributing
+                                                                ///< each pixel; may be null
+        int inputIndex  ///< bit of provenanceMap to set for this image
+);
+
+/**
+ * @brief add good pixels from many images to a coadd and associated weight map in a single pass
+ *
+ * This is equivalent to calling addToCoadd once for each image, in order,
+ * but the coadd is traversed only once: it is processed in bands of rows and every overlapping image
+ * is added to a band while that band of the coadd and weight map is still in cache.
+ * Good pixels are those that are not NaN (thus they do include +/- inf).
+ *
+ * @return overlapBBoxList: overlapping bounding box of each image, relative to parent image
+ *
+ * @throw pexExcept::InvalidParameterError if coadd and weightMap dimensions or xy0 do not match,
+ *        or if imageList contains a null image.
+ * @throw pexExcept::LengthError if imageList and weightList have different lengths.
+ */
+template <typename CoaddPixelT, typename WeightPixelT>
+std::vector<lsst::geom::Box2I> addManyToCoadd(
+        lsst::afw::image::Image<CoaddPixelT> &coadd,  ///< [in,out] coadd to be modified
+        lsst::afw::image::Image<WeightPixelT> &
+                weightMap,  ///< [in,out] weight map to be modified;
+                            ///< this is the sum of weights of all images contributing each pixel of the coadd
+        std::vector<std::shared_ptr<lsst::afw::image::Image<CoaddPixelT>>> const
+                &imageList,                         ///< images to add to coadd
+        std::vector<WeightPixelT> const &weightList  ///< relative weight of each image
+);
+
+/**
+ * @brief add good pixels from many masked images to a coadd image and associated weight map
+ *        in a single pass
+ *
+ * This is equivalent to calling addToCoadd once for each masked image, in order,
+ * but the coadd is traversed only once: it is processed in bands of rows and every overlapping image
+ * is added to a band while that band of the coadd and weight map is still in cache.
+ * Good pixels are those for which mask & badPixelMask == 0.
+ *
+ * @return overlapBBoxList: overlapping bounding box of each image, relative to parent image
+ *
+ * @throw pexExcept::InvalidParameterError if coadd and weightMap dimensions or xy0 do not match,
+ *        or if maskedImageList contains a null image.
+ * @throw pexExcept::LengthError if maskedImageList and weightList have different lengths.
+ */
+template <typename CoaddPixelT, typename WeightPixelT>
+std::vector<lsst::geom::Box2I> addManyToCoadd(
+        lsst::afw::image::MaskedImage<CoaddPixelT, lsst::afw::image::MaskPixel,
+                                      lsst::afw::image::VariancePixel>
+                &coadd,  ///< [in,out] coadd to be modified
+        lsst::afw::image::Image<WeightPixelT> &
+                weightMap,  ///< [in,out] weight map to be modified;
+                            ///< this is the sum of weights of all images contributing each pixel of the coadd
+        std::vector<std::shared_ptr<lsst::afw::image::MaskedImage<
+                CoaddPixelT, lsst::afw::image::MaskPixel, lsst::afw::image::VariancePixel>>> const
+                &maskedImageList,  ///< masked images to add to coadd
+        lsst::afw::image::MaskPixel const
+                badPixelMask,                        ///< skip input pixel if input mask & badPixelMask !=0
+        std::vector<WeightPixelT> const &weightList  ///< relative weight of each image
+);
+
+/**
+ * @brief one product to update from a masked image with addToCoaddTargets
+ *
+ * The operation says which of the other members are used; good pixels are those of the masked image
+ * for which mask & badPixelMask == 0.
+ */
+template <typename CoaddPixelT, typename WeightPixelT>
+struct CoaddTarget {
+    typedef lsst::afw::image::MaskedImage<CoaddPixelT, lsst::afw::image::MaskPixel,
+                                          lsst::afw::image::VariancePixel>
+            MaskedImage;
+
+    /// How a target is updated
+    enum Operation {
+        ADD,        ///< add the good pixels to coadd and weight to weightMap, as by addToCoadd
+        COPY_GOOD,  ///< copy the good pixels to coadd, as by copyGoodPixels; weightMap and weight are unused
+        ADD_WEIGHT  ///< add weight to weightMap for each good pixel, e.g. for an exposure time map;
+                    ///< coadd is unused
+    };
+
+    CoaddTarget(Operation operation_, std::shared_ptr<MaskedImage> coadd_,
+                std::shared_ptr<lsst::afw::image::Image<WeightPixelT>> weightMap_,
+                lsst::afw::image::MaskPixel badPixelMask_, WeightPixelT weight_ = 1)
+            : operation(operation_),
+              coadd(std::move(coadd_)),
+              weightMap(std::move(weightMap_)),
+              badPixelMask(badPixelMask_),
+              weight(weight_) {}
+
+    Operation operation;                       ///< how to update the target
+    std::shared_ptr<MaskedImage> coadd;        ///< [in,out] coadd; may be null if unused
+    std::shared_ptr<lsst::afw::image::Image<WeightPixelT>>
+            weightMap;                         ///< [in,out] weight map; may be null if unused
+    lsst::afw::image::MaskPixel badPixelMask;  ///< skip pixel if mask & badPixelMask != 0
+    WeightPixelT weight;                       ///< relative weight of the image
+};
+
+/**
+ * @brief update several coadds from one masked image in a single pass over the image
+ *
+ * Each target is updated as given by its operation (see CoaddTarget).
+ * The result is the same as updating each target separately, in order,
+ * but each row of the masked image is read only once: it is applied to every target
+ * while it is still in cache.
+ *
+ * @return overlapBBoxList: overlapping bounding box of each target, relative to parent image
+ *
+ * @throw pexExcept::InvalidParameterError if a target lacks the coadd or weight map its operation needs,
+ *        or if an ADD target's coadd and weight map dimensions or xy0 do not match.
+ */
+template <typename CoaddPixelT, typename WeightPixelT>
+std::vector<lsst::geom::Box2I> addToCoaddTargets(
+        std::vector<CoaddTarget<CoaddPixelT, WeightPixelT>> const
+                &targetList,  ///< [in,out] targets to update
+        lsst::afw::image::MaskedImage<CoaddPixelT, lsst::afw::image::MaskPixel,
+                                      lsst::afw::image::VariancePixel> const
+                &maskedImage  ///< masked image to add to the targets
+);
+
+/**
+ * @brief count the saturated pixels of a weight map
+ *
+ * A pixel of an integer weight map is saturated if it equals std::numeric_limits<WeightPixelT>::max()
+ * or, for signed types, min(). Its true weight is at least (or at most) that value, so a weight that
+ * sums to exactly a limit also counts as saturated. Floating point weight maps never saturate.
+ *
+ * @return the number of saturated pixels; 0 for a floating point weight map
+ */
+template <typename WeightPixelT>
+std::int64_t countSaturatedWeights(
+        lsst::afw::image::Image<WeightPixelT> const &weightMap  ///< weight map to check
+);
+
 }  // namespace utils
 }  // namespace coadd
 }  // namespace lsst
@@ -0,0 +1,162 @@
+// -*- LSST-C++ -*-
+/*
+ * This file is part of coadd_utils.
+ *
+ * Developed for the LSST Data Management System.
+ * This product includes software developed by the LSST Project
+ * (https://www.lsst.org).
+ * See the COPYRIGHT file at the top-level directory of this distribution
+ * for details of code ownership.
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <https://www.gnu.org/licenses/>.
+ */
+
+#ifndef LSST_COADD_UTILS_ARRAYKERNELS_H
+#define LSST_COADD_UTILS_ARRAYKERNELS_H
+/**
+ * @file
+ *
+ * Versions of the coadd kernels that work on pixel arrays owned by the caller,
+ * such as numpy arrays or shared memory, instead of afw images.
+ *
+ * Each plane is described by a PixelArray; the planes of a masked image are passed separately
+ * and must have the same bounding box. Overlaps are computed exactly as by the afw image versions.
+ */
+#include <cstddef>
+
+#include "lsst/geom.h"
+#include "lsst/afw/image/LsstImageTypes.h"
+
+namespace lsst {
+namespace coadd {
+namespace utils {
+
+/**
+ * @brief a view of a 2-d array of pixels owned by the caller, with the parent position of its first pixel
+ *
+ * Pixels within a row must be contiguous; successive rows are rowStride pixels apart.
+ */
+template <typename PixelT>
+struct PixelArray {
+    PixelT *data;               ///< first pixel of the first row
+    int width;                  ///< number of pixels per row
+    int height;                 ///< number of rows
+    std::ptrdiff_t rowStride;   ///< number of pixels between the starts of successive rows
+    int x0;                     ///< parent x of the first pixel
+    int y0;                     ///< parent y of the first pixel
+
+    /// Return the parent bounding box of the array
+    lsst::geom::Box2I getBBox() const {
+        return lsst::geom::Box2I(lsst::geom::Point2I(x0, y0), lsst::geom::Extent2I(width, height));
+    }
+
+    /// Return a pointer to pixel (x, y), where x, y are relative to the parent image
+    PixelT *getPixelPtr(int x, int y) const { return data + (y - y0) * rowStride + (x - x0); }
+};
+
+/**
+ * @brief add good pixels from an image array to a coadd and weight map arrays
+ *
+ * This is addToCoadd for an Image; good pixels are those that are not NaN.
+ *
+ * @return overlapping bounding box, relative to parent image (hence this is not the same as
+ * the bounding box of the overlap relative to the coadd arrays)
+ *
+ * @throw pexExcept::InvalidParameterError if coadd and weightMap bounding boxes differ
+ */
+template <typename CoaddPixelT, typename WeightPixelT>
+lsst::geom::Box2I addToCoaddArrays(
+        PixelArray<CoaddPixelT> const &coadd,           ///< [in,out] coadd to be modified
+        PixelArray<WeightPixelT> const &weightMap,      ///< [in,out] weight map to be modified
+        PixelArray<CoaddPixelT const> const &image,     ///< image to add to coadd
+        WeightPixelT weight                             ///< relative weight of this image
+);
+
+/**
+ * @brief add good pixels from masked image arrays to coadd and weight map arrays
+ *
+ * This is addToCoadd for a MaskedImage; good pixels are those for which mask & badPixelMask == 0.
+ *
+ * @return overlapping bounding box, relative to parent image
+ *
+ * @throw pexExcept::InvalidParameterError if the coadd planes and weightMap bounding boxes differ
+ * or the planes of the input do not have the same bounding box.
+ */
+template <typename CoaddPixelT, typename WeightPixelT>
+lsst::geom::Box2I addToCoaddArrays(
+        PixelArray<CoaddPixelT> const &coaddImage,                          ///< [in,out] coadd image
+        PixelArray<lsst::afw::image::MaskPixel> const &coaddMask,           ///< [in,out] coadd mask
+        PixelArray<lsst::afw::image::VariancePixel> const &coaddVariance,   ///< [in,out] coadd variance
+        PixelArray<WeightPixelT> const &weightMap,                          ///< [in,out] weight map
+        PixelArray<CoaddPixelT const> const &image,                         ///< image to add
+        PixelArray<lsst::afw::image::MaskPixel const> const &mask,          ///< mask of image
+        PixelArray<lsst::afw::image::VariancePixel const> const &variance,  ///< variance of image
+        lsst::afw::image::MaskPixel const badPixelMask,  ///< skip input pixel if mask & badPixelMask != 0
+        WeightPixelT weight                             ///< relative weight of this image
+);
+
+/**
+ * @brief copy good pixels from one image array to another
+ *
+ * This is copyGoodPixels for an Image; good pixels are those that are not NaN.
+ *
+ * @return the number of pixels copied
+ */
+template <typename ImagePixelT>
+int copyGoodPixelsArrays(
+        PixelArray<ImagePixelT> const &destImage,       ///< [in,out] image to modify
+        PixelArray<ImagePixelT const> const &srcImage   ///< image to copy
+);
+
+/**
+ * @brief copy good pixels from one set of masked image arrays to another
+ *
+ * This is copyGoodPixels for a MaskedImage; good pixels are those for which mask & badPixelMask == 0.
+ *
+ * @return the number of pixels copied
+ *
+ * @throw pexExcept::InvalidParameterError if the planes of the destination or of the source
+ * do not have the same bounding box.
+ */
+template <typename ImagePixelT>
+int copyGoodPixelsArrays(
+        PixelArray<ImagePixelT> const &destImage,                              ///< [in,out] image
+        PixelArray<lsst::afw::image::MaskPixel> const &destMask,               ///< [in,out] mask
+        PixelArray<lsst::afw::image::VariancePixel> const &destVariance,       ///< [in,out] variance
+        PixelArray<ImagePixelT const> const &srcImage,                         ///< image to copy
+        PixelArray<lsst::afw::image::MaskPixel const> const &srcMask,          ///< mask to copy
+        PixelArray<lsst::afw::image::VariancePixel const> const &srcVariance,  ///< variance to copy
+        lsst::afw::image::MaskPixel const badPixelMask  ///< skip input pixel if mask & badPixelMask != 0
+);
+
+/**
+ * @brief set edgeMask bits of a coadd mask array wherever the weight map array is zero
+ *
+ * This is setCoaddEdgeBits with the mask bits given explicitly, since there is no afw mask plane
+ * dictionary to look NO_DATA up in.
+ *
+ * @throw pexExcept::InvalidParameterError if coaddMask and weightMap dimensions differ.
+ */
+template <typename WeightPixelT>
+void setCoaddEdgeBitsArrays(
+        PixelArray<lsst::afw::image::MaskPixel> const &coaddMask,  ///< [in,out] mask of coadd
+        PixelArray<WeightPixelT const> const &weightMap,           ///< weight map
+        lsst::afw::image::MaskPixel const edgeMask                 ///< bits to set, e.g. NO_DATA
+);
+
+}  // namespace utils
+}  // namespace coadd
+}  // namespace lsst
+
+#endif  // !defined(LSST_COADD_UTILS_ARRAYKERNELS_H)
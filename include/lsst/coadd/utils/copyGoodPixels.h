@@ -31,6 +31,7 @@
  */
 #include "lsst/geom.h"
 #include "lsst/afw/image.h"
+#include "lsst/coadd/utils/GoodPixelSpans.h"
 
 namespace lsst {
 namespace coadd {
@@ -71,6 +72,42 @@ int copyGoodPixels(
         lsst::afw::image::MaskPixel const badPixelMask  ///< skip input pixel if src mask & badPixelMask != 0
 );
 
+/**
+ * @brief copy the pixels listed in a GoodPixelSpans from one image to another
+ *
+ * This is copyGoodPixels, except that the good pixels are those in goodPixelSpans,
+ * which are copied a whole span at a time without testing each pixel.
+ *
+ * @return number of pixels copied
+ *
+ * @throw pexExcept::InvalidParameterError if srcImage and goodPixelSpans bounding boxes do not match.
+ */
+template <typename ImagePixelT>
+int copyGoodPixels(lsst::afw::image::Image<ImagePixelT> &destImage,      ///< [in,out] image to be modified
+                   lsst::afw::image::Image<ImagePixelT> const &srcImage,  ///< image to copy
+                   GoodPixelSpans const &goodPixelSpans                   ///< good pixels of srcImage
+);
+
+/**
+ * @brief copy the pixels listed in a GoodPixelSpans from one masked image to another
+ *
+ * This is copyGoodPixels, except that the good pixels are those in goodPixelSpans,
+ * which are copied a whole span at a time without testing each pixel.
+ *
+ * @return number of pixels copied
+ *
+ * @throw pexExcept::InvalidParameterError if srcImage and goodPixelSpans bounding boxes do not match.
+ */
+template <typename ImagePixelT>
+int copyGoodPixels(
+        lsst::afw::image::MaskedImage<ImagePixelT, lsst::afw::image::MaskPixel,
+                                      lsst::afw::image::VariancePixel>
+                &destImage,  ///< [in,out] image to be modified
+        lsst::afw::image::MaskedImage<ImagePixelT, lsst::afw::image::MaskPixel,
+                                      lsst::afw::image::VariancePixel> const &srcImage,  ///< image to copy
+        GoodPixelSpans const &goodPixelSpans  ///< good pixels of srcImage
+);
+
 }  // namespace utils
 }  // namespace coadd
 }  // namespace lsst
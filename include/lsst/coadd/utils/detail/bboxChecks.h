@@ -0,0 +1,66 @@
+// -*- LSST-C++ -*-
+/*
+ * This file is part of coadd_utils.
+ *
+ * Developed for the LSST Data Management System.
+ * This product includes software developed by the LSST Project
+ * (https://www.lsst.org).
+ * See the COPYRIGHT file at the top-level directory of this distribution
+ * for details of code ownership.
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <https://www.gnu.org/licenses/>.
+ */
+
+#ifndef LSST_COADD_UTILS_DETAIL_BBOXCHECKS_H
+#define LSST_COADD_UTILS_DETAIL_BBOXCHECKS_H
+/**
+ * @file
+ *
+ * Bounding box checks shared by the coadd kernels; does not depend on afw.
+ */
+#include "boost/format.hpp"
+
+#include "lsst/pex/exceptions.h"
+#include "lsst/geom.h"
+
+namespace lsst {
+namespace coadd {
+namespace utils {
+namespace detail {
+
+/**
+ * Throw InvalidParameterError if two images have different bounding boxes
+ *
+ * ImageT1 and ImageT2 may be any types with a getBBox method returning the parent bounding box,
+ * such as afw images, PixelArrays and GoodPixelSpans.
+ */
+template <typename ImageT1, typename ImageT2>
+void assertSameBBox(ImageT1 const &image1,  ///< first image
+                    char const *name1,      ///< name of first image, for the error message
+                    ImageT2 const &image2,  ///< second image
+                    char const *name2       ///< name of second image, for the error message
+) {
+    if (image1.getBBox() != image2.getBBox()) {
+        throw LSST_EXCEPT(lsst::pex::exceptions::InvalidParameterError,
+                          (boost::format("%s and %s parent bboxes differ: %s != %s") % name1 % name2 %
+                           image1.getBBox() % image2.getBBox()).str());
+    }
+}
+
+}  // namespace detail
+}  // namespace utils
+}  // namespace coadd
+}  // namespace lsst
+
+#endif  // !defined(LSST_COADD_UTILS_DETAIL_BBOXCHECKS_H)
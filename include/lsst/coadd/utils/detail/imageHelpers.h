@@ -0,0 +1,82 @@
+// -*- LSST-C++ -*-
+/*
+ * This file is part of coadd_utils.
+ *
+ * Developed for the LSST Data Management System.
+ * This product includes software developed by the LSST Project
+ * (https://www.lsst.org).
+ * See the COPYRIGHT file at the top-level directory of this distribution
+ * for details of code ownership.
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <https://www.gnu.org/licenses/>.
+ */
+
+#ifndef LSST_COADD_UTILS_DETAIL_IMAGEHELPERS_H
+#define LSST_COADD_UTILS_DETAIL_IMAGEHELPERS_H
+/**
+ * @file
+ *
+ * Argument checks and pixel sizes shared by the coadd kernels.
+ */
+#include <cstddef>
+
+#include "lsst/afw/image.h"
+#include "lsst/coadd/utils/GoodPixelSpans.h"
+#include "lsst/coadd/utils/detail/bboxChecks.h"
+
+namespace lsst {
+namespace coadd {
+namespace utils {
+namespace detail {
+
+/**
+ * Throw InvalidParameterError if the coadd and weight map bounding boxes differ
+ */
+template <typename CoaddT, typename WeightPixelT>
+void assertSameBBox(CoaddT const &coadd,                                    ///< coadd
+                    lsst::afw::image::Image<WeightPixelT> const &weightMap  ///< weight map
+) {
+    assertSameBBox(coadd, "coadd", weightMap, "weightMap");
+}
+
+/**
+ * Throw InvalidParameterError if an image and its good pixel spans have different bounding boxes
+ */
+template <typename ImageT>
+void assertSameSpansBBox(ImageT const &image,                    ///< image
+                         GoodPixelSpans const &goodPixelSpans,   ///< good pixels of image
+                         char const *name = "image"              ///< name of image, for the error message
+) {
+    assertSameBBox(image, name, goodPixelSpans, "goodPixelSpans");
+}
+
+/**
+ * Number of bytes in one pixel of all planes of an image
+ */
+template <typename PixelT>
+std::size_t getPixelBytes(lsst::afw::image::Image<PixelT> const &) {
+    return sizeof(PixelT);
+}
+
+template <typename PixelT>
+std::size_t getPixelBytes(lsst::afw::image::MaskedImage<PixelT> const &) {
+    return sizeof(PixelT) + sizeof(lsst::afw::image::MaskPixel) + sizeof(lsst::afw::image::VariancePixel);
+}
+
+}  // namespace detail
+}  // namespace utils
+}  // namespace coadd
+}  // namespace lsst
+
+#endif  // !defined(LSST_COADD_UTILS_DETAIL_IMAGEHELPERS_H)
@@ -0,0 +1,71 @@
+// -*- LSST-C++ -*-
+/*
+ * This file is part of coadd_utils.
+ *
+ * Developed for the LSST Data Management System.
+ * This product includes software developed by the LSST Project
+ * (https://www.lsst.org).
+ * See the COPYRIGHT file at the top-level directory of this distribution
+ * for details of code ownership.
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <https://www.gnu.org/licenses/>.
+ */
+
+#ifndef LSST_COADD_UTILS_DETAIL_OVERLAPBANDS_H
+#define LSST_COADD_UTILS_DETAIL_OVERLAPBANDS_H
+/**
+ * @file
+ *
+ * Split the overlap of a destination and a source into bands of rows; does not depend on afw.
+ */
+#include "lsst/geom.h"
+#include "lsst/coadd/utils/parallel.h"
+
+namespace lsst {
+namespace coadd {
+namespace utils {
+namespace detail {
+
+/**
+ * Call func(bandBBox) for each band of rows of the overlap of two bounding boxes
+ *
+ * The bands are processed by up to getNumThreads() threads, as for forEachRowBand;
+ * func is not called if the bounding boxes do not overlap.
+ *
+ * @return overlapping bounding box, relative to parent image
+ */
+template <typename Func>
+lsst::geom::Box2I forEachOverlapBand(lsst::geom::Box2I const &destBBox,  ///< bounding box of the destination
+                                     lsst::geom::Box2I const &srcBBox,   ///< bounding box of the source
+                                     Func const &func  ///< function to call for each band
+) {
+    lsst::geom::Box2I overlapBBox = destBBox;
+    overlapBBox.clip(srcBBox);
+    if (overlapBBox.isEmpty()) {
+        return overlapBBox;
+    }
+
+    forEachRowBand(overlapBBox.getBeginY(), overlapBBox.getEndY(), [&](int bandBeginY, int bandEndY) {
+        func(lsst::geom::Box2I(lsst::geom::Point2I(overlapBBox.getMinX(), bandBeginY),
+                               lsst::geom::Extent2I(overlapBBox.getWidth(), bandEndY - bandBeginY)));
+    });
+    return overlapBBox;
+}
+
+}  // namespace detail
+}  // namespace utils
+}  // namespace coadd
+}  // namespace lsst
+
+#endif  // !defined(LSST_COADD_UTILS_DETAIL_OVERLAPBANDS_H)
@@ -0,0 +1,810 @@
+// -*- LSST-C++ -*-
+/*
+ * This file is part of coadd_utils.
+ *
+ * Developed for the LSST Data Management System.
+ * This product includes software developed by the LSST Project
+ * (https://www.lsst.org).
+ * See the COPYRIGHT file at the top-level directory of this distribution
+ * for details of code ownership.
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <https://www.gnu.org/licenses/>.
+ */
+
+#ifndef LSST_COADD_UTILS_DETAIL_ROWKERNELS_H
+#define LSST_COADD_UTILS_DETAIL_ROWKERNELS_H
+/**
+ * @file
+ *
+ * Per-row pixel loops shared by the coadd kernels.
+ *
+ * The loops work directly on contiguous rows of the image, mask, variance and weight planes
+ * and contain no branches, so that the compiler can vectorize them.
+ * Each output pixel is computed with the same arithmetic as afw::image pixel operations,
+ * so the results are identical to adding or copying pixel by pixel.
+ */
+#include <algorithm>
+#include <cmath>
+#include <cstddef>
+#include <cstdint>
+#include <cstring>
+#include <limits>
+#include <type_traits>
+
+#include "lsst/afw/image/LsstImageTypes.h"
+
+namespace lsst {
+namespace coadd {
+namespace utils {
+namespace detail {
+
+/// Unsigned integer type with the same size as a pixel type
+template <std::size_t N>
+struct UIntOfSize;
+template <>
+struct UIntOfSize<1> {
+    typedef std::uint8_t type;
+};
+template <>
+struct UIntOfSize<2> {
+    typedef std::uint16_t type;
+};
+template <>
+struct UIntOfSize<4> {
+    typedef std::uint32_t type;
+};
+template <>
+struct UIntOfSize<8> {
+    typedef std::uint64_t type;
+};
+
+/**
+ * Return a if cond is true, else b, selecting on the bits of the values
+ *
+ * Unlike `cond ? a : b` this cannot be turned back into a conditional store by the optimizer,
+ * so loops built from it are vectorized.
+ */
+template <typename T>
+inline T bitSelect(bool cond, T a, T b) {
+    typedef typename UIntOfSize<sizeof(T)>::type UInt;
+    UInt const keep = -static_cast<UInt>(cond);
+    UInt aBits, bBits;
+    std::memcpy(&aBits, &a, sizeof(T));
+    std::memcpy(&bBits, &b, sizeof(T));
+    UInt const resultBits = (aBits & keep) | (bBits & ~keep);
+    T result;
+    std::memcpy(&result, &resultBits, sizeof(T));
+    return result;
+}
+
+/**
+ * Return value if cond is true, else an additive identity
+ *
+ * The identity is -0 for floating point types, so that x + addendIf(false, value) == x
+ * for every x, including x = -0.
+ */
+template <typename T>
+inline T addendIf(bool cond, T value) {
+    return bitSelect(cond, value, static_cast<T>(-static_cast<T>(0)));
+}
+
+/**
+ * Return true if a weight map pixel is saturated
+ *
+ * Integer weight sums saturate at the limits of the type instead of overflowing, so a pixel
+ * equal to std::numeric_limits<T>::max() (or, for signed types, min()) is saturated: its true
+ * weight is at least (or at most) that value and cannot be recovered. A weight that sums to
+ * exactly a limit is therefore treated as saturated, too. The min() of an unsigned type is zero,
+ * the weight of an empty pixel, so it is not a saturation limit. Floating point weights never saturate.
+ */
+template <typename T>
+inline typename std::enable_if<std::is_integral<T>::value, bool>::type isSaturatedWeight(T weight) {
+    return (weight == std::numeric_limits<T>::max()) |
+           (std::is_signed<T>::value & (weight == std::numeric_limits<T>::min()));
+}
+
+template <typename T>
+inline typename std::enable_if<std::is_floating_point<T>::value, bool>::type isSaturatedWeight(T) {
+    return false;
+}
+
+/**
+ * Return a + b for a weight map pixel
+ *
+ * Integer sums clamp at the limits of the type instead of overflowing.
+ * A saturated pixel (see isSaturatedWeight) is returned unchanged.
+ */
+template <typename T>
+inline typename std::enable_if<std::is_integral<T>::value, T>::type addWeight(T a, T b) {
+    typedef std::int64_t Wide;
+    static_assert(sizeof(T) < sizeof(Wide), "sum of two weights must fit in Wide");
+    Wide const sum = static_cast<Wide>(a) + static_cast<Wide>(b);
+    Wide const minValue = std::numeric_limits<T>::min(), maxValue = std::numeric_limits<T>::max();
+    T const clamped = static_cast<T>(std::min(std::max(sum, minValue), maxValue));
+    return bitSelect(isSaturatedWeight(a), a, clamped);
+}
+
+template <typename T>
+inline typename std::enable_if<std::is_floating_point<T>::value, T>::type addWeight(T a, T b) {
+    return a + b;
+}
+
+/**
+ * Return a - b for a weight map pixel; the inverse of addWeight
+ *
+ * Integer differences clamp at the limits of the type. A saturated pixel (see isSaturatedWeight)
+ * is returned unchanged, because the weight that was lost when it saturated cannot be recovered:
+ * inputs cannot be removed from saturated pixels.
+ */
+template <typename T>
+inline typename std::enable_if<std::is_integral<T>::value, T>::type subtractWeight(T a, T b) {
+    typedef std::int64_t Wide;
+    static_assert(sizeof(T) < sizeof(Wide), "difference of two weights must fit in Wide");
+    Wide const diff = static_cast<Wide>(a) - static_cast<Wide>(b);
+    Wide const minValue = std::numeric_limits<T>::min(), maxValue = std::numeric_limits<T>::max();
+    T const clamped = static_cast<T>(std::min(std::max(diff, minValue), maxValue));
+    return bitSelect(isSaturatedWeight(a), a, clamped);
+}
+
+template <typename T>
+inline typename std::enable_if<std::is_floating_point<T>::value, T>::type subtractWeight(T a, T b) {
+    return a - b;
+}
+
+/// Return true if an Image pixel is good: not NaN (thus +/- inf are good)
+template <typename PixelT>
+inline bool isKnownValue(PixelT value) {
+    return !std::isnan(static_cast<float>(value));
+}
+
+/**
+ * Add the good pixels of one row of an image to a row of a coadd and weight map
+ *
+ * Good pixels are those that are not NaN.
+ */
+template <typename CoaddPixelT, typename WeightPixelT>
+inline void addRowToCoadd(CoaddPixelT *__restrict__ coadd,        ///< [in,out] coadd row
+                          WeightPixelT *__restrict__ weightMap,   ///< [in,out] weight map row
+                          CoaddPixelT const *__restrict__ image,  ///< image row
+                          int width,                              ///< number of pixels in the row
+                          WeightPixelT weight                     ///< relative weight of this image
+) {
+    CoaddPixelT const imageWeight = static_cast<CoaddPixelT>(weight);
+    for (int x = 0; x < width; ++x) {
+        bool const isGood = isKnownValue(image[x]);
+        coadd[x] += addendIf(isGood, image[x] * imageWeight);
+        weightMap[x] = addWeight(weightMap[x], addendIf(isGood, weight));
+    }
+}
+
+/**
+ * Add the good pixels of one row of a masked image to a row of a coadd and weight map
+ *
+ * Good pixels are those for which mask & badPixelMask == 0.
+ */
+template <typename CoaddPixelT, typename WeightPixelT>
+inline void addRowToCoadd(
+        CoaddPixelT *__restrict__ coaddImage,                                 ///< [in,out] coadd image row
+        lsst::afw::image::MaskPixel *__restrict__ coaddMask,                  ///< [in,out] coadd mask row
+        lsst::afw::image::VariancePixel *__restrict__ coaddVariance,          ///< [in,out] coadd variance row
+        WeightPixelT *__restrict__ weightMap,                                 ///< [in,out] weight map row
+        CoaddPixelT const *__restrict__ image,                                ///< image row
+        lsst::afw::image::MaskPixel const *__restrict__ mask,                 ///< mask row
+        lsst::afw::image::VariancePixel const *__restrict__ variance,         ///< variance row
+        int width,                                                            ///< number of pixels in the row
+        lsst::afw::image::MaskPixel badPixelMask,  ///< skip pixel if mask & badPixelMask != 0
+        WeightPixelT weight                        ///< relative weight of this image
+) {
+    typedef lsst::afw::image::VariancePixel VariancePixel;
+
+    CoaddPixelT const imageWeight = static_cast<CoaddPixelT>(weight);
+    CoaddPixelT const imageWeight2 = imageWeight * imageWeight;
+    for (int x = 0; x < width; ++x) {
+        bool const isGood = (mask[x] & badPixelMask) == 0;
+        // variance of image * weight as computed by afw pixel arithmetic; the weight has zero variance
+        VariancePixel const weightedVariance = image[x] * image[x] * 0 + imageWeight2 * variance[x];
+        coaddImage[x] += addendIf(isGood, image[x] * imageWeight);
+        coaddMask[x] |= addendIf(isGood, mask[x]);
+        coaddVariance[x] += addendIf(isGood, weightedVariance);
+        weightMap[x] = addWeight(weightMap[x], addendIf(isGood, weight));
+    }
+}
+
+/**
+ * Add a span of pixels of an image to a span of a coadd and weight map
+ *
+ * Every pixel is added; the caller has already selected the good pixels.
+ */
+template <typename CoaddPixelT, typename WeightPixelT>
+inline void addSpanToCoadd(CoaddPixelT *__restrict__ coadd,        ///< [in,out] coadd span
+                           WeightPixelT *__restrict__ weightMap,   ///< [in,out] weight map span
+                           CoaddPixelT const *__restrict__ image,  ///< image span
+                           int width,                              ///< number of pixels in the span
+                           WeightPixelT weight                     ///< relative weight of this image
+) {
+    CoaddPixelT const imageWeight = static_cast<CoaddPixelT>(weight);
+    for (int x = 0; x < width; ++x) {
+        coadd[x] += image[x] * imageWeight;
+        weightMap[x] = addWeight(weightMap[x], weight);
+    }
+}
+
+/**
+ * Add a span of pixels of a masked image to a span of a coadd and weight map
+ *
+ * Every pixel is added; the caller has already selected the good pixels.
+ */
+template <typename CoaddPixelT, typename WeightPixelT>
+inline void addSpanToCoadd(
+        CoaddPixelT *__restrict__ coaddImage,                          ///< [in,out] coadd image span
+        lsst::afw::image::MaskPixel *__restrict__ coaddMask,           ///< [in,out] coadd mask span
+        lsst::afw::image::VariancePixel *__restrict__ coaddVariance,   ///< [in,out] coadd variance span
+        WeightPixelT *__restrict__ weightMap,                          ///< [in,out] weight map span
+        CoaddPixelT const *__restrict__ image,                         ///< image span
+        lsst::afw::image::MaskPixel const *__restrict__ mask,          ///< mask span
+        lsst::afw::image::VariancePixel const *__restrict__ variance,  ///< variance span
+        int width,                                                     ///< number of pixels in the span
+        WeightPixelT weight                                            ///< relative weight of this image
+) {
+    typedef lsst::afw::image::VariancePixel VariancePixel;
+
+    CoaddPixelT const imageWeight = static_cast<CoaddPixelT>(weight);
+    CoaddPixelT const imageWeight2 = imageWeight * imageWeight;
+    for (int x = 0; x < width; ++x) {
+        // variance of image * weight as computed by afw pixel arithmetic; the weight has zero variance
+        VariancePixel const weightedVariance = image[x] * image[x] * 0 + imageWeight2 * variance[x];
+        coaddImage[x] += image[x] * imageWeight;
+        coaddMask[x] |= mask[x];
+        coaddVariance[x] += weightedVariance;
+        weightMap[x] = addWeight(weightMap[x], weight);
+    }
+}
+
+/**
+ * Add the good pixels of one row of an image to a row of a coadd and weight map,
+ * weighting each pixel by the corresponding pixel of a weight row
+ *
+ * Good pixels are those that are not NaN.
+ */
+template <typename CoaddPixelT, typename WeightPixelT>
+inline void addRowToCoadd(CoaddPixelT *__restrict__ coadd,             ///< [in,out] coadd row
+                          WeightPixelT *__restrict__ weightMap,        ///< [in,out] weight map row
+                          CoaddPixelT const *__restrict__ image,       ///< image row
+                          int width,                                   ///< number of pixels in the row
+                          WeightPixelT const *__restrict__ weight      ///< weight row
+) {
+    for (int x = 0; x < width; ++x) {
+        bool const isGood = isKnownValue(image[x]);
+        coadd[x] += addendIf(isGood, image[x] * static_cast<CoaddPixelT>(weight[x]));
+        weightMap[x] = addWeight(weightMap[x], addendIf(isGood, weight[x]));
+    }
+}
+
+/**
+ * Add the good pixels of one row of a masked image to a row of a coadd and weight map,
+ * weighting each pixel by the corresponding pixel of a weight row
+ *
+ * Good pixels are those for which mask & badPixelMask == 0.
+ */
+template <typename CoaddPixelT, typename WeightPixelT>
+inline void addRowToCoadd(
+        CoaddPixelT *__restrict__ coaddImage,                                 ///< [in,out] coadd image row
+        lsst::afw::image::MaskPixel *__restrict__ coaddMask,                  ///< [in,out] coadd mask row
+        lsst::afw::image::VariancePixel *__restrict__ coaddVariance,          ///< [in,out] coadd variance row
+        WeightPixelT *__restrict__ weightMap,                                 ///< [in,out] weight map row
+        CoaddPixelT const *__restrict__ image,                                ///< image row
+        lsst::afw::image::MaskPixel const *__restrict__ mask,                 ///< mask row
+        lsst::afw::image::VariancePixel const *__restrict__ variance,         ///< variance row
+        int width,                                                            ///< number of pixels in the row
+        lsst::afw::image::MaskPixel badPixelMask,  ///< skip pixel if mask & badPixelMask != 0
+        WeightPixelT const *__restrict__ weight    ///< weight row
+) {
+    typedef lsst::afw::image::VariancePixel VariancePixel;
+
+    for (int x = 0; x < width; ++x) {
+        bool const isGood = (mask[x] & badPixelMask) == 0;
+        CoaddPixelT const imageWeight = static_cast<CoaddPixelT>(weight[x]);
+        CoaddPixelT const imageWeight2 = imageWeight * imageWeight;
+        VariancePixel const weightedVariance = image[x] * image[x] * 0 + imageWeight2 * variance[x];
+        coaddImage[x] += addendIf(isGood, image[x] * imageWeight);
+        coaddMask[x] |= addendIf(isGood, mask[x]);
+        coaddVariance[x] += addendIf(isGood, weightedVariance);
+        weightMap[x] = addWeight(weightMap[x], addendIf(isGood, weight[x]));
+    }
+}
+
+/**
+ * Add the good pixels of one row of a masked image to a row of a coadd and weight map,
+ * weighting each pixel by the inverse of its variance
+ *
+ * Good pixels are those for which mask & badPixelMask == 0 and whose variance is positive and finite;
+ * bad pixels contribute nothing, not even their mask bits.
+ */
+template <typename CoaddPixelT, typename WeightPixelT>
+inline void addRowToCoaddInverseVariance(
+        CoaddPixelT *__restrict__ coaddImage,                                 ///< [in,out] coadd image row
+        lsst::afw::image::MaskPixel *__restrict__ coaddMask,                  ///< [in,out] coadd mask row
+        lsst::afw::image::VariancePixel *__restrict__ coaddVariance,          ///< [in,out] coadd variance row
+        WeightPixelT *__restrict__ weightMap,                                 ///< [in,out] weight map row
+        CoaddPixelT const *__restrict__ image,                                ///< image row
+        lsst::afw::image::MaskPixel const *__restrict__ mask,                 ///< mask row
+        lsst::afw::image::VariancePixel const *__restrict__ variance,         ///< variance row
+        int width,                                                            ///< number of pixels in the row
+        lsst::afw::image::MaskPixel badPixelMask,  ///< skip pixel if mask & badPixelMask != 0
+        WeightPixelT weightScale                   ///< weight of a pixel is weightScale / variance
+) {
+    typedef lsst::afw::image::VariancePixel VariancePixel;
+
+    for (int x = 0; x < width; ++x) {
+        bool const isGood = ((mask[x] & badPixelMask) == 0) & (variance[x] > 0) &
+                            (variance[x] < std::numeric_limits<VariancePixel>::infinity());
+        WeightPixelT const weight = weightScale / variance[x];
+        CoaddPixelT const imageWeight = static_cast<CoaddPixelT>(weight);
+        CoaddPixelT const imageWeight2 = imageWeight * imageWeight;
+        VariancePixel const weightedVariance = image[x] * image[x] * 0 + imageWeight2 * variance[x];
+        coaddImage[x] += addendIf(isGood, image[x] * imageWeight);
+        coaddMask[x] |= addendIf(isGood, mask[x]);
+        coaddVariance[x] += addendIf(isGood, weightedVariance);
+        weightMap[x] = addWeight(weightMap[x], addendIf(isGood, weight));
+    }
+}
+
+/**
+ * Add the good pixels of one row of a masked image to a row of a coadd and weight map,
+ * using compensated (Neumaier) summation for the coadd image
+ *
+ * This is addRowToCoadd, except that the rounding error of each image sum is accumulated
+ * in a compensation row; the accurate sum is coaddImage + compensation.
+ * Good pixels are those for which mask & badPixelMask == 0.
+ *
+ * The compensation is only correct if the compiler preserves floating point associativity
+ * (e.g. no -ffast-math). It is not updated where the sum is infinite (an infinite input or an overflow),
+ * so it stays finite and coaddImage + compensation is the infinite sum rather than NaN.
+ */
+template <typename CoaddPixelT, typename WeightPixelT>
+inline void addRowToCoaddCompensated(
+        CoaddPixelT *__restrict__ coaddImage,                                 ///< [in,out] coadd image row
+        CoaddPixelT *__restrict__ compensation,                               ///< [in,out] compensation row
+        lsst::afw::image::MaskPixel *__restrict__ coaddMask,                  ///< [in,out] coadd mask row
+        lsst::afw::image::VariancePixel *__restrict__ coaddVariance,          ///< [in,out] coadd variance row
+        WeightPixelT *__restrict__ weightMap,                                 ///< [in,out] weight map row
+        CoaddPixelT const *__restrict__ image,                                ///< image row
+        lsst::afw::image::MaskPixel const *__restrict__ mask,                 ///< mask row
+        lsst::afw::image::VariancePixel const *__restrict__ variance,         ///< variance row
+        int width,                                                            ///< number of pixels in the row
+        lsst::afw::image::MaskPixel badPixelMask,  ///< skip pixel if mask & badPixelMask != 0
+        WeightPixelT weight                        ///< relative weight of this image
+) {
+    typedef lsst::afw::image::VariancePixel VariancePixel;
+
+    CoaddPixelT const imageWeight = static_cast<CoaddPixelT>(weight);
+    CoaddPixelT const imageWeight2 = imageWeight * imageWeight;
+    for (int x = 0; x < width; ++x) {
+        bool const isGood = (mask[x] & badPixelMask) == 0;
+        VariancePixel const weightedVariance = image[x] * image[x] * 0 + imageWeight2 * variance[x];
+        CoaddPixelT const addend = addendIf(isGood, image[x] * imageWeight);
+        CoaddPixelT const sum = coaddImage[x] + addend;
+        // the low-order bits of the smaller term are lost in sum; recover them exactly
+        bool const isCoaddLarger = std::abs(coaddImage[x]) >= std::abs(addend);
+        CoaddPixelT const larger = bitSelect(isCoaddLarger, coaddImage[x], addend);
+        CoaddPixelT const smaller = bitSelect(isCoaddLarger, addend, coaddImage[x]);
+        // an infinite sum has no rounding error to recover, and (larger - sum) would be NaN
+        compensation[x] += addendIf(std::isfinite(sum), (larger - sum) + smaller);
+        coaddImage[x] = sum;
+        coaddMask[x] |= addendIf(isGood, mask[x]);
+        coaddVariance[x] += addendIf(isGood, weightedVariance);
+        weightMap[x] = addWeight(weightMap[x], addendIf(isGood, weight));
+    }
+}
+
+/**
+ * Return value if cond is true, else a subtractive identity
+ *
+ * The identity is +0 for floating point types, so that x - subtrahendIf(false, value) == x
+ * for every x, including x = -0.
+ */
+template <typename T>
+inline T subtrahendIf(bool cond, T value) {
+    return bitSelect(cond, value, static_cast<T>(0));
+}
+
+/**
+ * Subtract the good pixels of one row of an image from a row of a coadd and weight map
+ *
+ * This undoes addRowToCoadd; good pixels are those that are not NaN.
+ * Saturated weight map pixels are left unchanged (see subtractWeight).
+ */
+template <typename CoaddPixelT, typename WeightPixelT>
+inline void removeRowFromCoadd(CoaddPixelT *__restrict__ coadd,        ///< [in,out] coadd row
+                               WeightPixelT *__restrict__ weightMap,   ///< [in,out] weight map row
+                               CoaddPixelT const *__restrict__ image,  ///< image row
+                               int width,                              ///< number of pixels in the row
+                               WeightPixelT weight                     ///< relative weight of this image
+) {
+    CoaddPixelT const imageWeight = static_cast<CoaddPixelT>(weight);
+    for (int x = 0; x < width; ++x) {
+        bool const isGood = isKnownValue(image[x]);
+        coadd[x] -= subtrahendIf(isGood, image[x] * imageWeight);
+        weightMap[x] = subtractWeight(weightMap[x], subtrahendIf(isGood, weight));
+    }
+}
+
+/**
+ * Subtract the good pixels of one row of a masked image from a row of a coadd and weight map
+ *
+ * This undoes addRowToCoadd, except that the coadd mask is left unchanged;
+ * good pixels are those for which mask & badPixelMask == 0.
+ * Saturated weight map pixels are left unchanged (see subtractWeight).
+ */
+template <typename CoaddPixelT, typename WeightPixelT>
+inline void removeRowFromCoadd(
+        CoaddPixelT *__restrict__ coaddImage,                                 ///< [in,out] coadd image row
+        lsst::afw::image::VariancePixel *__restrict__ coaddVariance,          ///< [in,out] coadd variance row
+        WeightPixelT *__restrict__ weightMap,                                 ///< [in,out] weight map row
+        CoaddPixelT const *__restrict__ image,                                ///< image row
+        lsst::afw::image::MaskPixel const *__restrict__ mask,                 ///< mask row
+        lsst::afw::image::VariancePixel const *__restrict__ variance,         ///< variance row
+        int width,                                                            ///< number of pixels in the row
+        lsst::afw::image::MaskPixel badPixelMask,  ///< skip pixel if mask & badPixelMask != 0
+        WeightPixelT weight                        ///< relative weight of this image
+) {
+    typedef lsst::afw::image::VariancePixel VariancePixel;
+
+    CoaddPixelT const imageWeight = static_cast<CoaddPixelT>(weight);
+    CoaddPixelT const imageWeight2 = imageWeight * imageWeight;
+    for (int x = 0; x < width; ++x) {
+        bool const isGood = (mask[x] & badPixelMask) == 0;
+        // the same variance that addRowToCoadd added
+        VariancePixel const weightedVariance = image[x] * image[x] * 0 + imageWeight2 * variance[x];
+        coaddImage[x] -= subtrahendIf(isGood, image[x] * imageWeight);
+        coaddVariance[x] -= subtrahendIf(isGood, weightedVariance);
+        weightMap[x] = subtractWeight(weightMap[x], subtrahendIf(isGood, weight));
+    }
+}
+
+/**
+ * Add weight to a row of a weight map for each good pixel of a row of a masked image
+ *
+ * Good pixels are those for which mask & badPixelMask == 0.
+ */
+template <typename WeightPixelT>
+inline void addRowToWeightMap(WeightPixelT *__restrict__ weightMap,                  ///< [in,out] weight map row
+                              lsst::afw::image::MaskPixel const *__restrict__ mask,  ///< mask row
+                              int width,                                             ///< number of pixels
+                              lsst::afw::image::MaskPixel badPixelMask,  ///< skip if mask & badPixelMask != 0
+                              WeightPixelT weight                        ///< weight to add
+) {
+    for (int x = 0; x < width; ++x) {
+        bool const isGood = (mask[x] & badPixelMask) == 0;
+        weightMap[x] = addWeight(weightMap[x], addendIf(isGood, weight));
+    }
+}
+
+/**
+ * Increment one row of a count map for each good pixel of a row of an image
+ *
+ * Good pixels are those that are not NaN.
+ */
+template <typename ImagePixelT>
+inline void addRowToCountMap(int *__restrict__ countMap,             ///< [in,out] count map row
+                             ImagePixelT const *__restrict__ image,  ///< image row
+                             int width                               ///< number of pixels in the row
+) {
+    for (int x = 0; x < width; ++x) {
+        countMap[x] += isKnownValue(image[x]);
+    }
+}
+
+/**
+ * Increment one row of a count map for each good pixel of a row of a mask
+ *
+ * Good pixels are those for which mask & badPixelMask == 0.
+ */
+inline void addRowToCountMap(int *__restrict__ countMap,                            ///< [in,out] count map row
+                             lsst::afw::image::MaskPixel const *__restrict__ mask,  ///< mask row
+                             int width,                                  ///< number of pixels in the row
+                             lsst::afw::image::MaskPixel badPixelMask    ///< bad if mask & badPixelMask != 0
+) {
+    for (int x = 0; x < width; ++x) {
+        countMap[x] += (mask[x] & badPixelMask) == 0;
+    }
+}
+
+/**
+ * OR inputBit into one row of a provenance map for each good pixel of a row of an image
+ *
+ * Good pixels are those that are not NaN.
+ */
+template <typename ImagePixelT>
+inline void addRowToProvenanceMap(std::uint64_t *__restrict__ provenanceMap,  ///< [in,out] provenance row
+                                  ImagePixelT const *__restrict__ image,      ///< image row
+                                  int width,                 ///< number of pixels in the row
+                                  std::uint64_t inputBit     ///< bit to set for each good pixel
+) {
+    for (int x = 0; x < width; ++x) {
+        provenanceMap[x] |= addendIf(isKnownValue(image[x]), inputBit);
+    }
+}
+
+/**
+ * OR inputBit into one row of a provenance map for each good pixel of a row of a mask
+ *
+ * Good pixels are those for which mask & badPixelMask == 0.
+ */
+inline void addRowToProvenanceMap(
+        std::uint64_t *__restrict__ provenanceMap,             ///< [in,out] provenance map row
+        lsst::afw::image::MaskPixel const *__restrict__ mask,  ///< mask row
+        int width,                                             ///< number of pixels in the row
+        lsst::afw::image::MaskPixel badPixelMask,              ///< bad if mask & badPixelMask != 0
+        std::uint64_t inputBit                                 ///< bit to set for each good pixel
+) {
+    for (int x = 0; x < width; ++x) {
+        provenanceMap[x] |= addendIf((mask[x] & badPixelMask) == 0, inputBit);
+    }
+}
+
+/**
+ * Count the good pixels of one row of an image; good pixels are those that are not NaN
+ */
+template <typename ImagePixelT>
+inline int countGoodRow(ImagePixelT const *__restrict__ image,  ///< image row
+                        int width                               ///< number of pixels in the row
+) {
+    int numGoodPix = 0;
+    for (int x = 0; x < width; ++x) {
+        numGoodPix += isKnownValue(image[x]);
+    }
+    return numGoodPix;
+}
+
+/**
+ * Count the good pixels of one row of a mask; good pixels are those for which mask & badPixelMask == 0
+ */
+inline int countGoodRow(lsst::afw::image::MaskPixel const *__restrict__ mask,  ///< mask row
+                        int width,                                  ///< number of pixels in the row
+                        lsst::afw::image::MaskPixel badPixelMask    ///< bad if mask & badPixelMask != 0
+) {
+    int numGoodPix = 0;
+    for (int x = 0; x < width; ++x) {
+        numGoodPix += (mask[x] & badPixelMask) == 0;
+    }
+    return numGoodPix;
+}
+
+/**
+ * Count the pixels of one row of a masked image that addRowToCoaddInverseVariance would add
+ */
+inline int countGoodRow(lsst::afw::image::MaskPixel const *__restrict__ mask,          ///< mask row
+                        lsst::afw::image::VariancePixel const *__restrict__ variance,  ///< variance row
+                        int width,                                  ///< number of pixels in the row
+                        lsst::afw::image::MaskPixel badPixelMask    ///< bad if mask & badPixelMask != 0
+) {
+    typedef lsst::afw::image::VariancePixel VariancePixel;
+
+    int numGoodPix = 0;
+    for (int x = 0; x < width; ++x) {
+        numGoodPix += ((mask[x] & badPixelMask) == 0) & (variance[x] > 0) &
+                      (variance[x] < std::numeric_limits<VariancePixel>::infinity());
+    }
+    return numGoodPix;
+}
+
+/**
+ * Count the nonzero pixels of one row of a weight map
+ */
+template <typename WeightPixelT>
+inline int countNonzeroRow(WeightPixelT const *__restrict__ weightMap,  ///< weight map row
+                           int width                                    ///< number of pixels in the row
+) {
+    int numNonzeroPix = 0;
+    for (int x = 0; x < width; ++x) {
+        numNonzeroPix += weightMap[x] != 0;
+    }
+    return numNonzeroPix;
+}
+
+/**
+ * Count the saturated pixels of one row of a weight map (see isSaturatedWeight)
+ */
+template <typename WeightPixelT>
+inline int countSaturatedRow(WeightPixelT const *__restrict__ weightMap,  ///< weight map row
+                             int width                                    ///< number of pixels in the row
+) {
+    int numSaturatedPix = 0;
+    for (int x = 0; x < width; ++x) {
+        numSaturatedPix += isSaturatedWeight(weightMap[x]);
+    }
+    return numSaturatedPix;
+}
+
+/**
+ * Copy the good pixels of one row of an image; good pixels are those that are not NaN
+ *
+ * @return number of pixels copied
+ */
+template <typename ImagePixelT>
+inline int copyGoodRow(ImagePixelT *__restrict__ dest,        ///< [in,out] destination row
+                       ImagePixelT const *__restrict__ src,   ///< source row
+                       int width                              ///< number of pixels in the row
+) {
+    int numGoodPix = 0;
+    for (int x = 0; x < width; ++x) {
+        bool const isGood = isKnownValue(src[x]);
+        dest[x] = bitSelect(isGood, src[x], dest[x]);
+        numGoodPix += isGood;
+    }
+    return numGoodPix;
+}
+
+/**
+ * Copy the good pixels of one row of a masked image; good pixels are those for which
+ * mask & badPixelMask == 0
+ *
+ * @return number of pixels copied
+ */
+template <typename ImagePixelT>
+inline int copyGoodRow(
+        ImagePixelT *__restrict__ destImage,                            ///< [in,out] destination image row
+        lsst::afw::image::MaskPixel *__restrict__ destMask,             ///< [in,out] destination mask row
+        lsst::afw::image::VariancePixel *__restrict__ destVariance,     ///< [in,out] destination variance row
+        ImagePixelT const *__restrict__ srcImage,                       ///< source image row
+        lsst::afw::image::MaskPixel const *__restrict__ srcMask,        ///< source mask row
+        lsst::afw::image::VariancePixel const *__restrict__ srcVariance, ///< source variance row
+        int width,                                                      ///< number of pixels in the row
+        lsst::afw::image::MaskPixel badPixelMask  ///< skip pixel if mask & badPixelMask != 0
+) {
+    int numGoodPix = 0;
+    for (int x = 0; x < width; ++x) {
+        bool const isGood = (srcMask[x] & badPixelMask) == 0;
+        destImage[x] = bitSelect(isGood, srcImage[x], destImage[x]);
+        destMask[x] = bitSelect(isGood, srcMask[x], destMask[x]);
+        destVariance[x] = bitSelect(isGood, srcVariance[x], destVariance[x]);
+        numGoodPix += isGood;
+    }
+    return numGoodPix;
+}
+
+/**
+ * OR edgeMask into one row of a coadd mask wherever the weight map is zero
+ */
+template <typename WeightPixelT>
+inline void setEdgeBitsRow(
+        lsst::afw::image::MaskPixel *__restrict__ coaddMask,  ///< [in,out] coadd mask row
+        WeightPixelT const *__restrict__ weightMap,           ///< weight map row
+        int width,                                            ///< number of pixels in the row
+        lsst::afw::image::MaskPixel edgeMask                  ///< bits to set where weight is 0
+) {
+    for (int x = 0; x < width; ++x) {
+        coaddMask[x] |= addendIf(weightMap[x] == 0, edgeMask);
+    }
+}
+
+/**
+ * OR bitMask into one row of a coadd mask wherever a row of a map is <= threshold
+ */
+template <typename MapPixelT>
+inline void setThresholdBitsRow(
+        lsst::afw::image::MaskPixel *__restrict__ coaddMask,  ///< [in,out] coadd mask row
+        MapPixelT const *__restrict__ map,                    ///< weight or count map row
+        int width,                                            ///< number of pixels in the row
+        double threshold,                                     ///< set bits where map <= threshold
+        lsst::afw::image::MaskPixel bitMask                   ///< bits to set
+) {
+    for (int x = 0; x < width; ++x) {
+        coaddMask[x] |= addendIf(static_cast<double>(map[x]) <= threshold, bitMask);
+    }
+}
+
+/**
+ * Normalize one row of a coadd by the corresponding row of its weight map
+ *
+ * Pixels with zero weight are left unchanged, or set to NaN if fillNaN is true.
+ */
+template <typename CoaddPixelT, typename WeightPixelT>
+inline void finalizeRow(CoaddPixelT *__restrict__ coadd,             ///< [in,out] coadd row
+                        WeightPixelT const *__restrict__ weightMap,  ///< weight map row
+                        int width,                                   ///< number of pixels in the row
+                        bool fillNaN                                 ///< set pixels with zero weight to NaN?
+) {
+    CoaddPixelT const one = 1;
+    CoaddPixelT const nan = std::numeric_limits<CoaddPixelT>::quiet_NaN();
+    for (int x = 0; x < width; ++x) {
+        bool const isNoData = weightMap[x] == 0;
+        // divide pixels with no data by 1, leaving them unchanged
+        CoaddPixelT const weight = bitSelect(isNoData, one, static_cast<CoaddPixelT>(weightMap[x]));
+        coadd[x] = bitSelect(isNoData & fillNaN, nan, coadd[x] / weight);
+    }
+}
+
+/**
+ * Normalize one row of a masked coadd by the corresponding row of its weight map
+ *
+ * The image is divided by the weight and the variance by the weight squared.
+ * Pixels with zero weight have edgeMask set, and their image and variance are left unchanged,
+ * or set to NaN if fillNaN is true.
+ */
+template <typename CoaddPixelT, typename WeightPixelT>
+inline void finalizeRow(
+        CoaddPixelT *__restrict__ coaddImage,                          ///< [in,out] coadd image row
+        lsst::afw::image::MaskPixel *__restrict__ coaddMask,           ///< [in,out] coadd mask row
+        lsst::afw::image::VariancePixel *__restrict__ coaddVariance,   ///< [in,out] coadd variance row
+        WeightPixelT const *__restrict__ weightMap,                    ///< weight map row
+        int width,                                                     ///< number of pixels in the row
+        lsst::afw::image::MaskPixel edgeMask,  ///< bits to set where weight is 0
+        bool fillNaN                           ///< set image and variance of pixels with zero weight to NaN?
+) {
+    typedef lsst::afw::image::VariancePixel VariancePixel;
+
+    CoaddPixelT const one = 1;
+    CoaddPixelT const nan = std::numeric_limits<CoaddPixelT>::quiet_NaN();
+    VariancePixel const varianceNaN = std::numeric_limits<VariancePixel>::quiet_NaN();
+    for (int x = 0; x < width; ++x) {
+        bool const isNoData = weightMap[x] == 0;
+        bool const isFilled = isNoData & fillNaN;
+        // divide pixels with no data by 1, leaving them unchanged
+        CoaddPixelT const weight = bitSelect(isNoData, one, static_cast<CoaddPixelT>(weightMap[x]));
+        VariancePixel const variance = coaddVariance[x] / (weight * weight);
+        coaddImage[x] = bitSelect(isFilled, nan, coaddImage[x] / weight);
+        coaddMask[x] |= addendIf(isNoData, edgeMask);
+        coaddVariance[x] = bitSelect(isFilled, varianceNaN, variance);
+    }
+}
+
+/**
+ * Return a pointer to pixel (x, y) of an image plane, where x, y are relative to the parent image,
+ * and set rowStride to the number of pixels between successive rows
+ */
+template <typename ImageT>
+inline auto getPixelPtr(ImageT &image, int x, int y, std::ptrdiff_t &rowStride)
+        -> decltype(image.getArray().getData()) {
+    auto array = image.getArray();
+    rowStride = array.template getStride<0>();
+    return array.getData() + (y - image.getY0()) * rowStride + (x - image.getX0());
+}
+
+/**
+ * Pointer to successive rows of an image plane, starting at a given pixel
+ */
+template <typename PixelT>
+class RowPointer {
+public:
+    /**
+     * Point to pixel (x, y) of an image plane, where x, y are relative to the parent image
+     */
+    template <typename ImageT>
+    RowPointer(ImageT &image, int x, int y) : _stride(0), _ptr(getPixelPtr(image, x, y, _stride)) {}
+
+    /// Point to no image; get() returns null, before and after advancing
+    RowPointer() : _stride(0), _ptr(nullptr) {}
+
+    /// Return a pointer to the first pixel of the current row
+    PixelT *get() const { return _ptr; }
+
+    /// Advance to the next row
+    RowPointer &operator++() {
+        _ptr += _stride;
+        return *this;
+    }
+
+private:
+    std::ptrdiff_t _stride;
+    PixelT *_ptr;
+};
+
+}  // namespace detail
+}  // namespace utils
+}  // namespace coadd
+}  // namespace lsst
+
+#endif  // !defined(LSST_COADD_UTILS_DETAIL_ROWKERNELS_H)
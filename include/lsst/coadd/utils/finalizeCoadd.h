@@ -0,0 +1,77 @@
+// -*- LSST-C++ -*-
+/*
+ * This file is part of coadd_utils.
+ *
+ * Developed for the LSST Data Management System.
+ * This product includes software developed by the LSST Project
+ * (https://www.lsst.org).
+ * See the COPYRIGHT file at the top-level directory of this distribution
+ * for details of code ownership.
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <https://www.gnu.org/licenses/>.
+ */
+
+#ifndef LSST_COADD_UTILS_FINALIZECOADD_H
+#define LSST_COADD_UTILS_FINALIZECOADD_H
+/**
+ * @file
+ */
+#include "lsst/afw/image.h"
+
+namespace lsst {
+namespace coadd {
+namespace utils {
+
+/**
+ * @brief normalize a coadd by its weight map and flag pixels with no data, in a single pass
+ *
+ * For each pixel with nonzero weight w: image /= w.
+ * For each pixel with zero weight: the pixel is left unchanged, or set to NaN if fillNaN is true.
+ *
+ * @throw pexExcept::InvalidParameterError if coadd and weightMap dimensions or xy0 do not match.
+ */
+template <typename CoaddPixelT, typename WeightPixelT>
+void finalizeCoadd(
+        lsst::afw::image::Image<CoaddPixelT> &coadd,            ///< [in,out] coadd to be normalized
+        lsst::afw::image::Image<WeightPixelT> const &weightMap,  ///< weight map
+        bool fillNaN = false                                     ///< set pixels with zero weight to NaN?
+);
+
+/**
+ * @brief normalize a coadd by its weight map and flag pixels with no data, in a single pass
+ *
+ * This is equivalent to dividing the image by the weight map, dividing the variance by
+ * the weight map squared and calling setCoaddEdgeBits, but makes one pass over the data
+ * and allocates no temporaries.
+ *
+ * For each pixel with nonzero weight w: image /= w, variance /= w^2.
+ * For each pixel with zero weight: the NO_DATA mask bit is set and the image and variance
+ * are left unchanged, or set to NaN if fillNaN is true.
+ *
+ * @throw pexExcept::InvalidParameterError if coadd and weightMap dimensions or xy0 do not match.
+ */
+template <typename CoaddPixelT, typename WeightPixelT>
+void finalizeCoadd(
+        lsst::afw::image::MaskedImage<CoaddPixelT, lsst::afw::image::MaskPixel,
+                                      lsst::afw::image::VariancePixel>
+                &coadd,                                          ///< [in,out] coadd to be normalized
+        lsst::afw::image::Image<WeightPixelT> const &weightMap,  ///< weight map
+        bool fillNaN = false  ///< set image and variance of pixels with zero weight to NaN?
+);
+
+}  // namespace utils
+}  // namespace coadd
+}  // namespace lsst
+
+#endif  // !defined(LSST_COADD_UTILS_FINALIZECOADD_H)
@@ -0,0 +1,151 @@
+// -*- LSST-C++ -*-
+/*
+ * This file is part of coadd_utils.
+ *
+ * Developed for the LSST Data Management System.
+ * This product includes software developed by the LSST Project
+ * (https://www.lsst.org).
+ * See the COPYRIGHT file at the top-level directory of this distribution
+ * for details of code ownership.
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <https://www.gnu.org/licenses/>.
+ */
+
+#ifndef LSST_COADD_UTILS_KERNELSTATS_H
+#define LSST_COADD_UTILS_KERNELSTATS_H
+/**
+ * @file
+ */
+#include <atomic>
+#include <chrono>
+#include <cstdint>
+#include <map>
+#include <string>
+
+namespace lsst {
+namespace coadd {
+namespace utils {
+
+/**
+ * @brief counters of the work done by one coadd kernel
+ *
+ * A pixel is visited if it is in the overlap of the input and output bounding boxes.
+ * Good pixels are those the kernel used: pixels added by addToCoadd, pixels copied by copyGoodPixels
+ * and pixels with nonzero weight for setCoaddEdgeBits. The other visited pixels are rejected.
+ * numBytes estimates memory traffic: the bytes of every image plane read or written over the overlap,
+ * with planes that are both read and written counted twice.
+ * The variants of a kernel (e.g. addManyToCoadd and addToCoaddArrays for addToCoadd) share its counters;
+ * each call counts once, with the pixels of all of its inputs or targets.
+ */
+struct KernelStats {
+    std::int64_t numCalls = 0;       ///< number of calls
+    std::int64_t numEmptyCalls = 0;  ///< number of calls whose input and output did not overlap
+    std::int64_t numPixels = 0;      ///< number of pixels visited
+    std::int64_t numGoodPixels = 0;  ///< number of good pixels visited
+    std::int64_t numBytes = 0;       ///< number of bytes read or written
+    double seconds = 0;              ///< wall time spent in the kernel (sec)
+
+    /// Number of rejected pixels visited
+    std::int64_t getNumRejectedPixels() const { return numPixels - numGoodPixels; }
+};
+
+/**
+ * @brief enable or disable the kernel counters
+ *
+ * The counters are disabled by default; while disabled each kernel call only tests one flag.
+ */
+void setKernelStatsEnabled(bool enabled  ///< enable the counters?
+);
+
+/// Are the kernel counters enabled?
+bool getKernelStatsEnabled();
+
+/**
+ * @brief get the counters of each kernel, summed over all threads
+ *
+ * @return a map of kernel name ("addToCoadd", "copyGoodPixels" or "setCoaddEdgeBits") to its counters
+ */
+std::map<std::string, KernelStats> getKernelStats();
+
+/**
+ * @brief reset the counters of every kernel to zero
+ *
+ * Calls that are running during the reset may be partly counted.
+ */
+void resetKernelStats();
+
+namespace detail {
+
+/// Kernels that have counters
+enum class Kernel { ADD_TO_COADD = 0, COPY_GOOD_PIXELS, SET_COADD_EDGE_BITS, NUM_KERNELS };
+
+/// True if the kernel counters are enabled; use isKernelStatsEnabled to test it
+extern std::atomic<bool> kernelStatsEnabled;
+
+inline bool isKernelStatsEnabled() { return kernelStatsEnabled.load(std::memory_order_relaxed); }
+
+/// Add one call to the counters of the calling thread
+void recordKernelCall(Kernel kernel, std::int64_t numPixels, std::int64_t numGoodPixels,
+                      std::int64_t numBytes, std::int64_t nanoseconds);
+
+/**
+ * Record one call of a kernel when it goes out of scope, if the counters were enabled when it was made
+ *
+ * Call addPixels with the work done; a call with no pixels is counted as an empty call.
+ */
+class KernelStatsRecorder final {
+public:
+    explicit KernelStatsRecorder(Kernel kernel) : _kernel(kernel), _enabled(isKernelStatsEnabled()) {
+        if (_enabled) {
+            _start = std::chrono::steady_clock::now();
+        }
+    }
+
+    KernelStatsRecorder(KernelStatsRecorder const &) = delete;
+    KernelStatsRecorder &operator=(KernelStatsRecorder const &) = delete;
+
+    ~KernelStatsRecorder() {
+        if (_enabled) {
+            auto const elapsed = std::chrono::steady_clock::now() - _start;
+            recordKernelCall(_kernel, _numPixels, _numGoodPixels, _numBytes,
+                             std::chrono::duration_cast<std::chrono::nanoseconds>(elapsed).count());
+        }
+    }
+
+    /// Should the caller count its pixels?
+    bool isEnabled() const { return _enabled; }
+
+    /// Add pixels visited, good pixels and bytes read or written
+    void addPixels(std::int64_t numPixels, std::int64_t numGoodPixels, std::int64_t numBytes) {
+        _numPixels += numPixels;
+        _numGoodPixels += numGoodPixels;
+        _numBytes += numBytes;
+    }
+
+private:
+    Kernel const _kernel;
+    bool const _enabled;
+    std::chrono::steady_clock::time_point _start;
+    std::int64_t _numPixels = 0;
+    std::int64_t _numGoodPixels = 0;
+    std::int64_t _numBytes = 0;
+};
+
+}  // namespace detail
+
+}  // namespace utils
+}  // namespace coadd
+}  // namespace lsst
+
+#endif  // !defined(LSST_COADD_UTILS_KERNELSTATS_H)
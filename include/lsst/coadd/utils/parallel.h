@@ -0,0 +1,123 @@
+// -*- LSST-C++ -*-
+/*
+ * This file is part of coadd_utils.
+ *
+ * Developed for the LSST Data Management System.
+ * This product includes software developed by the LSST Project
+ * (https://www.lsst.org).
+ * See the COPYRIGHT file at the top-level directory of this distribution
+ * for details of code ownership.
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <https://www.gnu.org/licenses/>.
+ */
+
+#ifndef LSST_COADD_UTILS_PARALLEL_H
+#define LSST_COADD_UTILS_PARALLEL_H
+/**
+ * @file
+ *
+ * Row-band threading for the coadd kernels.
+ *
+ * Kernel calls that write disjoint regions of their outputs may also be made concurrently
+ * from different threads; the Python bindings release the GIL to allow this.
+ */
+#include <algorithm>
+#include <exception>
+#include <functional>
+#include <vector>
+
+namespace lsst {
+namespace coadd {
+namespace utils {
+
+/**
+ * @brief set the number of threads used by the coadd kernels
+ *
+ * addToCoadd, addManyToCoadd, copyGoodPixels and setCoaddEdgeBits split the rows they touch
+ * into bands and process the bands concurrently using up to this many threads.
+ * The results are identical to single-threaded execution.
+ *
+ * The calling thread processes one band and a pool of nThreads - 1 worker threads the others.
+ * The workers are started when a kernel first needs them and kept for later calls;
+ * changing the number of threads stops them, and the new number is started when next needed.
+ *
+ * The default is 1 (no threading). Code that calls the kernels from several processes or threads
+ * at once, such as the worker processes of assembleCoadd, should leave this at 1
+ * so that the machine is not oversubscribed.
+ *
+ * @throw pexExcept::InvalidParameterError if nThreads < 0.
+ */
+void setNumThreads(int nThreads  ///< number of threads; 0 to use the number of hardware threads
+);
+
+/**
+ * @brief get the number of threads used by the coadd kernels
+ */
+int getNumThreads();
+
+namespace detail {
+
+/// Minimum number of rows in a band processed by one thread
+int const MIN_ROWS_PER_THREAD = 32;
+
+/**
+ * Call task(i) for each i in [0, nTasks), concurrently on the calling thread and the worker pool
+ *
+ * Return once every call has finished. task must not throw.
+ */
+void runTasks(int nTasks, std::function<void(int)> const &task);
+
+/**
+ * Call func(bandBeginY, bandEndY) for contiguous bands of rows that together cover [beginY, endY)
+ *
+ * The bands are processed concurrently using up to getNumThreads() threads, with runTasks;
+ * func must therefore be safe to call concurrently for disjoint bands.
+ * If any call throws, the first exception is rethrown once all bands have finished.
+ */
+template <typename Func>
+void forEachRowBand(int beginY, int endY, Func const &func) {
+    int const nRows = endY - beginY;
+    if (nRows <= 0) {
+        return;
+    }
+    int const nBands = std::max(1, std::min(getNumThreads(), nRows / MIN_ROWS_PER_THREAD));
+    if (nBands == 1) {
+        func(beginY, endY);
+        return;
+    }
+
+    std::vector<std::exception_ptr> errors(nBands);
+    runTasks(nBands, [&](int i) {
+        int const bandBeginY = beginY + static_cast<int>((static_cast<long>(nRows) * i) / nBands);
+        int const bandEndY = beginY + static_cast<int>((static_cast<long>(nRows) * (i + 1)) / nBands);
+        try {
+            func(bandBeginY, bandEndY);
+        } catch (...) {
+            errors[i] = std::current_exception();
+        }
+    });
+    for (auto const &error : errors) {
+        if (error) {
+            std::rethrow_exception(error);
+        }
+    }
+}
+
+}  // namespace detail
+
+}  // namespace utils
+}  // namespace coadd
+}  // namespace lsst
+
+#endif  // !defined(LSST_COADD_UTILS_PARALLEL_H)
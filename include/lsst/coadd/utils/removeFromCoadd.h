@@ -0,0 +1,98 @@
+// -*- LSST-C++ -*-
+/*
+ * This file is part of coadd_utils.
+ *
+ * Developed for the LSST Data Management System.
+ * This product includes software developed by the LSST Project
+ * (https://www.lsst.org).
+ * See the COPYRIGHT file at the top-level directory of this distribution
+ * for details of code ownership.
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <https://www.gnu.org/licenses/>.
+ */
+
+#ifndef LSST_COADD_UTILS_REMOVEFROMCOADD_H
+#define LSST_COADD_UTILS_REMOVEFROMCOADD_H
+/**
+ * @file
+ */
+#include "lsst/geom.h"
+#include "lsst/afw/image.h"
+
+namespace lsst {
+namespace coadd {
+namespace utils {
+
+/**
+ * @brief remove good pixels of an image from a coadd and associated weight map
+ *
+ * This undoes addToCoadd with the same image and weight:
+ * coadd[i+coadd.x0, j+coadd.y0] -= image[i+image.x0, j+image.y0] * weight
+ * weightMap[i+weightMap.x0, j+weightMap.y0] -= weight
+ * for all good image pixels that overlap a coadd pixel.
+ * Good pixels are those that are not NaN (thus they do include +/- inf).
+ * The result equals the coadd without the image only to within rounding error
+ * (exactly, for integer weight maps, except where they saturated).
+ * Inputs cannot be removed from saturated pixels of an integer weight map
+ * (pixels equal to the maximum, or for signed types the minimum, of the type;
+ * see countSaturatedWeights): their weight is left unchanged.
+ *
+ * @return overlapBBox: overlapping bounding box, relative to parent image (hence xy0 is taken into account)
+ *
+ * @throw pexExcept::InvalidParameterError if coadd and weightMap dimensions or xy0 do not match.
+ */
+template <typename CoaddPixelT, typename WeightPixelT>
+lsst::geom::Box2I removeFromCoadd(
+        lsst::afw::image::Image<CoaddPixelT> &coadd,        ///< [in,out] coadd to be modified
+        lsst::afw::image::Image<WeightPixelT> &weightMap,   ///< [in,out] weight map to be modified
+        lsst::afw::image::Image<CoaddPixelT> const &image,  ///< image that was added to coadd
+        WeightPixelT weight                                 ///< relative weight the image was added with
+);
+
+/**
+ * @brief remove good pixels of a masked image from a coadd image and associated weight map
+ *
+ * This undoes addToCoadd with the same masked image, bad pixel mask and weight:
+ * the image, variance and weight are subtracted for every pixel for which mask & badPixelMask == 0.
+ * The coadd mask is not changed, since the bits an input contributed cannot be told apart from
+ * those of other inputs; recompute it (e.g. with a provenance map) if it matters.
+ * The result equals the coadd without the masked image only to within rounding error
+ * (exactly, for integer weight maps, except where they saturated).
+ * Inputs cannot be removed from saturated pixels of an integer weight map
+ * (pixels equal to the maximum, or for signed types the minimum, of the type;
+ * see countSaturatedWeights): their weight is left unchanged.
+ *
+ * @return overlapBBox: overlapping bounding box, relative to parent image (hence xy0 is taken into account)
+ *
+ * @throw pexExcept::InvalidParameterError if coadd and weightMap dimensions or xy0 do not match.
+ */
+template <typename CoaddPixelT, typename WeightPixelT>
+lsst::geom::Box2I removeFromCoadd(
+        lsst::afw::image::MaskedImage<CoaddPixelT, lsst::afw::image::MaskPixel,
+                                      lsst::afw::image::VariancePixel>
+                &coadd,                                     ///< [in,out] coadd to be modified
+        lsst::afw::image::Image<WeightPixelT> &weightMap,   ///< [in,out] weight map to be modified
+        lsst::afw::image::MaskedImage<CoaddPixelT, lsst::afw::image::MaskPixel,
+                                      lsst::afw::image::VariancePixel> const
+                &maskedImage,  ///< masked image that was added to coadd
+        lsst::afw::image::MaskPixel const
+                badPixelMask,  ///< badPixelMask the masked image was added with
+        WeightPixelT weight    ///< relative weight the masked image was added with
+);
+
+}  // namespace utils
+}  // namespace coadd
+}  // namespace lsst
+
+#endif  // !defined(LSST_COADD_UTILS_REMOVEFROMCOADD_H)
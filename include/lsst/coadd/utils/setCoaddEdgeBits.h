@@ -29,6 +29,8 @@
  *
  * @author Russell Owen
  */
+#include <vector>
+
 #include "lsst/afw/image.h"
 
 namespace lsst {
@@ -49,6 +51,42 @@ void setCoaddEdgeBits(
         lsst::afw::image::Image<WeightPixelT> const &weightMap           ///< weight map
 );
 
+/**
+ * @brief a rule for setCoaddEdgeBits: set bitMask in the coadd mask wherever a map is <= threshold
+ */
+struct CoaddMaskRule {
+    /// Map to which the threshold applies
+    enum Map { WEIGHT, COUNT };
+
+    CoaddMaskRule(lsst::afw::image::MaskPixel bitMask_,  ///< bits to set where the rule matches
+                  double threshold_,                      ///< set bits where map value <= threshold
+                  Map map_ = WEIGHT                       ///< map to which the threshold applies
+                  )
+            : bitMask(bitMask_), threshold(threshold_), map(map_) {}
+
+    lsst::afw::image::MaskPixel bitMask;  ///< bits to set where the rule matches
+    double threshold;                     ///< set bits where map value <= threshold
+    Map map;                              ///< map to which the threshold applies
+};
+
+/**
+ * @brief set bits of a coadd mask from thresholds on its weight map and count map
+ *
+ * All rules are applied in one pass over the maps, one row at a time.
+ * CoaddMaskRule(NO_DATA bit, 0) reproduces setCoaddEdgeBits(coaddMask, weightMap)
+ * for a weight map with no negative weights.
+ *
+ * @throw pexExcept::InvalidParameterError if the dimensions of coaddMask, weightMap and countMap
+ *   (if not null) do not match, or if a rule uses the count map and countMap is null.
+ */
+template <typename WeightPixelT>
+void setCoaddEdgeBits(
+        lsst::afw::image::Mask<lsst::afw::image::MaskPixel> &coaddMask,  ///< [in,out] mask of coadd
+        lsst::afw::image::Image<WeightPixelT> const &weightMap,          ///< weight map
+        std::vector<CoaddMaskRule> const &rules,                         ///< rules to apply
+        lsst::afw::image::Image<int> const *countMap = nullptr  ///< number of inputs per pixel; may be null
+);
+
 }  // namespace utils
 }  // namespace coadd
 }  // namespace lsst
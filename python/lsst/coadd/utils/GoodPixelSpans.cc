@@ -0,0 +1,81 @@
+/*
+ * This file is part of coadd_utils.
+ *
+ * Developed for the LSST Data Management System.
+ * This product includes software developed by the LSST Project
+ * (https://www.lsst.org).
+ * See the COPYRIGHT file at the top-level directory of this distribution
+ * for details of code ownership.
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <https://www.gnu.org/licenses/>.
+ */
+
+#include <utility>
+#include <vector>
+
+#include "pybind11/pybind11.h"
+#include "pybind11/stl.h"
+#include "lsst/cpputils/python.h"
+
+#include "lsst/coadd/utils/GoodPixelSpans.h"
+
+namespace py = pybind11;
+using namespace pybind11::literals;
+
+namespace lsst {
+namespace coadd {
+namespace utils {
+
+namespace {
+
+using PyGoodPixelSpans = py::class_<GoodPixelSpans, std::shared_ptr<GoodPixelSpans>>;
+
+template <typename ImagePixelT>
+void declareImageConstructor(PyGoodPixelSpans &cls) {
+    cls.def(py::init<lsst::afw::image::Image<ImagePixelT> const &>(), "image"_a,
+            py::call_guard<py::gil_scoped_release>());
+}
+
+}  // namespace
+
+void wrapGoodPixelSpans(lsst::cpputils::python::WrapperCollection &wrappers) {
+    wrappers.wrapType(PyGoodPixelSpans(wrappers.module, "GoodPixelSpans"), [](auto &mod, auto &cls) {
+        cls.def(py::init<lsst::afw::image::Mask<lsst::afw::image::MaskPixel> const &,
+                         lsst::afw::image::MaskPixel const>(),
+                "mask"_a, "badPixelMask"_a, py::call_guard<py::gil_scoped_release>());
+        declareImageConstructor<double>(cls);
+        declareImageConstructor<float>(cls);
+        cls.def("getBBox", &GoodPixelSpans::getBBox);
+        cls.def("getNumSpans", &GoodPixelSpans::getNumSpans);
+        cls.def("getNumGoodPixels", &GoodPixelSpans::getNumGoodPixels);
+        cls.def(
+                "getRowSpans",
+                [](GoodPixelSpans const &self, int y) {
+                    if (y < self.getBBox().getMinY() || y > self.getBBox().getMaxY()) {
+                        throw py::index_error("row " + std::to_string(y) + " is outside the bounding box");
+                    }
+                    std::vector<std::pair<int, int>> spans;
+                    for (auto span = self.beginRow(y); span != self.endRow(y); ++span) {
+                        spans.emplace_back(span->beginX, span->endX);
+                    }
+                    return spans;
+                },
+                "y"_a);
+        cls.def_property_readonly("bbox", &GoodPixelSpans::getBBox);
+    });
+}
+
+}  // namespace utils
+}  // namespace coadd
+}  // namespace lsst
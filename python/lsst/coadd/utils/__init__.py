@@ -21,7 +21,60 @@
 #
 
 """lsst.coadd.utils
+
+The compiled kernels and the Python modules of this package are imported
+on first access to one of their attributes, so ``import lsst.coadd.utils``
+does not import afw. `lsst.coadd.utils.arrays` provides the array kernels
+without importing afw at all.
 """
 
-from ._coaddUtilsLib import *
+import importlib
+import types
+
 from .version import *
+
+# Public names of each Python module, imported on first use;
+# all other public names are looked up in the compiled _coaddUtilsLib
+_MODULE_NAMES = {
+    ".arrays": ("addToCoaddArrays", "copyGoodPixelsArrays", "setCoaddEdgeBitsArrays",
+                "setNumThreads", "getNumThreads"),
+    ".statisticsAccumulator": ("StatisticsAccumulator",),
+    ".memmapCoadd": ("MemmapCoadd", "CoaddCheckpoint", "writeCoaddCheckpoint", "readCoaddCheckpoint"),
+    ".bboxIndex": ("BBoxIndex",),
+    ".assemble": ("CoaddInput", "FitsLoader", "assembleCoadd", "assembleCoaddStreaming"),
+    ".fitsCutout": ("readFitsBBox", "readFitsCutout", "addFitsToCoadd", "copyGoodPixelsFromFits"),
+    ".coaddAccumulator": ("CoaddAccumulator",),
+    ".tiledCoadd": ("TiledCoadd",),
+    ".warpAndAdd": ("warpAndAddToCoadd",),
+}
+_MODULE_OF_NAME = {name: moduleName for moduleName, names in _MODULE_NAMES.items() for name in names}
+
+
+def _getAllNames():
+    """Return the public names of the package, importing _coaddUtilsLib.
+    """
+    lib = importlib.import_module("._coaddUtilsLib", __name__)
+    libNames = [name for name, value in vars(lib).items()
+                if not name.startswith("_") and not isinstance(value, types.ModuleType)]
+    return sorted(set(libNames) | set(_MODULE_OF_NAME))
+
+
+def __getattr__(name):
+    if name == "__all__":
+        return _getAllNames()
+    if name.startswith("__"):
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    if "." + name in _MODULE_NAMES:
+        # importing a submodule also sets it as an attribute of this package
+        return importlib.import_module("." + name, __name__)
+    module = importlib.import_module(_MODULE_OF_NAME.get(name, "._coaddUtilsLib"), __name__)
+    try:
+        value = getattr(module, name)
+    except AttributeError:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_getAllNames()))
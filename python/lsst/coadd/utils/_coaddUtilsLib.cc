@@ -29,17 +29,25 @@ namespace coadd {
 namespace utils {
 
 using lsst::cpputils::python::WrapperCollection;
+void wrapGoodPixelSpans(WrapperCollection &wrappers);
 void wrapAddtoCoadd(WrapperCollection &wrappers);
 void wrapCopyGoodPixels(WrapperCollection &wrappers);
 void wrapSetCoaddEdgeBits(WrapperCollection &wrappers);
+void wrapFinalizeCoadd(WrapperCollection &wrappers);
+void wrapRemoveFromCoadd(WrapperCollection &wrappers);
+void wrapKernelStats(WrapperCollection &wrappers);
 
 PYBIND11_MODULE(_coaddUtilsLib, mod) {
     lsst::cpputils::python::WrapperCollection wrappers(mod, "lsst.coadd.utils");
     wrappers.addSignatureDependency("lsst.afw.image");
     wrappers.addSignatureDependency("lsst.afw.geom");
+    wrapGoodPixelSpans(wrappers);
     wrapAddtoCoadd(wrappers);
     wrapCopyGoodPixels(wrappers);
     wrapSetCoaddEdgeBits(wrappers);
+    wrapFinalizeCoadd(wrappers);
+    wrapRemoveFromCoadd(wrappers);
+    wrapKernelStats(wrappers);
     wrappers.finish();
 }
 
@@ -20,7 +20,10 @@
  * see <https://www.lsstcorp.org/LegalNotices/>.
  */
 
+#include <string>
+
 #include "pybind11/pybind11.h"
+#include "pybind11/stl.h"
 #include "lsst/cpputils/python.h"
 
 #include "lsst/coadd/utils/addToCoadd.h"
@@ -43,19 +46,131 @@ void declareAddToCoadd(py::module &mod) {
             (geom::Box2I(*)(afwImage::Image<CoaddPixelT> &, afwImage::Image<WeightPixelT> &,
                                afwImage::Image<CoaddPixelT> const &, WeightPixelT)) &
                     addToCoadd,
-            "coadd"_a, "weightMap"_a, "image"_a, "weight"_a);
+            "coadd"_a, "weightMap"_a, "image"_a, "weight"_a,
+            py::call_guard<py::gil_scoped_release>());
     mod.def("addToCoadd",
             (geom::Box2I(*)(afwImage::MaskedImage<CoaddPixelT> &, afwImage::Image<WeightPixelT> &,
                                afwImage::MaskedImage<CoaddPixelT> const &, afwImage::MaskPixel const,
                                WeightPixelT)) &
                     addToCoadd,
-            "coadd"_a, "weightMap"_a, "maskedImage"_a, "badPixelMask"_a, "weight"_a);
+            "coadd"_a, "weightMap"_a, "maskedImage"_a, "badPixelMask"_a, "weight"_a,
+            py::call_guard<py::gil_scoped_release>());
+    mod.def("addToCoadd",
+            (geom::Box2I(*)(afwImage::Image<CoaddPixelT> &, afwImage::Image<WeightPixelT> &,
+                               afwImage::Image<CoaddPixelT> const &, afwImage::Image<WeightPixelT> const &)) &
+                    addToCoadd,
+            "coadd"_a, "weightMap"_a, "image"_a, "weightImage"_a,
+            py::call_guard<py::gil_scoped_release>());
+    mod.def("addToCoadd",
+            (geom::Box2I(*)(afwImage::MaskedImage<CoaddPixelT> &, afwImage::Image<WeightPixelT> &,
+                               afwImage::MaskedImage<CoaddPixelT> const &, afwImage::MaskPixel const,
+                               afwImage::Image<WeightPixelT> const &)) &
+                    addToCoadd,
+            "coadd"_a, "weightMap"_a, "maskedImage"_a, "badPixelMask"_a, "weightImage"_a,
+            py::call_guard<py::gil_scoped_release>());
+    mod.def("addToCoadd",
+            (geom::Box2I(*)(afwImage::Image<CoaddPixelT> &, afwImage::Image<WeightPixelT> &,
+                            afwImage::Image<CoaddPixelT> const &, GoodPixelSpans const &, WeightPixelT)) &
+                    addToCoadd,
+            "coadd"_a, "weightMap"_a, "image"_a, "goodPixelSpans"_a, "weight"_a,
+            py::call_guard<py::gil_scoped_release>());
+    mod.def("addToCoadd",
+            (geom::Box2I(*)(afwImage::MaskedImage<CoaddPixelT> &, afwImage::Image<WeightPixelT> &,
+                            afwImage::MaskedImage<CoaddPixelT> const &, GoodPixelSpans const &,
+                            WeightPixelT)) &
+                    addToCoadd,
+            "coadd"_a, "weightMap"_a, "maskedImage"_a, "goodPixelSpans"_a, "weight"_a,
+            py::call_guard<py::gil_scoped_release>());
+    mod.def("addToCoaddCompensated", &addToCoaddCompensated<CoaddPixelT, WeightPixelT>, "coadd"_a,
+            "compensation"_a, "weightMap"_a, "maskedImage"_a, "badPixelMask"_a, "weight"_a,
+            py::call_guard<py::gil_scoped_release>());
+    mod.def("addToCoaddWithProvenance",
+            (geom::Box2I(*)(afwImage::Image<CoaddPixelT> &, afwImage::Image<WeightPixelT> &,
+                            afwImage::Image<CoaddPixelT> const &, WeightPixelT, afwImage::Image<int> *,
+                            afwImage::Image<std::uint64_t> *, int)) &
+                    addToCoaddWithProvenance,
+            "coadd"_a, "weightMap"_a, "image"_a, "weight"_a,
+            "countMap"_a = static_cast<afwImage::Image<int> *>(nullptr),
+            "provenanceMap"_a = static_cast<afwImage::Image<std::uint64_t> *>(nullptr), "inputIndex"_a = 0,
+            py::call_guard<py::gil_scoped_release>());
+    mod.def("addToCoaddWithProvenance",
+            (geom::Box2I(*)(afwImage::MaskedImage<CoaddPixelT> &, afwImage::Image<WeightPixelT> &,
+                            afwImage::MaskedImage<CoaddPixelT> const &, afwImage::MaskPixel const,
+                            WeightPixelT, afwImage::Image<int> *, afwImage::Image<std::uint64_t> *, int)) &
+                    addToCoaddWithProvenance,
+            "coadd"_a, "weightMap"_a, "maskedImage"_a, "badPixelMask"_a, "weight"_a,
+            "countMap"_a = static_cast<afwImage::Image<int> *>(nullptr),
+            "provenanceMap"_a = static_cast<afwImage::Image<std::uint64_t> *>(nullptr), "inputIndex"_a = 0,
+            py::call_guard<py::gil_scoped_release>());
+    mod.def("addManyToCoadd",
+            (std::vector<geom::Box2I>(*)(afwImage::Image<CoaddPixelT> &, afwImage::Image<WeightPixelT> &,
+                                         std::vector<std::shared_ptr<afwImage::Image<CoaddPixelT>>> const &,
+                                         std::vector<WeightPixelT> const &)) &
+                    addManyToCoadd,
+            "coadd"_a, "weightMap"_a, "imageList"_a, "weightList"_a,
+            py::call_guard<py::gil_scoped_release>());
+    mod.def("addManyToCoadd",
+            (std::vector<geom::Box2I>(*)(
+                    afwImage::MaskedImage<CoaddPixelT> &, afwImage::Image<WeightPixelT> &,
+                    std::vector<std::shared_ptr<afwImage::MaskedImage<CoaddPixelT>>> const &,
+                    afwImage::MaskPixel const, std::vector<WeightPixelT> const &)) &
+                    addManyToCoadd,
+            "coadd"_a, "weightMap"_a, "maskedImageList"_a, "badPixelMask"_a, "weightList"_a,
+            py::call_guard<py::gil_scoped_release>());
+    mod.def("addToCoaddTargets", &addToCoaddTargets<CoaddPixelT, WeightPixelT>, "targetList"_a,
+            "maskedImage"_a, py::call_guard<py::gil_scoped_release>());
+}
+
+template <typename CoaddPixelT, typename WeightPixelT>
+void declareCoaddTarget(lsst::cpputils::python::WrapperCollection &wrappers, std::string const &suffix) {
+    using Target = CoaddTarget<CoaddPixelT, WeightPixelT>;
+    using PyCoaddTarget = py::class_<Target>;
+    wrappers.wrapType(PyCoaddTarget(wrappers.module, ("CoaddTarget" + suffix).c_str()),
+                      [](auto &mod, auto &cls) {
+        py::enum_<typename Target::Operation>(cls, "Operation")
+                .value("ADD", Target::ADD)
+                .value("COPY_GOOD", Target::COPY_GOOD)
+                .value("ADD_WEIGHT", Target::ADD_WEIGHT)
+                .export_values();
+
+        cls.def(py::init<typename Target::Operation, std::shared_ptr<typename Target::MaskedImage>,
+                         std::shared_ptr<lsst::afw::image::Image<WeightPixelT>>, lsst::afw::image::MaskPixel,
+                         WeightPixelT>(),
+                "operation"_a, "coadd"_a = nullptr, "weightMap"_a = nullptr, "badPixelMask"_a = 0,
+                "weight"_a = 1);
+        cls.def_readwrite("operation", &Target::operation);
+        cls.def_readwrite("coadd", &Target::coadd);
+        cls.def_readwrite("weightMap", &Target::weightMap);
+        cls.def_readwrite("badPixelMask", &Target::badPixelMask);
+        cls.def_readwrite("weight", &Target::weight);
+    });
+}
+
+template <typename CoaddPixelT, typename WeightPixelT>
+void declareAddToCoaddInverseVariance(py::module &mod) {
+    mod.def("addToCoaddInverseVariance", &addToCoaddInverseVariance<CoaddPixelT, WeightPixelT>,
+            "coadd"_a, "weightMap"_a, "maskedImage"_a, "badPixelMask"_a, "weight"_a = 1,
+            py::call_guard<py::gil_scoped_release>());
+}
+
+template <typename WeightPixelT>
+void declareCountSaturatedWeights(py::module &mod) {
+    mod.def("countSaturatedWeights", &countSaturatedWeights<WeightPixelT>, "weightMap"_a,
+            py::call_guard<py::gil_scoped_release>());
 }
 
 }  // namespace
 
 void wrapAddtoCoadd(lsst::cpputils::python::WrapperCollection &wrappers) {
     auto &mod = wrappers.module;
+    declareCoaddTarget<double, double>(wrappers, "DD");
+    declareCoaddTarget<double, float>(wrappers, "DF");
+    declareCoaddTarget<double, int>(wrappers, "DI");
+    declareCoaddTarget<double, std::uint16_t>(wrappers, "DU");
+    declareCoaddTarget<float, double>(wrappers, "FD");
+    declareCoaddTarget<float, float>(wrappers, "FF");
+    declareCoaddTarget<float, int>(wrappers, "FI");
+    declareCoaddTarget<float, std::uint16_t>(wrappers, "FU");
     declareAddToCoadd<double, double>(mod);
     declareAddToCoadd<double, float>(mod);
     declareAddToCoadd<double, int>(mod);
@@ -64,6 +179,14 @@ void wrapAddtoCoadd(lsst::cpputils::python::WrapperCollection &wrappers) {
     declareAddToCoadd<float, float>(mod);
     declareAddToCoadd<float, int>(mod);
     declareAddToCoadd<float, std::uint16_t>(mod);
+    declareAddToCoaddInverseVariance<double, double>(mod);
+    declareAddToCoaddInverseVariance<double, float>(mod);
+    declareAddToCoaddInverseVariance<float, double>(mod);
+    declareAddToCoaddInverseVariance<float, float>(mod);
+    declareCountSaturatedWeights<double>(mod);
+    declareCountSaturatedWeights<float>(mod);
+    declareCountSaturatedWeights<int>(mod);
+    declareCountSaturatedWeights<std::uint16_t>(mod);
 }
 
 }  // namespace utils
@@ -0,0 +1,200 @@
+/*
+ * This file is part of coadd_utils.
+ *
+ * Developed for the LSST Data Management System.
+ * This product includes software developed by the LSST Project
+ * (https://www.lsst.org).
+ * See the COPYRIGHT file at the top-level directory of this distribution
+ * for details of code ownership.
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <https://www.gnu.org/licenses/>.
+ */
+
+#include <cstdint>
+#include <type_traits>
+
+#include "boost/format.hpp"
+#include "pybind11/pybind11.h"
+#include "pybind11/numpy.h"
+#include "lsst/cpputils/python.h"
+
+#include "lsst/pex/exceptions.h"
+#include "lsst/coadd/utils/arrayKernels.h"
+
+namespace py = pybind11;
+using namespace pybind11::literals;
+
+namespace lsst {
+namespace coadd {
+namespace utils {
+
+namespace {
+
+namespace pexExcept = lsst::pex::exceptions;
+namespace afwImage = lsst::afw::image;
+
+template <typename PixelT>
+using NumpyArray = py::array_t<typename std::remove_const<PixelT>::type>;
+
+/*
+ * Return a pointer to the pixels of an array, selected on constness by the tag argument;
+ * the non-const version raises if the array is read-only
+ */
+template <typename PixelT>
+PixelT *getPixelData(py::array_t<PixelT> &array, PixelT *) {
+    return array.mutable_data();
+}
+
+template <typename PixelT>
+PixelT const *getPixelData(py::array_t<PixelT> &array, PixelT const *) {
+    return array.data();
+}
+
+/*
+ * Make a PixelArray that views the pixels of a 2-d numpy array, without copying them
+ *
+ * The array's dtype must match PixelT exactly (the bindings do not convert arrays,
+ * since output written to a converted copy would be lost) and its rows must be contiguous.
+ * If PixelT is not const the array must be writeable.
+ */
+template <typename PixelT>
+PixelArray<PixelT> makePixelArray(NumpyArray<PixelT> &array, int x0, int y0, char const *name) {
+    std::ptrdiff_t const itemSize = sizeof(PixelT);
+    if (array.ndim() != 2) {
+        throw LSST_EXCEPT(pexExcept::InvalidParameterError,
+                          (boost::format("%s must be 2-dimensional, not %d-dimensional") % name %
+                           array.ndim()).str());
+    }
+    if ((array.shape(1) > 1 && array.strides(1) != itemSize) || array.strides(0) % itemSize != 0) {
+        throw LSST_EXCEPT(pexExcept::InvalidParameterError,
+                          (boost::format("%s rows must be contiguous; strides are (%d, %d) bytes") % name %
+                           array.strides(0) % array.strides(1)).str());
+    }
+    PixelT *data = getPixelData(array, static_cast<PixelT *>(nullptr));
+    return PixelArray<PixelT>{data, static_cast<int>(array.shape(1)), static_cast<int>(array.shape(0)),
+                              array.strides(0) / itemSize, x0, y0};
+}
+
+template <typename CoaddPixelT, typename WeightPixelT>
+void declareAddToCoaddArrays(py::module &mod) {
+    mod.def(
+            "addToCoaddArrays",
+            [](NumpyArray<CoaddPixelT> &coadd, NumpyArray<WeightPixelT> &weightMap, int coaddX0,
+               int coaddY0, NumpyArray<CoaddPixelT const> &image, int x0, int y0, WeightPixelT weight) {
+                auto coaddArray = makePixelArray<CoaddPixelT>(coadd, coaddX0, coaddY0, "coadd");
+                auto weightMapArray = makePixelArray<WeightPixelT>(weightMap, coaddX0, coaddY0, "weightMap");
+                auto imageArray = makePixelArray<CoaddPixelT const>(image, x0, y0, "image");
+                py::gil_scoped_release release;
+                return addToCoaddArrays(coaddArray, weightMapArray, imageArray, weight);
+            },
+            "coadd"_a.noconvert(), "weightMap"_a.noconvert(), "coaddX0"_a, "coaddY0"_a,
+            "image"_a.noconvert(), "x0"_a, "y0"_a, "weight"_a);
+    mod.def(
+            "addToCoaddArrays",
+            [](NumpyArray<CoaddPixelT> &coaddImage, NumpyArray<afwImage::MaskPixel> &coaddMask,
+               NumpyArray<afwImage::VariancePixel> &coaddVariance, NumpyArray<WeightPixelT> &weightMap,
+               int coaddX0, int coaddY0, NumpyArray<CoaddPixelT const> &image,
+               NumpyArray<afwImage::MaskPixel const> &mask,
+               NumpyArray<afwImage::VariancePixel const> &variance, int x0, int y0,
+               afwImage::MaskPixel badPixelMask, WeightPixelT weight) {
+                auto coaddImageArray =
+                        makePixelArray<CoaddPixelT>(coaddImage, coaddX0, coaddY0, "coaddImage");
+                auto coaddMaskArray =
+                        makePixelArray<afwImage::MaskPixel>(coaddMask, coaddX0, coaddY0, "coaddMask");
+                auto coaddVarianceArray = makePixelArray<afwImage::VariancePixel>(coaddVariance, coaddX0,
+                                                                                  coaddY0, "coaddVariance");
+                auto weightMapArray = makePixelArray<WeightPixelT>(weightMap, coaddX0, coaddY0, "weightMap");
+                auto imageArray = makePixelArray<CoaddPixelT const>(image, x0, y0, "image");
+                auto maskArray = makePixelArray<afwImage::MaskPixel const>(mask, x0, y0, "mask");
+                auto varianceArray =
+                        makePixelArray<afwImage::VariancePixel const>(variance, x0, y0, "variance");
+                py::gil_scoped_release release;
+                return addToCoaddArrays(coaddImageArray, coaddMaskArray, coaddVarianceArray, weightMapArray,
+                                        imageArray, maskArray, varianceArray, badPixelMask, weight);
+            },
+            "coaddImage"_a.noconvert(), "coaddMask"_a.noconvert(), "coaddVariance"_a.noconvert(),
+            "weightMap"_a.noconvert(), "coaddX0"_a, "coaddY0"_a, "image"_a.noconvert(),
+            "mask"_a.noconvert(), "variance"_a.noconvert(), "x0"_a, "y0"_a, "badPixelMask"_a, "weight"_a);
+}
+
+template <typename PixelT>
+void declarePixelArrayKernels(py::module &mod) {
+    mod.def(
+            "copyGoodPixelsArrays",
+            [](NumpyArray<PixelT> &destImage, int destX0, int destY0, NumpyArray<PixelT const> &srcImage,
+               int srcX0, int srcY0) {
+                auto destImageArray = makePixelArray<PixelT>(destImage, destX0, destY0, "destImage");
+                auto srcImageArray = makePixelArray<PixelT const>(srcImage, srcX0, srcY0, "srcImage");
+                py::gil_scoped_release release;
+                return copyGoodPixelsArrays(destImageArray, srcImageArray);
+            },
+            "destImage"_a.noconvert(), "destX0"_a, "destY0"_a, "srcImage"_a.noconvert(), "srcX0"_a,
+            "srcY0"_a);
+    mod.def(
+            "copyGoodPixelsArrays",
+            [](NumpyArray<PixelT> &destImage, NumpyArray<afwImage::MaskPixel> &destMask,
+               NumpyArray<afwImage::VariancePixel> &destVariance, int destX0, int destY0,
+               NumpyArray<PixelT const> &srcImage, NumpyArray<afwImage::MaskPixel const> &srcMask,
+               NumpyArray<afwImage::VariancePixel const> &srcVariance, int srcX0, int srcY0,
+               afwImage::MaskPixel badPixelMask) {
+                auto destImageArray = makePixelArray<PixelT>(destImage, destX0, destY0, "destImage");
+                auto destMaskArray =
+                        makePixelArray<afwImage::MaskPixel>(destMask, destX0, destY0, "destMask");
+                auto destVarianceArray = makePixelArray<afwImage::VariancePixel>(destVariance, destX0, destY0,
+                                                                                 "destVariance");
+                auto srcImageArray = makePixelArray<PixelT const>(srcImage, srcX0, srcY0, "srcImage");
+                auto srcMaskArray =
+                        makePixelArray<afwImage::MaskPixel const>(srcMask, srcX0, srcY0, "srcMask");
+                auto srcVarianceArray = makePixelArray<afwImage::VariancePixel const>(srcVariance, srcX0,
+                                                                                      srcY0, "srcVariance");
+                py::gil_scoped_release release;
+                return copyGoodPixelsArrays(destImageArray, destMaskArray, destVarianceArray, srcImageArray,
+                                            srcMaskArray, srcVarianceArray, badPixelMask);
+            },
+            "destImage"_a.noconvert(), "destMask"_a.noconvert(), "destVariance"_a.noconvert(), "destX0"_a,
+            "destY0"_a, "srcImage"_a.noconvert(), "srcMask"_a.noconvert(), "srcVariance"_a.noconvert(),
+            "srcX0"_a, "srcY0"_a, "badPixelMask"_a);
+    mod.def(
+            "setCoaddEdgeBitsArrays",
+            [](NumpyArray<afwImage::MaskPixel> &coaddMask, NumpyArray<PixelT const> &weightMap,
+               afwImage::MaskPixel edgeMask) {
+                auto coaddMaskArray = makePixelArray<afwImage::MaskPixel>(coaddMask, 0, 0, "coaddMask");
+                auto weightMapArray = makePixelArray<PixelT const>(weightMap, 0, 0, "weightMap");
+                py::gil_scoped_release release;
+                setCoaddEdgeBitsArrays(coaddMaskArray, weightMapArray, edgeMask);
+            },
+            "coaddMask"_a.noconvert(), "weightMap"_a.noconvert(), "edgeMask"_a);
+}
+
+}  // namespace
+
+void wrapArrayKernels(lsst::cpputils::python::WrapperCollection &wrappers) {
+    auto &mod = wrappers.module;
+    declareAddToCoaddArrays<double, double>(mod);
+    declareAddToCoaddArrays<double, float>(mod);
+    declareAddToCoaddArrays<double, int>(mod);
+    declareAddToCoaddArrays<double, std::uint16_t>(mod);
+    declareAddToCoaddArrays<float, double>(mod);
+    declareAddToCoaddArrays<float, float>(mod);
+    declareAddToCoaddArrays<float, int>(mod);
+    declareAddToCoaddArrays<float, std::uint16_t>(mod);
+    declarePixelArrayKernels<double>(mod);
+    declarePixelArrayKernels<float>(mod);
+    declarePixelArrayKernels<int>(mod);
+    declarePixelArrayKernels<std::uint16_t>(mod);
+}
+
+}  // namespace utils
+}  // namespace coadd
+}  // namespace lsst
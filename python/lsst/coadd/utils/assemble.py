@@ -0,0 +1,404 @@
+# This file is part of coadd_utils.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["CoaddInput", "FitsLoader", "assembleCoadd", "assembleCoaddStreaming"]
+
+import collections
+import concurrent.futures
+import os
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import lsst.geom as geom
+import lsst.afw.image as afwImage
+
+from ._coaddUtilsLib import addToCoadd, finalizeCoadd
+from ._coaddUtilsArrayLib import addToCoaddArrays, setNumThreads
+from .bboxIndex import BBoxIndex
+from .fitsCutout import readFitsCutout
+
+# afw image class for each supported pixel type
+_IMAGE_TYPES = {
+    np.dtype(np.float32): afwImage.ImageF,
+    np.dtype(np.float64): afwImage.ImageD,
+    np.dtype(np.int32): afwImage.ImageI,
+    np.dtype(np.uint16): afwImage.ImageU,
+}
+
+_MASKED_IMAGE_TYPES = {
+    np.dtype(np.float32): afwImage.MaskedImageF,
+    np.dtype(np.float64): afwImage.MaskedImageD,
+}
+
+CoaddInput = collections.namedtuple("CoaddInput", ["loader", "bbox", "weight"])
+CoaddInput.__doc__ = """An input to `assembleCoadd` or `assembleCoaddStreaming`.
+
+Parameters
+----------
+loader : callable
+    Called as ``loader(bbox)`` with an `lsst.geom.Box2I` it should cover,
+    returns an `lsst.afw.image.MaskedImage` registered to the coadd, with the
+    coadd pixel type, whose bounding box contains the overlap of ``bbox``
+    with the input (it may be the whole input), or `None` if they do not
+    overlap. Must be picklable to be used by worker processes.
+bbox : `lsst.geom.Box2I` or `None`
+    Parent bounding box of the input, used to decide which parts of the
+    coadd it overlaps without loading it. `assembleCoaddStreaming` accepts
+    `None` if it is not known, in which case the loader is called with
+    the coadd bounding box and only the overlap of the result is used.
+weight : `float`
+    Relative weight of the input.
+"""
+
+
+class FitsLoader:
+    """Load the part of a masked image FITS file that overlaps the requested
+    region, as a `CoaddInput` loader, with `readFitsCutout`.
+
+    Parameters
+    ----------
+    path : `str`
+        Path of a FITS file holding a masked image or exposure
+        registered to the coadd, e.g. a warp.
+    pixelType : `type`, optional
+        Pixel type of the image plane: `numpy.float32` or `numpy.float64`.
+    """
+
+    def __init__(self, path, pixelType=np.float32):
+        self.path = os.fspath(path)
+        self.pixelType = np.dtype(pixelType)
+
+    def __repr__(self):
+        return f"FitsLoader({self.path!r}, {self.pixelType.name})"
+
+    def __call__(self, bbox):
+        """Read the part of the masked image that overlaps ``bbox``;
+        return `None` if there is none.
+        """
+        return readFitsCutout(self.path, bbox, self.pixelType)
+
+
+def assembleCoadd(bbox, inputs, badPixelMask, numProcesses=None, numBands=None,
+                  coaddType=np.float32, weightType=np.float64, finalize=False):
+    """Make a coadd from many inputs using several processes.
+
+    The coadd is split into horizontal bands, each accumulated by one task
+    in a pool of worker processes. The coadd image, mask, variance and
+    weight planes are held in shared memory, and each task loads just the
+    part of each input that overlaps its band and adds it with
+    `addToCoaddArrays` directly into the shared planes, so no pixels are
+    pickled. Bands do not overlap, so the result is identical to adding
+    the inputs in order with `addToCoadd`.
+
+    The worker processes run the kernels with one thread each (see
+    `setNumThreads`), so that together they use ``numProcesses`` cores;
+    if ``numProcesses`` is 1 the kernels use the threads of this process.
+
+    Parameters
+    ----------
+    bbox : `lsst.geom.Box2I`
+        Parent bounding box of the coadd.
+    inputs : iterable [`CoaddInput`]
+        Inputs to add; each must have a bbox.
+    badPixelMask : `int`
+        Skip input pixels for which ``mask & badPixelMask != 0``.
+    numProcesses : `int`, optional
+        Number of worker processes; `os.cpu_count` if `None`.
+        If 1 the bands are accumulated in this process.
+    numBands : `int`, optional
+        Number of bands to split the coadd into; ``numProcesses`` if `None`.
+        More bands balance the load better, but each input is loaded
+        once per band it overlaps.
+    coaddType : `type`, optional
+        Pixel type of the coadd image: `numpy.float32` or `numpy.float64`.
+    weightType : `type`, optional
+        Pixel type of the weight map.
+    finalize : `bool`, optional
+        If `True`, normalize the coadd by the weight map and set NO_DATA
+        where it is zero, with `finalizeCoadd`.
+
+    Returns
+    -------
+    coadd : `lsst.afw.image.MaskedImage`
+        The coadd, normalized if ``finalize``.
+    weightMap : `lsst.afw.image.Image`
+        The weight map.
+    """
+    coaddDtype = np.dtype(coaddType)
+    weightDtype = np.dtype(weightType)
+    if coaddDtype not in _MASKED_IMAGE_TYPES:
+        raise ValueError(f"Unsupported coadd pixel type {coaddDtype}")
+    if weightDtype not in _IMAGE_TYPES:
+        raise ValueError(f"Unsupported weight pixel type {weightDtype}")
+    if numProcesses is None:
+        numProcesses = os.cpu_count() or 1
+    if numBands is None:
+        numBands = numProcesses
+    if numProcesses < 1 or numBands < 1:
+        raise ValueError(f"numProcesses={numProcesses} and numBands={numBands} must be positive")
+
+    index = BBoxIndex()
+    for coaddInput in inputs:
+        if coaddInput.bbox is None:
+            raise ValueError(f"assembleCoadd needs the bbox of every input; {coaddInput.loader} has none")
+        index.add(coaddInput.bbox, (coaddInput.loader, weightDtype.type(coaddInput.weight).item()))
+
+    dtypes = {
+        "image": coaddDtype,
+        "mask": np.dtype(np.int32),
+        "variance": np.dtype(np.float32),
+        "weight": weightDtype,
+    }
+    shape = (bbox.getHeight(), bbox.getWidth())
+    planes = _SharedPlanes.create(shape, dtypes)
+    try:
+        tasks = []
+        for bandBBox in _splitIntoBands(bbox, numBands):
+            overlaps = [(overlapBBox, loader, weight)
+                        for overlapBBox, (loader, weight) in index.query(bandBBox)]
+            if overlaps:
+                tasks.append((bbox, bandBBox, overlaps, badPixelMask))
+        if numProcesses == 1 or len(tasks) <= 1:
+            for task in tasks:
+                _addBandToPlanes(planes, *task)
+        else:
+            spec = planes.getSpec()
+            with concurrent.futures.ProcessPoolExecutor(min(numProcesses, len(tasks)),
+                                                        initializer=_initWorker) as executor:
+                for _ in executor.map(_addBand, [(spec,) + task for task in tasks]):
+                    pass
+
+        coadd = _MASKED_IMAGE_TYPES[coaddDtype](bbox)
+        weightMap = _IMAGE_TYPES[weightDtype](bbox)
+        coadd.image.array[:, :] = planes.arrays["image"]
+        coadd.mask.array[:, :] = planes.arrays["mask"]
+        coadd.variance.array[:, :] = planes.arrays["variance"]
+        weightMap.array[:, :] = planes.arrays["weight"]
+    finally:
+        planes.close(unlink=True)
+
+    if finalize:
+        finalizeCoadd(coadd, weightMap)
+    return coadd, weightMap
+
+
+def assembleCoaddStreaming(bbox, inputs, badPixelMask, prefetch=2, numIoThreads=1,
+                           coaddType=np.float32, weightType=np.float64, finalize=False):
+    """Make a coadd from a stream of inputs, reading ahead while accumulating.
+
+    Inputs are loaded on background threads up to ``prefetch`` ahead of the
+    one being added with `addToCoadd`, which releases the GIL, so reading
+    the next inputs overlaps accumulating the current one. At most
+    ``prefetch + 1`` loaded inputs are held at once, and ``inputs`` is only
+    consumed as fast as they are added. Inputs are added in order, so the
+    result is identical to adding them one at a time with `addToCoadd`.
+
+    The loading threads do not call the kernels; `addToCoadd` runs on the
+    calling thread with the threads set by `setNumThreads`.
+
+    Parameters
+    ----------
+    bbox : `lsst.geom.Box2I`
+        Parent bounding box of the coadd.
+    inputs : iterable [`CoaddInput` or `str`]
+        Inputs to add, e.g. a generator. A path is read with `FitsLoader`
+        and given a weight of 1.
+    badPixelMask : `int`
+        Skip input pixels for which ``mask & badPixelMask != 0``.
+    prefetch : `int`, optional
+        Maximum number of inputs to load ahead of the one being added;
+        0 to load each input only when it is needed.
+    numIoThreads : `int`, optional
+        Number of threads loading inputs concurrently.
+    coaddType : `type`, optional
+        Pixel type of the coadd image: `numpy.float32` or `numpy.float64`.
+    weightType : `type`, optional
+        Pixel type of the weight map.
+    finalize : `bool`, optional
+        If `True`, normalize the coadd by the weight map and set NO_DATA
+        where it is zero, with `finalizeCoadd`.
+
+    Returns
+    -------
+    coadd : `lsst.afw.image.MaskedImage`
+        The coadd, normalized if ``finalize``.
+    weightMap : `lsst.afw.image.Image`
+        The weight map.
+    """
+    coaddDtype = np.dtype(coaddType)
+    weightDtype = np.dtype(weightType)
+    if coaddDtype not in _MASKED_IMAGE_TYPES:
+        raise ValueError(f"Unsupported coadd pixel type {coaddDtype}")
+    if weightDtype not in _IMAGE_TYPES:
+        raise ValueError(f"Unsupported weight pixel type {weightDtype}")
+    if prefetch < 0 or numIoThreads < 1:
+        raise ValueError(f"prefetch={prefetch} must be non-negative and numIoThreads={numIoThreads} positive")
+
+    coadd = _MASKED_IMAGE_TYPES[coaddDtype](bbox)
+    weightMap = _IMAGE_TYPES[weightDtype](bbox)
+
+    def addLoaded(future):
+        maskedImage, weight = future.result()
+        if maskedImage is not None:
+            addToCoadd(coadd, weightMap, maskedImage, badPixelMask, weightDtype.type(weight).item())
+
+    pending = collections.deque()
+    with concurrent.futures.ThreadPoolExecutor(numIoThreads, thread_name_prefix="coaddPrefetch") as executor:
+        try:
+            for coaddInput in inputs:
+                if not isinstance(coaddInput, CoaddInput):
+                    coaddInput = CoaddInput(FitsLoader(coaddInput, coaddDtype), None, 1.0)
+                if coaddInput.bbox is None:
+                    loadBBox = geom.Box2I(bbox)
+                else:
+                    loadBBox = geom.Box2I(coaddInput.bbox)
+                    loadBBox.clip(bbox)
+                    if loadBBox.isEmpty():
+                        continue
+                pending.append(executor.submit(_load, coaddInput, loadBBox))
+                if len(pending) > prefetch:
+                    addLoaded(pending.popleft())
+            while pending:
+                addLoaded(pending.popleft())
+        finally:
+            for future in pending:
+                future.cancel()
+
+    if finalize:
+        finalizeCoadd(coadd, weightMap)
+    return coadd, weightMap
+
+
+def _load(coaddInput, bbox):
+    """Load an input for assembleCoaddStreaming; runs on a prefetch thread.
+    """
+    return coaddInput.loader(bbox), coaddInput.weight
+
+
+class _SharedPlanes:
+    """The coadd planes, each in a block of shared memory.
+
+    Use `create` in the parent process and `attach` with the result of
+    `getSpec` in a worker.
+    """
+
+    def __init__(self, shape, dtypes, blocks):
+        self.shape = shape
+        self.dtypes = dtypes
+        self.blocks = blocks
+        self.arrays = {name: np.ndarray(shape, dtype=dtypes[name], buffer=blocks[name].buf)
+                       for name in dtypes}
+
+    @classmethod
+    def create(cls, shape, dtypes):
+        """Allocate zeroed shared memory for each plane.
+        """
+        blocks = {}
+        try:
+            for name, dtype in dtypes.items():
+                size = max(1, shape[0]*shape[1]*dtype.itemsize)
+                blocks[name] = shared_memory.SharedMemory(create=True, size=size)
+        except Exception:
+            for block in blocks.values():
+                block.close()
+                block.unlink()
+            raise
+        return cls(shape, dtypes, blocks)
+
+    @classmethod
+    def attach(cls, spec):
+        """Attach to planes created by another process.
+
+        Only the creating process unlinks the blocks; worker processes started
+        by `multiprocessing` share its resource tracker, so attaching does not
+        make them responsible for the blocks.
+        """
+        shape, dtypes, names = spec
+        blocks = {name: shared_memory.SharedMemory(name=blockName) for name, blockName in names.items()}
+        return cls(shape, {name: np.dtype(dtype) for name, dtype in dtypes.items()}, blocks)
+
+    def getSpec(self):
+        """Return a picklable description of the planes, for `attach`.
+        """
+        return (self.shape, {name: dtype.str for name, dtype in self.dtypes.items()},
+                {name: block.name for name, block in self.blocks.items()})
+
+    def close(self, unlink=False):
+        """Release the arrays and close (and optionally unlink) the blocks.
+        """
+        self.arrays = {}
+        for block in self.blocks.values():
+            block.close()
+            if unlink:
+                block.unlink()
+
+
+def _splitIntoBands(bbox, numBands):
+    """Split a bounding box into at most numBands full-width bands of rows
+    of nearly equal height.
+    """
+    numBands = min(numBands, bbox.getHeight())
+    bands = []
+    for i in range(numBands):
+        beginY = bbox.getBeginY() + (bbox.getHeight()*i)//numBands
+        endY = bbox.getBeginY() + (bbox.getHeight()*(i + 1))//numBands
+        bands.append(geom.Box2I(geom.Point2I(bbox.getMinX(), beginY),
+                                geom.Extent2I(bbox.getWidth(), endY - beginY)))
+    return bands
+
+
+def _initWorker():
+    """Run the kernels single-threaded in a worker process of assembleCoadd.
+    """
+    setNumThreads(1)
+
+
+def _addBand(task):
+    """Attach to the shared coadd planes and add the inputs that overlap
+    one band to them; runs in a worker process.
+    """
+    spec, *bandTask = task
+    planes = _SharedPlanes.attach(spec)
+    try:
+        _addBandToPlanes(planes, *bandTask)
+    finally:
+        planes.close()
+
+
+def _addBandToPlanes(planes, coaddBBox, bandBBox, overlaps, badPixelMask):
+    """Add the inputs that overlap one band to the coadd planes.
+    """
+    rows = slice(bandBBox.getBeginY() - coaddBBox.getBeginY(), bandBBox.getEndY() - coaddBBox.getBeginY())
+    band = {name: array[rows] for name, array in planes.arrays.items()}
+    try:
+        for overlapBBox, loader, weight in overlaps:
+            maskedImage = loader(overlapBBox)
+            if maskedImage is None:
+                continue
+            maskedImage = maskedImage[overlapBBox]
+            addToCoaddArrays(band["image"], band["mask"], band["variance"], band["weight"],
+                             bandBBox.getMinX(), bandBBox.getMinY(),
+                             maskedImage.image.array, maskedImage.mask.array, maskedImage.variance.array,
+                             overlapBBox.getMinX(), overlapBBox.getMinY(), badPixelMask, weight)
+    finally:
+        # don't let a traceback keep views of the shared memory alive, which would stop it being closed
+        del band
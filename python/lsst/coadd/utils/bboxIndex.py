@@ -0,0 +1,106 @@
+# This file is part of coadd_utils.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["BBoxIndex"]
+
+from collections import defaultdict
+
+import lsst.geom as geom
+
+
+class BBoxIndex:
+    """A spatial index of parent bounding boxes, for finding the inputs
+    that overlap a coadd or a tile of one without touching their pixels.
+
+    Bounding boxes are binned into a regular grid of square cells; a query
+    only examines the boxes registered in the cells it covers, so its cost
+    depends on the number of nearby inputs rather than the total number.
+
+    Parameters
+    ----------
+    cellSize : `int`, optional
+        Width and height of a grid cell, in pixels. A good choice is
+        comparable to the size of the query regions (e.g. a patch).
+    """
+
+    def __init__(self, cellSize=2000):
+        if cellSize <= 0:
+            raise ValueError(f"cellSize={cellSize} must be positive")
+        self._cellSize = cellSize
+        self._cells = defaultdict(list)
+        self._entries = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, bbox, value):
+        """Register a bounding box.
+
+        Parameters
+        ----------
+        bbox : `lsst.geom.Box2I`
+            Parent bounding box of an input, e.g. of a warp.
+            Empty boxes are accepted but never returned by queries.
+        value : `object`
+            Value to return from queries that overlap ``bbox``,
+            e.g. a data ID or a deferred dataset handle.
+        """
+        bbox = geom.Box2I(bbox)
+        entryIndex = len(self._entries)
+        self._entries.append((bbox, value))
+        for cell in self._iterCells(bbox):
+            self._cells[cell].append(entryIndex)
+
+    def query(self, bbox):
+        """Find the registered boxes that overlap a region.
+
+        Parameters
+        ----------
+        bbox : `lsst.geom.Box2I`
+            Parent bounding box of the region, e.g. a coadd or a tile.
+
+        Returns
+        -------
+        overlaps : `list` [`tuple` [`lsst.geom.Box2I`, `object`]]
+            ``(overlapBBox, value)`` for each registered box that overlaps
+            ``bbox``, in the order they were added, where ``overlapBBox`` is
+            the intersection of the two boxes (as computed by `addToCoadd`).
+        """
+        candidates = set()
+        for cell in self._iterCells(bbox):
+            candidates.update(self._cells.get(cell, ()))
+        overlaps = []
+        for entryIndex in sorted(candidates):
+            entryBBox, value = self._entries[entryIndex]
+            overlapBBox = geom.Box2I(bbox)
+            overlapBBox.clip(entryBBox)
+            if not overlapBBox.isEmpty():
+                overlaps.append((overlapBBox, value))
+        return overlaps
+
+    def _iterCells(self, bbox):
+        """Iterate over the grid cells that bbox touches.
+        """
+        if bbox.isEmpty():
+            return
+        for cellY in range(bbox.getMinY() // self._cellSize, bbox.getMaxY() // self._cellSize + 1):
+            for cellX in range(bbox.getMinX() // self._cellSize, bbox.getMaxX() // self._cellSize + 1):
+                yield (cellX, cellY)
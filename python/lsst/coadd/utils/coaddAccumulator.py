@@ -0,0 +1,228 @@
+# This file is part of coadd_utils.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["CoaddAccumulator"]
+
+import time
+
+import numpy as np
+
+import lsst.afw.image as afwImage
+
+from ._coaddUtilsLib import addToCoadd
+from .memmapCoadd import readCoaddCheckpoint, writeCoaddCheckpoint
+
+# afw image classes for each supported pixel type
+_MASKED_IMAGE_TYPES = {
+    np.dtype(np.float32): afwImage.MaskedImageF,
+    np.dtype(np.float64): afwImage.MaskedImageD,
+}
+_IMAGE_TYPES = {
+    np.dtype(np.float32): afwImage.ImageF,
+    np.dtype(np.float64): afwImage.ImageD,
+    np.dtype(np.int32): afwImage.ImageI,
+    np.dtype(np.uint16): afwImage.ImageU,
+}
+
+
+def _toInputId(value):
+    """Convert an input ID read from JSON back to a hashable ID.
+    """
+    return tuple(_toInputId(item) for item in value) if isinstance(value, list) else value
+
+
+class CoaddAccumulator:
+    """Accumulate a coadd from identified inputs with `addToCoadd`,
+    saving checkpoints from which an interrupted accumulation resumes.
+
+    A checkpoint holds the coadd planes, the weight map and the IDs of the
+    inputs already added (see `writeCoaddCheckpoint`). If
+    ``checkpointDirectory`` holds a checkpoint when the accumulator is
+    constructed, accumulation resumes from it, and `add` skips the inputs
+    it already includes, so rerunning a job after preemption redoes at
+    most the inputs added since the last checkpoint.
+
+    Parameters
+    ----------
+    bbox : `lsst.geom.Box2I`
+        Parent bounding box of the coadd.
+    badPixelMask : `int`
+        Skip input pixels for which ``mask & badPixelMask != 0``.
+    checkpointDirectory : `str`, optional
+        Directory of the checkpoint; if `None` no checkpoints are saved.
+    checkpointInterval : `int`, optional
+        Save a checkpoint after this many inputs have been added since
+        the last one; if `None`, do not checkpoint by count.
+    checkpointSeconds : `float`, optional
+        Save a checkpoint when an input is added this many seconds or more
+        after the last checkpoint; if `None`, do not checkpoint by time.
+    compression : `str`, optional
+        Compression of the checkpoint planes: `None` or ``"zlib"``.
+    coaddType : `type`, optional
+        Pixel type of the coadd image plane: `numpy.float32` or
+        `numpy.float64`. Ignored when resuming from a checkpoint.
+    weightType : `type`, optional
+        Pixel type of the weight map. Ignored when resuming from a
+        checkpoint.
+
+    Raises
+    ------
+    ValueError
+        Raised if the checkpoint in ``checkpointDirectory`` has a different
+        bounding box or bad pixel mask.
+
+    Notes
+    -----
+    Input IDs may be any values that can be stored in JSON and hashed,
+    such as integers, strings or tuples of them (e.g. visit and detector).
+    """
+
+    def __init__(self, bbox, badPixelMask, checkpointDirectory=None, checkpointInterval=None,
+                 checkpointSeconds=None, compression=None, coaddType=np.float32, weightType=np.float64):
+        self._badPixelMask = int(badPixelMask)
+        self._checkpointDirectory = checkpointDirectory
+        self._checkpointInterval = checkpointInterval
+        self._checkpointSeconds = checkpointSeconds
+        self._compression = compression
+        self._inputIds = {}  # used as an ordered set
+
+        checkpoint = None
+        if checkpointDirectory is not None:
+            try:
+                checkpoint = readCoaddCheckpoint(checkpointDirectory)
+            except FileNotFoundError:
+                pass
+        if checkpoint is None:
+            coaddDtype = np.dtype(coaddType)
+            weightDtype = np.dtype(weightType)
+            if coaddDtype not in _MASKED_IMAGE_TYPES:
+                raise ValueError(f"Unsupported coadd pixel type {coaddDtype}")
+            if weightDtype not in _IMAGE_TYPES:
+                raise ValueError(f"Unsupported weight map pixel type {weightDtype}")
+            self._coadd = _MASKED_IMAGE_TYPES[coaddDtype](bbox)
+            self._weightMap = _IMAGE_TYPES[weightDtype](bbox)
+        else:
+            if checkpoint.coadd.getBBox() != bbox:
+                raise ValueError(f"Checkpoint {checkpointDirectory} has bbox {checkpoint.coadd.getBBox()}, "
+                                 f"not {bbox}")
+            if checkpoint.metadata.get("badPixelMask") != self._badPixelMask:
+                raise ValueError(f"Checkpoint {checkpointDirectory} has badPixelMask "
+                                 f"{checkpoint.metadata.get('badPixelMask')}, not {self._badPixelMask}")
+            self._coadd = checkpoint.coadd
+            self._weightMap = checkpoint.weightMap
+            self._inputIds = dict.fromkeys(_toInputId(inputId) for inputId in checkpoint.metadata["inputIds"])
+        self._numUnsaved = 0
+        self._lastCheckpointTime = time.monotonic()
+
+    def __contains__(self, inputId):
+        """Return whether the input with this ID has been added, so that
+        a caller may avoid reading it.
+        """
+        return inputId in self._inputIds
+
+    def __len__(self):
+        """Return the number of inputs added.
+        """
+        return len(self._inputIds)
+
+    @property
+    def inputIds(self):
+        """IDs of the inputs added, in order (`list`).
+        """
+        return list(self._inputIds)
+
+    @property
+    def coadd(self):
+        """Unnormalized coadd (`lsst.afw.image.MaskedImage`).
+        """
+        return self._coadd
+
+    @property
+    def weightMap(self):
+        """Weight map of the coadd (`lsst.afw.image.Image`).
+        """
+        return self._weightMap
+
+    def add(self, inputId, maskedImage, weight):
+        """Add a masked image to the coadd unless it has already been added.
+
+        Saves a checkpoint afterwards if the checkpoint interval has been
+        reached.
+
+        Parameters
+        ----------
+        inputId : hashable
+            ID of the input.
+        maskedImage : `lsst.afw.image.MaskedImage`
+            Masked image to add, registered to the coadd, with the pixel
+            type of the coadd.
+        weight : `float`
+            Relative weight of this image; converted to the pixel type of
+            the weight map, so it is truncated for integer weight maps.
+
+        Returns
+        -------
+        added : `bool`
+            `True` if the image was added, `False` if an input with this
+            ID had already been added.
+        """
+        if inputId in self._inputIds:
+            return False
+        # pass the weight with the weight map's type, so that the overload for it is chosen
+        weight = self._weightMap.array.dtype.type(weight).item()
+        addToCoadd(self._coadd, self._weightMap, maskedImage, self._badPixelMask, weight)
+        self._inputIds[inputId] = None
+        self._numUnsaved += 1
+        if self._isCheckpointDue():
+            self.checkpoint()
+        return True
+
+    def checkpoint(self):
+        """Save a checkpoint now, if there is a checkpoint directory.
+        """
+        if self._checkpointDirectory is None:
+            return
+        metadata = {"badPixelMask": self._badPixelMask, "inputIds": list(self._inputIds)}
+        writeCoaddCheckpoint(self._checkpointDirectory, self._coadd, self._weightMap, metadata=metadata,
+                             compression=self._compression)
+        self._numUnsaved = 0
+        self._lastCheckpointTime = time.monotonic()
+
+    def finish(self):
+        """Save a final checkpoint, if anything was added since the last one,
+        and return the accumulated coadd.
+
+        Returns
+        -------
+        coadd : `lsst.afw.image.MaskedImage`
+            Unnormalized coadd; see `finalizeCoadd`.
+        weightMap : `lsst.afw.image.Image`
+            Weight map of the coadd.
+        """
+        if self._numUnsaved > 0:
+            self.checkpoint()
+        return self._coadd, self._weightMap
+
+    def _isCheckpointDue(self):
+        if self._checkpointInterval is not None and self._numUnsaved >= self._checkpointInterval:
+            return True
+        return (self._checkpointSeconds is not None
+                and time.monotonic() - self._lastCheckpointTime >= self._checkpointSeconds)
@@ -40,12 +40,26 @@ void declareCopyGoodPixels(py::module &mod) {
 
     mod.def("copyGoodPixels",
             (int (*)(afwImage::Image<ImagePixelT> &, afwImage::Image<ImagePixelT> const &)) & copyGoodPixels,
-            "destImage"_a, "srcImage"_a);
+            "destImage"_a, "srcImage"_a,
+            py::call_guard<py::gil_scoped_release>());
     mod.def("copyGoodPixels",
             (int (*)(afwImage::MaskedImage<ImagePixelT> &, afwImage::MaskedImage<ImagePixelT> const &,
                      afwImage::MaskPixel const)) &
                     copyGoodPixels,
-            "destImage"_a, "srcImage"_a, "badPixelMask"_a);
+            "destImage"_a, "srcImage"_a, "badPixelMask"_a,
+            py::call_guard<py::gil_scoped_release>());
+    mod.def("copyGoodPixels",
+            (int (*)(afwImage::Image<ImagePixelT> &, afwImage::Image<ImagePixelT> const &,
+                     GoodPixelSpans const &)) &
+                    copyGoodPixels,
+            "destImage"_a, "srcImage"_a, "goodPixelSpans"_a,
+            py::call_guard<py::gil_scoped_release>());
+    mod.def("copyGoodPixels",
+            (int (*)(afwImage::MaskedImage<ImagePixelT> &, afwImage::MaskedImage<ImagePixelT> const &,
+                     GoodPixelSpans const &)) &
+                    copyGoodPixels,
+            "destImage"_a, "srcImage"_a, "goodPixelSpans"_a,
+            py::call_guard<py::gil_scoped_release>());
 }
 
 }  // namespace
@@ -0,0 +1,70 @@
+/*
+ * This file is part of coadd_utils.
+ *
+ * Developed for the LSST Data Management System.
+ * This product includes software developed by the LSST Project
+ * (https://www.lsst.org).
+ * See the COPYRIGHT file at the top-level directory of this distribution
+ * for details of code ownership.
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <https://www.gnu.org/licenses/>.
+ */
+
+#include "pybind11/pybind11.h"
+#include "lsst/cpputils/python.h"
+
+#include "lsst/coadd/utils/finalizeCoadd.h"
+
+namespace py = pybind11;
+using namespace pybind11::literals;
+
+namespace lsst {
+namespace coadd {
+namespace utils {
+
+namespace {
+
+template <typename CoaddPixelT, typename WeightPixelT>
+void declareFinalizeCoadd(py::module &mod) {
+    namespace afwImage = lsst::afw::image;
+
+    mod.def("finalizeCoadd",
+            (void (*)(afwImage::Image<CoaddPixelT> &, afwImage::Image<WeightPixelT> const &, bool)) &
+                    finalizeCoadd,
+            "coadd"_a, "weightMap"_a, "fillNaN"_a = false,
+            py::call_guard<py::gil_scoped_release>());
+    mod.def("finalizeCoadd",
+            (void (*)(afwImage::MaskedImage<CoaddPixelT> &, afwImage::Image<WeightPixelT> const &, bool)) &
+                    finalizeCoadd,
+            "coadd"_a, "weightMap"_a, "fillNaN"_a = false,
+            py::call_guard<py::gil_scoped_release>());
+}
+
+}  // namespace
+
+void wrapFinalizeCoadd(lsst::cpputils::python::WrapperCollection &wrappers) {
+    auto &mod = wrappers.module;
+    declareFinalizeCoadd<double, double>(mod);
+    declareFinalizeCoadd<double, float>(mod);
+    declareFinalizeCoadd<double, int>(mod);
+    declareFinalizeCoadd<double, std::uint16_t>(mod);
+    declareFinalizeCoadd<float, double>(mod);
+    declareFinalizeCoadd<float, float>(mod);
+    declareFinalizeCoadd<float, int>(mod);
+    declareFinalizeCoadd<float, std::uint16_t>(mod);
+}
+
+}  // namespace utils
+}  // namespace coadd
+}  // namespace lsst
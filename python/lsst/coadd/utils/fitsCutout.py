@@ -0,0 +1,141 @@
+# This file is part of coadd_utils.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["readFitsBBox", "readFitsCutout", "addFitsToCoadd", "copyGoodPixelsFromFits"]
+
+import numpy as np
+
+import lsst.geom as geom
+import lsst.afw.image as afwImage
+
+from ._coaddUtilsLib import addToCoadd, copyGoodPixels
+
+# afw masked image class for each supported pixel type
+_MASKED_IMAGE_TYPES = {
+    np.dtype(np.float32): afwImage.MaskedImageF,
+    np.dtype(np.float64): afwImage.MaskedImageD,
+}
+
+
+def readFitsBBox(path):
+    """Read the parent bounding box of a masked image or exposure FITS file
+    from its header, without reading any pixels.
+
+    Parameters
+    ----------
+    path : `str`
+        Path of the FITS file.
+
+    Returns
+    -------
+    bbox : `lsst.geom.Box2I`
+        Parent bounding box of the image.
+    """
+    return afwImage.MaskedImageFitsReader(path).readBBox(afwImage.PARENT)
+
+
+def readFitsCutout(path, bbox, pixelType=np.float32):
+    """Read the part of a masked image or exposure FITS file that overlaps
+    a region, without reading the rest of its pixels.
+
+    Only the rows and columns of the overlap are read (cfitsio reads just
+    the needed rows, or tiles if the file is tile-compressed), so I/O and
+    memory are proportional to the overlap rather than the whole image.
+
+    Parameters
+    ----------
+    path : `str`
+        Path of the FITS file.
+    bbox : `lsst.geom.Box2I`
+        Region of interest, e.g. a coadd, relative to the parent image.
+    pixelType : `type`, optional
+        Pixel type of the image plane: `numpy.float32` or `numpy.float64`.
+
+    Returns
+    -------
+    cutout : `lsst.afw.image.MaskedImage` or `None`
+        The overlapping part of the image, or `None` if it does not
+        overlap ``bbox``.
+    """
+    overlapBBox = readFitsBBox(path)
+    overlapBBox.clip(bbox)
+    if overlapBBox.isEmpty():
+        return None
+    return _MASKED_IMAGE_TYPES[np.dtype(pixelType)](path, bbox=overlapBBox, origin=afwImage.PARENT)
+
+
+def addFitsToCoadd(coadd, weightMap, path, badPixelMask, weight):
+    """Add the good pixels of a masked image FITS file to a coadd, reading
+    only the part that overlaps the coadd.
+
+    This is `addToCoadd` applied to `readFitsCutout` of the coadd bbox.
+
+    Parameters
+    ----------
+    coadd : `lsst.afw.image.MaskedImage`
+        Coadd to be modified.
+    weightMap : `lsst.afw.image.Image`
+        Weight map to be modified.
+    path : `str`
+        Path of the FITS file of a masked image or exposure registered
+        to the coadd, e.g. a warp.
+    badPixelMask : `int`
+        Skip input pixels for which ``mask & badPixelMask != 0``.
+    weight : `float`
+        Relative weight of this image.
+
+    Returns
+    -------
+    overlapBBox : `lsst.geom.Box2I`
+        Overlapping bounding box, relative to the parent image;
+        empty (and nothing was read but the header) if there is no overlap.
+    """
+    cutout = readFitsCutout(path, coadd.getBBox(), pixelType=coadd.image.array.dtype)
+    if cutout is None:
+        return geom.Box2I()
+    return addToCoadd(coadd, weightMap, cutout, badPixelMask, weight)
+
+
+def copyGoodPixelsFromFits(destImage, path, badPixelMask):
+    """Copy the good pixels of a masked image FITS file into a masked image,
+    reading only the part that overlaps it.
+
+    This is `copyGoodPixels` applied to `readFitsCutout` of the destination bbox.
+
+    Parameters
+    ----------
+    destImage : `lsst.afw.image.MaskedImage`
+        Masked image to modify.
+    path : `str`
+        Path of the FITS file of a masked image or exposure registered
+        to ``destImage``.
+    badPixelMask : `int`
+        Skip input pixels for which ``mask & badPixelMask != 0``.
+
+    Returns
+    -------
+    numGoodPix : `int`
+        Number of pixels copied.
+    """
+    cutout = readFitsCutout(path, destImage.getBBox(), pixelType=destImage.image.array.dtype)
+    if cutout is None:
+        return 0
+    return copyGoodPixels(destImage, cutout, badPixelMask)
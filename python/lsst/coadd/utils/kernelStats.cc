@@ -0,0 +1,66 @@
+/*
+ * This file is part of coadd_utils.
+ *
+ * Developed for the LSST Data Management System.
+ * This product includes software developed by the LSST Project
+ * (https://www.lsst.org).
+ * See the COPYRIGHT file at the top-level directory of this distribution
+ * for details of code ownership.
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <https://www.gnu.org/licenses/>.
+ */
+
+#include <string>
+
+#include "pybind11/pybind11.h"
+#include "pybind11/stl.h"
+#include "lsst/cpputils/python.h"
+
+#include "lsst/coadd/utils/kernelStats.h"
+
+namespace py = pybind11;
+using namespace pybind11::literals;
+
+namespace lsst {
+namespace coadd {
+namespace utils {
+
+void wrapKernelStats(lsst::cpputils::python::WrapperCollection &wrappers) {
+    wrappers.wrapType(py::class_<KernelStats>(wrappers.module, "KernelStats"), [](auto &mod, auto &cls) {
+        cls.def_readonly("numCalls", &KernelStats::numCalls);
+        cls.def_readonly("numEmptyCalls", &KernelStats::numEmptyCalls);
+        cls.def_readonly("numPixels", &KernelStats::numPixels);
+        cls.def_readonly("numGoodPixels", &KernelStats::numGoodPixels);
+        cls.def_readonly("numBytes", &KernelStats::numBytes);
+        cls.def_readonly("seconds", &KernelStats::seconds);
+        cls.def_property_readonly("numRejectedPixels", &KernelStats::getNumRejectedPixels);
+        cls.def("__repr__", [](KernelStats const &self) {
+            return "KernelStats(numCalls=" + std::to_string(self.numCalls) +
+                   ", numEmptyCalls=" + std::to_string(self.numEmptyCalls) +
+                   ", numPixels=" + std::to_string(self.numPixels) +
+                   ", numGoodPixels=" + std::to_string(self.numGoodPixels) +
+                   ", numBytes=" + std::to_string(self.numBytes) +
+                   ", seconds=" + std::to_string(self.seconds) + ")";
+        });
+
+        mod.def("setKernelStatsEnabled", &setKernelStatsEnabled, "enabled"_a);
+        mod.def("getKernelStatsEnabled", &getKernelStatsEnabled);
+        mod.def("getKernelStats", &getKernelStats);
+        mod.def("resetKernelStats", &resetKernelStats);
+    });
+}
+
+}  // namespace utils
+}  // namespace coadd
+}  // namespace lsst
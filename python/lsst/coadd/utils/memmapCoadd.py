@@ -0,0 +1,437 @@
+# This file is part of coadd_utils.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["MemmapCoadd", "CoaddCheckpoint", "writeCoaddCheckpoint", "readCoaddCheckpoint"]
+
+from collections import namedtuple
+import json
+import os
+import shutil
+import zlib
+
+import numpy as np
+
+import lsst.geom as geom
+import lsst.afw.image as afwImage
+
+from ._coaddUtilsLib import addToCoadd, removeFromCoadd
+
+# afw image class for each supported pixel type
+_IMAGE_TYPES = {
+    np.dtype(np.float32): afwImage.ImageF,
+    np.dtype(np.float64): afwImage.ImageD,
+    np.dtype(np.int32): afwImage.ImageI,
+    np.dtype(np.uint16): afwImage.ImageU,
+}
+
+
+class MemmapCoadd:
+    """A coadd and weight map kept in memory-mapped files, for patches
+    too large to hold in memory.
+
+    The image, mask, variance and weight planes are each stored as a raw
+    row-major array of native-endian pixels in its own file in
+    ``directory``, described by a small JSON header. Each call to `add`
+    maps only the band of rows that overlaps the incoming image, accumulates
+    into it with `addToCoadd`, and unmaps it, so resident memory is bounded
+    by the size of the inputs rather than the size of the coadd.
+
+    Use `create` to make a new coadd or `open` to reopen an existing one,
+    rather than constructing this class directly.
+
+    Parameters
+    ----------
+    directory : `str`
+        Directory holding the header and plane files.
+    mode : `str`
+        ``"r+"`` to allow `add`, ``"r"`` for read-only access.
+    """
+
+    HEADER_NAME = "coadd.json"
+    PLANE_NAMES = ("image", "mask", "variance", "weight")
+
+    def __init__(self, directory, mode="r+"):
+        if mode not in ("r", "r+"):
+            raise ValueError(f"mode={mode!r} must be 'r' or 'r+'")
+        with open(os.path.join(directory, self.HEADER_NAME)) as f:
+            header = json.load(f)
+        if header.get("compression") is not None:
+            raise ValueError(f"{directory} is a compressed checkpoint, which cannot be memory-mapped")
+        self._directory = directory
+        self._mode = mode
+        self._bbox = geom.Box2I(geom.Point2I(*header["min"]), geom.Extent2I(*header["dimensions"]))
+        self._dtypes = {name: np.dtype(header["dtypes"][name]) for name in self.PLANE_NAMES}
+
+    @classmethod
+    def create(cls, directory, bbox, coaddType=np.float32, weightType=np.float64):
+        """Create a new, zeroed, memory-mapped coadd.
+
+        Parameters
+        ----------
+        directory : `str`
+            Directory in which to create the files; made if missing.
+        bbox : `lsst.geom.Box2I`
+            Parent bounding box of the coadd.
+        coaddType : `type`, optional
+            Pixel type of the coadd image plane: `numpy.float32` or `numpy.float64`.
+        weightType : `type`, optional
+            Pixel type of the weight map.
+
+        Returns
+        -------
+        coadd : `MemmapCoadd`
+            The new coadd, open for update.
+        """
+        dtypes = {
+            "image": np.dtype(coaddType),
+            "mask": np.dtype(np.int32),
+            "variance": np.dtype(np.float32),
+            "weight": np.dtype(weightType),
+        }
+        for name in ("image", "weight"):
+            if dtypes[name] not in _IMAGE_TYPES:
+                raise ValueError(f"Unsupported {name} pixel type {dtypes[name]}")
+        os.makedirs(directory, exist_ok=True)
+        numPixels = bbox.getWidth()*bbox.getHeight()
+        for name, dtype in dtypes.items():
+            with open(os.path.join(directory, f"{name}.raw"), "wb") as f:
+                f.truncate(numPixels*dtype.itemsize)  # sparse file of zeros
+        _writeHeader(directory, bbox, dtypes)
+        return cls(directory)
+
+    @classmethod
+    def open(cls, directory, mode="r+"):
+        """Open an existing memory-mapped coadd.
+        """
+        return cls(directory, mode=mode)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.flush()
+
+    def getBBox(self):
+        """Return the parent bounding box of the coadd.
+        """
+        return geom.Box2I(self._bbox)
+
+    def add(self, maskedImage, badPixelMask, weight):
+        """Add the good pixels of a masked image to the coadd and weight map.
+
+        This is `addToCoadd` applied to the band of rows of the coadd
+        that overlaps ``maskedImage``.
+
+        Parameters
+        ----------
+        maskedImage : `lsst.afw.image.MaskedImage`
+            Masked image to add, registered to the coadd.
+        badPixelMask : `int`
+            Skip input pixels for which ``mask & badPixelMask != 0``.
+        weight : `float`
+            Relative weight of this image.
+
+        Returns
+        -------
+        overlapBBox : `lsst.geom.Box2I`
+            Overlapping bounding box, relative to the parent image.
+        """
+        if self._mode != "r+":
+            raise RuntimeError(f"{self._directory} is open read-only")
+        overlapBBox = self.getBBox()
+        overlapBBox.clip(maskedImage.getBBox())
+        if overlapBBox.isEmpty():
+            return overlapBBox
+        planes = self._mapBBox(overlapBBox, writable=True)
+        coadd = afwImage.makeMaskedImage(planes["image"], planes["mask"], planes["variance"])
+        addToCoadd(coadd, planes["weight"], maskedImage, badPixelMask, weight)
+        return overlapBBox
+
+    def remove(self, maskedImage, badPixelMask, weight):
+        """Remove the good pixels of a masked image from the coadd and
+        weight map.
+
+        This is `removeFromCoadd` applied to the band of rows of the coadd
+        that overlaps ``maskedImage``; it undoes an `add` with the same
+        arguments, except that the coadd mask is not changed.
+
+        Parameters
+        ----------
+        maskedImage : `lsst.afw.image.MaskedImage`
+            Masked image that was added.
+        badPixelMask : `int`
+            Bad pixel mask it was added with.
+        weight : `float`
+            Relative weight it was added with.
+
+        Returns
+        -------
+        overlapBBox : `lsst.geom.Box2I`
+            Overlapping bounding box, relative to the parent image.
+        """
+        if self._mode != "r+":
+            raise RuntimeError(f"{self._directory} is open read-only")
+        overlapBBox = self.getBBox()
+        overlapBBox.clip(maskedImage.getBBox())
+        if overlapBBox.isEmpty():
+            return overlapBBox
+        planes = self._mapBBox(overlapBBox, writable=True)
+        coadd = afwImage.makeMaskedImage(planes["image"], planes["mask"], planes["variance"])
+        removeFromCoadd(coadd, planes["weight"], maskedImage, badPixelMask, weight)
+        return overlapBBox
+
+    def readMaskedImage(self, bbox=None):
+        """Read (a subregion of) the coadd into memory.
+
+        Parameters
+        ----------
+        bbox : `lsst.geom.Box2I`, optional
+            Region to read, relative to the parent image; all of it if `None`.
+
+        Returns
+        -------
+        coadd : `lsst.afw.image.MaskedImage`
+            A deep copy of the coadd in ``bbox``.
+        """
+        planes = self._mapBBox(self._getReadBBox(bbox), writable=False,
+                               planeNames=("image", "mask", "variance"))
+        return afwImage.makeMaskedImage(planes["image"], planes["mask"], planes["variance"])
+
+    def readWeightMap(self, bbox=None):
+        """Read (a subregion of) the weight map into memory.
+
+        Parameters
+        ----------
+        bbox : `lsst.geom.Box2I`, optional
+            Region to read, relative to the parent image; all of it if `None`.
+
+        Returns
+        -------
+        weightMap : `lsst.afw.image.Image`
+            A deep copy of the weight map in ``bbox``.
+        """
+        return self._mapBBox(self._getReadBBox(bbox), writable=False, planeNames=("weight",))["weight"]
+
+    def flush(self):
+        """Flush the plane files to disk.
+        """
+        if self._mode != "r+":
+            return
+        for name in self.PLANE_NAMES:
+            fd = os.open(self._getPath(name), os.O_RDWR)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def _getPath(self, name):
+        return os.path.join(self._directory, f"{name}.raw")
+
+    def _getReadBBox(self, bbox):
+        if bbox is None:
+            return self.getBBox()
+        if not self._bbox.contains(bbox):
+            raise ValueError(f"bbox {bbox} is not contained in the coadd bbox {self._bbox}")
+        return bbox
+
+    def _mapBBox(self, bbox, writable, planeNames=PLANE_NAMES):
+        """Map the rows of the named coadd planes spanned by bbox and return
+        afw images of bbox.
+
+        If writable the images are views of the mapped files, which are
+        unmapped when the images are released; otherwise they are copies.
+
+        Returns
+        -------
+        planes : `dict` [`str`, `lsst.afw.image.Image` or `lsst.afw.image.Mask`]
+            Image of bbox for each plane name.
+        """
+        width = self._bbox.getWidth()
+        rowOffset = bbox.getMinY() - self._bbox.getMinY()
+        xSlice = slice(bbox.getMinX() - self._bbox.getMinX(), bbox.getMaxX() - self._bbox.getMinX() + 1)
+        xy0 = bbox.getMin()
+        planes = {}
+        for name in planeNames:
+            dtype = self._dtypes[name]
+            band = np.memmap(self._getPath(name), dtype=dtype, mode="r+" if writable else "r",
+                             offset=rowOffset*width*dtype.itemsize, shape=(bbox.getHeight(), width))
+            array = band[:, xSlice] if writable else np.array(band[:, xSlice])
+            imageType = afwImage.Mask if name == "mask" else _IMAGE_TYPES[dtype]
+            planes[name] = imageType(array, deep=False, xy0=xy0)
+        return planes
+
+
+CoaddCheckpoint = namedtuple("CoaddCheckpoint", ["coadd", "weightMap", "metadata"])
+CoaddCheckpoint.__doc__ = """The accumulated state of a coadd, as read by `readCoaddCheckpoint`.
+
+Parameters
+----------
+coadd : `lsst.afw.image.MaskedImage`
+    Unnormalized coadd.
+weightMap : `lsst.afw.image.Image`
+    Weight map of the coadd.
+metadata : `dict`
+    Metadata saved with the checkpoint.
+"""
+
+
+# compression levels of the supported checkpoint compressions
+_COMPRESSION_LEVELS = {"zlib": 1}
+
+
+def _writeHeader(directory, bbox, dtypes, metadata=None, compression=None, maskPlanes=None):
+    """Write the JSON header of a coadd directory.
+    """
+    header = {
+        "min": [bbox.getMinX(), bbox.getMinY()],
+        "dimensions": [bbox.getWidth(), bbox.getHeight()],
+        "dtypes": {name: dtype.str for name, dtype in dtypes.items()},
+    }
+    if maskPlanes is not None:
+        header["maskPlanes"] = maskPlanes
+    if metadata is not None:
+        header["metadata"] = metadata
+    if compression is not None:
+        header["compression"] = compression
+    with open(os.path.join(directory, MemmapCoadd.HEADER_NAME), "w") as f:
+        json.dump(header, f)
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def writeCoaddCheckpoint(directory, coadd, weightMap, metadata=None, compression=None):
+    """Save the accumulated state of a coadd, so that it can be updated
+    later with `addToCoadd` and `removeFromCoadd` instead of being rebuilt.
+
+    The checkpoint has the `MemmapCoadd` format: a JSON header and one raw
+    file of native-endian pixels per plane, so writing and reading it cost
+    no more than copying the pixels, and it may also be opened with
+    `MemmapCoadd.open`. The checkpoint is written to a temporary directory
+    that then replaces ``directory``, so an interrupted write leaves any
+    previous checkpoint intact. The mask plane dictionary of the coadd is
+    saved with the pixels, so that `readCoaddCheckpoint` can restore the
+    meaning of the mask bits.
+
+    With ``compression="zlib"`` each plane is compressed at the fastest
+    zlib level instead; this is much smaller for sparsely covered coadds
+    and for the mask, but cannot be opened with `MemmapCoadd`.
+
+    Parameters
+    ----------
+    directory : `str`
+        Directory of the checkpoint; replaced if it exists.
+    coadd : `lsst.afw.image.MaskedImage`
+        Unnormalized coadd, e.g. as accumulated by `addToCoadd`.
+    weightMap : `lsst.afw.image.Image`
+        Weight map of the coadd.
+    metadata : `dict`, optional
+        JSON-serializable metadata to save with the checkpoint,
+        e.g. the IDs of the inputs in the coadd.
+    compression : `str`, optional
+        `None` for raw planes, or ``"zlib"``.
+    """
+    if compression is not None and compression not in _COMPRESSION_LEVELS:
+        raise ValueError(f"Unsupported compression {compression!r}; must be None or one of "
+                         f"{sorted(_COMPRESSION_LEVELS)}")
+    bbox = coadd.getBBox()
+    if weightMap.getBBox() != bbox:
+        raise ValueError(f"coadd and weightMap parent bboxes differ: {bbox} != {weightMap.getBBox()}")
+    planes = {
+        "image": coadd.image.array,
+        "mask": coadd.mask.array,
+        "variance": coadd.variance.array,
+        "weight": weightMap.array,
+    }
+    directory = os.path.normpath(directory)
+    tempDirectory = f"{directory}.tmp"
+    oldDirectory = f"{directory}.old"
+    shutil.rmtree(tempDirectory, ignore_errors=True)
+    os.makedirs(tempDirectory)
+    for name, array in planes.items():
+        with open(os.path.join(tempDirectory, f"{name}.raw"), "wb") as f:
+            if compression is None:
+                np.ascontiguousarray(array).tofile(f)
+            else:
+                f.write(zlib.compress(np.ascontiguousarray(array), _COMPRESSION_LEVELS[compression]))
+            f.flush()
+            os.fsync(f.fileno())
+    _writeHeader(tempDirectory, bbox, {name: array.dtype for name, array in planes.items()},
+                 metadata=metadata, compression=compression,
+                 maskPlanes=dict(coadd.mask.getMaskPlaneDict()))
+
+    shutil.rmtree(oldDirectory, ignore_errors=True)
+    if os.path.exists(directory):
+        os.rename(directory, oldDirectory)
+    os.rename(tempDirectory, directory)
+    shutil.rmtree(oldDirectory, ignore_errors=True)
+
+
+def readCoaddCheckpoint(directory):
+    """Read the accumulated state of a coadd saved by `writeCoaddCheckpoint`.
+
+    If the mask planes of this process differ from those the checkpoint was
+    written with, the bits of the coadd mask are rearranged to match them
+    (adding any planes they lack), as by
+    `lsst.afw.image.Mask.conformMaskPlanes`.
+
+    Parameters
+    ----------
+    directory : `str`
+        Directory of the checkpoint.
+
+    Returns
+    -------
+    checkpoint : `CoaddCheckpoint`
+        The coadd, weight map and metadata.
+    """
+    oldDirectory = f"{os.path.normpath(directory)}.old"
+    if not os.path.exists(directory) and os.path.exists(oldDirectory):
+        # writeCoaddCheckpoint was interrupted while replacing the checkpoint
+        directory = oldDirectory
+    with open(os.path.join(directory, MemmapCoadd.HEADER_NAME)) as f:
+        header = json.load(f)
+    if header.get("compression") is None:
+        memmapCoadd = MemmapCoadd.open(directory, mode="r")
+        coadd = memmapCoadd.readMaskedImage()
+        _conformMaskPlanes(coadd.mask, header)
+        return CoaddCheckpoint(coadd, memmapCoadd.readWeightMap(), header.get("metadata", {}))
+
+    xy0 = geom.Point2I(*header["min"])
+    width, height = header["dimensions"]
+    planes = {}
+    for name in MemmapCoadd.PLANE_NAMES:
+        dtype = np.dtype(header["dtypes"][name])
+        with open(os.path.join(directory, f"{name}.raw"), "rb") as f:
+            array = np.frombuffer(zlib.decompress(f.read()), dtype=dtype).reshape(height, width).copy()
+        imageType = afwImage.Mask if name == "mask" else _IMAGE_TYPES[dtype]
+        planes[name] = imageType(array, deep=False, xy0=xy0)
+    _conformMaskPlanes(planes["mask"], header)
+    coadd = afwImage.makeMaskedImage(planes["image"], planes["mask"], planes["variance"])
+    return CoaddCheckpoint(coadd, planes["weight"], header.get("metadata", {}))
+
+
+def _conformMaskPlanes(mask, header):
+    """Rearrange the bits of a mask read from a checkpoint to match the mask
+    planes of this process, if the checkpoint recorded its mask planes.
+    """
+    maskPlanes = header.get("maskPlanes")
+    if maskPlanes is not None and maskPlanes != dict(mask.getMaskPlaneDict()):
+        mask.conformMaskPlanes(maskPlanes)
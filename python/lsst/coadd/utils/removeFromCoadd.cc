@@ -0,0 +1,74 @@
+/*
+ * This file is part of coadd_utils.
+ *
+ * Developed for the LSST Data Management System.
+ * This product includes software developed by the LSST Project
+ * (https://www.lsst.org).
+ * See the COPYRIGHT file at the top-level directory of this distribution
+ * for details of code ownership.
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <https://www.gnu.org/licenses/>.
+ */
+
+#include "pybind11/pybind11.h"
+#include "lsst/cpputils/python.h"
+
+#include "lsst/coadd/utils/removeFromCoadd.h"
+
+namespace py = pybind11;
+using namespace pybind11::literals;
+
+namespace lsst {
+namespace coadd {
+namespace utils {
+
+namespace {
+
+template <typename CoaddPixelT, typename WeightPixelT>
+void declareRemoveFromCoadd(py::module &mod) {
+    namespace geom = lsst::geom;
+    namespace afwImage = lsst::afw::image;
+
+    mod.def("removeFromCoadd",
+            (geom::Box2I(*)(afwImage::Image<CoaddPixelT> &, afwImage::Image<WeightPixelT> &,
+                            afwImage::Image<CoaddPixelT> const &, WeightPixelT)) &
+                    removeFromCoadd,
+            "coadd"_a, "weightMap"_a, "image"_a, "weight"_a,
+            py::call_guard<py::gil_scoped_release>());
+    mod.def("removeFromCoadd",
+            (geom::Box2I(*)(afwImage::MaskedImage<CoaddPixelT> &, afwImage::Image<WeightPixelT> &,
+                            afwImage::MaskedImage<CoaddPixelT> const &, afwImage::MaskPixel const,
+                            WeightPixelT)) &
+                    removeFromCoadd,
+            "coadd"_a, "weightMap"_a, "maskedImage"_a, "badPixelMask"_a, "weight"_a,
+            py::call_guard<py::gil_scoped_release>());
+}
+
+}  // namespace
+
+void wrapRemoveFromCoadd(lsst::cpputils::python::WrapperCollection &wrappers) {
+    auto &mod = wrappers.module;
+    declareRemoveFromCoadd<double, double>(mod);
+    declareRemoveFromCoadd<double, float>(mod);
+    declareRemoveFromCoadd<double, int>(mod);
+    declareRemoveFromCoadd<double, std::uint16_t>(mod);
+    declareRemoveFromCoadd<float, double>(mod);
+    declareRemoveFromCoadd<float, float>(mod);
+    declareRemoveFromCoadd<float, int>(mod);
+    declareRemoveFromCoadd<float, std::uint16_t>(mod);
+}
+
+}  // namespace utils
+}  // namespace coadd
+}  // namespace lsst
@@ -20,7 +20,10 @@
  * see <https://www.lsstcorp.org/LegalNotices/>.
  */
 
+#include <vector>
+
 #include "pybind11/pybind11.h"
+#include "pybind11/stl.h"
 #include "lsst/cpputils/python.h"
 
 #include "lsst/coadd/utils/setCoaddEdgeBits.h"
@@ -41,12 +44,33 @@ void declareSetCoaddEdgeBits(py::module &mod) {
     mod.def("setCoaddEdgeBits",
             (void (*)(afwImage::Mask<afwImage::MaskPixel> &, afwImage::Image<WeightPixelT> const &)) &
                     setCoaddEdgeBits,
-            "coaddMask"_a, "weightMap"_a);
+            "coaddMask"_a, "weightMap"_a,
+            py::call_guard<py::gil_scoped_release>());
+    mod.def("setCoaddEdgeBits",
+            (void (*)(afwImage::Mask<afwImage::MaskPixel> &, afwImage::Image<WeightPixelT> const &,
+                      std::vector<CoaddMaskRule> const &, afwImage::Image<int> const *)) &
+                    setCoaddEdgeBits,
+            "coaddMask"_a, "weightMap"_a, "rules"_a,
+            "countMap"_a = static_cast<afwImage::Image<int> const *>(nullptr),
+            py::call_guard<py::gil_scoped_release>());
 }
 
 }  // namespace
 
 void wrapSetCoaddEdgeBits(lsst::cpputils::python::WrapperCollection &wrappers) {
+    using PyCoaddMaskRule = py::class_<CoaddMaskRule>;
+    wrappers.wrapType(PyCoaddMaskRule(wrappers.module, "CoaddMaskRule"), [](auto &mod, auto &cls) {
+        py::enum_<CoaddMaskRule::Map>(cls, "Map")
+                .value("WEIGHT", CoaddMaskRule::WEIGHT)
+                .value("COUNT", CoaddMaskRule::COUNT)
+                .export_values();
+        cls.def(py::init<lsst::afw::image::MaskPixel, double, CoaddMaskRule::Map>(), "bitMask"_a,
+                "threshold"_a, "map"_a = CoaddMaskRule::WEIGHT);
+        cls.def_readwrite("bitMask", &CoaddMaskRule::bitMask);
+        cls.def_readwrite("threshold", &CoaddMaskRule::threshold);
+        cls.def_readwrite("map", &CoaddMaskRule::map);
+    });
+
     auto &mod = wrappers.module;
     declareSetCoaddEdgeBits<double>(mod);
     declareSetCoaddEdgeBits<float>(mod);
@@ -0,0 +1,267 @@
+# This file is part of coadd_utils.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["StatisticsAccumulator"]
+
+import warnings
+
+import numpy as np
+
+import lsst.geom as geom
+import lsst.afw.image as afwImage
+
+
+class StatisticsAccumulator:
+    """Accumulate robust per-pixel statistics of a stack of masked images,
+    one image at a time.
+
+    Images are added with `add`, as with `addToCoadd`; only the per-pixel
+    state below is kept, so memory use does not grow with the number of
+    images, and each image is added by updating that state in place at its
+    good pixels:
+
+    - weighted running moments (Welford's algorithm), from which the
+      weighted mean and standard deviation of the good pixels are computed;
+    - optionally, a reservoir of at most ``reservoirSize`` samples per pixel
+      (a uniform random sample of the good pixels), from which an
+      approximate median is computed. The median is exact while no pixel has
+      received more than ``reservoirSize`` good values.
+
+    A single pass over the images gives the mean, standard deviation and
+    median. A sigma-clipped mean needs a second pass over the inputs: add
+    every image once, call `startClipPass`, then add every image again;
+    repeat for more iterations. Each clip pass rejects values further than
+    ``clipSigma`` standard deviations from the mean of the previous pass.
+
+    Parameters
+    ----------
+    bbox : `lsst.geom.Box2I`
+        Parent bounding box of the coadd.
+    badPixelMask : `int`, optional
+        Input pixels for which ``mask & badPixelMask != 0`` are ignored.
+    clipSigma : `float`, optional
+        Clipping threshold used by clip passes, in standard deviations.
+    reservoirSize : `int`, optional
+        Number of samples per pixel kept for the median; 0 to disable it.
+    seed : `int`, optional
+        Seed for the reservoir sampler.
+    dtype : `type`, optional
+        Pixel type of the moments: `numpy.float32`, or `numpy.float64`
+        for more precision at twice the memory.
+    """
+
+    def __init__(self, bbox, badPixelMask=0, clipSigma=3.0, reservoirSize=0, seed=1, dtype=np.float32):
+        if clipSigma <= 0:
+            raise ValueError(f"clipSigma={clipSigma} must be positive")
+        if reservoirSize < 0:
+            raise ValueError(f"reservoirSize={reservoirSize} must be non-negative")
+        dtype = np.dtype(dtype)
+        if dtype not in (np.float32, np.float64):
+            raise ValueError(f"Unsupported dtype {dtype}")
+        self._bbox = geom.Box2I(bbox)
+        self._badPixelMask = badPixelMask
+        self._clipSigma = clipSigma
+        self._rng = np.random.RandomState(seed)
+        shape = (bbox.getHeight(), bbox.getWidth())
+
+        self._sumWeight = np.zeros(shape, dtype=dtype)
+        self._mean = np.zeros(shape, dtype=dtype)
+        self._m2 = np.zeros(shape, dtype=dtype)
+        self._weightedVariance = np.zeros(shape, dtype=dtype)
+        self._mask = np.zeros(shape, dtype=np.int32)
+        self._lower = None
+        self._upper = None
+        self._passIndex = 0
+
+        if reservoirSize > 0:
+            self._reservoir = np.full((reservoirSize,) + shape, np.nan, dtype=np.float32)
+            self._numSeen = np.zeros(shape, dtype=np.int32)
+        else:
+            self._reservoir = None
+            self._numSeen = None
+
+    def getBBox(self):
+        """Return the parent bounding box of the coadd.
+        """
+        return geom.Box2I(self._bbox)
+
+    def getPassIndex(self):
+        """Return the index of the current pass: 0 before the first call to
+        `startClipPass`, 1 after, and so on.
+        """
+        return self._passIndex
+
+    def add(self, maskedImage, weight=1.0):
+        """Add the good pixels of a masked image.
+
+        Parameters
+        ----------
+        maskedImage : `lsst.afw.image.MaskedImage`
+            Masked image to add, registered to the coadd.
+        weight : `float`, optional
+            Relative weight of this image, used by the moments;
+            the reservoir is unweighted.
+
+        Returns
+        -------
+        overlapBBox : `lsst.geom.Box2I`
+            Overlapping bounding box, relative to the parent image.
+        """
+        overlapBBox = geom.Box2I(self._bbox)
+        overlapBBox.clip(maskedImage.getBBox())
+        if overlapBBox.isEmpty():
+            return overlapBBox
+
+        inputView = maskedImage[overlapBBox]
+        image = inputView.image.array
+        mask = inputView.mask.array
+        slices = self._getSlices(overlapBBox)
+
+        isGood = (mask & self._badPixelMask) == 0
+        if self._lower is not None:
+            isGood &= (image >= self._lower[slices]) & (image <= self._upper[slices])
+
+        # weighted incremental mean and variance (West 1979), computed only for the good pixels
+        dtype = self._mean.dtype
+        weight = dtype.type(weight)
+        value = image[isGood].astype(dtype)
+        sumWeight = self._sumWeight[slices][isGood]
+        sumWeight += weight
+        mean = self._mean[slices][isGood]
+        delta = value - mean
+        if weight != 0:
+            mean += delta*(weight/sumWeight)
+        value -= mean
+        value *= delta
+        value *= weight
+        self._mean[slices][isGood] = mean
+        self._m2[slices][isGood] += value
+        self._sumWeight[slices][isGood] = sumWeight
+        self._weightedVariance[slices][isGood] += inputView.variance.array[isGood]*(weight*weight)
+        self._mask[slices][isGood] |= mask[isGood]
+
+        if self._reservoir is not None and self._passIndex == 0:
+            self._addToReservoir(image, isGood, slices)
+        return overlapBBox
+
+    def startClipPass(self):
+        """Freeze the current mean and standard deviation as clipping bounds
+        and reset the moments, ready for all images to be added again.
+
+        The reservoir is only filled during the first pass,
+        so it is not affected.
+        """
+        mean = self._mean
+        stdDev = self._getStdDev()
+        hasData = self._sumWeight > 0
+        self._lower = np.where(hasData, mean - self._clipSigma*stdDev, -np.inf).astype(mean.dtype, copy=False)
+        self._upper = np.where(hasData, mean + self._clipSigma*stdDev, np.inf).astype(mean.dtype, copy=False)
+
+        self._sumWeight[:] = 0
+        self._mean[:] = 0
+        self._m2[:] = 0
+        self._weightedVariance[:] = 0
+        self._mask[:] = 0
+        self._passIndex += 1
+
+    def makeMeanImage(self):
+        """Make a coadd from the weighted mean of the current pass.
+
+        Returns
+        -------
+        coadd : `lsst.afw.image.MaskedImageF`
+            Weighted mean; its variance is sum(weight**2 * variance) / sum(weight)**2
+            and its mask is the OR of the masks of the contributing pixels.
+            Pixels with no data are NaN and have the NO_DATA bit set.
+        """
+        coadd = self._makeMaskedImage()
+        hasData = self._sumWeight > 0
+        coadd.image.array[:, :] = np.where(hasData, self._mean, np.nan)
+        coadd.variance.array[:, :] = np.divide(self._weightedVariance, self._sumWeight**2,
+                                               out=np.full_like(self._sumWeight, np.nan), where=hasData)
+        return coadd
+
+    def makeStdDevImage(self):
+        """Make an image of the weighted standard deviation of the inputs
+        for the current pass.
+
+        Returns
+        -------
+        stdDev : `lsst.afw.image.ImageF`
+            Weighted standard deviation; NaN where there is no data.
+        """
+        stdDev = afwImage.ImageF(self._bbox)
+        stdDev.array[:, :] = np.where(self._sumWeight > 0, self._getStdDev(), np.nan)
+        return stdDev
+
+    def makeMedianImage(self):
+        """Make a coadd from the median of the reservoir samples.
+
+        Returns
+        -------
+        coadd : `lsst.afw.image.MaskedImageF`
+            Median coadd. Its mask and variance are those of `makeMeanImage`
+            for the current pass, with the variance scaled by pi/2,
+            the asymptotic variance ratio of the median to the mean.
+
+        Raises
+        ------
+        RuntimeError
+            Raised if the accumulator was made with ``reservoirSize=0``.
+        """
+        if self._reservoir is None:
+            raise RuntimeError("No reservoir; construct with reservoirSize > 0 to compute a median")
+        coadd = self.makeMeanImage()
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", category=RuntimeWarning)  # all-NaN pixels
+            coadd.image.array[:, :] = np.nanmedian(self._reservoir, axis=0)
+        coadd.variance.array *= np.pi/2
+        return coadd
+
+    def _getStdDev(self):
+        variance = np.divide(self._m2, self._sumWeight, out=np.zeros_like(self._m2),
+                             where=self._sumWeight > 0)
+        return np.sqrt(np.maximum(variance, 0))
+
+    def _getSlices(self, bbox):
+        x0 = bbox.getMinX() - self._bbox.getMinX()
+        y0 = bbox.getMinY() - self._bbox.getMinY()
+        return (slice(y0, y0 + bbox.getHeight()), slice(x0, x0 + bbox.getWidth()))
+
+    def _addToReservoir(self, image, isGood, slices):
+        """Add good pixels to the reservoir using reservoir sampling
+        (Vitter's algorithm R), independently for each pixel.
+        """
+        reservoirSize = self._reservoir.shape[0]
+        numSeen = self._numSeen[slices]
+        slot = np.where(numSeen < reservoirSize, numSeen,
+                        np.floor(self._rng.uniform(size=numSeen.shape)*(numSeen + 1)).astype(np.int64))
+        replace = isGood & (slot < reservoirSize)
+        yInd, xInd = np.nonzero(replace)
+        reservoirView = self._reservoir[:, slices[0], slices[1]]
+        reservoirView[slot[replace], yInd, xInd] = image[replace]
+        self._numSeen[slices] += isGood
+
+    def _makeMaskedImage(self):
+        coadd = afwImage.MaskedImageF(self._bbox)
+        noData = afwImage.Mask.getPlaneBitMask("NO_DATA")
+        coadd.mask.array[:, :] = np.where(self._sumWeight > 0, self._mask, self._mask | noData)
+        return coadd
@@ -0,0 +1,251 @@
+# This file is part of coadd_utils.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["TiledCoadd"]
+
+import numpy as np
+
+import lsst.geom as geom
+import lsst.afw.image as afwImage
+
+from ._coaddUtilsLib import addToCoadd, finalizeCoadd, removeFromCoadd
+
+# afw image classes for each supported pixel type
+_MASKED_IMAGE_TYPES = {
+    np.dtype(np.float32): afwImage.MaskedImageF,
+    np.dtype(np.float64): afwImage.MaskedImageD,
+}
+_IMAGE_TYPES = {
+    np.dtype(np.float32): afwImage.ImageF,
+    np.dtype(np.float64): afwImage.ImageD,
+    np.dtype(np.int32): afwImage.ImageI,
+    np.dtype(np.uint16): afwImage.ImageU,
+}
+
+
+class TiledCoadd:
+    """A coadd and weight map stored as fixed-size tiles that are allocated
+    only when an input overlaps them.
+
+    For patches at the edge of the survey footprint most of the coadd
+    receives no data; such a coadd holds only the tiles that do. Each call
+    to `add` runs `addToCoadd` on every tile the input overlaps,
+    allocating tiles as needed, and `finalize` normalizes each allocated
+    tile with `finalizeCoadd` and flags the unallocated ones as NO_DATA
+    without looking at their pixels.
+
+    Parameters
+    ----------
+    bbox : `lsst.geom.Box2I`
+        Parent bounding box of the coadd.
+    tileSize : `int`, optional
+        Width and height of each tile, in pixels. Tiles are aligned to the
+        minimum corner of ``bbox``; those at the maximum edges are cut to
+        fit inside it.
+    coaddType : `type`, optional
+        Pixel type of the coadd image plane: `numpy.float32` or
+        `numpy.float64`.
+    weightType : `type`, optional
+        Pixel type of the weight map.
+    """
+
+    def __init__(self, bbox, tileSize=256, coaddType=np.float32, weightType=np.float64):
+        if tileSize < 1:
+            raise ValueError(f"tileSize={tileSize} must be positive")
+        coaddDtype = np.dtype(coaddType)
+        weightDtype = np.dtype(weightType)
+        if coaddDtype not in _MASKED_IMAGE_TYPES:
+            raise ValueError(f"Unsupported coadd pixel type {coaddDtype}")
+        if weightDtype not in _IMAGE_TYPES:
+            raise ValueError(f"Unsupported weight map pixel type {weightDtype}")
+        self._bbox = geom.Box2I(bbox)
+        self._tileSize = int(tileSize)
+        self._MaskedImage = _MASKED_IMAGE_TYPES[coaddDtype]
+        self._Image = _IMAGE_TYPES[weightDtype]
+        self._tiles = {}  # (tileX, tileY): (coadd, weightMap)
+
+    def getBBox(self):
+        """Return the parent bounding box of the coadd.
+        """
+        return geom.Box2I(self._bbox)
+
+    @property
+    def tileSize(self):
+        """Width and height of each tile, in pixels (`int`).
+        """
+        return self._tileSize
+
+    @property
+    def tileBBoxes(self):
+        """Parent bounding boxes of the allocated tiles, in row-major order
+        (`list` [`lsst.geom.Box2I`]).
+        """
+        return [self._getTileBBox(tileX, tileY)
+                for tileX, tileY in sorted(self._tiles, key=lambda index: (index[1], index[0]))]
+
+    def add(self, maskedImage, badPixelMask, weight):
+        """Add the good pixels of a masked image to the coadd and weight map.
+
+        This is `addToCoadd` applied to each tile that overlaps
+        ``maskedImage``, allocating the tiles that do not exist yet.
+
+        Parameters
+        ----------
+        maskedImage : `lsst.afw.image.MaskedImage`
+            Masked image to add, registered to the coadd, with the pixel
+            type of the coadd.
+        badPixelMask : `int`
+            Skip input pixels for which ``mask & badPixelMask != 0``.
+        weight : `float`
+            Relative weight of this image.
+
+        Returns
+        -------
+        overlapBBox : `lsst.geom.Box2I`
+            Overlapping bounding box, relative to the parent image.
+        """
+        overlapBBox = self.getBBox()
+        overlapBBox.clip(maskedImage.getBBox())
+        for tileX, tileY in self._getTileIndices(overlapBBox):
+            tile = self._tiles.get((tileX, tileY))
+            if tile is None:
+                tileBBox = self._getTileBBox(tileX, tileY)
+                tile = self._tiles[tileX, tileY] = (self._MaskedImage(tileBBox), self._Image(tileBBox))
+            addToCoadd(tile[0], tile[1], maskedImage, badPixelMask, weight)
+        return overlapBBox
+
+    def remove(self, maskedImage, badPixelMask, weight):
+        """Remove the good pixels of a masked image from the coadd and
+        weight map.
+
+        This is `removeFromCoadd` applied to each allocated tile that
+        overlaps ``maskedImage``; tiles are never freed.
+
+        Parameters
+        ----------
+        maskedImage : `lsst.afw.image.MaskedImage`
+            Masked image to remove, as previously passed to `add`.
+        badPixelMask : `int`
+            Bad pixel mask, as previously passed to `add`.
+        weight : `float`
+            Relative weight of this image, as previously passed to `add`.
+
+        Returns
+        -------
+        overlapBBox : `lsst.geom.Box2I`
+            Overlapping bounding box, relative to the parent image.
+        """
+        overlapBBox = self.getBBox()
+        overlapBBox.clip(maskedImage.getBBox())
+        for tileIndex in self._getTileIndices(overlapBBox):
+            tile = self._tiles.get(tileIndex)
+            if tile is not None:
+                removeFromCoadd(tile[0], tile[1], maskedImage, badPixelMask, weight)
+        return overlapBBox
+
+    def makeDense(self):
+        """Return the unnormalized coadd and weight map as full-size images.
+
+        Pixels of unallocated tiles are zero.
+
+        Returns
+        -------
+        coadd : `lsst.afw.image.MaskedImage`
+            Unnormalized coadd; see `finalizeCoadd`.
+        weightMap : `lsst.afw.image.Image`
+            Weight map of the coadd.
+        """
+        coadd = self._MaskedImage(self._bbox)
+        weightMap = self._Image(self._bbox)
+        for tileCoadd, tileWeightMap in self._tiles.values():
+            self._copyTile(coadd, weightMap, tileCoadd, tileWeightMap)
+        return coadd, weightMap
+
+    def finalize(self, fillNaN=False):
+        """Return the normalized coadd and its weight map as full-size images.
+
+        This is equivalent to calling `finalizeCoadd` on the result of
+        `makeDense`, but the pixels of unallocated tiles are never scanned:
+        their NO_DATA bit is set (and image and variance set to NaN if
+        ``fillNaN``) a whole tile at a time. The tiles themselves are not
+        modified.
+
+        Parameters
+        ----------
+        fillNaN : `bool`, optional
+            Set the image and variance of pixels with zero weight to NaN?
+
+        Returns
+        -------
+        coadd : `lsst.afw.image.MaskedImage`
+            Normalized coadd.
+        weightMap : `lsst.afw.image.Image`
+            Weight map of the coadd.
+        """
+        coadd = self._MaskedImage(self._bbox)
+        weightMap = self._Image(self._bbox)
+        noData = afwImage.Mask.getPlaneBitMask("NO_DATA")
+        for tileIndex in self._getTileIndices(self._bbox):
+            tileBBox = self._getTileBBox(*tileIndex)
+            tile = self._tiles.get(tileIndex)
+            if tile is not None:
+                self._copyTile(coadd, weightMap, *tile)
+                finalizeCoadd(coadd[tileBBox], weightMap[tileBBox], fillNaN)
+            else:
+                tileCoadd = coadd[tileBBox]
+                tileCoadd.mask.array[:, :] |= noData
+                if fillNaN:
+                    tileCoadd.image.array[:, :] = np.nan
+                    tileCoadd.variance.array[:, :] = np.nan
+        return coadd, weightMap
+
+    def _getTileBBox(self, tileX, tileY):
+        """Return the parent bounding box of a tile.
+        """
+        tileBBox = geom.Box2I(
+            geom.Point2I(self._bbox.getMinX() + tileX*self._tileSize,
+                         self._bbox.getMinY() + tileY*self._tileSize),
+            geom.Extent2I(self._tileSize, self._tileSize),
+        )
+        tileBBox.clip(self._bbox)
+        return tileBBox
+
+    def _getTileIndices(self, bbox):
+        """Return the (tileX, tileY) indices of all tiles that overlap a
+        bounding box contained in the coadd's.
+        """
+        if bbox.isEmpty():
+            return []
+        x0, y0 = self._bbox.getMinX(), self._bbox.getMinY()
+        xRange = range((bbox.getMinX() - x0) // self._tileSize, (bbox.getMaxX() - x0) // self._tileSize + 1)
+        yRange = range((bbox.getMinY() - y0) // self._tileSize, (bbox.getMaxY() - y0) // self._tileSize + 1)
+        return [(tileX, tileY) for tileY in yRange for tileX in xRange]
+
+    @staticmethod
+    def _copyTile(coadd, weightMap, tileCoadd, tileWeightMap):
+        """Copy a tile into the corresponding part of full-size images.
+        """
+        tileBBox = tileCoadd.getBBox()
+        denseCoadd = coadd[tileBBox]
+        denseCoadd.image.array[:, :] = tileCoadd.image.array
+        denseCoadd.mask.array[:, :] = tileCoadd.mask.array
+        denseCoadd.variance.array[:, :] = tileCoadd.variance.array
+        weightMap[tileBBox].array[:, :] = tileWeightMap.array
@@ -0,0 +1,149 @@
+# This file is part of coadd_utils.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+__all__ = ["warpAndAddToCoadd"]
+
+import numpy as np
+
+import lsst.geom as geom
+import lsst.afw.geom as afwGeom
+import lsst.afw.image as afwImage
+import lsst.afw.math as afwMath
+
+from ._coaddUtilsLib import addToCoadd
+
+# afw masked image class for each supported pixel type
+_MASKED_IMAGE_TYPES = {
+    np.dtype(np.float32): afwImage.MaskedImageF,
+    np.dtype(np.float64): afwImage.MaskedImageD,
+}
+
+# number of points per edge of an input at which its bounding box is
+# transformed to the coadd
+_NUM_EDGE_POINTS = 16
+
+
+def warpAndAddToCoadd(coadd, weightMap, coaddWcs, exposure, badPixelMask, weight,
+                      warpingControl=None, bandHeight=256):
+    """Warp an exposure to a coadd and add its good pixels, one band of coadd
+    rows at a time, without making a full warped image.
+
+    Each band of the region of the coadd covered by the exposure is warped
+    with `lsst.afw.math.warpImage` into a reused band-sized masked image,
+    which is then added with `addToCoadd`, so the memory needed beyond the
+    coadd is one band rather than a whole warp. The result is the same as
+    warping the exposure to the coadd bounding box and adding the warp
+    with ``badPixelMask | NO_DATA``, as long as ``warpingControl`` does not
+    interpolate the transform (``interpLength`` = 0, the default).
+
+    Parameters
+    ----------
+    coadd : `lsst.afw.image.MaskedImage`
+        Coadd to be modified.
+    weightMap : `lsst.afw.image.Image`
+        Weight map to be modified.
+    coaddWcs : `lsst.afw.geom.SkyWcs`
+        WCS of the coadd.
+    exposure : `lsst.afw.image.Exposure`
+        Unwarped input, e.g. a calexp, with a WCS.
+    badPixelMask : `int`
+        Skip warped pixels for which ``mask & badPixelMask != 0``;
+        pixels with no input data (NO_DATA) are always skipped.
+    weight : `float`
+        Relative weight of this exposure.
+    warpingControl : `lsst.afw.math.WarpingControl`, optional
+        Warping parameters; defaults to a lanczos3 kernel.
+    bandHeight : `int`, optional
+        Number of coadd rows warped at a time.
+
+    Returns
+    -------
+    overlapBBox : `lsst.geom.Box2I`
+        Region of the coadd that may have been modified, relative to the
+        parent image; empty if the exposure does not overlap the coadd.
+
+    Raises
+    ------
+    ValueError
+        Raised if ``bandHeight`` < 1.
+    """
+    if bandHeight < 1:
+        raise ValueError(f"bandHeight = {bandHeight} must be >= 1")
+    if warpingControl is None:
+        warpingControl = afwMath.WarpingControl("lanczos3")
+
+    srcToCoadd = afwGeom.makeWcsPairTransform(exposure.getWcs(), coaddWcs)
+    overlapBBox = _getWarpedBBox(exposure.getBBox(), srcToCoadd)
+    overlapBBox.clip(coadd.getBBox())
+    if overlapBBox.isEmpty():
+        return overlapBBox
+
+    badPixelMask |= afwImage.Mask.getPlaneBitMask("NO_DATA")
+    bandImage = _MASKED_IMAGE_TYPES[coadd.image.array.dtype](
+        geom.Box2I(overlapBBox.getMin(),
+                   geom.Extent2I(overlapBBox.getWidth(), min(bandHeight, overlapBBox.getHeight())))
+    )
+    for bandBeginY in range(overlapBBox.getBeginY(), overlapBBox.getEndY(), bandHeight):
+        bandBBox = geom.Box2I(
+            geom.Point2I(overlapBBox.getMinX(), bandBeginY),
+            geom.Extent2I(overlapBBox.getWidth(), min(bandHeight, overlapBBox.getEndY() - bandBeginY)),
+        )
+        bandImage.setXY0(bandBBox.getMin())
+        warpedBand = bandImage[bandBBox]
+        afwMath.warpImage(warpedBand, exposure.maskedImage, srcToCoadd, warpingControl)
+        addToCoadd(coadd, weightMap, warpedBand, badPixelMask, weight)
+    return overlapBBox
+
+
+def _getWarpedBBox(srcBBox, srcToCoadd):
+    """Return a bounding box that contains every coadd pixel whose center maps
+    into an input.
+
+    Parameters
+    ----------
+    srcBBox : `lsst.geom.Box2I`
+        Parent bounding box of the input.
+    srcToCoadd : `lsst.afw.geom.TransformPoint2ToPoint2`
+        Transform from input pixels to coadd pixels.
+
+    Returns
+    -------
+    coaddBBox : `lsst.geom.Box2I`
+        Bounding box of the input on the coadd, relative to the parent
+        coadd; grown by one pixel to allow for curvature of the edges
+        between the transformed points.
+    """
+    srcBox = geom.Box2D(srcBBox)
+    xList = np.linspace(srcBox.getMinX(), srcBox.getMaxX(), _NUM_EDGE_POINTS)
+    yList = np.linspace(srcBox.getMinY(), srcBox.getMaxY(), _NUM_EDGE_POINTS)
+    srcPoints = [geom.Point2D(x, y) for x in xList for y in (srcBox.getMinY(), srcBox.getMaxY())]
+    srcPoints += [geom.Point2D(x, y) for y in yList for x in (srcBox.getMinX(), srcBox.getMaxX())]
+
+    coaddBox = geom.Box2D()
+    for point in srcToCoadd.applyForward(srcPoints):
+        # points outside the valid region of a WCS transform to NaN
+        if np.isfinite(point.getX()) and np.isfinite(point.getY()):
+            coaddBox.include(point)
+    if coaddBox.isEmpty():
+        return geom.Box2I()
+    coaddBBox = geom.Box2I(coaddBox, geom.Box2I.EXPAND)
+    coaddBBox.grow(1)
+    return coaddBBox
@@ -0,0 +1,91 @@
+// -*- LSST-C++ -*-
+/*
+ * This file is part of coadd_utils.
+ *
+ * Developed for the LSST Data Management System.
+ * This product includes software developed by the LSST Project
+ * (https://www.lsst.org).
+ * See the COPYRIGHT file at the top-level directory of this distribution
+ * for details of code ownership.
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <https://www.gnu.org/licenses/>.
+ */
+
+#include <cstdint>
+
+#include "lsst/coadd/utils/GoodPixelSpans.h"
+#include "lsst/coadd/utils/detail/rowKernels.h"
+
+namespace afwImage = lsst::afw::image;
+namespace coaddUtils = lsst::coadd::utils;
+
+template <typename ImageT, typename IsGood>
+void coaddUtils::GoodPixelSpans::_indexRows(ImageT const &image, IsGood isGood) {
+    typedef typename ImageT::Pixel PixelT;
+    int const x0 = _bbox.getMinX(), width = _bbox.getWidth(), height = _bbox.getHeight();
+    _rowBegin.reserve(height + 1);
+    _rowBegin.push_back(0);
+    if (width > 0) {
+        coaddUtils::detail::RowPointer<PixelT const> row(image, x0, _bbox.getMinY());
+        for (int y = 0; y != height; ++y, ++row) {
+            PixelT const *pixels = row.get();
+            int x = 0;
+            while (x != width) {
+                while (x != width && !isGood(pixels[x])) {
+                    ++x;
+                }
+                int const beginX = x;
+                while (x != width && isGood(pixels[x])) {
+                    ++x;
+                }
+                if (x != beginX) {
+                    _spans.push_back(Span{x0 + beginX, x0 + x});
+                    _numGoodPixels += x - beginX;
+                }
+            }
+            _rowBegin.push_back(_spans.size());
+        }
+    } else {
+        _rowBegin.resize(height + 1, 0);
+    }
+    _spans.shrink_to_fit();
+}
+
+coaddUtils::GoodPixelSpans::GoodPixelSpans(
+    // spell out lsst:afw::image to make Doxygen happy
+    lsst::afw::image::Mask<lsst::afw::image::MaskPixel> const &mask,
+    lsst::afw::image::MaskPixel const badPixelMask
+) : _bbox(mask.getBBox()), _spans(), _rowBegin(), _numGoodPixels(0) {
+    _indexRows(mask, [badPixelMask](afwImage::MaskPixel pixel) { return (pixel & badPixelMask) == 0; });
+}
+
+template <typename ImagePixelT>
+coaddUtils::GoodPixelSpans::GoodPixelSpans(
+    // spell out lsst:afw::image to make Doxygen happy
+    lsst::afw::image::Image<ImagePixelT> const &image
+) : _bbox(image.getBBox()), _spans(), _rowBegin(), _numGoodPixels(0) {
+    _indexRows(image, [](ImagePixelT pixel) { return coaddUtils::detail::isKnownValue(pixel); });
+}
+
+// Explicit instantiations
+
+/// \cond
+#define INSTANTIATE(IMAGEPIXEL) \
+    template coaddUtils::GoodPixelSpans::GoodPixelSpans<IMAGEPIXEL>( \
+        afwImage::Image<IMAGEPIXEL> const &image \
+    );
+
+INSTANTIATE(double);
+INSTANTIATE(float);
+/// \endcond
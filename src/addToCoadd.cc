@@ -27,14 +27,24 @@
 *
 * @author Russell Owen
 */
+#include <algorithm>
+#include <atomic>
+#include <cstddef>
 #include <cstdint>
 #include <limits>
+#include <memory>
+#include <vector>
 
 #include "boost/format.hpp"
 
 #include "lsst/pex/exceptions.h"
 #include "lsst/geom.h"
 #include "lsst/coadd/utils/addToCoadd.h"
+#include "lsst/coadd/utils/kernelStats.h"
+#include "lsst/coadd/utils/parallel.h"
+#include "lsst/coadd/utils/detail/imageHelpers.h"
+#include "lsst/coadd/utils/detail/overlapBands.h"
+#include "lsst/coadd/utils/detail/rowKernels.h"
 
 namespace pexExcept = lsst::pex::exceptions;
 namespace geom = lsst::geom;
@@ -42,84 +52,843 @@ namespace afwImage = lsst::afw::image;
 namespace coaddUtils = lsst::coadd::utils;
 
 namespace {
+    using coaddUtils::detail::assertSameBBox;
+    using coaddUtils::detail::assertSameSpansBBox;
+    using coaddUtils::detail::getPixelBytes;
+    using coaddUtils::detail::addRowToCoadd;
+    using coaddUtils::detail::addRowToCoaddInverseVariance;
+    using coaddUtils::detail::addRowToCoaddCompensated;
+    using coaddUtils::detail::addRowToCountMap;
+    using coaddUtils::detail::addRowToProvenanceMap;
+    using coaddUtils::detail::addRowToWeightMap;
+    using coaddUtils::detail::copyGoodRow;
+    using coaddUtils::detail::countGoodRow;
+    using coaddUtils::detail::forEachOverlapBand;
+    using coaddUtils::detail::addSpanToCoadd;
+    using coaddUtils::detail::RowPointer;
+
     /*
-     * A boolean functor to test if a MaskedImage pixel is valid (mask & badPixel == 0)
+     * Number of bytes of coadd and weight map rows to process per row tile in addManyToCoadd.
+     *
+     * This is chosen so that a tile of the coadd planes plus weight map stays resident in cache
+     * while every overlapping input is added to it.
      */
-    struct CheckMask {
-        CheckMask(lsst::afw::image::MaskPixel badPixel) : _badPixel(badPixel) {}
+    std::size_t const TILE_BYTES = 1 << 20;
 
-        template<typename T>
-        bool operator()(T val) const {
-            return ((val.mask() & _badPixel) == 0) ? true : false;
-        }
-    private:
-        lsst::afw::image::MaskPixel _badPixel;
+    /*
+     * Weight of each pixel of a masked image is scale / variance
+     */
+    template <typename WeightPixelT>
+    struct InverseVarianceWeight {
+        WeightPixelT scale;
     };
 
     /*
-     * A boolean functor to test if an Image pixel has known value (not NaN)
+     * Relative weight of an image added with compensated summation, and the compensation image
      */
-    struct CheckKnownValue {
-        CheckKnownValue(lsst::afw::image::MaskPixel) {}
+    template <typename CoaddPixelT, typename WeightPixelT>
+    struct CompensatedWeight {
+        WeightPixelT weight;
+        afwImage::Image<CoaddPixelT> *compensation;
+    };
 
-        template<typename T>
-        bool operator()(T val) const {
-            return !std::isnan(static_cast<float>(*val));
-        }
+    /*
+     * Relative weight of an image whose good pixels are listed in a GoodPixelSpans, and the spans
+     */
+    template <typename WeightPixelT>
+    struct SpanWeight {
+        WeightPixelT weight;
+        coaddUtils::GoodPixelSpans const *goodPixelSpans;
+    };
+
+    /*
+     * Per-pixel records of which inputs contributed to a coadd
+     */
+    struct ProvenanceMaps {
+        afwImage::Image<int> *countMap;                 ///< number of inputs per pixel; may be null
+        afwImage::Image<std::uint64_t> *provenanceMap;  ///< bitset of inputs per pixel; may be null
+        std::uint64_t inputBit;                         ///< bit of provenanceMap to set for this input
     };
 
+    /*
+     * Add the good pixels of an image inside bbox to the coadd and weight map
+     *
+     * bbox must be contained in the bounding boxes of coadd, weightMap and image.
+     */
+    template <typename CoaddPixelT, typename WeightPixelT>
+    void addBBoxToCoadd(
+        afwImage::Image<CoaddPixelT> &coadd,                ///< [in,out] coadd to be modified
+        afwImage::Image<WeightPixelT> &weightMap,           ///< [in,out] weight map to be modified
+        afwImage::Image<CoaddPixelT> const &image,          ///< image to add to coadd
+        lsst::geom::Box2I const &bbox,                      ///< region to add, relative to parent image
+        afwImage::MaskPixel const,                          ///< bad pixel mask; ignored
+        WeightPixelT weight                                 ///< relative weight of this image
+    ) {
+        int const x0 = bbox.getMinX(), y0 = bbox.getMinY();
+        RowPointer<CoaddPixelT> coaddRow(coadd, x0, y0);
+        RowPointer<WeightPixelT> weightMapRow(weightMap, x0, y0);
+        RowPointer<CoaddPixelT const> imageRow(image, x0, y0);
+
+        for (int y = 0, endY = bbox.getHeight(); y != endY; ++y) {
+            addRowToCoadd(coaddRow.get(), weightMapRow.get(), imageRow.get(), bbox.getWidth(), weight);
+            ++coaddRow, ++weightMapRow, ++imageRow;
+        }
+    }
+
+    /*
+     * Add the good pixels of a masked image inside bbox to the coadd and weight map
+     *
+     * bbox must be contained in the bounding boxes of coadd, weightMap and image.
+     */
+    template <typename CoaddPixelT, typename WeightPixelT>
+    void addBBoxToCoadd(
+        afwImage::MaskedImage<CoaddPixelT> &coadd,          ///< [in,out] coadd to be modified
+        afwImage::Image<WeightPixelT> &weightMap,           ///< [in,out] weight map to be modified
+        afwImage::MaskedImage<CoaddPixelT> const &image,    ///< masked image to add to coadd
+        lsst::geom::Box2I const &bbox,                      ///< region to add, relative to parent image
+        afwImage::MaskPixel const badPixelMask,             ///< skip pixel if mask & badPixelMask != 0
+        WeightPixelT weight                                 ///< relative weight of this image
+    ) {
+        int const x0 = bbox.getMinX(), y0 = bbox.getMinY();
+        RowPointer<CoaddPixelT> coaddImageRow(*coadd.getImage(), x0, y0);
+        RowPointer<afwImage::MaskPixel> coaddMaskRow(*coadd.getMask(), x0, y0);
+        RowPointer<afwImage::VariancePixel> coaddVarianceRow(*coadd.getVariance(), x0, y0);
+        RowPointer<WeightPixelT> weightMapRow(weightMap, x0, y0);
+        RowPointer<CoaddPixelT const> imageRow(*image.getImage(), x0, y0);
+        RowPointer<afwImage::MaskPixel const> maskRow(*image.getMask(), x0, y0);
+        RowPointer<afwImage::VariancePixel const> varianceRow(*image.getVariance(), x0, y0);
+
+        for (int y = 0, endY = bbox.getHeight(); y != endY; ++y) {
+            addRowToCoadd(coaddImageRow.get(), coaddMaskRow.get(), coaddVarianceRow.get(), weightMapRow.get(),
+                          imageRow.get(), maskRow.get(), varianceRow.get(), bbox.getWidth(),
+                          badPixelMask, weight);
+            ++coaddImageRow, ++coaddMaskRow, ++coaddVarianceRow, ++weightMapRow;
+            ++imageRow, ++maskRow, ++varianceRow;
+        }
+    }
+
+    /*
+     * Add the spans of good pixels of an image inside bbox to the coadd and weight map
+     *
+     * bbox must be contained in the bounding boxes of coadd, weightMap and image.
+     */
+    template <typename CoaddPixelT, typename WeightPixelT>
+    void addBBoxToCoadd(
+        afwImage::Image<CoaddPixelT> &coadd,                ///< [in,out] coadd to be modified
+        afwImage::Image<WeightPixelT> &weightMap,           ///< [in,out] weight map to be modified
+        afwImage::Image<CoaddPixelT> const &image,          ///< image to add to coadd
+        lsst::geom::Box2I const &bbox,                      ///< region to add, relative to parent image
+        afwImage::MaskPixel const,                          ///< bad pixel mask; ignored
+        SpanWeight<WeightPixelT> weight                     ///< relative weight and good pixels of image
+    ) {
+        int const x0 = bbox.getMinX(), y0 = bbox.getMinY();
+        RowPointer<CoaddPixelT> coaddRow(coadd, x0, y0);
+        RowPointer<WeightPixelT> weightMapRow(weightMap, x0, y0);
+        RowPointer<CoaddPixelT const> imageRow(image, x0, y0);
+
+        for (int y = y0, endY = bbox.getEndY(); y != endY; ++y) {
+            weight.goodPixelSpans->forEachSpan(y, x0, bbox.getEndX(), [&](int beginX, int endX) {
+                int const dx = beginX - x0;
+                addSpanToCoadd(coaddRow.get() + dx, weightMapRow.get() + dx, imageRow.get() + dx,
+                               endX - beginX, weight.weight);
+            });
+            ++coaddRow, ++weightMapRow, ++imageRow;
+        }
+    }
+
+    /*
+     * Add the spans of good pixels of a masked image inside bbox to the coadd and weight map
+     *
+     * bbox must be contained in the bounding boxes of coadd, weightMap and image.
+     */
+    template <typename CoaddPixelT, typename WeightPixelT>
+    void addBBoxToCoadd(
+        afwImage::MaskedImage<CoaddPixelT> &coadd,          ///< [in,out] coadd to be modified
+        afwImage::Image<WeightPixelT> &weightMap,           ///< [in,out] weight map to be modified
+        afwImage::MaskedImage<CoaddPixelT> const &image,    ///< masked image to add to coadd
+        lsst::geom::Box2I const &bbox,                      ///< region to add, relative to parent image
+        afwImage::MaskPixel const,                          ///< bad pixel mask; ignored
+        SpanWeight<WeightPixelT> weight                     ///< relative weight and good pixels of image
+    ) {
+        int const x0 = bbox.getMinX(), y0 = bbox.getMinY();
+        RowPointer<CoaddPixelT> coaddImageRow(*coadd.getImage(), x0, y0);
+        RowPointer<afwImage::MaskPixel> coaddMaskRow(*coadd.getMask(), x0, y0);
+        RowPointer<afwImage::VariancePixel> coaddVarianceRow(*coadd.getVariance(), x0, y0);
+        RowPointer<WeightPixelT> weightMapRow(weightMap, x0, y0);
+        RowPointer<CoaddPixelT const> imageRow(*image.getImage(), x0, y0);
+        RowPointer<afwImage::MaskPixel const> maskRow(*image.getMask(), x0, y0);
+        RowPointer<afwImage::VariancePixel const> varianceRow(*image.getVariance(), x0, y0);
+
+        for (int y = y0, endY = bbox.getEndY(); y != endY; ++y) {
+            weight.goodPixelSpans->forEachSpan(y, x0, bbox.getEndX(), [&](int beginX, int endX) {
+                int const dx = beginX - x0;
+                addSpanToCoadd(coaddImageRow.get() + dx, coaddMaskRow.get() + dx,
+                               coaddVarianceRow.get() + dx, weightMapRow.get() + dx, imageRow.get() + dx,
+                               maskRow.get() + dx, varianceRow.get() + dx, endX - beginX, weight.weight);
+            });
+            ++coaddImageRow, ++coaddMaskRow, ++coaddVarianceRow, ++weightMapRow;
+            ++imageRow, ++maskRow, ++varianceRow;
+        }
+    }
+
+    /*
+     * Add the good pixels of an image inside bbox to the coadd and weight map,
+     * weighting each pixel by the corresponding pixel of weightImage
+     *
+     * bbox must be contained in the bounding boxes of coadd, weightMap, image and weightImage.
+     */
+    template <typename CoaddPixelT, typename WeightPixelT>
+    void addBBoxToCoadd(
+        afwImage::Image<CoaddPixelT> &coadd,                ///< [in,out] coadd to be modified
+        afwImage::Image<WeightPixelT> &weightMap,           ///< [in,out] weight map to be modified
+        afwImage::Image<CoaddPixelT> const &image,          ///< image to add to coadd
+        lsst::geom::Box2I const &bbox,                      ///< region to add, relative to parent image
+        afwImage::MaskPixel const,                          ///< bad pixel mask; ignored
+        afwImage::Image<WeightPixelT> const &weightImage    ///< weight of each pixel of image
+    ) {
+        int const x0 = bbox.getMinX(), y0 = bbox.getMinY();
+        RowPointer<CoaddPixelT> coaddRow(coadd, x0, y0);
+        RowPointer<WeightPixelT> weightMapRow(weightMap, x0, y0);
+        RowPointer<CoaddPixelT const> imageRow(image, x0, y0);
+        RowPointer<WeightPixelT const> weightRow(weightImage, x0, y0);
+
+        for (int y = 0, endY = bbox.getHeight(); y != endY; ++y) {
+            addRowToCoadd(coaddRow.get(), weightMapRow.get(), imageRow.get(), bbox.getWidth(),
+                          weightRow.get());
+            ++coaddRow, ++weightMapRow, ++imageRow, ++weightRow;
+        }
+    }
+
+    /*
+     * Add the good pixels of a masked image inside bbox to the coadd and weight map,
+     * weighting each pixel by the corresponding pixel of weightImage
+     *
+     * bbox must be contained in the bounding boxes of coadd, weightMap, image and weightImage.
+     */
+    template <typename CoaddPixelT, typename WeightPixelT>
+    void addBBoxToCoadd(
+        afwImage::MaskedImage<CoaddPixelT> &coadd,          ///< [in,out] coadd to be modified
+        afwImage::Image<WeightPixelT> &weightMap,           ///< [in,out] weight map to be modified
+        afwImage::MaskedImage<CoaddPixelT> const &image,    ///< masked image to add to coadd
+        lsst::geom::Box2I const &bbox,                      ///< region to add, relative to parent image
+        afwImage::MaskPixel const badPixelMask,             ///< skip pixel if mask & badPixelMask != 0
+        afwImage::Image<WeightPixelT> const &weightImage    ///< weight of each pixel of image
+    ) {
+        int const x0 = bbox.getMinX(), y0 = bbox.getMinY();
+        RowPointer<CoaddPixelT> coaddImageRow(*coadd.getImage(), x0, y0);
+        RowPointer<afwImage::MaskPixel> coaddMaskRow(*coadd.getMask(), x0, y0);
+        RowPointer<afwImage::VariancePixel> coaddVarianceRow(*coadd.getVariance(), x0, y0);
+        RowPointer<WeightPixelT> weightMapRow(weightMap, x0, y0);
+        RowPointer<CoaddPixelT const> imageRow(*image.getImage(), x0, y0);
+        RowPointer<afwImage::MaskPixel const> maskRow(*image.getMask(), x0, y0);
+        RowPointer<afwImage::VariancePixel const> varianceRow(*image.getVariance(), x0, y0);
+        RowPointer<WeightPixelT const> weightRow(weightImage, x0, y0);
+
+        for (int y = 0, endY = bbox.getHeight(); y != endY; ++y) {
+            addRowToCoadd(coaddImageRow.get(), coaddMaskRow.get(), coaddVarianceRow.get(), weightMapRow.get(),
+                          imageRow.get(), maskRow.get(), varianceRow.get(), bbox.getWidth(),
+                          badPixelMask, weightRow.get());
+            ++coaddImageRow, ++coaddMaskRow, ++coaddVarianceRow, ++weightMapRow;
+            ++imageRow, ++maskRow, ++varianceRow, ++weightRow;
+        }
+    }
+
+    /*
+     * Add the good pixels of a masked image inside bbox to the coadd and weight map,
+     * weighting each pixel by the inverse of its variance
+     *
+     * bbox must be contained in the bounding boxes of coadd, weightMap and image.
+     */
+    template <typename CoaddPixelT, typename WeightPixelT>
+    void addBBoxToCoadd(
+        afwImage::MaskedImage<CoaddPixelT> &coadd,          ///< [in,out] coadd to be modified
+        afwImage::Image<WeightPixelT> &weightMap,           ///< [in,out] weight map to be modified
+        afwImage::MaskedImage<CoaddPixelT> const &image,    ///< masked image to add to coadd
+        lsst::geom::Box2I const &bbox,                      ///< region to add, relative to parent image
+        afwImage::MaskPixel const badPixelMask,             ///< skip pixel if mask & badPixelMask != 0
+        InverseVarianceWeight<WeightPixelT> weight          ///< weight of each pixel is scale / variance
+    ) {
+        int const x0 = bbox.getMinX(), y0 = bbox.getMinY();
+        RowPointer<CoaddPixelT> coaddImageRow(*coadd.getImage(), x0, y0);
+        RowPointer<afwImage::MaskPixel> coaddMaskRow(*coadd.getMask(), x0, y0);
+        RowPointer<afwImage::VariancePixel> coaddVarianceRow(*coadd.getVariance(), x0, y0);
+        RowPointer<WeightPixelT> weightMapRow(weightMap, x0, y0);
+        RowPointer<CoaddPixelT const> imageRow(*image.getImage(), x0, y0);
+        RowPointer<afwImage::MaskPixel const> maskRow(*image.getMask(), x0, y0);
+        RowPointer<afwImage::VariancePixel const> varianceRow(*image.getVariance(), x0, y0);
+
+        for (int y = 0, endY = bbox.getHeight(); y != endY; ++y) {
+            addRowToCoaddInverseVariance(coaddImageRow.get(), coaddMaskRow.get(), coaddVarianceRow.get(),
+                                         weightMapRow.get(), imageRow.get(), maskRow.get(),
+                                         varianceRow.get(), bbox.getWidth(), badPixelMask, weight.scale);
+            ++coaddImageRow, ++coaddMaskRow, ++coaddVarianceRow, ++weightMapRow;
+            ++imageRow, ++maskRow, ++varianceRow;
+        }
+    }
+
+    /*
+     * Add the good pixels of a masked image inside bbox to the coadd and weight map,
+     * using compensated summation for the coadd image
+     *
+     * bbox must be contained in the bounding boxes of coadd, weightMap, compensation and image.
+     */
+    template <typename CoaddPixelT, typename WeightPixelT>
+    void addBBoxToCoadd(
+        afwImage::MaskedImage<CoaddPixelT> &coadd,          ///< [in,out] coadd to be modified
+        afwImage::Image<WeightPixelT> &weightMap,           ///< [in,out] weight map to be modified
+        afwImage::MaskedImage<CoaddPixelT> const &image,    ///< masked image to add to coadd
+        lsst::geom::Box2I const &bbox,                      ///< region to add, relative to parent image
+        afwImage::MaskPixel const badPixelMask,             ///< skip pixel if mask & badPixelMask != 0
+        CompensatedWeight<CoaddPixelT, WeightPixelT> weight ///< relative weight and compensation image
+    ) {
+        int const x0 = bbox.getMinX(), y0 = bbox.getMinY();
+        RowPointer<CoaddPixelT> coaddImageRow(*coadd.getImage(), x0, y0);
+        RowPointer<CoaddPixelT> compensationRow(*weight.compensation, x0, y0);
+        RowPointer<afwImage::MaskPixel> coaddMaskRow(*coadd.getMask(), x0, y0);
+        RowPointer<afwImage::VariancePixel> coaddVarianceRow(*coadd.getVariance(), x0, y0);
+        RowPointer<WeightPixelT> weightMapRow(weightMap, x0, y0);
+        RowPointer<CoaddPixelT const> imageRow(*image.getImage(), x0, y0);
+        RowPointer<afwImage::MaskPixel const> maskRow(*image.getMask(), x0, y0);
+        RowPointer<afwImage::VariancePixel const> varianceRow(*image.getVariance(), x0, y0);
+
+        for (int y = 0, endY = bbox.getHeight(); y != endY; ++y) {
+            addRowToCoaddCompensated(coaddImageRow.get(), compensationRow.get(), coaddMaskRow.get(),
+                                     coaddVarianceRow.get(), weightMapRow.get(), imageRow.get(),
+                                     maskRow.get(), varianceRow.get(), bbox.getWidth(), badPixelMask,
+                                     weight.weight);
+            ++coaddImageRow, ++compensationRow, ++coaddMaskRow, ++coaddVarianceRow, ++weightMapRow;
+            ++imageRow, ++maskRow, ++varianceRow;
+        }
+    }
+
+    /*
+     * Add the good pixels of an image inside bbox to the coadd and weight map
+     * and record them in the count and provenance maps, one row at a time
+     *
+     * bbox must be contained in the bounding boxes of coadd, weightMap, image and each map that is not null.
+     */
+    template <typename CoaddPixelT, typename WeightPixelT>
+    void addBBoxToCoaddWithProvenance(
+        afwImage::Image<CoaddPixelT> &coadd,                ///< [in,out] coadd to be modified
+        afwImage::Image<WeightPixelT> &weightMap,           ///< [in,out] weight map to be modified
+        afwImage::Image<CoaddPixelT> const &image,          ///< image to add to coadd
+        lsst::geom::Box2I const &bbox,                      ///< region to add, relative to parent image
+        afwImage::MaskPixel const,                          ///< bad pixel mask; ignored
+        WeightPixelT weight,                                ///< relative weight of this image
+        ProvenanceMaps const &provenance                    ///< [in,out] maps to be modified
+    ) {
+        int const x0 = bbox.getMinX(), y0 = bbox.getMinY();
+        RowPointer<CoaddPixelT> coaddRow(coadd, x0, y0);
+        RowPointer<WeightPixelT> weightMapRow(weightMap, x0, y0);
+        RowPointer<CoaddPixelT const> imageRow(image, x0, y0);
+        RowPointer<int> countMapRow;
+        if (provenance.countMap) {
+            countMapRow = RowPointer<int>(*provenance.countMap, x0, y0);
+        }
+        RowPointer<std::uint64_t> provenanceMapRow;
+        if (provenance.provenanceMap) {
+            provenanceMapRow = RowPointer<std::uint64_t>(*provenance.provenanceMap, x0, y0);
+        }
+
+        for (int y = 0, endY = bbox.getHeight(); y != endY; ++y) {
+            addRowToCoadd(coaddRow.get(), weightMapRow.get(), imageRow.get(), bbox.getWidth(), weight);
+            if (provenance.countMap) {
+                addRowToCountMap(countMapRow.get(), imageRow.get(), bbox.getWidth());
+            }
+            if (provenance.provenanceMap) {
+                addRowToProvenanceMap(provenanceMapRow.get(), imageRow.get(), bbox.getWidth(),
+                                      provenance.inputBit);
+            }
+            ++coaddRow, ++weightMapRow, ++imageRow, ++countMapRow, ++provenanceMapRow;
+        }
+    }
+
+    /*
+     * Add the good pixels of a masked image inside bbox to the coadd and weight map
+     * and record them in the count and provenance maps, one row at a time
+     *
+     * bbox must be contained in the bounding boxes of coadd, weightMap, image and each map that is not null.
+     */
+    template <typename CoaddPixelT, typename WeightPixelT>
+    void addBBoxToCoaddWithProvenance(
+        afwImage::MaskedImage<CoaddPixelT> &coadd,          ///< [in,out] coadd to be modified
+        afwImage::Image<WeightPixelT> &weightMap,           ///< [in,out] weight map to be modified
+        afwImage::MaskedImage<CoaddPixelT> const &image,    ///< masked image to add to coadd
+        lsst::geom::Box2I const &bbox,                      ///< region to add, relative to parent image
+        afwImage::MaskPixel const badPixelMask,             ///< skip pixel if mask & badPixelMask != 0
+        WeightPixelT weight,                                ///< relative weight of this image
+        ProvenanceMaps const &provenance                    ///< [in,out] maps to be modified
+    ) {
+        int const x0 = bbox.getMinX(), y0 = bbox.getMinY();
+        RowPointer<CoaddPixelT> coaddImageRow(*coadd.getImage(), x0, y0);
+        RowPointer<afwImage::MaskPixel> coaddMaskRow(*coadd.getMask(), x0, y0);
+        RowPointer<afwImage::VariancePixel> coaddVarianceRow(*coadd.getVariance(), x0, y0);
+        RowPointer<WeightPixelT> weightMapRow(weightMap, x0, y0);
+        RowPointer<CoaddPixelT const> imageRow(*image.getImage(), x0, y0);
+        RowPointer<afwImage::MaskPixel const> maskRow(*image.getMask(), x0, y0);
+        RowPointer<afwImage::VariancePixel const> varianceRow(*image.getVariance(), x0, y0);
+        RowPointer<int> countMapRow;
+        if (provenance.countMap) {
+            countMapRow = RowPointer<int>(*provenance.countMap, x0, y0);
+        }
+        RowPointer<std::uint64_t> provenanceMapRow;
+        if (provenance.provenanceMap) {
+            provenanceMapRow = RowPointer<std::uint64_t>(*provenance.provenanceMap, x0, y0);
+        }
+
+        for (int y = 0, endY = bbox.getHeight(); y != endY; ++y) {
+            addRowToCoadd(coaddImageRow.get(), coaddMaskRow.get(), coaddVarianceRow.get(), weightMapRow.get(),
+                          imageRow.get(), maskRow.get(), varianceRow.get(), bbox.getWidth(),
+                          badPixelMask, weight);
+            if (provenance.countMap) {
+                addRowToCountMap(countMapRow.get(), maskRow.get(), bbox.getWidth(), badPixelMask);
+            }
+            if (provenance.provenanceMap) {
+                addRowToProvenanceMap(provenanceMapRow.get(), maskRow.get(), bbox.getWidth(), badPixelMask,
+                                      provenance.inputBit);
+            }
+            ++coaddImageRow, ++coaddMaskRow, ++coaddVarianceRow, ++weightMapRow;
+            ++imageRow, ++maskRow, ++varianceRow, ++countMapRow, ++provenanceMapRow;
+        }
+    }
+
+    /*
+     * Count the pixels of an image inside bbox that are not NaN
+     */
+    template <typename CoaddPixelT, typename WeightT>
+    int countGoodBBox(
+        afwImage::Image<CoaddPixelT> const &image,          ///< image being added to the coadd
+        lsst::geom::Box2I const &bbox,                      ///< region to count, relative to parent image
+        afwImage::MaskPixel const,                          ///< bad pixel mask; ignored
+        WeightT const &                                     ///< weight of this image; ignored
+    ) {
+        RowPointer<CoaddPixelT const> imageRow(image, bbox.getMinX(), bbox.getMinY());
+        int numGoodPix = 0;
+        for (int y = 0, endY = bbox.getHeight(); y != endY; ++y, ++imageRow) {
+            numGoodPix += countGoodRow(imageRow.get(), bbox.getWidth());
+        }
+        return numGoodPix;
+    }
+
+    /*
+     * Count the pixels of a masked image inside bbox for which mask & badPixelMask == 0
+     */
+    template <typename CoaddPixelT, typename WeightT>
+    int countGoodBBox(
+        afwImage::MaskedImage<CoaddPixelT> const &image,    ///< masked image being added to the coadd
+        lsst::geom::Box2I const &bbox,                      ///< region to count, relative to parent image
+        afwImage::MaskPixel const badPixelMask,             ///< skip pixel if mask & badPixelMask != 0
+        WeightT const &                                     ///< weight of this image; ignored
+    ) {
+        RowPointer<afwImage::MaskPixel const> maskRow(*image.getMask(), bbox.getMinX(), bbox.getMinY());
+        int numGoodPix = 0;
+        for (int y = 0, endY = bbox.getHeight(); y != endY; ++y, ++maskRow) {
+            numGoodPix += countGoodRow(maskRow.get(), bbox.getWidth(), badPixelMask);
+        }
+        return numGoodPix;
+    }
+
+    /*
+     * Count the pixels of a masked image inside bbox that addToCoaddInverseVariance adds
+     */
+    template <typename CoaddPixelT, typename WeightPixelT>
+    int countGoodBBox(
+        afwImage::MaskedImage<CoaddPixelT> const &image,    ///< masked image being added to the coadd
+        lsst::geom::Box2I const &bbox,                      ///< region to count, relative to parent image
+        afwImage::MaskPixel const badPixelMask,             ///< skip pixel if mask & badPixelMask != 0
+        InverseVarianceWeight<WeightPixelT> const &         ///< weight of this image; ignored
+    ) {
+        int const x0 = bbox.getMinX(), y0 = bbox.getMinY();
+        RowPointer<afwImage::MaskPixel const> maskRow(*image.getMask(), x0, y0);
+        RowPointer<afwImage::VariancePixel const> varianceRow(*image.getVariance(), x0, y0);
+        int numGoodPix = 0;
+        for (int y = 0, endY = bbox.getHeight(); y != endY; ++y, ++maskRow, ++varianceRow) {
+            numGoodPix += countGoodRow(maskRow.get(), varianceRow.get(), bbox.getWidth(), badPixelMask);
+        }
+        return numGoodPix;
+    }
+
+    /*
+     * Count the good pixels inside bbox of an image whose good pixels are listed in a GoodPixelSpans
+     */
+    template <typename WeightPixelT>
+    int countGoodSpans(
+        lsst::geom::Box2I const &bbox,                      ///< region to count, relative to parent image
+        SpanWeight<WeightPixelT> const &weight              ///< relative weight and good pixel spans
+    ) {
+        int numGoodPix = 0;
+        for (int y = bbox.getMinY(), endY = bbox.getEndY(); y != endY; ++y) {
+            weight.goodPixelSpans->forEachSpan(y, bbox.getMinX(), bbox.getEndX(),
+                                               [&](int beginX, int endX) { numGoodPix += endX - beginX; });
+        }
+        return numGoodPix;
+    }
+
+    template <typename CoaddPixelT, typename WeightPixelT>
+    int countGoodBBox(
+        afwImage::Image<CoaddPixelT> const &,               ///< image being added to the coadd
+        lsst::geom::Box2I const &bbox,                      ///< region to count, relative to parent image
+        afwImage::MaskPixel const,                          ///< bad pixel mask; ignored
+        SpanWeight<WeightPixelT> const &weight              ///< relative weight and good pixel spans
+    ) {
+        return countGoodSpans(bbox, weight);
+    }
+
+    template <typename CoaddPixelT, typename WeightPixelT>
+    int countGoodBBox(
+        afwImage::MaskedImage<CoaddPixelT> const &,         ///< masked image being added to the coadd
+        lsst::geom::Box2I const &bbox,                      ///< region to count, relative to parent image
+        afwImage::MaskPixel const,                          ///< bad pixel mask; ignored
+        SpanWeight<WeightPixelT> const &weight              ///< relative weight and good pixel spans
+    ) {
+        return countGoodSpans(bbox, weight);
+    }
+
+    /*
+     * Number of bytes per pixel read or written by addToCoadd for a given kind of weight,
+     * beyond those of the coadd, weight map and input image
+     */
+    template <typename WeightT>
+    std::size_t getWeightBytes(WeightT const &) {
+        return 0;
+    }
+
+    template <typename WeightPixelT>
+    std::size_t getWeightBytes(afwImage::Image<WeightPixelT> const &) {
+        return sizeof(WeightPixelT);
+    }
+
+    template <typename CoaddPixelT, typename WeightPixelT>
+    std::size_t getWeightBytes(CompensatedWeight<CoaddPixelT, WeightPixelT> const &) {
+        return 2 * sizeof(CoaddPixelT);
+    }
+
     /*
      * Implementation of addToCoadd
      *
-     * The template parameter isValidPixel is a functor with operator()
-     * which returns true if a given image pixel is valid.
-     * This allows us to support multiple image types including
-     * MaskedImage with a mask bit and Image with a check for NaN.
+     * CoaddT may be an Image, whose good pixels are those that are not NaN,
+     * or a MaskedImage, whose good pixels are those for which mask & badPixelMask == 0.
+     * WeightT may be a WeightPixelT (the relative weight of the image), an Image<WeightPixelT>
+     * (the weight of each pixel of the image, with the same bounding box as the image),
+     * an InverseVarianceWeight<WeightPixelT>, a CompensatedWeight<CoaddPixelT, WeightPixelT>
+     * or a SpanWeight<WeightPixelT>.
      *
      * @return overlapping bounding box, relative to parent image
      */
-    template <typename CoaddT, typename WeightPixelT, typename isValidPixel>
+    template <typename CoaddT, typename WeightPixelT, typename WeightT>
     static lsst::geom::Box2I addToCoaddImpl(
         CoaddT &coadd,                                      ///< [in,out] coadd to be modified
         lsst::afw::image::Image<WeightPixelT> &weightMap,   ///< [in,out] weight map to be modified
         CoaddT const &image,                                ///< image to add to coadd
         lsst::afw::image::MaskPixel const badPixelMask,     ///< bad pixel mask; may be ignored
-        WeightPixelT weight                                 ///< relative weight of this image
+        WeightT const &weight                               ///< weight of this image
     ) {
-        typedef typename afwImage::Image<WeightPixelT> WeightMapT;
+        assertSameBBox(coadd, weightMap);
 
-        if (coadd.getBBox() != weightMap.getBBox()) {
-            throw LSST_EXCEPT(pexExcept::InvalidParameterError,
-                (boost::format("coadd and weightMap parent bboxes differ: %s != %s") %
-                coadd.getBBox() % weightMap.getBBox()).str());
+        coaddUtils::detail::KernelStatsRecorder stats(coaddUtils::detail::Kernel::ADD_TO_COADD);
+        std::atomic<std::int64_t> numGoodPix(0);
+        geom::Box2I const overlapBBox = forEachOverlapBand(coadd.getBBox(), image.getBBox(),
+            [&](geom::Box2I const &bandBBox) {
+                addBBoxToCoadd(coadd, weightMap, image, bandBBox, badPixelMask, weight);
+                if (stats.isEnabled()) {
+                    numGoodPix += countGoodBBox(image, bandBBox, badPixelMask, weight);
+                }
+            });
+        if (stats.isEnabled()) {
+            // the image is read; the coadd and weight map are read and written
+            std::int64_t const numPix = overlapBBox.getArea();
+            std::size_t const pixelBytes = getPixelBytes(image) +
+                                           2 * (getPixelBytes(coadd) + sizeof(WeightPixelT)) +
+                                           getWeightBytes(weight);
+            stats.addPixels(numPix, numGoodPix, numPix * static_cast<std::int64_t>(pixelBytes));
         }
+        return overlapBBox;
+    }
 
-        geom::Box2I overlapBBox = coadd.getBBox();
-        overlapBBox.clip(image.getBBox());
-        if (overlapBBox.isEmpty()) {
-            return overlapBBox;
+    /*
+     * Implementation of addToCoaddWithProvenance
+     *
+     * As addToCoaddImpl, but each row of the image is also recorded in the count and provenance maps
+     * right after it is added to the coadd, while it is still in cache.
+     *
+     * @return overlapping bounding box, relative to parent image
+     */
+    template <typename CoaddT, typename WeightPixelT>
+    static lsst::geom::Box2I addToCoaddWithProvenanceImpl(
+        CoaddT &coadd,                                      ///< [in,out] coadd to be modified
+        lsst::afw::image::Image<WeightPixelT> &weightMap,   ///< [in,out] weight map to be modified
+        CoaddT const &image,                                ///< image to add to coadd
+        lsst::afw::image::MaskPixel const badPixelMask,     ///< bad pixel mask; may be ignored
+        WeightPixelT weight,                                ///< relative weight of this image
+        afwImage::Image<int> *countMap,                     ///< [in,out] count map; may be null
+        afwImage::Image<std::uint64_t> *provenanceMap,      ///< [in,out] provenance map; may be null
+        int inputIndex                                      ///< bit of provenanceMap to set
+    ) {
+        assertSameBBox(coadd, weightMap);
+        if (countMap) {
+            assertSameBBox(coadd, "coadd", *countMap, "countMap");
+        }
+        if (provenanceMap) {
+            assertSameBBox(coadd, "coadd", *provenanceMap, "provenanceMap");
+            if (inputIndex < 0 || inputIndex >= 64) {
+                throw LSST_EXCEPT(pexExcept::InvalidParameterError,
+                    (boost::format("inputIndex = %d not in range [0, 64)") % inputIndex).str());
+            }
+        }
+        ProvenanceMaps const provenance{countMap, provenanceMap,
+                                        provenanceMap ? std::uint64_t(1) << inputIndex : 0};
+
+        coaddUtils::detail::KernelStatsRecorder stats(coaddUtils::detail::Kernel::ADD_TO_COADD);
+        std::atomic<std::int64_t> numGoodPix(0);
+        geom::Box2I const overlapBBox = forEachOverlapBand(coadd.getBBox(), image.getBBox(),
+            [&](geom::Box2I const &bandBBox) {
+                addBBoxToCoaddWithProvenance(coadd, weightMap, image, bandBBox, badPixelMask, weight,
+                                             provenance);
+                if (stats.isEnabled()) {
+                    numGoodPix += countGoodBBox(image, bandBBox, badPixelMask, weight);
+                }
+            });
+        if (stats.isEnabled()) {
+            // as addToCoaddImpl, plus the count and provenance maps, which are read and written
+            std::int64_t const numPix = overlapBBox.getArea();
+            std::size_t const pixelBytes = getPixelBytes(image) +
+                                           2 * (getPixelBytes(coadd) + sizeof(WeightPixelT)) +
+                                           (countMap ? 2 * sizeof(int) : 0) +
+                                           (provenanceMap ? 2 * sizeof(std::uint64_t) : 0);
+            stats.addPixels(numPix, numGoodPix, numPix * static_cast<std::int64_t>(pixelBytes));
+        }
+        return overlapBBox;
+    }
+
+    /*
+     * Row pointers to the planes of one target of addToCoaddTargets that its operation updates;
+     * the other planes are null
+     */
+    template <typename CoaddPixelT, typename WeightPixelT>
+    struct TargetRows {
+        typedef coaddUtils::CoaddTarget<CoaddPixelT, WeightPixelT> Target;
+
+        TargetRows() = default;
+
+        /*
+         * Point to pixel (x, y) of each plane of target that its operation updates
+         */
+        TargetRows(Target const &target, int x, int y) {
+            if (target.operation != Target::ADD_WEIGHT) {
+                coaddImage = RowPointer<CoaddPixelT>(*target.coadd->getImage(), x, y);
+                coaddMask = RowPointer<afwImage::MaskPixel>(*target.coadd->getMask(), x, y);
+                coaddVariance = RowPointer<afwImage::VariancePixel>(*target.coadd->getVariance(), x, y);
+            }
+            if (target.operation != Target::COPY_GOOD) {
+                weightMap = RowPointer<WeightPixelT>(*target.weightMap, x, y);
+            }
+        }
+
+        TargetRows &operator++() {
+            ++coaddImage, ++coaddMask, ++coaddVariance, ++weightMap;
+            return *this;
+        }
+
+        RowPointer<CoaddPixelT> coaddImage;
+        RowPointer<afwImage::MaskPixel> coaddMask;
+        RowPointer<afwImage::VariancePixel> coaddVariance;
+        RowPointer<WeightPixelT> weightMap;
+    };
+
+    /*
+     * Implementation of addToCoaddTargets
+     *
+     * Walk the image once, row by row, applying each row to every target before moving on to the next,
+     * so that each row of the image is read while it is still in cache.
+     *
+     * @return overlapping bounding box of each target, relative to parent image
+     */
+    template <typename CoaddPixelT, typename WeightPixelT>
+    static std::vector<lsst::geom::Box2I> addToCoaddTargetsImpl(
+        std::vector<coaddUtils::CoaddTarget<CoaddPixelT, WeightPixelT>> const &targetList,
+        afwImage::MaskedImage<CoaddPixelT> const &image
+    ) {
+        typedef coaddUtils::CoaddTarget<CoaddPixelT, WeightPixelT> Target;
+
+        std::size_t const numTargets = targetList.size();
+        std::vector<geom::Box2I> overlapBBoxList;
+        overlapBBoxList.reserve(numTargets);
+        geom::Box2I allOverlapBBox;
+        for (std::size_t i = 0; i < numTargets; ++i) {
+            Target const &target = targetList[i];
+            bool const needsCoadd = target.operation != Target::ADD_WEIGHT;
+            bool const needsWeightMap = target.operation != Target::COPY_GOOD;
+            if ((needsCoadd && !target.coadd) || (needsWeightMap && !target.weightMap)) {
+                throw LSST_EXCEPT(pexExcept::InvalidParameterError,
+                    (boost::format("target %d lacks the %s its operation needs") % i %
+                    (needsCoadd && !target.coadd ? "coadd" : "weight map")).str());
+            }
+            if (needsCoadd && needsWeightMap) {
+                assertSameBBox(*target.coadd, *target.weightMap);
+            }
+            geom::Box2I overlapBBox = needsCoadd ? target.coadd->getBBox() : target.weightMap->getBBox();
+            overlapBBox.clip(image.getBBox());
+            overlapBBoxList.push_back(overlapBBox);
+            allOverlapBBox.include(overlapBBox);
+        }
+        coaddUtils::detail::KernelStatsRecorder stats(coaddUtils::detail::Kernel::ADD_TO_COADD);
+        if (allOverlapBBox.isEmpty()) {
+            return overlapBBoxList;
         }
 
-        CoaddT coaddView(coadd, overlapBBox, afwImage::PARENT, false);
-        WeightMapT weightMapView(weightMap, overlapBBox, afwImage::PARENT, false);
-        CoaddT imageView(image, overlapBBox, afwImage::PARENT, false);
+        std::atomic<std::int64_t> numGoodPix(0);
+        coaddUtils::detail::forEachRowBand(allOverlapBBox.getBeginY(), allOverlapBBox.getEndY(),
+            [&](int bandBeginY, int bandEndY) {
+                std::int64_t bandNumGoodPix = 0;
+                // the rows of each target in this band, and pointers to the first of them
+                std::vector<int> beginYList(numTargets), endYList(numTargets);
+                std::vector<TargetRows<CoaddPixelT, WeightPixelT>> targetRowsList(numTargets);
+                for (std::size_t i = 0; i < numTargets; ++i) {
+                    geom::Box2I const &overlapBBox = overlapBBoxList[i];
+                    beginYList[i] = std::max(bandBeginY, overlapBBox.getBeginY());
+                    endYList[i] = overlapBBox.isEmpty() ? beginYList[i]
+                                                        : std::min(bandEndY, overlapBBox.getEndY());
+                    if (beginYList[i] < endYList[i]) {
+                        targetRowsList[i] = TargetRows<CoaddPixelT, WeightPixelT>(
+                                targetList[i], overlapBBox.getMinX(), beginYList[i]);
+                    }
+                }
 
-        isValidPixel const isValid(badPixelMask); // functor to check if a pixel is good
-        for (int y = 0, endY = imageView.getHeight(); y != endY; ++y) {
-            typename CoaddT::const_x_iterator imageIter = imageView.row_begin(y);
-            typename CoaddT::const_x_iterator const imageEndIter = imageView.row_end(y);
-            typename CoaddT::x_iterator coaddIter = coaddView.row_begin(y);
-            typename WeightMapT::x_iterator weightMapIter = weightMapView.row_begin(y);
-            for (; imageIter != imageEndIter; ++imageIter, ++coaddIter, ++weightMapIter) {
-                if (isValid(imageIter)) {
-                    typename CoaddT::SinglePixel pix = *imageIter;
-                    pix *= typename CoaddT::Pixel(weight);
-                    *coaddIter += pix;
-                    *weightMapIter += weight;
+                int const x0 = allOverlapBBox.getMinX();
+                RowPointer<CoaddPixelT const> imageRow(*image.getImage(), x0, bandBeginY);
+                RowPointer<afwImage::MaskPixel const> maskRow(*image.getMask(), x0, bandBeginY);
+                RowPointer<afwImage::VariancePixel const> varianceRow(*image.getVariance(), x0, bandBeginY);
+                for (int y = bandBeginY; y != bandEndY; ++y) {
+                    for (std::size_t i = 0; i < numTargets; ++i) {
+                        if (y < beginYList[i] || y >= endYList[i]) {
+                            continue;
+                        }
+                        Target const &target = targetList[i];
+                        TargetRows<CoaddPixelT, WeightPixelT> &rows = targetRowsList[i];
+                        int const dx = overlapBBoxList[i].getMinX() - x0;
+                        int const width = overlapBBoxList[i].getWidth();
+                        switch (target.operation) {
+                            case Target::ADD:
+                                addRowToCoadd(rows.coaddImage.get(), rows.coaddMask.get(),
+                                              rows.coaddVariance.get(), rows.weightMap.get(),
+                                              imageRow.get() + dx, maskRow.get() + dx,
+                                              varianceRow.get() + dx, width, target.badPixelMask,
+                                              target.weight);
+                                break;
+                            case Target::COPY_GOOD:
+                                copyGoodRow(rows.coaddImage.get(), rows.coaddMask.get(),
+                                            rows.coaddVariance.get(), imageRow.get() + dx, maskRow.get() + dx,
+                                            varianceRow.get() + dx, width, target.badPixelMask);
+                                break;
+                            case Target::ADD_WEIGHT:
+                                addRowToWeightMap(rows.weightMap.get(), maskRow.get() + dx, width,
+                                                  target.badPixelMask, target.weight);
+                                break;
+                        }
+                        if (stats.isEnabled()) {
+                            bandNumGoodPix += countGoodRow(maskRow.get() + dx, width, target.badPixelMask);
+                        }
+                        ++rows;
+                    }
+                    ++imageRow, ++maskRow, ++varianceRow;
                 }
+                numGoodPix += bandNumGoodPix;
+            });
+        if (stats.isEnabled()) {
+            // the image is read once; each target's planes are read and written over its overlap
+            std::size_t const imageBytes = getPixelBytes(image);
+            std::int64_t numPix = 0;
+            std::int64_t numBytes = allOverlapBBox.getArea() * static_cast<std::int64_t>(imageBytes);
+            for (std::size_t i = 0; i < numTargets; ++i) {
+                std::int64_t const targetNumPix = overlapBBoxList[i].getArea();
+                std::size_t const targetBytes =
+                        (targetList[i].operation != Target::ADD_WEIGHT ? imageBytes : 0) +
+                        (targetList[i].operation != Target::COPY_GOOD ? sizeof(WeightPixelT) : 0);
+                numPix += targetNumPix;
+                numBytes += targetNumPix * static_cast<std::int64_t>(2 * targetBytes);
             }
+            stats.addPixels(numPix, numGoodPix, numBytes);
         }
-        return overlapBBox;
+        return overlapBBoxList;
+    }
+
+    /*
+     * Implementation of addManyToCoadd
+     *
+     * Walk the coadd once in bands of rows, adding the overlapping part of every image
+     * to each band before moving on to the next, so that each band of the coadd and weight map
+     * is read and written while it is still in cache.
+     *
+     * @return overlapping bounding box of each image, relative to parent image
+     */
+    template <typename CoaddT, typename WeightPixelT>
+    static std::vector<lsst::geom::Box2I> addManyToCoaddImpl(
+        CoaddT &coadd,                                      ///< [in,out] coadd to be modified
+        lsst::afw::image::Image<WeightPixelT> &weightMap,   ///< [in,out] weight map to be modified
+        std::vector<std::shared_ptr<CoaddT>> const &imageList,  ///< images to add to coadd
+        lsst::afw::image::MaskPixel const badPixelMask,     ///< bad pixel mask; may be ignored
+        std::vector<WeightPixelT> const &weightList         ///< relative weight of each image
+    ) {
+        assertSameBBox(coadd, weightMap);
+        if (imageList.size() != weightList.size()) {
+            throw LSST_EXCEPT(pexExcept::LengthError,
+                (boost::format("number of images and weights differ: %d != %d") %
+                imageList.size() % weightList.size()).str());
+        }
+
+        std::vector<geom::Box2I> overlapBBoxList;
+        overlapBBoxList.reserve(imageList.size());
+        geom::Box2I allOverlapBBox;
+        for (auto const &imagePtr : imageList) {
+            if (!imagePtr) {
+                throw LSST_EXCEPT(pexExcept::InvalidParameterError, "image list contains a null image");
+            }
+            geom::Box2I overlapBBox = coadd.getBBox();
+            overlapBBox.clip(imagePtr->getBBox());
+            overlapBBoxList.push_back(overlapBBox);
+            allOverlapBBox.include(overlapBBox);
+        }
+        coaddUtils::detail::KernelStatsRecorder stats(coaddUtils::detail::Kernel::ADD_TO_COADD);
+        if (allOverlapBBox.isEmpty()) {
+            return overlapBBoxList;
+        }
+
+        std::size_t const rowBytes = static_cast<std::size_t>(coadd.getWidth()) *
+            (sizeof(typename CoaddT::SinglePixel) + sizeof(WeightPixelT));
+        int const tileHeight = static_cast<int>(std::max<std::size_t>(1, TILE_BYTES / rowBytes));
+
+        std::atomic<std::int64_t> numGoodPix(0);
+        coaddUtils::detail::forEachRowBand(allOverlapBBox.getBeginY(), allOverlapBBox.getEndY(),
+            [&](int bandBeginY, int bandEndY) {
+                for (int tileY0 = bandBeginY; tileY0 < bandEndY; tileY0 += tileHeight) {
+                    geom::Box2I const tileBBox(
+                        geom::Point2I(coadd.getX0(), tileY0),
+                        geom::Extent2I(coadd.getWidth(), std::min(tileHeight, bandEndY - tileY0))
+                    );
+                    for (std::size_t i = 0; i < imageList.size(); ++i) {
+                        geom::Box2I bbox = overlapBBoxList[i];
+                        bbox.clip(tileBBox);
+                        if (!bbox.isEmpty()) {
+                            addBBoxToCoadd(coadd, weightMap, *imageList[i], bbox, badPixelMask,
+                                           weightList[i]);
+                            if (stats.isEnabled()) {
+                                numGoodPix += countGoodBBox(*imageList[i], bbox, badPixelMask, weightList[i]);
+                            }
+                        }
+                    }
+                }
+            });
+        if (stats.isEnabled()) {
+            // as addToCoaddImpl, for the overlap of each image
+            std::int64_t numPix = 0;
+            for (auto const &overlapBBox : overlapBBoxList) {
+                numPix += overlapBBox.getArea();
+            }
+            std::size_t const pixelBytes = getPixelBytes(coadd) +
+                                           2 * (getPixelBytes(coadd) + sizeof(WeightPixelT));
+            stats.addPixels(numPix, numGoodPix, numPix * static_cast<std::int64_t>(pixelBytes));
+        }
+        return overlapBBoxList;
     }
 } // anonymous namespace
 
@@ -132,11 +901,87 @@ lsst::geom::Box2I coaddUtils::addToCoadd(
     WeightPixelT weight
 ) {
     typedef lsst::afw::image::Image<CoaddPixelT> Image;
-    return addToCoaddImpl<Image, WeightPixelT, CheckKnownValue>(coadd, weightMap, image, 0x0, weight);
+    return addToCoaddImpl<Image, WeightPixelT>(coadd, weightMap, image, 0x0, weight);
+}
+
+template <typename CoaddPixelT, typename WeightPixelT>
+lsst::geom::Box2I coaddUtils::addToCoadd(
+    // spell out lsst:afw::image to make Doxygen happy
+    lsst::afw::image::Image<CoaddPixelT> &coadd,
+    lsst::afw::image::Image<WeightPixelT> &weightMap,
+    lsst::afw::image::Image<CoaddPixelT> const &image,
+    lsst::afw::image::Image<WeightPixelT> const &weightImage
+) {
+    typedef lsst::afw::image::Image<CoaddPixelT> Image;
+    assertSameBBox(image, "image", weightImage, "weightImage");
+    return addToCoaddImpl<Image, WeightPixelT>(coadd, weightMap, image, 0x0, weightImage);
+}
+
+template <typename CoaddPixelT, typename WeightPixelT>
+lsst::geom::Box2I coaddUtils::addToCoadd(
+    // spell out lsst:afw::image to make Doxygen happy
+    lsst::afw::image::MaskedImage<CoaddPixelT, lsst::afw::image::MaskPixel,
+        lsst::afw::image::VariancePixel> &coadd,
+    lsst::afw::image::Image<WeightPixelT> &weightMap,
+    lsst::afw::image::MaskedImage<CoaddPixelT, lsst::afw::image::MaskPixel,
+        lsst::afw::image::VariancePixel> const &maskedImage,
+    lsst::afw::image::MaskPixel const badPixelMask,
+    WeightPixelT weight
+) {
+    typedef lsst::afw::image::MaskedImage<CoaddPixelT> Image;
+    return addToCoaddImpl<Image, WeightPixelT>(coadd, weightMap, maskedImage, badPixelMask, weight);
+}
+
+template <typename CoaddPixelT, typename WeightPixelT>
+lsst::geom::Box2I coaddUtils::addToCoadd(
+    // spell out lsst:afw::image to make Doxygen happy
+    lsst::afw::image::MaskedImage<CoaddPixelT, lsst::afw::image::MaskPixel,
+        lsst::afw::image::VariancePixel> &coadd,
+    lsst::afw::image::Image<WeightPixelT> &weightMap,
+    lsst::afw::image::MaskedImage<CoaddPixelT, lsst::afw::image::MaskPixel,
+        lsst::afw::image::VariancePixel> const &maskedImage,
+    lsst::afw::image::MaskPixel const badPixelMask,
+    lsst::afw::image::Image<WeightPixelT> const &weightImage
+) {
+    typedef lsst::afw::image::MaskedImage<CoaddPixelT> Image;
+    assertSameBBox(maskedImage, "image", weightImage, "weightImage");
+    return addToCoaddImpl<Image, WeightPixelT>(coadd, weightMap, maskedImage, badPixelMask, weightImage);
+}
+
+template <typename CoaddPixelT, typename WeightPixelT>
+lsst::geom::Box2I coaddUtils::addToCoadd(
+    // spell out lsst:afw::image to make Doxygen happy
+    lsst::afw::image::Image<CoaddPixelT> &coadd,
+    lsst::afw::image::Image<WeightPixelT> &weightMap,
+    lsst::afw::image::Image<CoaddPixelT> const &image,
+    GoodPixelSpans const &goodPixelSpans,
+    WeightPixelT weight
+) {
+    typedef lsst::afw::image::Image<CoaddPixelT> Image;
+    assertSameSpansBBox(image, goodPixelSpans);
+    return addToCoaddImpl<Image, WeightPixelT>(coadd, weightMap, image, 0x0,
+                                               SpanWeight<WeightPixelT>{weight, &goodPixelSpans});
 }
 
 template <typename CoaddPixelT, typename WeightPixelT>
 lsst::geom::Box2I coaddUtils::addToCoadd(
+    // spell out lsst:afw::image to make Doxygen happy
+    lsst::afw::image::MaskedImage<CoaddPixelT, lsst::afw::image::MaskPixel,
+        lsst::afw::image::VariancePixel> &coadd,
+    lsst::afw::image::Image<WeightPixelT> &weightMap,
+    lsst::afw::image::MaskedImage<CoaddPixelT, lsst::afw::image::MaskPixel,
+        lsst::afw::image::VariancePixel> const &maskedImage,
+    GoodPixelSpans const &goodPixelSpans,
+    WeightPixelT weight
+) {
+    typedef lsst::afw::image::MaskedImage<CoaddPixelT> Image;
+    assertSameSpansBBox(maskedImage, goodPixelSpans);
+    return addToCoaddImpl<Image, WeightPixelT>(coadd, weightMap, maskedImage, 0x0,
+                                               SpanWeight<WeightPixelT>{weight, &goodPixelSpans});
+}
+
+template <typename CoaddPixelT, typename WeightPixelT>
+lsst::geom::Box2I coaddUtils::addToCoaddInverseVariance(
     // spell out lsst:afw::image to make Doxygen happy
     lsst::afw::image::MaskedImage<CoaddPixelT, lsst::afw::image::MaskPixel,
         lsst::afw::image::VariancePixel> &coadd,
@@ -147,7 +992,120 @@ lsst::geom::Box2I coaddUtils::addToCoadd(
     WeightPixelT weight
 ) {
     typedef lsst::afw::image::MaskedImage<CoaddPixelT> Image;
-    return addToCoaddImpl<Image,WeightPixelT,CheckMask>(coadd, weightMap, maskedImage, badPixelMask, weight);
+    return addToCoaddImpl<Image, WeightPixelT>(coadd, weightMap, maskedImage, badPixelMask,
+                                               InverseVarianceWeight<WeightPixelT>{weight});
+}
+
+template <typename CoaddPixelT, typename WeightPixelT>
+lsst::geom::Box2I coaddUtils::addToCoaddCompensated(
+    // spell out lsst:afw::image to make Doxygen happy
+    lsst::afw::image::MaskedImage<CoaddPixelT, lsst::afw::image::MaskPixel,
+        lsst::afw::image::VariancePixel> &coadd,
+    lsst::afw::image::Image<CoaddPixelT> &compensation,
+    lsst::afw::image::Image<WeightPixelT> &weightMap,
+    lsst::afw::image::MaskedImage<CoaddPixelT, lsst::afw::image::MaskPixel,
+        lsst::afw::image::VariancePixel> const &maskedImage,
+    lsst::afw::image::MaskPixel const badPixelMask,
+    WeightPixelT weight
+) {
+    typedef lsst::afw::image::MaskedImage<CoaddPixelT> Image;
+    assertSameBBox(coadd, "coadd", compensation, "compensation");
+    return addToCoaddImpl<Image, WeightPixelT>(coadd, weightMap, maskedImage, badPixelMask,
+                                               CompensatedWeight<CoaddPixelT, WeightPixelT>{weight,
+                                                                                           &compensation});
+}
+
+template <typename CoaddPixelT, typename WeightPixelT>
+lsst::geom::Box2I coaddUtils::addToCoaddWithProvenance(
+    // spell out lsst:afw::image to make Doxygen happy
+    lsst::afw::image::Image<CoaddPixelT> &coadd,
+    lsst::afw::image::Image<WeightPixelT> &weightMap,
+    lsst::afw::image::Image<CoaddPixelT> const &image,
+    WeightPixelT weight,
+    lsst::afw::image::Image<int> *countMap,
+    lsst::afw::image::Image<std::uint64_t> *provenanceMap,
+    int inputIndex
+) {
+    typedef lsst::afw::image::Image<CoaddPixelT> Image;
+    return addToCoaddWithProvenanceImpl<Image, WeightPixelT>(coadd, weightMap, image, 0x0, weight,
+                                                             countMap, provenanceMap, inputIndex);
+}
+
+template <typename CoaddPixelT, typename WeightPixelT>
+lsst::geom::Box2I coaddUtils::addToCoaddWithProvenance(
+    // spell out lsst:afw::image to make Doxygen happy
+    lsst::afw::image::MaskedImage<CoaddPixelT, lsst::afw::image::MaskPixel,
+        lsst::afw::image::VariancePixel> &coadd,
+    lsst::afw::image::Image<WeightPixelT> &weightMap,
+    lsst::afw::image::MaskedImage<CoaddPixelT, lsst::afw::image::MaskPixel,
+        lsst::afw::image::VariancePixel> const &maskedImage,
+    lsst::afw::image::MaskPixel const badPixelMask,
+    WeightPixelT weight,
+    lsst::afw::image::Image<int> *countMap,
+    lsst::afw::image::Image<std::uint64_t> *provenanceMap,
+    int inputIndex
+) {
+    typedef lsst::afw::image::MaskedImage<CoaddPixelT> Image;
+    return addToCoaddWithProvenanceImpl<Image, WeightPixelT>(coadd, weightMap, maskedImage, badPixelMask,
+                                                             weight, countMap, provenanceMap, inputIndex);
+}
+
+template <typename CoaddPixelT, typename WeightPixelT>
+std::vector<lsst::geom::Box2I> coaddUtils::addManyToCoadd(
+    // spell out lsst:afw::image to make Doxygen happy
+    lsst::afw::image::Image<CoaddPixelT> &coadd,
+    lsst::afw::image::Image<WeightPixelT> &weightMap,
+    std::vector<std::shared_ptr<lsst::afw::image::Image<CoaddPixelT>>> const &imageList,
+    std::vector<WeightPixelT> const &weightList
+) {
+    typedef lsst::afw::image::Image<CoaddPixelT> Image;
+    return addManyToCoaddImpl<Image, WeightPixelT>(
+        coadd, weightMap, imageList, 0x0, weightList);
+}
+
+template <typename CoaddPixelT, typename WeightPixelT>
+std::vector<lsst::geom::Box2I> coaddUtils::addManyToCoadd(
+    // spell out lsst:afw::image to make Doxygen happy
+    lsst::afw::image::MaskedImage<CoaddPixelT, lsst::afw::image::MaskPixel,
+        lsst::afw::image::VariancePixel> &coadd,
+    lsst::afw::image::Image<WeightPixelT> &weightMap,
+    std::vector<std::shared_ptr<lsst::afw::image::MaskedImage<CoaddPixelT, lsst::afw::image::MaskPixel,
+        lsst::afw::image::VariancePixel>>> const &maskedImageList,
+    lsst::afw::image::MaskPixel const badPixelMask,
+    std::vector<WeightPixelT> const &weightList
+) {
+    typedef lsst::afw::image::MaskedImage<CoaddPixelT> Image;
+    return addManyToCoaddImpl<Image, WeightPixelT>(
+        coadd, weightMap, maskedImageList, badPixelMask, weightList);
+}
+
+template <typename CoaddPixelT, typename WeightPixelT>
+std::vector<lsst::geom::Box2I> coaddUtils::addToCoaddTargets(
+    // spell out lsst:afw::image to make Doxygen happy
+    std::vector<coaddUtils::CoaddTarget<CoaddPixelT, WeightPixelT>> const &targetList,
+    lsst::afw::image::MaskedImage<CoaddPixelT, lsst::afw::image::MaskPixel,
+        lsst::afw::image::VariancePixel> const &maskedImage
+) {
+    return addToCoaddTargetsImpl<CoaddPixelT, WeightPixelT>(targetList, maskedImage);
+}
+
+template <typename WeightPixelT>
+std::int64_t coaddUtils::countSaturatedWeights(
+    // spell out lsst:afw::image to make Doxygen happy
+    lsst::afw::image::Image<WeightPixelT> const &weightMap
+) {
+    std::atomic<std::int64_t> numSaturatedPix(0);
+    coaddUtils::detail::forEachRowBand(0, weightMap.getHeight(), [&](int bandBeginY, int bandEndY) {
+        coaddUtils::detail::RowPointer<WeightPixelT const> weightMapRow(
+            weightMap, weightMap.getX0(), weightMap.getY0() + bandBeginY);
+        std::int64_t bandNumSaturatedPix = 0;
+        for (int y = bandBeginY; y != bandEndY; ++y, ++weightMapRow) {
+            bandNumSaturatedPix += coaddUtils::detail::countSaturatedRow(weightMapRow.get(),
+                                                                         weightMap.getWidth());
+        }
+        numSaturatedPix += bandNumSaturatedPix;
+    });
+    return numSaturatedPix;
 }
 
 // Explicit instantiations
@@ -169,6 +1127,96 @@ lsst::geom::Box2I coaddUtils::addToCoadd(
         MASKEDIMAGE(COADDPIXEL) const &image, \
         afwImage::MaskPixel const badPixelMask, \
         WEIGHTPIXEL weight \
+    ); \
+    \
+    template lsst::geom::Box2I coaddUtils::addToCoadd<COADDPIXEL, WEIGHTPIXEL>( \
+        afwImage::Image<COADDPIXEL> &coadd, \
+        afwImage::Image<WEIGHTPIXEL> &weightMap, \
+        afwImage::Image<COADDPIXEL> const &image, \
+        afwImage::Image<WEIGHTPIXEL> const &weightImage \
+    ); \
+    \
+    template lsst::geom::Box2I coaddUtils::addToCoadd<COADDPIXEL, WEIGHTPIXEL>( \
+        MASKEDIMAGE(COADDPIXEL) &coadd, \
+        afwImage::Image<WEIGHTPIXEL> &weightMap, \
+        MASKEDIMAGE(COADDPIXEL) const &image, \
+        afwImage::MaskPixel const badPixelMask, \
+        afwImage::Image<WEIGHTPIXEL> const &weightImage \
+    ); \
+    \
+    template lsst::geom::Box2I coaddUtils::addToCoadd<COADDPIXEL, WEIGHTPIXEL>( \
+        afwImage::Image<COADDPIXEL> &coadd, \
+        afwImage::Image<WEIGHTPIXEL> &weightMap, \
+        afwImage::Image<COADDPIXEL> const &image, \
+        coaddUtils::GoodPixelSpans const &goodPixelSpans, \
+        WEIGHTPIXEL weight \
+    ); \
+    \
+    template lsst::geom::Box2I coaddUtils::addToCoadd<COADDPIXEL, WEIGHTPIXEL>( \
+        MASKEDIMAGE(COADDPIXEL) &coadd, \
+        afwImage::Image<WEIGHTPIXEL> &weightMap, \
+        MASKEDIMAGE(COADDPIXEL) const &image, \
+        coaddUtils::GoodPixelSpans const &goodPixelSpans, \
+        WEIGHTPIXEL weight \
+    ); \
+    \
+    template std::vector<lsst::geom::Box2I> coaddUtils::addToCoaddTargets<COADDPIXEL, WEIGHTPIXEL>( \
+        std::vector<coaddUtils::CoaddTarget<COADDPIXEL, WEIGHTPIXEL>> const &targetList, \
+        MASKEDIMAGE(COADDPIXEL) const &image \
+    ); \
+    \
+    template lsst::geom::Box2I coaddUtils::addToCoaddCompensated<COADDPIXEL, WEIGHTPIXEL>( \
+        MASKEDIMAGE(COADDPIXEL) &coadd, \
+        afwImage::Image<COADDPIXEL> &compensation, \
+        afwImage::Image<WEIGHTPIXEL> &weightMap, \
+        MASKEDIMAGE(COADDPIXEL) const &image, \
+        afwImage::MaskPixel const badPixelMask, \
+        WEIGHTPIXEL weight \
+    ); \
+    \
+    template lsst::geom::Box2I coaddUtils::addToCoaddWithProvenance<COADDPIXEL, WEIGHTPIXEL>( \
+        afwImage::Image<COADDPIXEL> &coadd, \
+        afwImage::Image<WEIGHTPIXEL> &weightMap, \
+        afwImage::Image<COADDPIXEL> const &image, \
+        WEIGHTPIXEL weight, \
+        afwImage::Image<int> *countMap, \
+        afwImage::Image<std::uint64_t> *provenanceMap, \
+        int inputIndex \
+    ); \
+    \
+    template lsst::geom::Box2I coaddUtils::addToCoaddWithProvenance<COADDPIXEL, WEIGHTPIXEL>( \
+        MASKEDIMAGE(COADDPIXEL) &coadd, \
+        afwImage::Image<WEIGHTPIXEL> &weightMap, \
+        MASKEDIMAGE(COADDPIXEL) const &image, \
+        afwImage::MaskPixel const badPixelMask, \
+        WEIGHTPIXEL weight, \
+        afwImage::Image<int> *countMap, \
+        afwImage::Image<std::uint64_t> *provenanceMap, \
+        int inputIndex \
+    ); \
+    \
+    template std::vector<lsst::geom::Box2I> coaddUtils::addManyToCoadd<COADDPIXEL, WEIGHTPIXEL>( \
+        afwImage::Image<COADDPIXEL> &coadd, \
+        afwImage::Image<WEIGHTPIXEL> &weightMap, \
+        std::vector<std::shared_ptr<afwImage::Image<COADDPIXEL>>> const &imageList, \
+        std::vector<WEIGHTPIXEL> const &weightList \
+    ); \
+    \
+    template std::vector<lsst::geom::Box2I> coaddUtils::addManyToCoadd<COADDPIXEL, WEIGHTPIXEL>( \
+        MASKEDIMAGE(COADDPIXEL) &coadd, \
+        afwImage::Image<WEIGHTPIXEL> &weightMap, \
+        std::vector<std::shared_ptr<MASKEDIMAGE(COADDPIXEL)>> const &maskedImageList, \
+        afwImage::MaskPixel const badPixelMask, \
+        std::vector<WEIGHTPIXEL> const &weightList \
+    );
+
+#define INSTANTIATE_INVERSE_VARIANCE(COADDPIXEL, WEIGHTPIXEL) \
+    template lsst::geom::Box2I coaddUtils::addToCoaddInverseVariance<COADDPIXEL, WEIGHTPIXEL>( \
+        MASKEDIMAGE(COADDPIXEL) &coadd, \
+        afwImage::Image<WEIGHTPIXEL> &weightMap, \
+        MASKEDIMAGE(COADDPIXEL) const &image, \
+        afwImage::MaskPixel const badPixelMask, \
+        WEIGHTPIXEL weight \
     );
 
 INSTANTIATE(double, double);
@@ -179,4 +1227,13 @@ INSTANTIATE(float, double);
 INSTANTIATE(float, float);
 INSTANTIATE(float, int);
 INSTANTIATE(float, std::uint16_t);
+INSTANTIATE_INVERSE_VARIANCE(double, double);
+INSTANTIATE_INVERSE_VARIANCE(double, float);
+INSTANTIATE_INVERSE_VARIANCE(float, double);
+INSTANTIATE_INVERSE_VARIANCE(float, float);
+template std::int64_t coaddUtils::countSaturatedWeights<double>(afwImage::Image<double> const &weightMap);
+template std::int64_t coaddUtils::countSaturatedWeights<float>(afwImage::Image<float> const &weightMap);
+template std::int64_t coaddUtils::countSaturatedWeights<int>(afwImage::Image<int> const &weightMap);
+template std::int64_t coaddUtils::countSaturatedWeights<std::uint16_t>(
+    afwImage::Image<std::uint16_t> const &weightMap);
 /// \endcond
@@ -0,0 +1,284 @@
+// -*- LSST-C++ -*-
+/*
+ * This file is part of coadd_utils.
+ *
+ * Developed for the LSST Data Management System.
+ * This product includes software developed by the LSST Project
+ * (https://www.lsst.org).
+ * See the COPYRIGHT file at the top-level directory of this distribution
+ * for details of code ownership.
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <https://www.gnu.org/licenses/>.
+ */
+
+#include <atomic>
+#include <cstdint>
+
+#include "boost/format.hpp"
+
+#include "lsst/pex/exceptions.h"
+#include "lsst/geom.h"
+#include "lsst/coadd/utils/arrayKernels.h"
+#include "lsst/coadd/utils/kernelStats.h"
+#include "lsst/coadd/utils/parallel.h"
+#include "lsst/coadd/utils/detail/bboxChecks.h"
+#include "lsst/coadd/utils/detail/overlapBands.h"
+#include "lsst/coadd/utils/detail/rowKernels.h"
+
+namespace pexExcept = lsst::pex::exceptions;
+namespace geom = lsst::geom;
+namespace afwImage = lsst::afw::image;
+namespace coaddUtils = lsst::coadd::utils;
+
+namespace {
+    using coaddUtils::PixelArray;
+    using coaddUtils::detail::assertSameBBox;
+
+    /*
+     * Call func(x0, y, width) for each row of the overlap of two bounding boxes,
+     * in bands of rows processed by up to getNumThreads() threads
+     *
+     * @return overlapping bounding box, relative to parent image
+     */
+    template <typename Func>
+    geom::Box2I forEachOverlapRow(
+        geom::Box2I const &destBBox,            ///< bounding box of the destination
+        geom::Box2I const &srcBBox,             ///< bounding box of the source
+        Func const &func                        ///< function to call for each row
+    ) {
+        return coaddUtils::detail::forEachOverlapBand(destBBox, srcBBox, [&](geom::Box2I const &bandBBox) {
+            for (int y = bandBBox.getBeginY(); y != bandBBox.getEndY(); ++y) {
+                func(bandBBox.getMinX(), y, bandBBox.getWidth());
+            }
+        });
+    }
+} // anonymous namespace
+
+template <typename CoaddPixelT, typename WeightPixelT>
+geom::Box2I coaddUtils::addToCoaddArrays(
+    PixelArray<CoaddPixelT> const &coadd,
+    PixelArray<WeightPixelT> const &weightMap,
+    PixelArray<CoaddPixelT const> const &image,
+    WeightPixelT weight
+) {
+    assertSameBBox(coadd, "coadd", weightMap, "weightMap");
+
+    coaddUtils::detail::KernelStatsRecorder stats(coaddUtils::detail::Kernel::ADD_TO_COADD);
+    std::atomic<std::int64_t> numGoodPix(0);
+    geom::Box2I const overlapBBox = forEachOverlapRow(coadd.getBBox(), image.getBBox(),
+                                                      [&](int x0, int y, int width) {
+        coaddUtils::detail::addRowToCoadd(coadd.getPixelPtr(x0, y), weightMap.getPixelPtr(x0, y),
+                                          image.getPixelPtr(x0, y), width, weight);
+        if (stats.isEnabled()) {
+            numGoodPix += coaddUtils::detail::countGoodRow(image.getPixelPtr(x0, y), width);
+        }
+    });
+    if (stats.isEnabled()) {
+        // the image is read; the coadd and weight map are read and written
+        std::int64_t const numPix = overlapBBox.getArea();
+        std::int64_t const pixelBytes =
+                sizeof(CoaddPixelT) + 2 * (sizeof(CoaddPixelT) + sizeof(WeightPixelT));
+        stats.addPixels(numPix, numGoodPix, numPix * pixelBytes);
+    }
+    return overlapBBox;
+}
+
+template <typename CoaddPixelT, typename WeightPixelT>
+geom::Box2I coaddUtils::addToCoaddArrays(
+    PixelArray<CoaddPixelT> const &coaddImage,
+    PixelArray<afwImage::MaskPixel> const &coaddMask,
+    PixelArray<afwImage::VariancePixel> const &coaddVariance,
+    PixelArray<WeightPixelT> const &weightMap,
+    PixelArray<CoaddPixelT const> const &image,
+    PixelArray<afwImage::MaskPixel const> const &mask,
+    PixelArray<afwImage::VariancePixel const> const &variance,
+    afwImage::MaskPixel const badPixelMask,
+    WeightPixelT weight
+) {
+    assertSameBBox(coaddImage, "coaddImage", coaddMask, "coaddMask");
+    assertSameBBox(coaddImage, "coaddImage", coaddVariance, "coaddVariance");
+    assertSameBBox(coaddImage, "coaddImage", weightMap, "weightMap");
+    assertSameBBox(image, "image", mask, "mask");
+    assertSameBBox(image, "image", variance, "variance");
+
+    coaddUtils::detail::KernelStatsRecorder stats(coaddUtils::detail::Kernel::ADD_TO_COADD);
+    std::atomic<std::int64_t> numGoodPix(0);
+    geom::Box2I const overlapBBox = forEachOverlapRow(coaddImage.getBBox(), image.getBBox(),
+                                                      [&](int x0, int y, int width) {
+        coaddUtils::detail::addRowToCoadd(
+            coaddImage.getPixelPtr(x0, y), coaddMask.getPixelPtr(x0, y), coaddVariance.getPixelPtr(x0, y),
+            weightMap.getPixelPtr(x0, y), image.getPixelPtr(x0, y), mask.getPixelPtr(x0, y),
+            variance.getPixelPtr(x0, y), width, badPixelMask, weight);
+        if (stats.isEnabled()) {
+            numGoodPix += coaddUtils::detail::countGoodRow(mask.getPixelPtr(x0, y), width, badPixelMask);
+        }
+    });
+    if (stats.isEnabled()) {
+        // the image is read; the coadd and weight map are read and written
+        std::int64_t const numPix = overlapBBox.getArea();
+        std::int64_t const maskedPixelBytes =
+                sizeof(CoaddPixelT) + sizeof(afwImage::MaskPixel) + sizeof(afwImage::VariancePixel);
+        std::int64_t const pixelBytes = maskedPixelBytes + 2 * (maskedPixelBytes + sizeof(WeightPixelT));
+        stats.addPixels(numPix, numGoodPix, numPix * pixelBytes);
+    }
+    return overlapBBox;
+}
+
+template <typename ImagePixelT>
+int coaddUtils::copyGoodPixelsArrays(
+    PixelArray<ImagePixelT> const &destImage,
+    PixelArray<ImagePixelT const> const &srcImage
+) {
+    coaddUtils::detail::KernelStatsRecorder stats(coaddUtils::detail::Kernel::COPY_GOOD_PIXELS);
+    std::atomic<int> numGoodPix(0);
+    geom::Box2I const overlapBBox = forEachOverlapRow(destImage.getBBox(), srcImage.getBBox(),
+                                                      [&](int x0, int y, int width) {
+        numGoodPix += coaddUtils::detail::copyGoodRow(destImage.getPixelPtr(x0, y),
+                                                      srcImage.getPixelPtr(x0, y), width);
+    });
+    if (stats.isEnabled()) {
+        // the source is read and the destination is read and written
+        std::int64_t const numPix = overlapBBox.getArea();
+        std::int64_t const pixelBytes = 3 * sizeof(ImagePixelT);
+        stats.addPixels(numPix, numGoodPix, numPix * pixelBytes);
+    }
+    return numGoodPix;
+}
+
+template <typename ImagePixelT>
+int coaddUtils::copyGoodPixelsArrays(
+    PixelArray<ImagePixelT> const &destImage,
+    PixelArray<afwImage::MaskPixel> const &destMask,
+    PixelArray<afwImage::VariancePixel> const &destVariance,
+    PixelArray<ImagePixelT const> const &srcImage,
+    PixelArray<afwImage::MaskPixel const> const &srcMask,
+    PixelArray<afwImage::VariancePixel const> const &srcVariance,
+    afwImage::MaskPixel const badPixelMask
+) {
+    assertSameBBox(destImage, "destImage", destMask, "destMask");
+    assertSameBBox(destImage, "destImage", destVariance, "destVariance");
+    assertSameBBox(srcImage, "srcImage", srcMask, "srcMask");
+    assertSameBBox(srcImage, "srcImage", srcVariance, "srcVariance");
+
+    coaddUtils::detail::KernelStatsRecorder stats(coaddUtils::detail::Kernel::COPY_GOOD_PIXELS);
+    std::atomic<int> numGoodPix(0);
+    geom::Box2I const overlapBBox = forEachOverlapRow(destImage.getBBox(), srcImage.getBBox(),
+                                                      [&](int x0, int y, int width) {
+        numGoodPix += coaddUtils::detail::copyGoodRow(
+            destImage.getPixelPtr(x0, y), destMask.getPixelPtr(x0, y), destVariance.getPixelPtr(x0, y),
+            srcImage.getPixelPtr(x0, y), srcMask.getPixelPtr(x0, y), srcVariance.getPixelPtr(x0, y),
+            width, badPixelMask);
+    });
+    if (stats.isEnabled()) {
+        // the source is read and the destination is read and written
+        std::int64_t const numPix = overlapBBox.getArea();
+        std::int64_t const pixelBytes =
+                3 * (sizeof(ImagePixelT) + sizeof(afwImage::MaskPixel) + sizeof(afwImage::VariancePixel));
+        stats.addPixels(numPix, numGoodPix, numPix * pixelBytes);
+    }
+    return numGoodPix;
+}
+
+template <typename WeightPixelT>
+void coaddUtils::setCoaddEdgeBitsArrays(
+    PixelArray<afwImage::MaskPixel> const &coaddMask,
+    PixelArray<WeightPixelT const> const &weightMap,
+    afwImage::MaskPixel const edgeMask
+) {
+    if (coaddMask.width != weightMap.width || coaddMask.height != weightMap.height) {
+        throw LSST_EXCEPT(pexExcept::InvalidParameterError,
+            (boost::format("coaddMask and weightMap dimensions differ: %dx%d != %dx%d") %
+            coaddMask.width % coaddMask.height % weightMap.width % weightMap.height).str());
+    }
+
+    coaddUtils::detail::KernelStatsRecorder stats(coaddUtils::detail::Kernel::SET_COADD_EDGE_BITS);
+
+    // match the arrays by position, not parent bbox, as setCoaddEdgeBits does
+    std::atomic<std::int64_t> numGoodPix(0);
+    coaddUtils::detail::forEachRowBand(0, weightMap.height, [&](int bandBeginY, int bandEndY) {
+        for (int y = bandBeginY; y != bandEndY; ++y) {
+            WeightPixelT const *weightMapRow = weightMap.data + y * weightMap.rowStride;
+            coaddUtils::detail::setEdgeBitsRow(coaddMask.data + y * coaddMask.rowStride, weightMapRow,
+                                               weightMap.width, edgeMask);
+            if (stats.isEnabled()) {
+                numGoodPix += coaddUtils::detail::countNonzeroRow(weightMapRow, weightMap.width);
+            }
+        }
+    });
+    if (stats.isEnabled()) {
+        // the weight map is read and the mask is read and written
+        std::int64_t const numPix = static_cast<std::int64_t>(weightMap.width) * weightMap.height;
+        std::int64_t const pixelBytes = sizeof(WeightPixelT) + 2 * sizeof(afwImage::MaskPixel);
+        stats.addPixels(numPix, numGoodPix, numPix * pixelBytes);
+    }
+}
+
+// Explicit instantiations
+
+/// \cond
+#define INSTANTIATE(COADDPIXEL, WEIGHTPIXEL) \
+    template geom::Box2I coaddUtils::addToCoaddArrays<COADDPIXEL, WEIGHTPIXEL>( \
+        PixelArray<COADDPIXEL> const &coadd, \
+        PixelArray<WEIGHTPIXEL> const &weightMap, \
+        PixelArray<COADDPIXEL const> const &image, \
+        WEIGHTPIXEL weight \
+    ); \
+    \
+    template geom::Box2I coaddUtils::addToCoaddArrays<COADDPIXEL, WEIGHTPIXEL>( \
+        PixelArray<COADDPIXEL> const &coaddImage, \
+        PixelArray<afwImage::MaskPixel> const &coaddMask, \
+        PixelArray<afwImage::VariancePixel> const &coaddVariance, \
+        PixelArray<WEIGHTPIXEL> const &weightMap, \
+        PixelArray<COADDPIXEL const> const &image, \
+        PixelArray<afwImage::MaskPixel const> const &mask, \
+        PixelArray<afwImage::VariancePixel const> const &variance, \
+        afwImage::MaskPixel const badPixelMask, \
+        WEIGHTPIXEL weight \
+    );
+
+#define INSTANTIATE_PIXEL(PIXEL) \
+    template int coaddUtils::copyGoodPixelsArrays<PIXEL>( \
+        PixelArray<PIXEL> const &destImage, \
+        PixelArray<PIXEL const> const &srcImage \
+    ); \
+    \
+    template int coaddUtils::copyGoodPixelsArrays<PIXEL>( \
+        PixelArray<PIXEL> const &destImage, \
+        PixelArray<afwImage::MaskPixel> const &destMask, \
+        PixelArray<afwImage::VariancePixel> const &destVariance, \
+        PixelArray<PIXEL const> const &srcImage, \
+        PixelArray<afwImage::MaskPixel const> const &srcMask, \
+        PixelArray<afwImage::VariancePixel const> const &srcVariance, \
+        afwImage::MaskPixel const badPixelMask \
+    ); \
+    \
+    template void coaddUtils::setCoaddEdgeBitsArrays<PIXEL>( \
+        PixelArray<afwImage::MaskPixel> const &coaddMask, \
+        PixelArray<PIXEL const> const &weightMap, \
+        afwImage::MaskPixel const edgeMask \
+    );
+
+INSTANTIATE(double, double);
+INSTANTIATE(double, float);
+INSTANTIATE(double, int);
+INSTANTIATE(double, std::uint16_t);
+INSTANTIATE(float, double);
+INSTANTIATE(float, float);
+INSTANTIATE(float, int);
+INSTANTIATE(float, std::uint16_t);
+INSTANTIATE_PIXEL(double);
+INSTANTIATE_PIXEL(float);
+INSTANTIATE_PIXEL(int);
+INSTANTIATE_PIXEL(std::uint16_t);
+/// \endcond
@@ -27,86 +27,184 @@
 *
 * @author Russell Owen
 */
+#include <algorithm>
+#include <atomic>
+#include <cstddef>
 #include <cstdint>
 #include <limits>
 
-#include "boost/format.hpp"
-
-#include "lsst/pex/exceptions.h"
 #include "lsst/geom.h"
 #include "lsst/coadd/utils/copyGoodPixels.h"
+#include "lsst/coadd/utils/kernelStats.h"
+#include "lsst/coadd/utils/detail/imageHelpers.h"
+#include "lsst/coadd/utils/detail/overlapBands.h"
+#include "lsst/coadd/utils/detail/rowKernels.h"
 
-namespace pexExcept = lsst::pex::exceptions;
 namespace geom = lsst::geom;
 namespace afwImage = lsst::afw::image;
 namespace coaddUtils = lsst::coadd::utils;
 
 namespace {
+    using coaddUtils::detail::assertSameSpansBBox;
+    using coaddUtils::detail::copyGoodRow;
+    using coaddUtils::detail::forEachOverlapBand;
+    using coaddUtils::detail::getPixelBytes;
+    using coaddUtils::detail::RowPointer;
+
     /*
-     * A boolean functor to test if a MaskedImage pixel is valid (mask & badPixel == 0)
+     * Copy the good pixels of an image inside bbox; good pixels are those that are not NaN
+     *
+     * bbox must be contained in the bounding boxes of destImage and srcImage.
+     *
+     * @return number of pixels copied
      */
-    struct CheckMask {
-        CheckMask(lsst::afw::image::MaskPixel badPixel) : _badPixel(badPixel) {}
+    template <typename ImagePixelT>
+    int copyGoodBBox(
+        afwImage::Image<ImagePixelT> &destImage,            ///< [in,out] image to modify
+        afwImage::Image<ImagePixelT> const &srcImage,       ///< image to copy
+        lsst::geom::Box2I const &bbox,                      ///< region to copy, relative to parent image
+        afwImage::MaskPixel const                           ///< bad pixel mask; ignored
+    ) {
+        int const x0 = bbox.getMinX(), y0 = bbox.getMinY();
+        RowPointer<ImagePixelT> destRow(destImage, x0, y0);
+        RowPointer<ImagePixelT const> srcRow(srcImage, x0, y0);
 
-        template<typename T>
-        bool operator()(T val) const {
-            return ((val.mask() & _badPixel) == 0) ? true : false;
+        int numGoodPix = 0;
+        for (int y = 0, endY = bbox.getHeight(); y != endY; ++y) {
+            numGoodPix += copyGoodRow(destRow.get(), srcRow.get(), bbox.getWidth());
+            ++destRow, ++srcRow;
         }
-    private:
-        lsst::afw::image::MaskPixel _badPixel;
-    };
+        return numGoodPix;
+    }
 
     /*
-     * A boolean functor to test if an Image pixel has known value (not NaN)
+     * Copy the good pixels of a masked image inside bbox; good pixels are those for which
+     * mask & badPixelMask == 0
+     *
+     * bbox must be contained in the bounding boxes of destImage and srcImage.
+     *
+     * @return number of pixels copied
      */
-    struct CheckKnownValue {
-        CheckKnownValue(lsst::afw::image::MaskPixel) {}
+    template <typename ImagePixelT>
+    int copyGoodBBox(
+        afwImage::MaskedImage<ImagePixelT> &destImage,          ///< [in,out] image to modify
+        afwImage::MaskedImage<ImagePixelT> const &srcImage,     ///< image to copy
+        lsst::geom::Box2I const &bbox,                          ///< region to copy, relative to parent image
+        afwImage::MaskPixel const badPixelMask                  ///< skip pixel if mask & badPixelMask != 0
+    ) {
+        int const x0 = bbox.getMinX(), y0 = bbox.getMinY();
+        RowPointer<ImagePixelT> destImageRow(*destImage.getImage(), x0, y0);
+        RowPointer<afwImage::MaskPixel> destMaskRow(*destImage.getMask(), x0, y0);
+        RowPointer<afwImage::VariancePixel> destVarianceRow(*destImage.getVariance(), x0, y0);
+        RowPointer<ImagePixelT const> srcImageRow(*srcImage.getImage(), x0, y0);
+        RowPointer<afwImage::MaskPixel const> srcMaskRow(*srcImage.getMask(), x0, y0);
+        RowPointer<afwImage::VariancePixel const> srcVarianceRow(*srcImage.getVariance(), x0, y0);
 
-        template<typename T>
-        bool operator()(T val) const {
-            return !std::isnan(static_cast<float>(*val));
+        int numGoodPix = 0;
+        for (int y = 0, endY = bbox.getHeight(); y != endY; ++y) {
+            numGoodPix += copyGoodRow(destImageRow.get(), destMaskRow.get(), destVarianceRow.get(),
+                                      srcImageRow.get(), srcMaskRow.get(), srcVarianceRow.get(),
+                                      bbox.getWidth(), badPixelMask);
+            ++destImageRow, ++destMaskRow, ++destVarianceRow;
+            ++srcImageRow, ++srcMaskRow, ++srcVarianceRow;
         }
-    };
+        return numGoodPix;
+    }
 
     /*
-     * Implementation of copyGoodPixels
+     * Copy the spans of good pixels of an image inside bbox
      *
-     * The template parameter isValidPixel is a functor with operator()
-     * which returns true if a given image pixel is valid.
-     * This allows us to support multiple image types including
-     * MaskedImage with a mask bit and Image with a check for NaN.
+     * bbox must be contained in the bounding boxes of destImage and srcImage.
      *
-     * @return overlapping bounding box, relative to parent image
+     * @return number of pixels copied
      */
-    template <typename ImageT, typename isValidPixel>
-    int copyGoodPixelsImpl(
-        ImageT &destImage,                                  ///< [in,out] image to modify
-        ImageT const &srcImage,                             ///< image to copy
-        lsst::afw::image::MaskPixel const badPixelMask      ///< bad pixel mask; may be ignored
+    template <typename ImagePixelT>
+    int copyGoodBBox(
+        afwImage::Image<ImagePixelT> &destImage,            ///< [in,out] image to modify
+        afwImage::Image<ImagePixelT> const &srcImage,       ///< image to copy
+        lsst::geom::Box2I const &bbox,                      ///< region to copy, relative to parent image
+        coaddUtils::GoodPixelSpans const &goodPixelSpans    ///< good pixels of srcImage
     ) {
-        geom::Box2I overlapBBox = destImage.getBBox();
-        overlapBBox.clip(srcImage.getBBox());
-        if (overlapBBox.isEmpty()) {
-            return 0;
+        int const x0 = bbox.getMinX(), y0 = bbox.getMinY();
+        RowPointer<ImagePixelT> destRow(destImage, x0, y0);
+        RowPointer<ImagePixelT const> srcRow(srcImage, x0, y0);
+
+        int numGoodPix = 0;
+        for (int y = y0, endY = bbox.getEndY(); y != endY; ++y) {
+            goodPixelSpans.forEachSpan(y, x0, bbox.getEndX(), [&](int beginX, int endX) {
+                int const dx = beginX - x0;
+                std::copy(srcRow.get() + dx, srcRow.get() + dx + (endX - beginX), destRow.get() + dx);
+                numGoodPix += endX - beginX;
+            });
+            ++destRow, ++srcRow;
         }
+        return numGoodPix;
+    }
 
-        ImageT destView(destImage, overlapBBox, afwImage::PARENT, false);
-        ImageT srcView(srcImage, overlapBBox, afwImage::PARENT, false);
+    /*
+     * Copy the spans of good pixels of a masked image inside bbox
+     *
+     * bbox must be contained in the bounding boxes of destImage and srcImage.
+     *
+     * @return number of pixels copied
+     */
+    template <typename ImagePixelT>
+    int copyGoodBBox(
+        afwImage::MaskedImage<ImagePixelT> &destImage,          ///< [in,out] image to modify
+        afwImage::MaskedImage<ImagePixelT> const &srcImage,     ///< image to copy
+        lsst::geom::Box2I const &bbox,                          ///< region to copy, relative to parent image
+        coaddUtils::GoodPixelSpans const &goodPixelSpans        ///< good pixels of srcImage
+    ) {
+        int const x0 = bbox.getMinX(), y0 = bbox.getMinY();
+        RowPointer<ImagePixelT> destImageRow(*destImage.getImage(), x0, y0);
+        RowPointer<afwImage::MaskPixel> destMaskRow(*destImage.getMask(), x0, y0);
+        RowPointer<afwImage::VariancePixel> destVarianceRow(*destImage.getVariance(), x0, y0);
+        RowPointer<ImagePixelT const> srcImageRow(*srcImage.getImage(), x0, y0);
+        RowPointer<afwImage::MaskPixel const> srcMaskRow(*srcImage.getMask(), x0, y0);
+        RowPointer<afwImage::VariancePixel const> srcVarianceRow(*srcImage.getVariance(), x0, y0);
 
-        isValidPixel const isValid(badPixelMask); // functor to check if a pixel is good
         int numGoodPix = 0;
-        for (int y = 0, endY = srcView.getHeight(); y != endY; ++y) {
-            typename ImageT::const_x_iterator srcIter = srcView.row_begin(y);
-            typename ImageT::const_x_iterator const srcEndIter = srcView.row_end(y);
-            typename ImageT::x_iterator destIter = destView.row_begin(y);
-            for (; srcIter != srcEndIter; ++srcIter, ++destIter) {
-                if (isValid(srcIter)) {
-                    *destIter = *srcIter;
-//                     typename ImageT::SinglePixel pix = *srcIter;
-//                     *destIter = pix;
-                    ++numGoodPix;
-                }
-            }
+        for (int y = y0, endY = bbox.getEndY(); y != endY; ++y) {
+            goodPixelSpans.forEachSpan(y, x0, bbox.getEndX(), [&](int beginX, int endX) {
+                int const dx = beginX - x0, width = endX - beginX;
+                std::copy(srcImageRow.get() + dx, srcImageRow.get() + dx + width, destImageRow.get() + dx);
+                std::copy(srcMaskRow.get() + dx, srcMaskRow.get() + dx + width, destMaskRow.get() + dx);
+                std::copy(srcVarianceRow.get() + dx, srcVarianceRow.get() + dx + width,
+                          destVarianceRow.get() + dx);
+                numGoodPix += width;
+            });
+            ++destImageRow, ++destMaskRow, ++destVarianceRow;
+            ++srcImageRow, ++srcMaskRow, ++srcVarianceRow;
+        }
+        return numGoodPix;
+    }
+
+    /*
+     * Implementation of copyGoodPixels
+     *
+     * ImageT may be an Image, whose good pixels are those that are not NaN,
+     * or a MaskedImage, whose good pixels are those for which mask & badPixelMask == 0.
+     * GoodT is the bad pixel mask (ignored for an Image) or a GoodPixelSpans for srcImage.
+     *
+     * @return number of pixels copied
+     */
+    template <typename ImageT, typename GoodT>
+    int copyGoodPixelsImpl(
+        ImageT &destImage,                                  ///< [in,out] image to modify
+        ImageT const &srcImage,                             ///< image to copy
+        GoodT const &good                                   ///< which pixels of srcImage are good
+    ) {
+        coaddUtils::detail::KernelStatsRecorder stats(coaddUtils::detail::Kernel::COPY_GOOD_PIXELS);
+        std::atomic<int> numGoodPix(0);
+        geom::Box2I const overlapBBox = forEachOverlapBand(destImage.getBBox(), srcImage.getBBox(),
+            [&](geom::Box2I const &bandBBox) {
+                numGoodPix += copyGoodBBox(destImage, srcImage, bandBBox, good);
+            });
+        if (stats.isEnabled()) {
+            // the source is read and the destination is read and written
+            std::int64_t const numPix = overlapBBox.getArea();
+            std::int64_t const pixelBytes = 3 * getPixelBytes(srcImage);
+            stats.addPixels(numPix, numGoodPix, numPix * pixelBytes);
         }
         return numGoodPix;
     }
@@ -119,7 +217,7 @@ int coaddUtils::copyGoodPixels(
     lsst::afw::image::Image<ImagePixelT> const &srcImage
 ) {
     typedef lsst::afw::image::Image<ImagePixelT> Image;
-    return copyGoodPixelsImpl<Image, CheckKnownValue>(destImage, srcImage, 0x0);
+    return copyGoodPixelsImpl<Image>(destImage, srcImage, afwImage::MaskPixel(0x0));
 }
 
 template <typename ImagePixelT>
@@ -132,7 +230,33 @@ int coaddUtils::copyGoodPixels(
     lsst::afw::image::MaskPixel const badPixelMask
 ) {
     typedef lsst::afw::image::MaskedImage<ImagePixelT> Image;
-    return copyGoodPixelsImpl<Image, CheckMask>(destImage, srcImage, badPixelMask);
+    return copyGoodPixelsImpl<Image>(destImage, srcImage, badPixelMask);
+}
+
+template <typename ImagePixelT>
+int coaddUtils::copyGoodPixels(
+    // spell out lsst:afw::image to make Doxygen happy
+    lsst::afw::image::Image<ImagePixelT> &destImage,
+    lsst::afw::image::Image<ImagePixelT> const &srcImage,
+    GoodPixelSpans const &goodPixelSpans
+) {
+    typedef lsst::afw::image::Image<ImagePixelT> Image;
+    assertSameSpansBBox(srcImage, goodPixelSpans, "srcImage");
+    return copyGoodPixelsImpl<Image>(destImage, srcImage, goodPixelSpans);
+}
+
+template <typename ImagePixelT>
+int coaddUtils::copyGoodPixels(
+    // spell out lsst:afw::image to make Doxygen happy
+    lsst::afw::image::MaskedImage<ImagePixelT, lsst::afw::image::MaskPixel,
+        lsst::afw::image::VariancePixel> &destImage,
+    lsst::afw::image::MaskedImage<ImagePixelT, lsst::afw::image::MaskPixel,
+        lsst::afw::image::VariancePixel> const &srcImage,
+    GoodPixelSpans const &goodPixelSpans
+) {
+    typedef lsst::afw::image::MaskedImage<ImagePixelT> Image;
+    assertSameSpansBBox(srcImage, goodPixelSpans, "srcImage");
+    return copyGoodPixelsImpl<Image>(destImage, srcImage, goodPixelSpans);
 }
 
 // Explicit instantiations
@@ -150,6 +274,18 @@ int coaddUtils::copyGoodPixels(
         MASKEDIMAGE(IMAGEPIXEL) &destImage, \
         MASKEDIMAGE(IMAGEPIXEL) const &srcImage, \
         afwImage::MaskPixel const badPixelMask \
+    ); \
+    \
+    template int coaddUtils::copyGoodPixels<IMAGEPIXEL>( \
+        afwImage::Image<IMAGEPIXEL> &destImage, \
+        afwImage::Image<IMAGEPIXEL> const &srcImage, \
+        coaddUtils::GoodPixelSpans const &goodPixelSpans \
+    ); \
+    \
+    template int coaddUtils::copyGoodPixels<IMAGEPIXEL>( \
+        MASKEDIMAGE(IMAGEPIXEL) &destImage, \
+        MASKEDIMAGE(IMAGEPIXEL) const &srcImage, \
+        coaddUtils::GoodPixelSpans const &goodPixelSpans \
     );
 
 INSTANTIATE(double);
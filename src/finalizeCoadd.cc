@@ -0,0 +1,115 @@
+// -*- LSST-C++ -*-
+/*
+ * This file is part of coadd_utils.
+ *
+ * Developed for the LSST Data Management System.
+ * This product includes software developed by the LSST Project
+ * (https://www.lsst.org).
+ * See the COPYRIGHT file at the top-level directory of this distribution
+ * for details of code ownership.
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <https://www.gnu.org/licenses/>.
+ */
+
+#include <cstdint>
+
+#include "lsst/geom.h"
+#include "lsst/coadd/utils/finalizeCoadd.h"
+#include "lsst/coadd/utils/parallel.h"
+#include "lsst/coadd/utils/detail/imageHelpers.h"
+#include "lsst/coadd/utils/detail/rowKernels.h"
+
+namespace geom = lsst::geom;
+namespace afwImage = lsst::afw::image;
+namespace coaddUtils = lsst::coadd::utils;
+
+namespace {
+    using coaddUtils::detail::assertSameBBox;
+    using coaddUtils::detail::finalizeRow;
+    using coaddUtils::detail::RowPointer;
+} // anonymous namespace
+
+template <typename CoaddPixelT, typename WeightPixelT>
+void coaddUtils::finalizeCoadd(
+    // spell out lsst:afw::image to make Doxygen happy
+    lsst::afw::image::Image<CoaddPixelT> &coadd,
+    lsst::afw::image::Image<WeightPixelT> const &weightMap,
+    bool fillNaN
+) {
+    assertSameBBox(coadd, weightMap);
+
+    int const x0 = coadd.getX0(), y0 = coadd.getY0();
+    coaddUtils::detail::forEachRowBand(0, coadd.getHeight(), [&](int bandBeginY, int bandEndY) {
+        RowPointer<CoaddPixelT> coaddRow(coadd, x0, y0 + bandBeginY);
+        RowPointer<WeightPixelT const> weightMapRow(weightMap, x0, y0 + bandBeginY);
+        for (int y = bandBeginY; y != bandEndY; ++y) {
+            finalizeRow(coaddRow.get(), weightMapRow.get(), coadd.getWidth(), fillNaN);
+            ++coaddRow, ++weightMapRow;
+        }
+    });
+}
+
+template <typename CoaddPixelT, typename WeightPixelT>
+void coaddUtils::finalizeCoadd(
+    // spell out lsst:afw::image to make Doxygen happy
+    lsst::afw::image::MaskedImage<CoaddPixelT, lsst::afw::image::MaskPixel,
+        lsst::afw::image::VariancePixel> &coadd,
+    lsst::afw::image::Image<WeightPixelT> const &weightMap,
+    bool fillNaN
+) {
+    assertSameBBox(coadd, weightMap);
+
+    afwImage::MaskPixel const edgeMask = afwImage::Mask<afwImage::MaskPixel>::getPlaneBitMask("NO_DATA");
+
+    int const x0 = coadd.getX0(), y0 = coadd.getY0();
+    coaddUtils::detail::forEachRowBand(0, coadd.getHeight(), [&](int bandBeginY, int bandEndY) {
+        RowPointer<CoaddPixelT> coaddImageRow(*coadd.getImage(), x0, y0 + bandBeginY);
+        RowPointer<afwImage::MaskPixel> coaddMaskRow(*coadd.getMask(), x0, y0 + bandBeginY);
+        RowPointer<afwImage::VariancePixel> coaddVarianceRow(*coadd.getVariance(), x0, y0 + bandBeginY);
+        RowPointer<WeightPixelT const> weightMapRow(weightMap, x0, y0 + bandBeginY);
+        for (int y = bandBeginY; y != bandEndY; ++y) {
+            finalizeRow(coaddImageRow.get(), coaddMaskRow.get(), coaddVarianceRow.get(), weightMapRow.get(),
+                        coadd.getWidth(), edgeMask, fillNaN);
+            ++coaddImageRow, ++coaddMaskRow, ++coaddVarianceRow, ++weightMapRow;
+        }
+    });
+}
+
+// Explicit instantiations
+
+/// \cond
+#define MASKEDIMAGE(IMAGEPIXEL) afwImage::MaskedImage<IMAGEPIXEL, \
+    afwImage::MaskPixel, afwImage::VariancePixel>
+#define INSTANTIATE(COADDPIXEL, WEIGHTPIXEL) \
+    template void coaddUtils::finalizeCoadd<COADDPIXEL, WEIGHTPIXEL>( \
+        afwImage::Image<COADDPIXEL> &coadd, \
+        afwImage::Image<WEIGHTPIXEL> const &weightMap, \
+        bool fillNaN \
+    ); \
+    \
+    template void coaddUtils::finalizeCoadd<COADDPIXEL, WEIGHTPIXEL>( \
+        MASKEDIMAGE(COADDPIXEL) &coadd, \
+        afwImage::Image<WEIGHTPIXEL> const &weightMap, \
+        bool fillNaN \
+    );
+
+INSTANTIATE(double, double);
+INSTANTIATE(double, float);
+INSTANTIATE(double, int);
+INSTANTIATE(double, std::uint16_t);
+INSTANTIATE(float, double);
+INSTANTIATE(float, float);
+INSTANTIATE(float, int);
+INSTANTIATE(float, std::uint16_t);
+/// \endcond
@@ -0,0 +1,162 @@
+// -*- LSST-C++ -*-
+/*
+ * This file is part of coadd_utils.
+ *
+ * Developed for the LSST Data Management System.
+ * This product includes software developed by the LSST Project
+ * (https://www.lsst.org).
+ * See the COPYRIGHT file at the top-level directory of this distribution
+ * for details of code ownership.
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <https://www.gnu.org/licenses/>.
+ */
+
+#include <array>
+#include <atomic>
+#include <cstdint>
+#include <map>
+#include <mutex>
+#include <set>
+#include <string>
+
+#include "lsst/coadd/utils/kernelStats.h"
+
+namespace coaddUtils = lsst::coadd::utils;
+using coaddUtils::detail::Kernel;
+
+namespace {
+    int const NUM_KERNELS = static_cast<int>(Kernel::NUM_KERNELS);
+
+    /// Names of the kernels, in the order of Kernel
+    char const *const KERNEL_NAMES[NUM_KERNELS] = {"addToCoadd", "copyGoodPixels", "setCoaddEdgeBits"};
+
+    /*
+     * Counters of one kernel
+     *
+     * Counters are atomic so they may be read and reset by other threads while the owning thread
+     * updates them; they are only ever updated by one thread, so updates never contend.
+     */
+    struct AtomicKernelStats {
+        std::atomic<std::int64_t> numCalls{0};
+        std::atomic<std::int64_t> numEmptyCalls{0};
+        std::atomic<std::int64_t> numPixels{0};
+        std::atomic<std::int64_t> numGoodPixels{0};
+        std::atomic<std::int64_t> numBytes{0};
+        std::atomic<std::int64_t> nanoseconds{0};
+
+        void add(std::int64_t calls, std::int64_t emptyCalls, std::int64_t pixels, std::int64_t goodPixels,
+                 std::int64_t bytes, std::int64_t nsec) {
+            numCalls.fetch_add(calls, std::memory_order_relaxed);
+            numEmptyCalls.fetch_add(emptyCalls, std::memory_order_relaxed);
+            numPixels.fetch_add(pixels, std::memory_order_relaxed);
+            numGoodPixels.fetch_add(goodPixels, std::memory_order_relaxed);
+            numBytes.fetch_add(bytes, std::memory_order_relaxed);
+            nanoseconds.fetch_add(nsec, std::memory_order_relaxed);
+        }
+
+        void addTo(AtomicKernelStats &other) const {
+            other.add(numCalls.load(std::memory_order_relaxed), numEmptyCalls.load(std::memory_order_relaxed),
+                      numPixels.load(std::memory_order_relaxed), numGoodPixels.load(std::memory_order_relaxed),
+                      numBytes.load(std::memory_order_relaxed), nanoseconds.load(std::memory_order_relaxed));
+        }
+
+        void addTo(coaddUtils::KernelStats &stats) const {
+            stats.numCalls += numCalls.load(std::memory_order_relaxed);
+            stats.numEmptyCalls += numEmptyCalls.load(std::memory_order_relaxed);
+            stats.numPixels += numPixels.load(std::memory_order_relaxed);
+            stats.numGoodPixels += numGoodPixels.load(std::memory_order_relaxed);
+            stats.numBytes += numBytes.load(std::memory_order_relaxed);
+            stats.seconds += nanoseconds.load(std::memory_order_relaxed) * 1.0e-9;
+        }
+
+        void reset() {
+            numCalls.store(0, std::memory_order_relaxed);
+            numEmptyCalls.store(0, std::memory_order_relaxed);
+            numPixels.store(0, std::memory_order_relaxed);
+            numGoodPixels.store(0, std::memory_order_relaxed);
+            numBytes.store(0, std::memory_order_relaxed);
+            nanoseconds.store(0, std::memory_order_relaxed);
+        }
+    };
+
+    typedef std::array<AtomicKernelStats, NUM_KERNELS> StatsBlock;
+
+    std::mutex registryMutex;
+    std::set<StatsBlock *> registry;    ///< counters of each live thread that has called a kernel
+    StatsBlock retiredStats;            ///< counters of threads that have exited
+
+    /*
+     * Counters of one thread, registered while the thread is alive
+     */
+    struct ThreadStats {
+        StatsBlock block;
+
+        ThreadStats() {
+            std::lock_guard<std::mutex> lock(registryMutex);
+            registry.insert(&block);
+        }
+
+        ~ThreadStats() {
+            std::lock_guard<std::mutex> lock(registryMutex);
+            for (int i = 0; i < NUM_KERNELS; ++i) {
+                block[i].addTo(retiredStats[i]);
+            }
+            registry.erase(&block);
+        }
+    };
+
+    StatsBlock &getThreadStats() {
+        thread_local ThreadStats threadStats;
+        return threadStats.block;
+    }
+} // anonymous namespace
+
+std::atomic<bool> coaddUtils::detail::kernelStatsEnabled(false);
+
+void coaddUtils::detail::recordKernelCall(Kernel kernel, std::int64_t numPixels, std::int64_t numGoodPixels,
+                                          std::int64_t numBytes, std::int64_t nanoseconds) {
+    getThreadStats()[static_cast<int>(kernel)].add(1, numPixels == 0, numPixels, numGoodPixels, numBytes,
+                                                    nanoseconds);
+}
+
+void coaddUtils::setKernelStatsEnabled(bool enabled) {
+    detail::kernelStatsEnabled.store(enabled);
+}
+
+bool coaddUtils::getKernelStatsEnabled() {
+    return detail::kernelStatsEnabled.load();
+}
+
+std::map<std::string, coaddUtils::KernelStats> coaddUtils::getKernelStats() {
+    std::lock_guard<std::mutex> lock(registryMutex);
+    std::map<std::string, KernelStats> result;
+    for (int i = 0; i < NUM_KERNELS; ++i) {
+        KernelStats &stats = result[KERNEL_NAMES[i]];
+        retiredStats[i].addTo(stats);
+        for (StatsBlock const *block : registry) {
+            (*block)[i].addTo(stats);
+        }
+    }
+    return result;
+}
+
+void coaddUtils::resetKernelStats() {
+    std::lock_guard<std::mutex> lock(registryMutex);
+    for (int i = 0; i < NUM_KERNELS; ++i) {
+        retiredStats[i].reset();
+        for (StatsBlock *block : registry) {
+            (*block)[i].reset();
+        }
+    }
+}
@@ -0,0 +1,217 @@
+// -*- LSST-C++ -*-
+/*
+ * This file is part of coadd_utils.
+ *
+ * Developed for the LSST Data Management System.
+ * This product includes software developed by the LSST Project
+ * (https://www.lsst.org).
+ * See the COPYRIGHT file at the top-level directory of this distribution
+ * for details of code ownership.
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <https://www.gnu.org/licenses/>.
+ */
+
+#include <algorithm>
+#include <atomic>
+#include <condition_variable>
+#include <deque>
+#include <functional>
+#include <mutex>
+#include <thread>
+#include <vector>
+
+#include <pthread.h>
+
+#include "boost/format.hpp"
+
+#include "lsst/pex/exceptions.h"
+#include "lsst/coadd/utils/parallel.h"
+
+namespace pexExcept = lsst::pex::exceptions;
+namespace coaddUtils = lsst::coadd::utils;
+
+namespace {
+    std::atomic<int> numThreads(1);
+
+    /*
+     * Worker threads shared by all kernel calls
+     *
+     * The workers are started by the first call to run that needs them. Tasks are queued, and a thread
+     * waiting in run executes queued tasks as well as the workers, so every task is executed even
+     * while the workers are being stopped, or in a child process after fork, which has no workers.
+     */
+    class WorkerPool final {
+    public:
+        WorkerPool() {
+            pthread_atfork(&prepareFork, &afterForkInParent, &afterForkInChild);
+        }
+
+        WorkerPool(WorkerPool const &) = delete;
+        WorkerPool &operator=(WorkerPool const &) = delete;
+
+        /*
+         * Call task(i) for each i in [0, nTasks) and return once every call has finished
+         */
+        void run(int nTasks, std::function<void(int)> const &task) {
+            Batch batch{task, nTasks};
+            std::unique_lock<std::mutex> lock(_mutex);
+            if (!_stopping) {
+                while (static_cast<int>(_workers.size()) < _numWorkers) {
+                    _workers.emplace_back([this]() { work(); });
+                }
+            }
+            for (int i = 0; i < nTasks; ++i) {
+                _queue.push_back(Task{&batch, i});
+            }
+            _workAvailable.notify_all();
+            while (batch.numUnfinished > 0) {
+                if (_queue.empty()) {
+                    _taskFinished.wait(lock);
+                } else {
+                    runQueuedTask(lock);
+                }
+            }
+        }
+
+        /*
+         * Stop the workers; the next call to run starts nWorkers of them
+         */
+        void resize(int nWorkers) {
+            std::lock_guard<std::mutex> resizeLock(_resizeMutex);
+            std::vector<std::thread> workers;
+            {
+                std::lock_guard<std::mutex> lock(_mutex);
+                if (nWorkers == _numWorkers) {
+                    return;
+                }
+                _numWorkers = nWorkers;
+                _stopping = true;
+                workers.swap(_workers);
+                _workAvailable.notify_all();
+            }
+            for (auto &worker : workers) {
+                worker.join();
+            }
+            std::lock_guard<std::mutex> lock(_mutex);
+            _stopping = false;
+        }
+
+    private:
+        struct Batch {
+            std::function<void(int)> const &task;
+            int numUnfinished;
+        };
+
+        struct Task {
+            Batch *batch;
+            int index;
+        };
+
+        /*
+         * Execute the first queued task; lock must be held and the queue not empty
+         */
+        void runQueuedTask(std::unique_lock<std::mutex> &lock) {
+            Task const task = _queue.front();
+            _queue.pop_front();
+            lock.unlock();
+            task.batch->task(task.index);
+            lock.lock();
+            if (--task.batch->numUnfinished == 0) {
+                _taskFinished.notify_all();
+            }
+        }
+
+        /*
+         * Main loop of a worker thread
+         */
+        void work() {
+            std::unique_lock<std::mutex> lock(_mutex);
+            while (true) {
+                _workAvailable.wait(lock, [this]() { return _stopping || !_queue.empty(); });
+                if (_stopping) {
+                    return;
+                }
+                runQueuedTask(lock);
+            }
+        }
+
+        static void prepareFork();
+        static void afterForkInParent();
+        static void afterForkInChild();
+
+        std::mutex _resizeMutex;                // serializes calls to resize
+        std::mutex _mutex;                      // guards all members below
+        std::condition_variable _workAvailable;
+        std::condition_variable _taskFinished;
+        std::deque<Task> _queue;
+        std::vector<std::thread> _workers;
+        int _numWorkers = 0;
+        bool _stopping = false;
+    };
+
+    /*
+     * The worker pool; never destroyed, so that idle workers need not be joined at exit
+     */
+    WorkerPool &getWorkerPool() {
+        static WorkerPool *pool = new WorkerPool();
+        return *pool;
+    }
+
+    void WorkerPool::prepareFork() {
+        WorkerPool &pool = getWorkerPool();
+        pool._resizeMutex.lock();
+        pool._mutex.lock();
+    }
+
+    void WorkerPool::afterForkInParent() {
+        WorkerPool &pool = getWorkerPool();
+        pool._mutex.unlock();
+        pool._resizeMutex.unlock();
+    }
+
+    void WorkerPool::afterForkInChild() {
+        // The workers and the threads waiting for queued tasks do not exist in the child
+        WorkerPool &pool = getWorkerPool();
+        new std::vector<std::thread>(std::move(pool._workers));
+        pool._workers.clear();
+        pool._queue.clear();
+        pool._stopping = false;
+        pool._mutex.unlock();
+        pool._resizeMutex.unlock();
+    }
+} // anonymous namespace
+
+void coaddUtils::setNumThreads(int nThreads) {
+    if (nThreads < 0) {
+        throw LSST_EXCEPT(pexExcept::InvalidParameterError,
+            (boost::format("nThreads = %d must be >= 0") % nThreads).str());
+    }
+    if (nThreads == 0) {
+        nThreads = std::max(1u, std::thread::hardware_concurrency());
+    }
+    numThreads.store(nThreads);
+    getWorkerPool().resize(nThreads - 1);
+}
+
+int coaddUtils::getNumThreads() {
+    return numThreads.load();
+}
+
+void coaddUtils::detail::runTasks(int nTasks, std::function<void(int)> const &task) {
+    if (nTasks == 1) {
+        task(0);
+        return;
+    }
+    getWorkerPool().run(nTasks, task);
+}
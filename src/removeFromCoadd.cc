@@ -0,0 +1,126 @@
+// -*- LSST-C++ -*-
+/*
+ * This file is part of coadd_utils.
+ *
+ * Developed for the LSST Data Management System.
+ * This product includes software developed by the LSST Project
+ * (https://www.lsst.org).
+ * See the COPYRIGHT file at the top-level directory of this distribution
+ * for details of code ownership.
+ *
+ * This program is free software: you can redistribute it and/or modify
+ * it under the terms of the GNU General Public License as published by
+ * the Free Software Foundation, either version 3 of the License, or
+ * (at your option) any later version.
+ *
+ * This program is distributed in the hope that it will be useful,
+ * but WITHOUT ANY WARRANTY; without even the implied warranty of
+ * MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+ * GNU General Public License for more details.
+ *
+ * You should have received a copy of the GNU General Public License
+ * along with this program.  If not, see <https://www.gnu.org/licenses/>.
+ */
+
+#include <cstdint>
+
+#include "lsst/geom.h"
+#include "lsst/coadd/utils/removeFromCoadd.h"
+#include "lsst/coadd/utils/detail/imageHelpers.h"
+#include "lsst/coadd/utils/detail/overlapBands.h"
+#include "lsst/coadd/utils/detail/rowKernels.h"
+
+namespace geom = lsst::geom;
+namespace afwImage = lsst::afw::image;
+namespace coaddUtils = lsst::coadd::utils;
+
+namespace {
+    using coaddUtils::detail::assertSameBBox;
+    using coaddUtils::detail::forEachOverlapBand;
+    using coaddUtils::detail::removeRowFromCoadd;
+    using coaddUtils::detail::RowPointer;
+} // anonymous namespace
+
+template <typename CoaddPixelT, typename WeightPixelT>
+lsst::geom::Box2I coaddUtils::removeFromCoadd(
+    // spell out lsst:afw::image to make Doxygen happy
+    lsst::afw::image::Image<CoaddPixelT> &coadd,
+    lsst::afw::image::Image<WeightPixelT> &weightMap,
+    lsst::afw::image::Image<CoaddPixelT> const &image,
+    WeightPixelT weight
+) {
+    assertSameBBox(coadd, weightMap);
+
+    return forEachOverlapBand(coadd.getBBox(), image.getBBox(), [&](geom::Box2I const &bbox) {
+        int const x0 = bbox.getMinX(), y0 = bbox.getMinY();
+        RowPointer<CoaddPixelT> coaddRow(coadd, x0, y0);
+        RowPointer<WeightPixelT> weightMapRow(weightMap, x0, y0);
+        RowPointer<CoaddPixelT const> imageRow(image, x0, y0);
+        for (int y = 0, endY = bbox.getHeight(); y != endY; ++y) {
+            removeRowFromCoadd(coaddRow.get(), weightMapRow.get(), imageRow.get(), bbox.getWidth(), weight);
+            ++coaddRow, ++weightMapRow, ++imageRow;
+        }
+    });
+}
+
+template <typename CoaddPixelT, typename WeightPixelT>
+lsst::geom::Box2I coaddUtils::removeFromCoadd(
+    // spell out lsst:afw::image to make Doxygen happy
+    lsst::afw::image::MaskedImage<CoaddPixelT, lsst::afw::image::MaskPixel,
+        lsst::afw::image::VariancePixel> &coadd,
+    lsst::afw::image::Image<WeightPixelT> &weightMap,
+    lsst::afw::image::MaskedImage<CoaddPixelT, lsst::afw::image::MaskPixel,
+        lsst::afw::image::VariancePixel> const &maskedImage,
+    lsst::afw::image::MaskPixel const badPixelMask,
+    WeightPixelT weight
+) {
+    assertSameBBox(coadd, weightMap);
+
+    return forEachOverlapBand(coadd.getBBox(), maskedImage.getBBox(), [&](geom::Box2I const &bbox) {
+        int const x0 = bbox.getMinX(), y0 = bbox.getMinY();
+        RowPointer<CoaddPixelT> coaddImageRow(*coadd.getImage(), x0, y0);
+        RowPointer<afwImage::VariancePixel> coaddVarianceRow(*coadd.getVariance(), x0, y0);
+        RowPointer<WeightPixelT> weightMapRow(weightMap, x0, y0);
+        RowPointer<CoaddPixelT const> imageRow(*maskedImage.getImage(), x0, y0);
+        RowPointer<afwImage::MaskPixel const> maskRow(*maskedImage.getMask(), x0, y0);
+        RowPointer<afwImage::VariancePixel const> varianceRow(*maskedImage.getVariance(), x0, y0);
+        for (int y = 0, endY = bbox.getHeight(); y != endY; ++y) {
+            removeRowFromCoadd(coaddImageRow.get(), coaddVarianceRow.get(), weightMapRow.get(),
+                               imageRow.get(), maskRow.get(), varianceRow.get(), bbox.getWidth(),
+                               badPixelMask, weight);
+            ++coaddImageRow, ++coaddVarianceRow, ++weightMapRow;
+            ++imageRow, ++maskRow, ++varianceRow;
+        }
+    });
+}
+
+// Explicit instantiations
+
+/// \cond
+#define MASKEDIMAGE(IMAGEPIXEL) afwImage::MaskedImage<IMAGEPIXEL, \
+    afwImage::MaskPixel, afwImage::VariancePixel>
+#define INSTANTIATE(COADDPIXEL, WEIGHTPIXEL) \
+    template lsst::geom::Box2I coaddUtils::removeFromCoadd<COADDPIXEL, WEIGHTPIXEL>( \
+        afwImage::Image<COADDPIXEL> &coadd, \
+        afwImage::Image<WEIGHTPIXEL> &weightMap, \
+        afwImage::Image<COADDPIXEL> const &image, \
+        WEIGHTPIXEL weight \
+    ); \
+    \
+    template lsst::geom::Box2I coaddUtils::removeFromCoadd<COADDPIXEL, WEIGHTPIXEL>( \
+        MASKEDIMAGE(COADDPIXEL) &coadd, \
+        afwImage::Image<WEIGHTPIXEL> &weightMap, \
+        MASKEDIMAGE(COADDPIXEL) const &image, \
+        afwImage::MaskPixel const badPixelMask, \
+        WEIGHTPIXEL weight \
+    );
+
+INSTANTIATE(double, double);
+INSTANTIATE(double, float);
+INSTANTIATE(double, int);
+INSTANTIATE(double, std::uint16_t);
+INSTANTIATE(float, double);
+INSTANTIATE(float, float);
+INSTANTIATE(float, int);
+INSTANTIATE(float, std::uint16_t);
+/// \endcond
@@ -27,12 +27,17 @@
 *
 * @author Russell Owen
 */
+#include <atomic>
 #include <cstdint>
+#include <vector>
 
 #include "boost/format.hpp"
 
 #include "lsst/pex/exceptions.h"
 #include "lsst/coadd/utils/setCoaddEdgeBits.h"
+#include "lsst/coadd/utils/kernelStats.h"
+#include "lsst/coadd/utils/parallel.h"
+#include "lsst/coadd/utils/detail/rowKernels.h"
 
 namespace pexExcept = lsst::pex::exceptions;
 namespace afwImage = lsst::afw::image;
@@ -44,9 +49,6 @@ void coaddUtils::setCoaddEdgeBits(
     lsst::afw::image::Mask<lsst::afw::image::MaskPixel> &coaddMask,
     lsst::afw::image::Image<WeightPixelT> const &weightMap
 ) {
-    typedef afwImage::Mask<afwImage::MaskPixel>::x_iterator MaskXIter;
-    typedef typename afwImage::Image<WeightPixelT>::const_x_iterator WeightMapConstXIter;
-
     if (coaddMask.getDimensions() != weightMap.getDimensions()) {
         throw LSST_EXCEPT(pexExcept::InvalidParameterError,
             (boost::format("coaddMask and weightMap dimensions differ: %dx%d != %dx%d") %
@@ -54,18 +56,95 @@ void coaddUtils::setCoaddEdgeBits(
             ).str());
     }
 
+    coaddUtils::detail::KernelStatsRecorder stats(coaddUtils::detail::Kernel::SET_COADD_EDGE_BITS);
     afwImage::MaskPixel const edgeMask = afwImage::Mask<afwImage::MaskPixel>::getPlaneBitMask("NO_DATA");
 
     // Set the pixels row by row, to avoid repeated checks for end-of-row
-    for (int y = 0, endY = weightMap.getHeight(); y != endY; ++y) {
-        WeightMapConstXIter weightMapPtr = weightMap.row_begin(y);
-        WeightMapConstXIter const weightMapEndPtr = weightMap.row_end(y);
-        MaskXIter coaddMaskPtr = coaddMask.row_begin(y);
-        for (; weightMapPtr != weightMapEndPtr; ++weightMapPtr, ++coaddMaskPtr) {
-            if (*weightMapPtr == 0) {
-                (*coaddMaskPtr) = (*coaddMaskPtr) | edgeMask;
+    std::atomic<std::int64_t> numGoodPix(0);
+    coaddUtils::detail::forEachRowBand(0, weightMap.getHeight(), [&](int bandBeginY, int bandEndY) {
+        coaddUtils::detail::RowPointer<afwImage::MaskPixel> coaddMaskRow(
+            coaddMask, coaddMask.getX0(), coaddMask.getY0() + bandBeginY);
+        coaddUtils::detail::RowPointer<WeightPixelT const> weightMapRow(
+            weightMap, weightMap.getX0(), weightMap.getY0() + bandBeginY);
+        for (int y = bandBeginY; y != bandEndY; ++y) {
+            coaddUtils::detail::setEdgeBitsRow(coaddMaskRow.get(), weightMapRow.get(), weightMap.getWidth(),
+                                               edgeMask);
+            if (stats.isEnabled()) {
+                numGoodPix += coaddUtils::detail::countNonzeroRow(weightMapRow.get(), weightMap.getWidth());
+            }
+            ++coaddMaskRow, ++weightMapRow;
+        }
+    });
+    if (stats.isEnabled()) {
+        // the weight map is read and the mask is read and written
+        std::int64_t const numPix = static_cast<std::int64_t>(weightMap.getWidth()) * weightMap.getHeight();
+        std::int64_t const pixelBytes = sizeof(WeightPixelT) + 2 * sizeof(afwImage::MaskPixel);
+        stats.addPixels(numPix, numGoodPix, numPix * pixelBytes);
+    }
+}
+
+template<typename WeightPixelT>
+void coaddUtils::setCoaddEdgeBits(
+    lsst::afw::image::Mask<lsst::afw::image::MaskPixel> &coaddMask,
+    lsst::afw::image::Image<WeightPixelT> const &weightMap,
+    std::vector<CoaddMaskRule> const &rules,
+    lsst::afw::image::Image<int> const *countMap
+) {
+    if (coaddMask.getDimensions() != weightMap.getDimensions()) {
+        throw LSST_EXCEPT(pexExcept::InvalidParameterError,
+            (boost::format("coaddMask and weightMap dimensions differ: %dx%d != %dx%d") %
+            coaddMask.getWidth() % coaddMask.getHeight() % weightMap.getWidth() % weightMap.getHeight()
+            ).str());
+    }
+    if (countMap && countMap->getDimensions() != weightMap.getDimensions()) {
+        throw LSST_EXCEPT(pexExcept::InvalidParameterError,
+            (boost::format("countMap and weightMap dimensions differ: %dx%d != %dx%d") %
+            countMap->getWidth() % countMap->getHeight() % weightMap.getWidth() % weightMap.getHeight()
+            ).str());
+    }
+    for (auto const &rule : rules) {
+        if (rule.map == CoaddMaskRule::COUNT && !countMap) {
+            throw LSST_EXCEPT(pexExcept::InvalidParameterError,
+                              "a rule uses the count map but countMap is null");
+        }
+    }
+
+    coaddUtils::detail::KernelStatsRecorder stats(coaddUtils::detail::Kernel::SET_COADD_EDGE_BITS);
+
+    // Apply every rule to a row while it is in cache
+    std::atomic<std::int64_t> numGoodPix(0);
+    coaddUtils::detail::forEachRowBand(0, weightMap.getHeight(), [&](int bandBeginY, int bandEndY) {
+        int const width = weightMap.getWidth();
+        coaddUtils::detail::RowPointer<afwImage::MaskPixel> coaddMaskRow(
+            coaddMask, coaddMask.getX0(), coaddMask.getY0() + bandBeginY);
+        coaddUtils::detail::RowPointer<WeightPixelT const> weightMapRow(
+            weightMap, weightMap.getX0(), weightMap.getY0() + bandBeginY);
+        coaddUtils::detail::RowPointer<int const> countMapRow = countMap ?
+            coaddUtils::detail::RowPointer<int const>(
+                *countMap, countMap->getX0(), countMap->getY0() + bandBeginY) :
+            coaddUtils::detail::RowPointer<int const>();
+        for (int y = bandBeginY; y != bandEndY; ++y) {
+            for (auto const &rule : rules) {
+                if (rule.map == CoaddMaskRule::WEIGHT) {
+                    coaddUtils::detail::setThresholdBitsRow(coaddMaskRow.get(), weightMapRow.get(), width,
+                                                            rule.threshold, rule.bitMask);
+                } else {
+                    coaddUtils::detail::setThresholdBitsRow(coaddMaskRow.get(), countMapRow.get(), width,
+                                                            rule.threshold, rule.bitMask);
+                }
             }
+            if (stats.isEnabled()) {
+                numGoodPix += coaddUtils::detail::countNonzeroRow(weightMapRow.get(), width);
+            }
+            ++coaddMaskRow, ++weightMapRow, ++countMapRow;
         }
+    });
+    if (stats.isEnabled()) {
+        // the weight and count maps are read and the mask is read and written
+        std::int64_t const numPix = static_cast<std::int64_t>(weightMap.getWidth()) * weightMap.getHeight();
+        std::int64_t const pixelBytes = sizeof(WeightPixelT) + (countMap ? sizeof(int) : 0) +
+                                        2 * sizeof(afwImage::MaskPixel);
+        stats.addPixels(numPix, numGoodPix, numPix * pixelBytes);
     }
 }
 
@@ -77,6 +156,12 @@ void coaddUtils::setCoaddEdgeBits(
     template void coaddUtils::setCoaddEdgeBits<WEIGHTPIXEL>( \
         afwImage::Mask<afwImage::MaskPixel> &coaddMask, \
         afwImage::Image<WEIGHTPIXEL> const &weightMap \
+    ); \
+    template void coaddUtils::setCoaddEdgeBits<WEIGHTPIXEL>( \
+        afwImage::Mask<afwImage::MaskPixel> &coaddMask, \
+        afwImage::Image<WEIGHTPIXEL> const &weightMap, \
+        std::vector<coaddUtils::CoaddMaskRule> const &rules, \
+        afwImage::Image<int> const *countMap \
     );
 
 INSTANTIATE(double);
@@ -0,0 +1,59 @@
+# This file is part of coadd_utils.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Helpers shared by the coadd_utils tests
+"""
+
+__all__ = ["makeRandomMaskedImage"]
+
+import lsst.afw.image as afwImage
+
+
+def makeRandomMaskedImage(rng, bbox, maskedImageClass=afwImage.MaskedImageF, imageRange=None):
+    """Make a masked image with random pixel values.
+
+    Parameters
+    ----------
+    rng : `numpy.random.RandomState`
+        Random number generator.
+    bbox : `lsst.geom.Box2I`
+        Parent bounding box of the masked image.
+    maskedImageClass : `type`, optional
+        Masked image class, e.g. `lsst.afw.image.MaskedImageD`.
+    imageRange : `tuple` [`float`, `float`], optional
+        If given, draw the image uniformly from ``[min, max)``; otherwise
+        draw it from a unit normal distribution.
+
+    Returns
+    -------
+    maskedImage : ``maskedImageClass``
+        Masked image whose mask is drawn from 0-3 and whose variance is drawn
+        uniformly from [1, 2).
+    """
+    maskedImage = maskedImageClass(bbox)
+    shape = maskedImage.image.array.shape
+    if imageRange is None:
+        maskedImage.image.array[:, :] = rng.normal(size=shape)
+    else:
+        maskedImage.image.array[:, :] = rng.uniform(*imageRange, size=shape)
+    maskedImage.mask.array[:, :] = rng.randint(0, 4, size=shape)
+    maskedImage.variance.array[:, :] = rng.uniform(1, 2, size=shape)
+    return maskedImage
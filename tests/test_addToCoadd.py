@@ -36,6 +36,8 @@ import lsst.afw.display.ds9 as ds9
 import lsst.pex.exceptions as pexExcept
 import lsst.coadd.utils as coaddUtils
 
+from coaddTestUtils import makeRandomMaskedImage
+
 try:
     display
 except NameError:
@@ -184,6 +186,522 @@ class AddToCoaddTestCase(unittest.TestCase):
             self.assertEqual(truth_stdev, stdev)
 
 
+class AddToCoaddSpecialValuesTestCase(lsst.utils.tests.TestCase):
+    """Test that addToCoadd leaves coadd pixels bit-for-bit unchanged where the input is bad
+    """
+
+    def testMaskedImage(self):
+        bbox = geom.Box2I(geom.Point2I(0, 0), geom.Extent2I(37, 11))
+        badPixelMask = 0x1
+        weight = np.float32(0.75)
+        rng = np.random.RandomState(5)
+
+        maskedImage = afwImage.MaskedImageF(bbox)
+        maskedImage.image.array[:, :] = rng.normal(size=maskedImage.image.array.shape)
+        maskedImage.variance.array[:, :] = rng.uniform(1, 2, size=maskedImage.variance.array.shape)
+        maskedImage.mask.array[:, :] = rng.randint(0, 2, size=maskedImage.mask.array.shape)
+        isBad = (maskedImage.mask.array & badPixelMask) != 0
+        maskedImage.image.array[isBad] = np.where(rng.randint(0, 2, size=isBad.sum()), np.nan, np.inf)
+
+        coadd = afwImage.MaskedImageF(bbox)
+        coadd.image.array[:, :] = -0.0
+        coadd.variance.array[:, :] = -0.0
+        weightMap = afwImage.ImageF(bbox)
+        weightMap.array[:, :] = -0.0
+
+        coaddUtils.addToCoadd(coadd, weightMap, maskedImage, badPixelMask, weight)
+
+        isGood = ~isBad
+        self.assertTrue(np.all(np.signbit(coadd.image.array[isBad])))
+        self.assertTrue(np.all(np.signbit(coadd.variance.array[isBad])))
+        self.assertTrue(np.all(np.signbit(weightMap.array[isBad])))
+        np.testing.assert_array_equal(coadd.image.array[isBad], 0)
+        np.testing.assert_array_equal(coadd.image.array[isGood],
+                                      maskedImage.image.array[isGood]*weight)
+        np.testing.assert_array_equal(coadd.variance.array[isGood],
+                                      maskedImage.variance.array[isGood]*weight**2)
+        np.testing.assert_array_equal(weightMap.array[isGood], weight)
+        np.testing.assert_array_equal(coadd.mask.array, np.where(isBad, 0, maskedImage.mask.array))
+
+
+class AddManyToCoaddTestCase(lsst.utils.tests.TestCase):
+    """A test case for addManyToCoadd
+    """
+
+    def setUp(self):
+        self.rng = np.random.RandomState(12345)
+        self.coaddBBox = geom.Box2I(geom.Point2I(100, 200), geom.Extent2I(40, 1500))
+        # extends beyond the coadd, fully inside the coadd, partial overlap, no overlap
+        self.bboxList = [
+            geom.Box2I(geom.Point2I(90, 180), geom.Extent2I(30, 1000)),
+            geom.Box2I(geom.Point2I(110, 300), geom.Extent2I(20, 1200)),
+            geom.Box2I(geom.Point2I(130, 1600), geom.Extent2I(30, 300)),
+            geom.Box2I(geom.Point2I(0, 0), geom.Extent2I(10, 10)),
+        ]
+        self.weightList = [0.5, 1.0, 2.5, 3.0]
+        self.badPixelMask = 0x1
+
+    def testMaskedImage(self):
+        """Test that addManyToCoadd matches repeated calls to addToCoadd for MaskedImages"""
+        maskedImageList = [makeRandomMaskedImage(self.rng, bbox) for bbox in self.bboxList]
+
+        coadd = afwImage.MaskedImageF(self.coaddBBox)
+        weightMap = afwImage.ImageD(self.coaddBBox)
+        overlapBBoxList = [
+            coaddUtils.addToCoadd(coadd, weightMap, maskedImage, self.badPixelMask, weight)
+            for maskedImage, weight in zip(maskedImageList, self.weightList)
+        ]
+
+        manyCoadd = afwImage.MaskedImageF(self.coaddBBox)
+        manyWeightMap = afwImage.ImageD(self.coaddBBox)
+        manyOverlapBBoxList = coaddUtils.addManyToCoadd(manyCoadd, manyWeightMap, maskedImageList,
+                                                        self.badPixelMask, self.weightList)
+
+        self.assertEqual(manyOverlapBBoxList, overlapBBoxList)
+        self.assertTrue(manyOverlapBBoxList[-1].isEmpty())
+        self.assertMaskedImagesEqual(manyCoadd, coadd)
+        self.assertImagesEqual(manyWeightMap, weightMap)
+
+    def testImage(self):
+        """Test that addManyToCoadd matches repeated calls to addToCoadd for Images"""
+        imageList = []
+        for bbox in self.bboxList:
+            maskedImage = makeRandomMaskedImage(self.rng, bbox)
+            image = maskedImage.image
+            image.array[maskedImage.mask.array == 0] = np.nan
+            imageList.append(image)
+
+        coadd = afwImage.ImageF(self.coaddBBox)
+        weightMap = afwImage.ImageF(self.coaddBBox)
+        overlapBBoxList = [
+            coaddUtils.addToCoadd(coadd, weightMap, image, weight)
+            for image, weight in zip(imageList, self.weightList)
+        ]
+
+        manyCoadd = afwImage.ImageF(self.coaddBBox)
+        manyWeightMap = afwImage.ImageF(self.coaddBBox)
+        manyOverlapBBoxList = coaddUtils.addManyToCoadd(manyCoadd, manyWeightMap, imageList,
+                                                        self.weightList)
+
+        self.assertEqual(manyOverlapBBoxList, overlapBBoxList)
+        self.assertImagesEqual(manyCoadd, coadd)
+        self.assertImagesEqual(manyWeightMap, weightMap)
+
+    def testAssertions(self):
+        """Test that addManyToCoadd requires matching image and weight lists"""
+        maskedImageList = [makeRandomMaskedImage(self.rng, bbox) for bbox in self.bboxList]
+        coadd = afwImage.MaskedImageF(self.coaddBBox)
+        weightMap = afwImage.ImageD(self.coaddBBox)
+        with self.assertRaises(pexExcept.LengthError):
+            coaddUtils.addManyToCoadd(coadd, weightMap, maskedImageList, self.badPixelMask,
+                                      self.weightList[:-1])
+
+
+class AddToCoaddWeightImageTestCase(lsst.utils.tests.TestCase):
+    """A test case for addToCoadd with a weight image and for addToCoaddInverseVariance
+    """
+
+    def setUp(self):
+        self.rng = np.random.RandomState(54321)
+        self.coaddBBox = geom.Box2I(geom.Point2I(100, 200), geom.Extent2I(40, 50))
+        self.bbox = geom.Box2I(geom.Point2I(90, 210), geom.Extent2I(30, 60))
+        self.badPixelMask = 0x1
+
+    def makeWeightImage(self):
+        weightImage = afwImage.ImageF(self.bbox)
+        weightImage.array[:, :] = self.rng.uniform(0.5, 2, size=weightImage.array.shape)
+        return weightImage
+
+    def testMaskedImage(self):
+        """Test addToCoadd with a weight image against a numpy reference"""
+        maskedImage = makeRandomMaskedImage(self.rng, self.bbox)
+        weightImage = self.makeWeightImage()
+        coadd = afwImage.MaskedImageF(self.coaddBBox)
+        weightMap = afwImage.ImageF(self.coaddBBox)
+
+        overlapBBox = coaddUtils.addToCoadd(coadd, weightMap, maskedImage, self.badPixelMask, weightImage)
+
+        refOverlapBBox = geom.Box2I(self.coaddBBox)
+        refOverlapBBox.clip(self.bbox)
+        self.assertEqual(overlapBBox, refOverlapBBox)
+        inputView = maskedImage[overlapBBox]
+        weightArray = weightImage[overlapBBox].array
+        isGood = (inputView.mask.array & self.badPixelMask) == 0
+        coaddView = coadd[overlapBBox]
+        np.testing.assert_array_equal(coaddView.image.array,
+                                      np.where(isGood, inputView.image.array*weightArray, 0))
+        np.testing.assert_array_equal(coaddView.mask.array, np.where(isGood, inputView.mask.array, 0))
+        np.testing.assert_array_equal(coaddView.variance.array,
+                                      np.where(isGood, inputView.variance.array*weightArray**2, 0))
+        np.testing.assert_array_equal(weightMap[overlapBBox].array, np.where(isGood, weightArray, 0))
+
+        outsideBBox = geom.Box2I(geom.Point2I(100, 200), geom.Extent2I(40, 10))
+        self.assertTrue(np.all(coadd[outsideBBox].image.array == 0))
+        self.assertTrue(np.all(weightMap[outsideBBox].array == 0))
+
+    def testImage(self):
+        """Test addToCoadd with a weight image for Images"""
+        maskedImage = makeRandomMaskedImage(self.rng, self.bbox)
+        image = maskedImage.image
+        image.array[maskedImage.mask.array == 0] = np.nan
+        weightImage = self.makeWeightImage()
+        coadd = afwImage.ImageF(self.coaddBBox)
+        weightMap = afwImage.ImageF(self.coaddBBox)
+
+        overlapBBox = coaddUtils.addToCoadd(coadd, weightMap, image, weightImage)
+
+        inputArray = image[overlapBBox].array
+        weightArray = weightImage[overlapBBox].array
+        isGood = np.isfinite(inputArray)
+        np.testing.assert_array_equal(coadd[overlapBBox].array, np.where(isGood, inputArray*weightArray, 0))
+        np.testing.assert_array_equal(weightMap[overlapBBox].array, np.where(isGood, weightArray, 0))
+
+    def testInverseVariance(self):
+        """Test that addToCoaddInverseVariance matches addToCoadd with a weight image of 1/variance"""
+        maskedImage = makeRandomMaskedImage(self.rng, self.bbox)
+        maskedImage.variance.array[0, :10] = 0
+        maskedImage.variance.array[1, :10] = np.inf
+        maskedImage.variance.array[2, :10] = np.nan
+        weight = np.float32(2.5)
+        coadd = afwImage.MaskedImageF(self.coaddBBox)
+        weightMap = afwImage.ImageF(self.coaddBBox)
+        coaddUtils.addToCoaddInverseVariance(coadd, weightMap, maskedImage, self.badPixelMask, weight)
+
+        refMaskedImage = afwImage.MaskedImageF(maskedImage, deep=True)
+        refMaskedImage.mask.array[0:3, :10] |= self.badPixelMask
+        refWeightImage = afwImage.ImageF(self.bbox)
+        with np.errstate(divide="ignore"):
+            refWeightImage.array[:, :] = weight/maskedImage.variance.array
+        refCoadd = afwImage.MaskedImageF(self.coaddBBox)
+        refWeightMap = afwImage.ImageF(self.coaddBBox)
+        coaddUtils.addToCoadd(refCoadd, refWeightMap, refMaskedImage, self.badPixelMask, refWeightImage)
+
+        self.assertMaskedImagesEqual(coadd, refCoadd)
+        self.assertImagesEqual(weightMap, refWeightMap)
+
+    def testAssertions(self):
+        """Test that the weight image must have the same bounding box as the image"""
+        maskedImage = makeRandomMaskedImage(self.rng, self.bbox)
+        weightImage = afwImage.ImageF(self.coaddBBox)
+        coadd = afwImage.MaskedImageF(self.coaddBBox)
+        weightMap = afwImage.ImageF(self.coaddBBox)
+        with self.assertRaises(pexExcept.InvalidParameterError):
+            coaddUtils.addToCoadd(coadd, weightMap, maskedImage, self.badPixelMask, weightImage)
+        with self.assertRaises(pexExcept.InvalidParameterError):
+            coaddUtils.addToCoadd(coadd.image, weightMap, maskedImage.image, weightImage)
+
+
+class AddToCoaddWithProvenanceTestCase(lsst.utils.tests.TestCase):
+    """A test case for addToCoaddWithProvenance
+    """
+
+    def setUp(self):
+        self.rng = np.random.RandomState(24680)
+        self.coaddBBox = geom.Box2I(geom.Point2I(100, 200), geom.Extent2I(40, 50))
+        # extends beyond the coadd, fully inside the coadd, no overlap
+        self.bboxList = [
+            geom.Box2I(geom.Point2I(90, 210), geom.Extent2I(30, 60)),
+            geom.Box2I(geom.Point2I(110, 220), geom.Extent2I(20, 20)),
+            geom.Box2I(geom.Point2I(0, 0), geom.Extent2I(10, 10)),
+        ]
+        self.weightList = [0.5, 1.0, 2.5]
+        self.badPixelMask = 0x1
+
+    def makeReferenceMaps(self, isGoodList):
+        """Compute the count and provenance maps from the good pixels of each input.
+
+        Parameters
+        ----------
+        isGoodList : `list` [`lsst.afw.image.Image`]
+            For each input, an image that is nonzero where the input is good.
+        """
+        countMap = afwImage.ImageI(self.coaddBBox)
+        provenanceMap = afwImage.ImageL(self.coaddBBox)
+        for inputIndex, isGood in enumerate(isGoodList):
+            overlapBBox = geom.Box2I(self.coaddBBox)
+            overlapBBox.clip(isGood.getBBox())
+            if overlapBBox.isEmpty():
+                continue
+            good = isGood[overlapBBox].array != 0
+            countMap[overlapBBox].array[good] += 1
+            provenanceMap[overlapBBox].array[good] |= np.uint64(1) << np.uint64(inputIndex)
+        return countMap, provenanceMap
+
+    def testMaskedImage(self):
+        """Test that addToCoaddWithProvenance matches addToCoadd and records the good pixels
+        of each input"""
+        maskedImageList = [makeRandomMaskedImage(self.rng, bbox) for bbox in self.bboxList]
+
+        coadd = afwImage.MaskedImageF(self.coaddBBox)
+        weightMap = afwImage.ImageD(self.coaddBBox)
+        overlapBBoxList = [
+            coaddUtils.addToCoadd(coadd, weightMap, maskedImage, self.badPixelMask, weight)
+            for maskedImage, weight in zip(maskedImageList, self.weightList)
+        ]
+        isGoodList = []
+        for maskedImage in maskedImageList:
+            isGood = afwImage.ImageI(maskedImage.getBBox())
+            isGood.array[:, :] = (maskedImage.mask.array & self.badPixelMask) == 0
+            isGoodList.append(isGood)
+        refCountMap, refProvenanceMap = self.makeReferenceMaps(isGoodList)
+
+        for numThreads in (1, 3):
+            with self.subTest(numThreads=numThreads):
+                coaddUtils.setNumThreads(numThreads)
+                try:
+                    provCoadd = afwImage.MaskedImageF(self.coaddBBox)
+                    provWeightMap = afwImage.ImageD(self.coaddBBox)
+                    countMap = afwImage.ImageI(self.coaddBBox)
+                    provenanceMap = afwImage.ImageL(self.coaddBBox)
+                    provOverlapBBoxList = [
+                        coaddUtils.addToCoaddWithProvenance(
+                            provCoadd, provWeightMap, maskedImage, self.badPixelMask, weight,
+                            countMap=countMap, provenanceMap=provenanceMap, inputIndex=inputIndex)
+                        for inputIndex, (maskedImage, weight)
+                        in enumerate(zip(maskedImageList, self.weightList))
+                    ]
+                finally:
+                    coaddUtils.setNumThreads(1)
+
+                self.assertEqual(provOverlapBBoxList, overlapBBoxList)
+                self.assertMaskedImagesEqual(provCoadd, coadd)
+                self.assertImagesEqual(provWeightMap, weightMap)
+                self.assertImagesEqual(countMap, refCountMap)
+                self.assertImagesEqual(provenanceMap, refProvenanceMap)
+
+    def testImage(self):
+        """Test addToCoaddWithProvenance for Images, with only a count map"""
+        imageList = []
+        for bbox in self.bboxList:
+            maskedImage = makeRandomMaskedImage(self.rng, bbox)
+            image = maskedImage.image
+            image.array[maskedImage.mask.array == 0] = np.nan
+            imageList.append(image)
+
+        coadd = afwImage.ImageF(self.coaddBBox)
+        weightMap = afwImage.ImageF(self.coaddBBox)
+        provCoadd = afwImage.ImageF(self.coaddBBox)
+        provWeightMap = afwImage.ImageF(self.coaddBBox)
+        countMap = afwImage.ImageI(self.coaddBBox)
+        isGoodList = []
+        for image, weight in zip(imageList, self.weightList):
+            coaddUtils.addToCoadd(coadd, weightMap, image, weight)
+            coaddUtils.addToCoaddWithProvenance(provCoadd, provWeightMap, image, weight, countMap=countMap)
+            isGood = afwImage.ImageI(image.getBBox())
+            isGood.array[:, :] = np.isfinite(image.array)
+            isGoodList.append(isGood)
+        refCountMap, _ = self.makeReferenceMaps(isGoodList)
+
+        self.assertImagesEqual(provCoadd, coadd)
+        self.assertImagesEqual(provWeightMap, weightMap)
+        self.assertImagesEqual(countMap, refCountMap)
+
+    def testAssertions(self):
+        """Test that the maps must match the coadd and inputIndex must fit in the provenance map"""
+        maskedImage = makeRandomMaskedImage(self.rng, self.bboxList[0])
+        coadd = afwImage.MaskedImageF(self.coaddBBox)
+        weightMap = afwImage.ImageD(self.coaddBBox)
+        badBBox = geom.Box2I(self.coaddBBox.getMin(), geom.Extent2I(10, 10))
+        with self.assertRaises(pexExcept.InvalidParameterError):
+            coaddUtils.addToCoaddWithProvenance(coadd, weightMap, maskedImage, self.badPixelMask, 1.0,
+                                                countMap=afwImage.ImageI(badBBox))
+        with self.assertRaises(pexExcept.InvalidParameterError):
+            coaddUtils.addToCoaddWithProvenance(coadd, weightMap, maskedImage, self.badPixelMask, 1.0,
+                                                provenanceMap=afwImage.ImageL(badBBox))
+        for inputIndex in (-1, 64):
+            with self.assertRaises(pexExcept.InvalidParameterError):
+                coaddUtils.addToCoaddWithProvenance(coadd, weightMap, maskedImage, self.badPixelMask, 1.0,
+                                                    provenanceMap=afwImage.ImageL(self.coaddBBox),
+                                                    inputIndex=inputIndex)
+
+
+class AddToCoaddCompensatedTestCase(lsst.utils.tests.TestCase):
+    """A test case for addToCoaddCompensated and saturating integer weight maps
+    """
+
+    def setUp(self):
+        self.rng = np.random.RandomState(13579)
+        self.coaddBBox = geom.Box2I(geom.Point2I(-5, 10), geom.Extent2I(12, 9))
+        self.badPixelMask = 0x1
+
+    def testAccuracy(self):
+        """Test that a compensated float coadd is as accurate as a double coadd"""
+        coadd = afwImage.MaskedImageF(self.coaddBBox)
+        compensation = afwImage.ImageF(self.coaddBBox)
+        weightMap = afwImage.ImageU(self.coaddBBox)
+        plainCoadd = afwImage.MaskedImageF(self.coaddBBox)
+        plainWeightMap = afwImage.ImageU(self.coaddBBox)
+        refImage = np.zeros(coadd.image.array.shape, dtype=np.float64)
+        for i in range(2000):
+            maskedImage = makeRandomMaskedImage(self.rng, self.coaddBBox, imageRange=(0, 1000))
+            overlapBBox = coaddUtils.addToCoaddCompensated(coadd, compensation, weightMap, maskedImage,
+                                                           self.badPixelMask, 1)
+            self.assertEqual(overlapBBox, self.coaddBBox)
+            coaddUtils.addToCoadd(plainCoadd, plainWeightMap, maskedImage, self.badPixelMask, 1)
+            good = (maskedImage.mask.array & self.badPixelMask) == 0
+            refImage[good] += maskedImage.image.array[good]
+
+        # everything but the image matches addToCoadd
+        self.assertImagesEqual(coadd.mask, plainCoadd.mask)
+        self.assertImagesEqual(coadd.variance, plainCoadd.variance)
+        self.assertImagesEqual(weightMap, plainWeightMap)
+
+        compensatedError = np.abs(coadd.image.array.astype(np.float64) + compensation.array - refImage)
+        plainError = np.abs(plainCoadd.image.array.astype(np.float64) - refImage)
+        # a double coadd would be accurate to about 1 ulp of the float result
+        ulp = np.spacing(refImage.astype(np.float32))
+        self.assertLessEqual(np.max(compensatedError / ulp), 1.0)
+        self.assertGreater(np.max(plainError / ulp), 10.0)
+
+    def testInfinite(self):
+        """Test that infinite inputs and sums do not make the compensation NaN"""
+        coadd = afwImage.MaskedImageF(self.coaddBBox)
+        compensation = afwImage.ImageF(self.coaddBBox)
+        weightMap = afwImage.ImageF(self.coaddBBox)
+        big = np.finfo(np.float32).max
+        for i in range(3):
+            maskedImage = makeRandomMaskedImage(self.rng, self.coaddBBox, imageRange=(0, 1000))
+            maskedImage.mask.array[:, :] = 0
+            maskedImage.image.array[0, 0] = np.inf
+            maskedImage.image.array[0, 1] = -np.inf
+            # the sum of these overflows on the second input
+            maskedImage.image.array[1, 0] = big
+            coaddUtils.addToCoaddCompensated(coadd, compensation, weightMap, maskedImage,
+                                             self.badPixelMask, 1.0)
+
+        self.assertTrue(np.all(np.isfinite(compensation.array)))
+        total = coadd.image.array + compensation.array
+        self.assertEqual(total[0, 0], np.inf)
+        self.assertEqual(total[0, 1], -np.inf)
+        self.assertEqual(total[1, 0], np.inf)
+        total[0, 0:2] = total[1, 0] = 0
+        self.assertTrue(np.all(np.isfinite(total)))
+
+    def testSaturation(self):
+        """Test that integer weight maps saturate instead of overflowing"""
+        maskedImage = makeRandomMaskedImage(self.rng, self.coaddBBox, imageRange=(0, 1000))
+        maskedImage.mask.array[:, :] = 0
+        maskedImage.mask.array[0, 0] = self.badPixelMask
+        for useCompensated in (False, True):
+            with self.subTest(useCompensated=useCompensated):
+                coadd = afwImage.MaskedImageF(self.coaddBBox)
+                compensation = afwImage.ImageF(self.coaddBBox)
+                weightMap = afwImage.ImageU(self.coaddBBox)
+                for i in range(3):
+                    if useCompensated:
+                        coaddUtils.addToCoaddCompensated(coadd, compensation, weightMap, maskedImage,
+                                                         self.badPixelMask, 30000)
+                    else:
+                        coaddUtils.addToCoadd(coadd, weightMap, maskedImage, self.badPixelMask, 30000)
+                self.assertEqual(weightMap.array[0, 0], 0)
+                self.assertTrue(np.all(weightMap.array.flat[1:] == np.iinfo(np.uint16).max))
+                self.assertEqual(coaddUtils.countSaturatedWeights(weightMap), weightMap.array.size - 1)
+
+    def testCountSaturatedWeights(self):
+        """Test that a weight that sums to exactly a limit counts as saturated"""
+        weightMap = afwImage.ImageI(self.coaddBBox)
+        self.assertEqual(coaddUtils.countSaturatedWeights(weightMap), 0)
+        weightMap.array[0, 0] = np.iinfo(np.int32).max
+        weightMap.array[0, 1] = np.iinfo(np.int32).min
+        weightMap.array[0, 2] = np.iinfo(np.int32).max - 1
+        self.assertEqual(coaddUtils.countSaturatedWeights(weightMap), 2)
+        self.assertEqual(coaddUtils.countSaturatedWeights(afwImage.ImageU(self.coaddBBox)), 0)
+        floatWeightMap = afwImage.ImageF(self.coaddBBox)
+        floatWeightMap.array[:, :] = np.finfo(np.float32).max
+        self.assertEqual(coaddUtils.countSaturatedWeights(floatWeightMap), 0)
+
+    def testAssertions(self):
+        """Test that the compensation image must match the coadd"""
+        maskedImage = makeRandomMaskedImage(self.rng, self.coaddBBox, imageRange=(0, 1000))
+        coadd = afwImage.MaskedImageF(self.coaddBBox)
+        weightMap = afwImage.ImageF(self.coaddBBox)
+        badBBox = geom.Box2I(self.coaddBBox.getMin(), geom.Extent2I(3, 3))
+        with self.assertRaises(pexExcept.InvalidParameterError):
+            coaddUtils.addToCoaddCompensated(coadd, afwImage.ImageF(badBBox), weightMap, maskedImage,
+                                             self.badPixelMask, 1.0)
+
+
+class AddToCoaddTargetsTestCase(lsst.utils.tests.TestCase):
+    """A test case for addToCoaddTargets
+    """
+
+    def setUp(self):
+        self.rng = np.random.RandomState(86420)
+        self.imageBBox = geom.Box2I(geom.Point2I(10, 20), geom.Extent2I(40, 30))
+        self.maskedImage = afwImage.MaskedImageF(self.imageBBox)
+        shape = self.maskedImage.image.array.shape
+        self.maskedImage.image.array[:, :] = self.rng.normal(size=shape)
+        self.maskedImage.mask.array[:, :] = self.rng.randint(0, 4, size=shape)
+        self.maskedImage.variance.array[:, :] = self.rng.uniform(1, 2, size=shape)
+        self.coaddBBox = geom.Box2I(geom.Point2I(0, 0), geom.Extent2I(45, 40))
+        self.otherBBox = geom.Box2I(geom.Point2I(30, 35), geom.Extent2I(50, 50))
+        self.farBBox = geom.Box2I(geom.Point2I(500, 500), geom.Extent2I(10, 10))
+
+    def testTargets(self):
+        """Test that updating several targets in one pass matches updating each separately"""
+        Target = coaddUtils.CoaddTargetFD
+
+        def makeTargets():
+            return [
+                Target(Target.ADD, afwImage.MaskedImageF(self.coaddBBox), afwImage.ImageD(self.coaddBBox),
+                       0x1, 0.5),
+                Target(Target.ADD, afwImage.MaskedImageF(self.otherBBox), afwImage.ImageD(self.otherBBox),
+                       0x3, 2.0),
+                Target(Target.COPY_GOOD, coadd=afwImage.MaskedImageF(self.coaddBBox), badPixelMask=0x1),
+                Target(Target.ADD_WEIGHT, weightMap=afwImage.ImageD(self.coaddBBox), badPixelMask=0x2,
+                       weight=30.0),
+                Target(Target.ADD, afwImage.MaskedImageF(self.farBBox), afwImage.ImageD(self.farBBox),
+                       0x1, 1.0),
+            ]
+
+        refTargets = makeTargets()
+        refOverlapBBoxList = []
+        for target in refTargets:
+            if target.operation == Target.COPY_GOOD:
+                coaddUtils.copyGoodPixels(target.coadd, self.maskedImage, target.badPixelMask)
+                overlapBBox = geom.Box2I(target.coadd.getBBox())
+                overlapBBox.clip(self.imageBBox)
+            elif target.operation == Target.ADD_WEIGHT:
+                overlapBBox = geom.Box2I(target.weightMap.getBBox())
+                overlapBBox.clip(self.imageBBox)
+                isGood = (self.maskedImage[overlapBBox].mask.array & target.badPixelMask) == 0
+                target.weightMap[overlapBBox].array[isGood] += target.weight
+            else:
+                overlapBBox = coaddUtils.addToCoadd(target.coadd, target.weightMap, self.maskedImage,
+                                                    target.badPixelMask, target.weight)
+            refOverlapBBoxList.append(overlapBBox)
+
+        for numThreads in (1, 3):
+            with self.subTest(numThreads=numThreads):
+                targets = makeTargets()
+                coaddUtils.setNumThreads(numThreads)
+                try:
+                    overlapBBoxList = coaddUtils.addToCoaddTargets(targets, self.maskedImage)
+                finally:
+                    coaddUtils.setNumThreads(1)
+                self.assertEqual(overlapBBoxList, refOverlapBBoxList)
+                for target, refTarget in zip(targets, refTargets):
+                    if target.coadd is not None:
+                        self.assertMaskedImagesEqual(target.coadd, refTarget.coadd)
+                    if target.weightMap is not None:
+                        self.assertImagesEqual(target.weightMap, refTarget.weightMap)
+
+    def testAssertions(self):
+        """Test that targets must have the images their operation needs, with consistent bboxes"""
+        Target = coaddUtils.CoaddTargetFD
+        coadd = afwImage.MaskedImageF(self.coaddBBox)
+        weightMap = afwImage.ImageD(self.coaddBBox)
+        for target in (
+            Target(Target.ADD, coadd=coadd),
+            Target(Target.ADD, weightMap=weightMap),
+            Target(Target.COPY_GOOD, weightMap=weightMap),
+            Target(Target.ADD_WEIGHT, coadd=coadd),
+            Target(Target.ADD, coadd, afwImage.ImageD(self.otherBBox), 0x1),
+        ):
+            with self.assertRaises(pexExcept.InvalidParameterError):
+                coaddUtils.addToCoaddTargets([target], self.maskedImage)
+
+
 class AddToCoaddAfwdataTestCase(unittest.TestCase):
     """A test case for addToCoadd using afwdata
     """
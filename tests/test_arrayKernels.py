@@ -0,0 +1,156 @@
+# This file is part of coadd_utils.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Test the array versions of the coadd kernels against the afw image versions
+"""
+import unittest
+
+import numpy as np
+
+import lsst.utils.tests
+import lsst.geom as geom
+import lsst.afw.image as afwImage
+import lsst.pex.exceptions as pexExcept
+import lsst.coadd.utils as coaddUtils
+
+from coaddTestUtils import makeRandomMaskedImage
+
+
+class ArrayKernelsTestCase(lsst.utils.tests.TestCase):
+    """Compare addToCoaddArrays, copyGoodPixelsArrays and setCoaddEdgeBitsArrays
+    with addToCoadd, copyGoodPixels and setCoaddEdgeBits
+    """
+
+    def setUp(self):
+        self.rng = np.random.RandomState(12345)
+        self.coaddBBox = geom.Box2I(geom.Point2I(-5, 10), geom.Extent2I(40, 31))
+        self.inputBBox = geom.Box2I(geom.Point2I(12, -3), geom.Extent2I(35, 29))
+        self.badPixelMask = 0x1
+
+    def testAddToCoaddArrays(self):
+        for maskedImageType in (afwImage.MaskedImageF, afwImage.MaskedImageD):
+            for weightType in (afwImage.ImageF, afwImage.ImageD, afwImage.ImageI, afwImage.ImageU):
+                weight = weightType(self.coaddBBox).array.dtype.type(2).item()
+                coadd = makeRandomMaskedImage(self.rng, self.coaddBBox, maskedImageType, (0, 100))
+                weightMap = weightType(self.coaddBBox)
+                maskedImage = makeRandomMaskedImage(self.rng, self.inputBBox, maskedImageType, (0, 100))
+                refCoadd = coadd.clone()
+                refWeightMap = weightMap.clone()
+                refBBox = coaddUtils.addToCoadd(refCoadd, refWeightMap, maskedImage, self.badPixelMask,
+                                                weight)
+
+                coaddX0, coaddY0 = self.coaddBBox.getMin()
+                x0, y0 = self.inputBBox.getMin()
+                bbox = coaddUtils.addToCoaddArrays(
+                    coadd.image.array, coadd.mask.array, coadd.variance.array, weightMap.array,
+                    coaddX0, coaddY0, maskedImage.image.array, maskedImage.mask.array,
+                    maskedImage.variance.array, x0, y0, self.badPixelMask, weight)
+                self.assertEqual(bbox, refBBox)
+                self.assertMaskedImagesEqual(coadd, refCoadd)
+                self.assertImagesEqual(weightMap, refWeightMap)
+
+                image = maskedImage.image
+                image.array[image.array < 20] = np.nan
+                refBBox = coaddUtils.addToCoadd(refCoadd.image, refWeightMap, image, weight)
+                bbox = coaddUtils.addToCoaddArrays(coadd.image.array, weightMap.array, coaddX0, coaddY0,
+                                                   image.array, x0, y0, weight)
+                self.assertEqual(bbox, refBBox)
+                self.assertImagesEqual(coadd.image, refCoadd.image)
+                self.assertImagesEqual(weightMap, refWeightMap)
+
+    def testCopyGoodPixelsArrays(self):
+        for maskedImageType in (afwImage.MaskedImageF, afwImage.MaskedImageD):
+            dest = makeRandomMaskedImage(self.rng, self.coaddBBox, maskedImageType, (0, 100))
+            src = makeRandomMaskedImage(self.rng, self.inputBBox, maskedImageType, (0, 100))
+            refDest = dest.clone()
+            refNumGood = coaddUtils.copyGoodPixels(refDest, src, self.badPixelMask)
+
+            destX0, destY0 = self.coaddBBox.getMin()
+            srcX0, srcY0 = self.inputBBox.getMin()
+            numGood = coaddUtils.copyGoodPixelsArrays(
+                dest.image.array, dest.mask.array, dest.variance.array, destX0, destY0,
+                src.image.array, src.mask.array, src.variance.array, srcX0, srcY0, self.badPixelMask)
+            self.assertEqual(numGood, refNumGood)
+            self.assertMaskedImagesEqual(dest, refDest)
+
+            src.image.array[src.image.array < 20] = np.nan
+            refNumGood = coaddUtils.copyGoodPixels(refDest.image, src.image)
+            numGood = coaddUtils.copyGoodPixelsArrays(dest.image.array, destX0, destY0,
+                                                      src.image.array, srcX0, srcY0)
+            self.assertEqual(numGood, refNumGood)
+            self.assertImagesEqual(dest.image, refDest.image)
+
+    def testSetCoaddEdgeBitsArrays(self):
+        edgeMask = afwImage.Mask.getPlaneBitMask("NO_DATA")
+        for weightType in (afwImage.ImageF, afwImage.ImageD, afwImage.ImageI, afwImage.ImageU):
+            weightMap = weightType(self.coaddBBox)
+            weightMap.array[:, :] = self.rng.randint(0, 2, size=weightMap.array.shape)
+            mask = afwImage.Mask(self.coaddBBox)
+            mask.array[:, :] = self.rng.randint(0, 4, size=mask.array.shape)
+            refMask = mask.clone()
+            coaddUtils.setCoaddEdgeBits(refMask, weightMap)
+            coaddUtils.setCoaddEdgeBitsArrays(mask.array, weightMap.array, edgeMask)
+            self.assertMasksEqual(mask, refMask)
+
+    def testNoCopy(self):
+        """Arrays that would need converting or copying are rejected
+        """
+        coadd = np.zeros((10, 10), dtype=np.float32)
+        image = np.ones((10, 10), dtype=np.float32)
+        with self.assertRaises(TypeError):
+            coaddUtils.addToCoaddArrays(coadd, np.zeros((10, 10), dtype=np.int64), 0, 0, image, 0, 0, 1)
+        with self.assertRaises(TypeError):
+            coaddUtils.addToCoaddArrays(coadd.tolist(), np.zeros((10, 10)), 0, 0, image, 0, 0, 1.0)
+        with self.assertRaises(pexExcept.InvalidParameterError):
+            coaddUtils.addToCoaddArrays(coadd[:, ::2], np.zeros((10, 5)), 0, 0, image, 0, 0, 1.0)
+        readOnly = np.zeros((10, 10), dtype=np.float32)
+        readOnly.flags.writeable = False
+        with self.assertRaises(ValueError):
+            coaddUtils.addToCoaddArrays(readOnly, np.zeros((10, 10)), 0, 0, image, 0, 0, 1.0)
+
+        # strided rows and read-only inputs are fine
+        weightMap = np.zeros((20, 10))
+        image.flags.writeable = False
+        coaddUtils.addToCoaddArrays(coadd, weightMap[::2], 0, 0, image, 0, 0, 1.0)
+        np.testing.assert_array_equal(coadd, image)
+        np.testing.assert_array_equal(weightMap[::2], 1.0)
+        np.testing.assert_array_equal(weightMap[1::2], 0.0)
+
+    def testAssertions(self):
+        coadd = np.zeros((10, 10), dtype=np.float32)
+        image = np.ones((10, 10), dtype=np.float32)
+        with self.assertRaises(pexExcept.InvalidParameterError):
+            coaddUtils.addToCoaddArrays(coadd, np.zeros((10, 11)), 0, 0, image, 0, 0, 1.0)
+        with self.assertRaises(pexExcept.InvalidParameterError):
+            coaddUtils.setCoaddEdgeBitsArrays(np.zeros((10, 10), dtype=np.int32), np.zeros((9, 10)), 1)
+
+
+class MemoryTester(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
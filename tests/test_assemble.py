@@ -0,0 +1,256 @@
+# This file is part of coadd_utils.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Test lsst.coadd.utils.assembleCoadd and assembleCoaddStreaming
+"""
+import os
+import tempfile
+import threading
+import unittest
+
+import numpy as np
+
+import lsst.utils.tests
+import lsst.geom as geom
+import lsst.afw.image as afwImage
+import lsst.coadd.utils as coaddUtils
+
+
+class SyntheticLoader:
+    """Picklable loader that makes the same random masked image on each call.
+    """
+
+    def __init__(self, bbox, seed, pixelType=np.float32):
+        self.bbox = bbox
+        self.seed = seed
+        self.pixelType = pixelType
+        self.calls = []
+
+    def __call__(self, bbox):
+        self.calls.append(bbox)
+        rng = np.random.RandomState(self.seed)
+        maskedImage = {np.float32: afwImage.MaskedImageF, np.float64: afwImage.MaskedImageD}[self.pixelType](
+            self.bbox)
+        shape = maskedImage.image.array.shape
+        maskedImage.image.array[:, :] = rng.normal(size=shape)
+        maskedImage.mask.array[:, :] = rng.randint(0, 4, size=shape)
+        maskedImage.variance.array[:, :] = rng.uniform(1, 2, size=shape)
+        return maskedImage
+
+
+class AssembleTestMixin:
+    """Inputs, and a reference coadd made from them with addToCoadd
+    """
+
+    def setUp(self):
+        self.coaddBBox = geom.Box2I(geom.Point2I(5, 7), geom.Extent2I(50, 80))
+        bboxList = [
+            geom.Box2I(geom.Point2I(0, 0), geom.Extent2I(30, 40)),
+            geom.Box2I(geom.Point2I(20, 30), geom.Extent2I(60, 30)),
+            geom.Box2I(geom.Point2I(10, 50), geom.Extent2I(40, 60)),
+            geom.Box2I(geom.Point2I(200, 300), geom.Extent2I(10, 10)),
+        ]
+        self.inputs = [coaddUtils.CoaddInput(SyntheticLoader(bbox, seed), bbox, weight)
+                       for seed, (bbox, weight) in enumerate(zip(bboxList, [1.0, 0.5, 2.0, 3.0]))]
+        self.badPixelMask = 0x1
+
+    def makeReference(self, coaddType=afwImage.MaskedImageF, weightType=afwImage.ImageD):
+        coadd = coaddType(self.coaddBBox)
+        weightMap = weightType(self.coaddBBox)
+        for coaddInput in self.inputs:
+            coaddUtils.addToCoadd(coadd, weightMap, coaddInput.loader(coaddInput.bbox), self.badPixelMask,
+                                  weightMap.array.dtype.type(coaddInput.weight).item())
+        return coadd, weightMap
+
+
+class AssembleCoaddTestCase(AssembleTestMixin, lsst.utils.tests.TestCase):
+    """Compare assembleCoadd against addToCoadd
+    """
+
+    def testAssemble(self):
+        refCoadd, refWeightMap = self.makeReference()
+        for numProcesses, numBands in [(1, 1), (1, 5), (2, None), (3, 7)]:
+            with self.subTest(numProcesses=numProcesses, numBands=numBands):
+                coadd, weightMap = coaddUtils.assembleCoadd(self.coaddBBox, self.inputs, self.badPixelMask,
+                                                            numProcesses=numProcesses, numBands=numBands)
+                self.assertMaskedImagesEqual(coadd, refCoadd)
+                self.assertImagesEqual(weightMap, refWeightMap)
+
+    def testBandLoads(self):
+        """Each input is only loaded for the bands it overlaps, and only
+        the overlapping region is requested
+        """
+        coaddUtils.assembleCoadd(self.coaddBBox, self.inputs, self.badPixelMask, numProcesses=1, numBands=4)
+        numCalls = [len(coaddInput.loader.calls) for coaddInput in self.inputs]
+        self.assertEqual(numCalls, [2, 2, 2, 0])
+        for coaddInput in self.inputs:
+            for bbox in coaddInput.loader.calls:
+                self.assertTrue(coaddInput.bbox.contains(bbox))
+                self.assertTrue(self.coaddBBox.contains(bbox))
+
+    def testTypesAndFinalize(self):
+        for coaddType, maskedImageType in [(np.float32, afwImage.MaskedImageF),
+                                           (np.float64, afwImage.MaskedImageD)]:
+            for weightType, imageType in [(np.float32, afwImage.ImageF), (np.int32, afwImage.ImageI)]:
+                for coaddInput in self.inputs:
+                    coaddInput.loader.pixelType = coaddType
+                refCoadd, refWeightMap = self.makeReference(maskedImageType, imageType)
+                coaddUtils.finalizeCoadd(refCoadd, refWeightMap)
+                coadd, weightMap = coaddUtils.assembleCoadd(self.coaddBBox, self.inputs, self.badPixelMask,
+                                                            numProcesses=2, coaddType=coaddType,
+                                                            weightType=weightType, finalize=True)
+                self.assertIsInstance(coadd, maskedImageType)
+                self.assertIsInstance(weightMap, imageType)
+                self.assertMaskedImagesEqual(coadd, refCoadd)
+                self.assertImagesEqual(weightMap, refWeightMap)
+
+    def testNoInputs(self):
+        coadd, weightMap = coaddUtils.assembleCoadd(self.coaddBBox, [], self.badPixelMask, numProcesses=2)
+        self.assertEqual(coadd.getBBox(), self.coaddBBox)
+        np.testing.assert_array_equal(weightMap.array, 0)
+
+    def testErrors(self):
+        with self.assertRaises(ValueError):
+            coaddUtils.assembleCoadd(self.coaddBBox, self.inputs, self.badPixelMask, coaddType=np.int32)
+        with self.assertRaises(ValueError):
+            coaddUtils.assembleCoadd(self.coaddBBox, self.inputs, self.badPixelMask, numProcesses=0)
+
+
+class AssembleCoaddStreamingTestCase(AssembleTestMixin, lsst.utils.tests.TestCase):
+    """Compare assembleCoaddStreaming against addToCoadd
+    """
+
+    def testAssemble(self):
+        refCoadd, refWeightMap = self.makeReference()
+        for prefetch, numIoThreads in [(0, 1), (1, 1), (2, 1), (3, 2), (10, 3)]:
+            with self.subTest(prefetch=prefetch, numIoThreads=numIoThreads):
+                coadd, weightMap = coaddUtils.assembleCoaddStreaming(
+                    self.coaddBBox, iter(self.inputs), self.badPixelMask, prefetch=prefetch,
+                    numIoThreads=numIoThreads)
+                self.assertMaskedImagesEqual(coadd, refCoadd)
+                self.assertImagesEqual(weightMap, refWeightMap)
+
+    def testUnknownBBox(self):
+        """Inputs without a bbox are loaded and clipped to the coadd;
+        inputs known not to overlap are never loaded
+        """
+        refCoadd, refWeightMap = self.makeReference()
+        for coaddInput in self.inputs:
+            coaddInput.loader.calls.clear()
+        inputs = [coaddInput._replace(bbox=None) for coaddInput in self.inputs[:-1]] + self.inputs[-1:]
+        coadd, weightMap = coaddUtils.assembleCoaddStreaming(self.coaddBBox, inputs, self.badPixelMask)
+        self.assertMaskedImagesEqual(coadd, refCoadd)
+        self.assertImagesEqual(weightMap, refWeightMap)
+        for coaddInput in inputs[:-1]:
+            self.assertEqual(coaddInput.loader.calls, [self.coaddBBox])
+        self.assertEqual(inputs[-1].loader.calls, [])
+
+    def testBackPressure(self):
+        """The input generator is never more than prefetch + 1 inputs ahead
+        of the input being added
+        """
+        for prefetch in (0, 1, 3):
+            numYielded = [0]
+            lock = threading.Lock()
+
+            class RecordingLoader(SyntheticLoader):
+                def __call__(self, bbox):
+                    with lock:
+                        self.numYieldedAtLoad = numYielded[0]
+                    return super().__call__(bbox)
+
+            inputs = [coaddUtils.CoaddInput(RecordingLoader(self.coaddBBox, seed), self.coaddBBox, 1.0)
+                      for seed in range(8)]
+
+            def generate():
+                for coaddInput in inputs:
+                    with lock:
+                        numYielded[0] += 1
+                    yield coaddInput
+
+            coaddUtils.assembleCoaddStreaming(self.coaddBBox, generate(), self.badPixelMask,
+                                              prefetch=prefetch)
+            for i, coaddInput in enumerate(inputs):
+                self.assertLessEqual(coaddInput.loader.numYieldedAtLoad, i + prefetch + 1)
+
+    def testPaths(self):
+        refCoadd, refWeightMap = self.makeReference()
+        with tempfile.TemporaryDirectory() as directory:
+            paths = []
+            for i, coaddInput in enumerate(self.inputs):
+                paths.append(os.path.join(directory, f"input{i}.fits"))
+                coaddInput.loader(coaddInput.bbox).writeFits(paths[-1])
+            inputs = [coaddUtils.CoaddInput(coaddUtils.FitsLoader(path), coaddInput.bbox, coaddInput.weight)
+                      for path, coaddInput in zip(paths, self.inputs)]
+            coadd, weightMap = coaddUtils.assembleCoaddStreaming(self.coaddBBox, inputs, self.badPixelMask)
+            self.assertMaskedImagesEqual(coadd, refCoadd)
+            self.assertImagesEqual(weightMap, refWeightMap)
+
+            # bare paths have weight 1
+            coadd, weightMap = coaddUtils.assembleCoaddStreaming(self.coaddBBox, paths[:1], self.badPixelMask)
+            refCoadd = afwImage.MaskedImageF(self.coaddBBox)
+            refWeightMap = afwImage.ImageD(self.coaddBBox)
+            coaddUtils.addToCoadd(refCoadd, refWeightMap, afwImage.MaskedImageF(paths[0]), self.badPixelMask,
+                                  1.0)
+            self.assertMaskedImagesEqual(coadd, refCoadd)
+            self.assertImagesEqual(weightMap, refWeightMap)
+
+    def testTypesAndFinalize(self):
+        for coaddType, maskedImageType in [(np.float32, afwImage.MaskedImageF),
+                                           (np.float64, afwImage.MaskedImageD)]:
+            for coaddInput in self.inputs:
+                coaddInput.loader.pixelType = coaddType
+            refCoadd, refWeightMap = self.makeReference(maskedImageType, afwImage.ImageF)
+            coaddUtils.finalizeCoadd(refCoadd, refWeightMap)
+            coadd, weightMap = coaddUtils.assembleCoaddStreaming(
+                self.coaddBBox, self.inputs, self.badPixelMask, coaddType=coaddType, weightType=np.float32,
+                finalize=True)
+            self.assertMaskedImagesEqual(coadd, refCoadd)
+            self.assertImagesEqual(weightMap, refWeightMap)
+
+    def testNoInputs(self):
+        coadd, weightMap = coaddUtils.assembleCoaddStreaming(self.coaddBBox, iter([]), self.badPixelMask)
+        np.testing.assert_array_equal(weightMap.array, 0)
+
+    def testErrors(self):
+        with self.assertRaises(ValueError):
+            coaddUtils.assembleCoaddStreaming(self.coaddBBox, self.inputs, self.badPixelMask, prefetch=-1)
+
+        class FailingLoader:
+            def __call__(self, bbox):
+                raise RuntimeError("read failed")
+
+        inputs = self.inputs[:1] + [coaddUtils.CoaddInput(FailingLoader(), None, 1.0)] + self.inputs[1:]
+        with self.assertRaisesRegex(RuntimeError, "read failed"):
+            coaddUtils.assembleCoaddStreaming(self.coaddBBox, inputs, self.badPixelMask)
+
+
+class MemoryTester(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
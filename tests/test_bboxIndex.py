@@ -0,0 +1,84 @@
+# This file is part of coadd_utils.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Test lsst.coadd.utils.BBoxIndex
+"""
+import unittest
+
+import numpy as np
+
+import lsst.utils.tests
+import lsst.geom as geom
+import lsst.coadd.utils as coaddUtils
+
+
+class BBoxIndexTestCase(lsst.utils.tests.TestCase):
+    """Compare BBoxIndex queries against a brute-force search
+    """
+
+    def setUp(self):
+        rng = np.random.RandomState(12345)
+        self.bboxList = []
+        for i in range(200):
+            x0, y0 = rng.randint(-5000, 5000, size=2)
+            width, height = rng.randint(1, 3000, size=2)
+            self.bboxList.append(geom.Box2I(geom.Point2I(int(x0), int(y0)),
+                                            geom.Extent2I(int(width), int(height))))
+        self.bboxList.append(geom.Box2I())
+
+    def bruteForceQuery(self, bbox):
+        overlaps = []
+        for i, inputBBox in enumerate(self.bboxList):
+            overlapBBox = geom.Box2I(bbox)
+            overlapBBox.clip(inputBBox)
+            if not overlapBBox.isEmpty():
+                overlaps.append((overlapBBox, i))
+        return overlaps
+
+    def testQuery(self):
+        for cellSize in (100, 1000, 100000):
+            index = coaddUtils.BBoxIndex(cellSize=cellSize)
+            for i, bbox in enumerate(self.bboxList):
+                index.add(bbox, i)
+            self.assertEqual(len(index), len(self.bboxList))
+
+            for x0 in range(-6000, 6000, 1700):
+                for y0 in range(-6000, 6000, 1300):
+                    queryBBox = geom.Box2I(geom.Point2I(x0, y0), geom.Extent2I(1000, 800))
+                    self.assertEqual(index.query(queryBBox), self.bruteForceQuery(queryBBox))
+            self.assertEqual(index.query(geom.Box2I()), [])
+
+    def testBadCellSize(self):
+        with self.assertRaises(ValueError):
+            coaddUtils.BBoxIndex(cellSize=0)
+
+
+class MemoryTester(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
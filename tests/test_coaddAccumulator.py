@@ -0,0 +1,156 @@
+# This file is part of coadd_utils.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Test lsst.coadd.utils.CoaddAccumulator
+"""
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import lsst.utils.tests
+import lsst.geom as geom
+import lsst.afw.image as afwImage
+import lsst.coadd.utils as coaddUtils
+
+
+class CoaddAccumulatorTestCase(lsst.utils.tests.TestCase):
+    """Compare CoaddAccumulator, interrupted and resumed, against addToCoadd
+    """
+
+    def setUp(self):
+        rng = np.random.RandomState(12345)
+        self.coaddBBox = geom.Box2I(geom.Point2I(5, 7), geom.Extent2I(50, 80))
+        self.badPixelMask = 0x1
+        self.inputs = []
+        for i in range(6):
+            bbox = geom.Box2I(geom.Point2I(i*10 - 10, i*5), geom.Extent2I(40, 60))
+            maskedImage = afwImage.MaskedImageF(bbox)
+            shape = maskedImage.image.array.shape
+            maskedImage.image.array[:, :] = rng.normal(size=shape)
+            maskedImage.mask.array[:, :] = rng.randint(0, 4, size=shape)
+            maskedImage.variance.array[:, :] = rng.uniform(1, 2, size=shape)
+            self.inputs.append(((1000 + i, "r"), maskedImage, 1.0 + i))
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.tempDir.name, "checkpoint")
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def makeReference(self, weightMapClass=afwImage.ImageD):
+        coadd = afwImage.MaskedImageF(self.coaddBBox)
+        weightMap = weightMapClass(self.coaddBBox)
+        for _, maskedImage, weight in self.inputs:
+            coaddUtils.addToCoadd(coadd, weightMap, maskedImage, self.badPixelMask,
+                                  weightMap.array.dtype.type(weight).item())
+        return coadd, weightMap
+
+    def testNoCheckpoint(self):
+        accumulator = coaddUtils.CoaddAccumulator(self.coaddBBox, self.badPixelMask)
+        for inputId, maskedImage, weight in self.inputs:
+            self.assertTrue(accumulator.add(inputId, maskedImage, weight))
+        self.assertFalse(accumulator.add(*self.inputs[0]))
+        coadd, weightMap = accumulator.finish()
+        refCoadd, refWeightMap = self.makeReference()
+        self.assertMaskedImagesEqual(coadd, refCoadd)
+        self.assertImagesEqual(weightMap, refWeightMap)
+        self.assertEqual(accumulator.inputIds, [inputId for inputId, _, _ in self.inputs])
+        self.assertEqual(len(accumulator), len(self.inputs))
+
+    def testIntegerWeightMap(self):
+        """Test that float weights are converted for integer weight maps"""
+        for weightType, weightMapClass in ((np.int32, afwImage.ImageI), (np.uint16, afwImage.ImageU)):
+            with self.subTest(weightType=weightType):
+                accumulator = coaddUtils.CoaddAccumulator(self.coaddBBox, self.badPixelMask,
+                                                          weightType=weightType)
+                for inputId, maskedImage, weight in self.inputs:
+                    accumulator.add(inputId, maskedImage, weight)
+                coadd, weightMap = accumulator.finish()
+                self.assertIsInstance(weightMap, weightMapClass)
+                refCoadd, refWeightMap = self.makeReference(weightMapClass)
+                self.assertMaskedImagesEqual(coadd, refCoadd)
+                self.assertImagesEqual(weightMap, refWeightMap)
+
+    def testResume(self):
+        for compression in (None, "zlib"):
+            with self.subTest(compression=compression):
+                directory = f"{self.directory}-{compression}"
+                accumulator = coaddUtils.CoaddAccumulator(self.coaddBBox, self.badPixelMask,
+                                                          checkpointDirectory=directory,
+                                                          checkpointInterval=2, compression=compression)
+                # interrupted after 5 inputs, of which 4 were checkpointed
+                for inputId, maskedImage, weight in self.inputs[:5]:
+                    accumulator.add(inputId, maskedImage, weight)
+                del accumulator
+
+                resumed = coaddUtils.CoaddAccumulator(self.coaddBBox, self.badPixelMask,
+                                                      checkpointDirectory=directory,
+                                                      checkpointInterval=2, compression=compression)
+                self.assertEqual(len(resumed), 4)
+                added = [resumed.add(inputId, maskedImage, weight)
+                         for inputId, maskedImage, weight in self.inputs]
+                self.assertEqual(added, [False]*4 + [True]*2)
+                coadd, weightMap = resumed.finish()
+
+                refCoadd, refWeightMap = self.makeReference()
+                self.assertMaskedImagesEqual(coadd, refCoadd)
+                self.assertImagesEqual(weightMap, refWeightMap)
+
+                # the final checkpoint includes everything; resuming from it adds nothing
+                finished = coaddUtils.CoaddAccumulator(self.coaddBBox, self.badPixelMask,
+                                                       checkpointDirectory=directory)
+                self.assertIn(self.inputs[-1][0], finished)
+                self.assertMaskedImagesEqual(finished.coadd, refCoadd)
+                self.assertImagesEqual(finished.weightMap, refWeightMap)
+
+    def testCheckpointSeconds(self):
+        accumulator = coaddUtils.CoaddAccumulator(self.coaddBBox, self.badPixelMask,
+                                                  checkpointDirectory=self.directory, checkpointSeconds=0)
+        accumulator.add(*self.inputs[0])
+        checkpoint = coaddUtils.readCoaddCheckpoint(self.directory)
+        self.assertEqual(checkpoint.metadata["inputIds"], [list(self.inputs[0][0])])
+
+    def testMismatch(self):
+        accumulator = coaddUtils.CoaddAccumulator(self.coaddBBox, self.badPixelMask,
+                                                  checkpointDirectory=self.directory)
+        accumulator.add(*self.inputs[0])
+        accumulator.finish()
+        with self.assertRaises(ValueError):
+            coaddUtils.CoaddAccumulator(self.coaddBBox, 0x3, checkpointDirectory=self.directory)
+        with self.assertRaises(ValueError):
+            coaddUtils.CoaddAccumulator(geom.Box2I(self.coaddBBox.getMin(), geom.Extent2I(10, 10)),
+                                        self.badPixelMask, checkpointDirectory=self.directory)
+        with self.assertRaises(ValueError):
+            coaddUtils.CoaddAccumulator(self.coaddBBox, self.badPixelMask, coaddType=np.int32)
+
+
+class MemoryTester(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -0,0 +1,100 @@
+# This file is part of coadd_utils.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Test lsst.coadd.utils.finalizeCoadd
+"""
+import unittest
+
+import numpy as np
+
+import lsst.utils.tests
+import lsst.geom as geom
+import lsst.afw.image as afwImage
+import lsst.pex.exceptions as pexExcept
+import lsst.coadd.utils as coaddUtils
+
+
+class FinalizeCoaddTestCase(lsst.utils.tests.TestCase):
+    """Compare finalizeCoadd against normalizing in numpy and setCoaddEdgeBits
+    """
+
+    def setUp(self):
+        self.rng = np.random.RandomState(12345)
+        self.bbox = geom.Box2I(geom.Point2I(10, 20), geom.Extent2I(37, 41))
+
+    def makeCoadd(self, weightType):
+        coadd = afwImage.MaskedImageF(self.bbox)
+        shape = coadd.image.array.shape
+        coadd.image.array[:, :] = self.rng.normal(size=shape)
+        coadd.mask.array[:, :] = self.rng.randint(0, 4, size=shape)
+        coadd.variance.array[:, :] = self.rng.uniform(1, 2, size=shape)
+        weightMap = weightType(self.bbox)
+        weightMap.array[:, :] = self.rng.randint(0, 3, size=shape)
+        return coadd, weightMap
+
+    def testMaskedImage(self):
+        for weightType in (afwImage.ImageD, afwImage.ImageF, afwImage.ImageI, afwImage.ImageU):
+            for fillNaN in (False, True):
+                coadd, weightMap = self.makeCoadd(weightType)
+                isNoData = weightMap.array == 0
+                weight = np.where(isNoData, 1, weightMap.array).astype(np.float32)
+                refImage = coadd.image.array/weight
+                refVariance = coadd.variance.array/(weight*weight)
+                if fillNaN:
+                    refImage[isNoData] = np.nan
+                    refVariance[isNoData] = np.nan
+                refMask = afwImage.Mask(coadd.mask, deep=True)
+                coaddUtils.setCoaddEdgeBits(refMask, weightMap)
+
+                coaddUtils.finalizeCoadd(coadd, weightMap, fillNaN=fillNaN)
+                np.testing.assert_array_equal(coadd.image.array, refImage)
+                np.testing.assert_array_equal(coadd.variance.array, refVariance)
+                self.assertMasksEqual(coadd.mask, refMask)
+
+    def testImage(self):
+        for fillNaN in (False, True):
+            coadd, weightMap = self.makeCoadd(afwImage.ImageD)
+            image = coadd.image
+            isNoData = weightMap.array == 0
+            refImage = image.array/np.where(isNoData, 1, weightMap.array).astype(np.float32)
+            if fillNaN:
+                refImage[isNoData] = np.nan
+            coaddUtils.finalizeCoadd(image, weightMap, fillNaN)
+            np.testing.assert_array_equal(image.array, refImage)
+
+    def testAssertions(self):
+        coadd, _ = self.makeCoadd(afwImage.ImageF)
+        weightMap = afwImage.ImageF(geom.Box2I(geom.Point2I(0, 0), self.bbox.getDimensions()))
+        with self.assertRaises(pexExcept.InvalidParameterError):
+            coaddUtils.finalizeCoadd(coadd, weightMap)
+
+
+class MemoryTester(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
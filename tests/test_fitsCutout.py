@@ -0,0 +1,114 @@
+# This file is part of coadd_utils.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Test lsst.coadd.utils.readFitsCutout and the functions that use it
+"""
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import lsst.utils.tests
+import lsst.geom as geom
+import lsst.afw.image as afwImage
+import lsst.coadd.utils as coaddUtils
+
+
+class FitsCutoutTestCase(lsst.utils.tests.TestCase):
+    """Compare reading cutouts of a FITS file with using the whole image
+    """
+
+    def setUp(self):
+        rng = np.random.RandomState(12345)
+        self.coaddBBox = geom.Box2I(geom.Point2I(5, 7), geom.Extent2I(50, 80))
+        self.inputBBox = geom.Box2I(geom.Point2I(40, -10), geom.Extent2I(60, 30))
+        self.maskedImage = afwImage.MaskedImageF(self.inputBBox)
+        shape = self.maskedImage.image.array.shape
+        self.maskedImage.image.array[:, :] = rng.normal(size=shape)
+        self.maskedImage.mask.array[:, :] = rng.randint(0, 4, size=shape)
+        self.maskedImage.variance.array[:, :] = rng.uniform(1, 2, size=shape)
+        self.badPixelMask = 0x1
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, "input.fits")
+        self.maskedImage.writeFits(self.path)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testReadFitsCutout(self):
+        self.assertEqual(coaddUtils.readFitsBBox(self.path), self.inputBBox)
+        overlapBBox = geom.Box2I(self.coaddBBox)
+        overlapBBox.clip(self.inputBBox)
+        for pixelType in (np.float32, np.float64):
+            cutout = coaddUtils.readFitsCutout(self.path, self.coaddBBox, pixelType)
+            self.assertEqual(cutout.getBBox(), overlapBBox)
+            self.assertEqual(cutout.image.array.dtype, pixelType)
+            self.assertFloatsEqual(cutout.image.array, self.maskedImage[overlapBBox].image.array)
+            self.assertFloatsEqual(cutout.mask.array, self.maskedImage[overlapBBox].mask.array)
+            self.assertFloatsEqual(cutout.variance.array, self.maskedImage[overlapBBox].variance.array)
+
+        farBBox = geom.Box2I(geom.Point2I(500, 500), geom.Extent2I(10, 10))
+        self.assertIsNone(coaddUtils.readFitsCutout(self.path, farBBox))
+
+    def testAddFitsToCoadd(self):
+        coadd = afwImage.MaskedImageF(self.coaddBBox)
+        weightMap = afwImage.ImageD(self.coaddBBox)
+        refCoadd = afwImage.MaskedImageF(self.coaddBBox)
+        refWeightMap = afwImage.ImageD(self.coaddBBox)
+        overlapBBox = coaddUtils.addFitsToCoadd(coadd, weightMap, self.path, self.badPixelMask, 0.5)
+        refOverlapBBox = coaddUtils.addToCoadd(refCoadd, refWeightMap, self.maskedImage,
+                                               self.badPixelMask, 0.5)
+        self.assertEqual(overlapBBox, refOverlapBBox)
+        self.assertMaskedImagesEqual(coadd, refCoadd)
+        self.assertImagesEqual(weightMap, refWeightMap)
+
+        farCoadd = afwImage.MaskedImageF(geom.Box2I(geom.Point2I(500, 500), geom.Extent2I(10, 10)))
+        farWeightMap = afwImage.ImageD(farCoadd.getBBox())
+        overlapBBox = coaddUtils.addFitsToCoadd(farCoadd, farWeightMap, self.path, self.badPixelMask, 1.0)
+        self.assertTrue(overlapBBox.isEmpty())
+
+    def testCopyGoodPixelsFromFits(self):
+        dest = afwImage.MaskedImageF(self.coaddBBox)
+        refDest = afwImage.MaskedImageF(self.coaddBBox)
+        numGood = coaddUtils.copyGoodPixelsFromFits(dest, self.path, self.badPixelMask)
+        refNumGood = coaddUtils.copyGoodPixels(refDest, self.maskedImage, self.badPixelMask)
+        self.assertEqual(numGood, refNumGood)
+        self.assertMaskedImagesEqual(dest, refDest)
+
+    def testFitsLoader(self):
+        loader = coaddUtils.FitsLoader(self.path)
+        cutoutBBox = geom.Box2I(geom.Point2I(45, 0), geom.Extent2I(5, 8))
+        self.assertMaskedImagesEqual(loader(cutoutBBox), self.maskedImage[cutoutBBox])
+        self.assertIsNone(loader(geom.Box2I(geom.Point2I(500, 500), geom.Extent2I(10, 10))))
+
+
+class MemoryTester(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -0,0 +1,188 @@
+# This file is part of coadd_utils.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Test lsst.coadd.utils.GoodPixelSpans and the kernels that use it
+"""
+import unittest
+
+import numpy as np
+
+import lsst.utils.tests
+import lsst.geom as geom
+import lsst.afw.image as afwImage
+import lsst.pex.exceptions as pexExcept
+import lsst.coadd.utils as coaddUtils
+
+
+def makeMaskedImage(rng, bbox, badPixelMask):
+    """Make a masked image with random pixel values
+
+    The bad pixels come in runs, as for bright star halos and chip gaps; the first
+    row is entirely bad and the last row entirely good.
+    """
+    maskedImage = afwImage.MaskedImageF(bbox)
+    shape = maskedImage.image.array.shape
+    maskedImage.image.array[:, :] = rng.normal(size=shape)
+    maskedImage.mask.array[:, :] = rng.randint(0, 4, size=shape) & 0x2
+    maskedImage.variance.array[:, :] = rng.uniform(1, 2, size=shape)
+    for y in range(shape[0]):
+        beginX, endX = sorted(rng.randint(0, shape[1] + 1, size=2))
+        maskedImage.mask.array[y, beginX:endX] |= badPixelMask
+    maskedImage.mask.array[0, :] |= badPixelMask
+    maskedImage.mask.array[-1, :] &= ~badPixelMask
+    return maskedImage
+
+
+class GoodPixelSpansTestCase(lsst.utils.tests.TestCase):
+    """Compare the kernels given a GoodPixelSpans with the kernels given a bad pixel mask
+    """
+
+    def setUp(self):
+        self.rng = np.random.RandomState(97531)
+        self.coaddBBox = geom.Box2I(geom.Point2I(-20, 30), geom.Extent2I(60, 45))
+        # extends beyond the coadd, fully inside the coadd, no overlap
+        self.bboxList = [
+            geom.Box2I(geom.Point2I(-30, 20), geom.Extent2I(50, 40)),
+            geom.Box2I(geom.Point2I(0, 40), geom.Extent2I(25, 15)),
+            geom.Box2I(geom.Point2I(500, 500), geom.Extent2I(10, 10)),
+        ]
+        self.badPixelMask = 0x1
+
+    def testSpans(self):
+        """Test that the spans list exactly the good pixels, as maximal runs"""
+        maskedImage = makeMaskedImage(self.rng, self.bboxList[0], self.badPixelMask)
+        image = maskedImage.image.clone()
+        image.array[(maskedImage.mask.array & self.badPixelMask) != 0] = np.nan
+        isGood = (maskedImage.mask.array & self.badPixelMask) == 0
+        x0 = maskedImage.getX0()
+        for goodPixelSpans in (
+            coaddUtils.GoodPixelSpans(maskedImage.mask, self.badPixelMask),
+            coaddUtils.GoodPixelSpans(image),
+        ):
+            self.assertEqual(goodPixelSpans.getBBox(), maskedImage.getBBox())
+            self.assertEqual(goodPixelSpans.getNumGoodPixels(), np.sum(isGood))
+            numSpans = 0
+            for j, y in enumerate(range(maskedImage.getY0(), maskedImage.getY0() + maskedImage.getHeight())):
+                spans = goodPixelSpans.getRowSpans(y)
+                numSpans += len(spans)
+                rowIsGood = np.zeros(maskedImage.getWidth(), dtype=bool)
+                for beginX, endX in spans:
+                    self.assertLess(beginX, endX)
+                    rowIsGood[beginX - x0:endX - x0] = True
+                np.testing.assert_array_equal(rowIsGood, isGood[j])
+                for (beginX, endX), (nextBeginX, nextEndX) in zip(spans[:-1], spans[1:]):
+                    self.assertLess(endX, nextBeginX)
+            self.assertEqual(goodPixelSpans.getNumSpans(), numSpans)
+            self.assertEqual(goodPixelSpans.getRowSpans(maskedImage.getY0()), [])
+            self.assertEqual(goodPixelSpans.getRowSpans(maskedImage.getY0() + maskedImage.getHeight() - 1),
+                             [(x0, x0 + maskedImage.getWidth())])
+            with self.assertRaises(IndexError):
+                goodPixelSpans.getRowSpans(maskedImage.getY0() - 1)
+
+    def testCopyGoodPixels(self):
+        """Test copyGoodPixels with a GoodPixelSpans for images and masked images"""
+        for bbox in self.bboxList:
+            with self.subTest(bbox=bbox):
+                maskedImage = makeMaskedImage(self.rng, bbox, self.badPixelMask)
+                goodPixelSpans = coaddUtils.GoodPixelSpans(maskedImage.mask, self.badPixelMask)
+
+                dest = afwImage.MaskedImageF(self.coaddBBox)
+                refDest = afwImage.MaskedImageF(self.coaddBBox)
+                numGood = coaddUtils.copyGoodPixels(dest, maskedImage, goodPixelSpans)
+                refNumGood = coaddUtils.copyGoodPixels(refDest, maskedImage, self.badPixelMask)
+                self.assertEqual(numGood, refNumGood)
+                self.assertMaskedImagesEqual(dest, refDest)
+
+                image = maskedImage.image.clone()
+                image.array[(maskedImage.mask.array & self.badPixelMask) != 0] = np.nan
+                destImage = afwImage.ImageF(self.coaddBBox)
+                refDestImage = afwImage.ImageF(self.coaddBBox)
+                numGood = coaddUtils.copyGoodPixels(destImage, image, coaddUtils.GoodPixelSpans(image))
+                refNumGood = coaddUtils.copyGoodPixels(refDestImage, image)
+                self.assertEqual(numGood, refNumGood)
+                self.assertImagesEqual(destImage, refDestImage)
+
+    def testAddToCoadd(self):
+        """Test that addToCoadd with a GoodPixelSpans matches addToCoadd with a bad pixel mask"""
+        maskedImageList = [makeMaskedImage(self.rng, bbox, self.badPixelMask) for bbox in self.bboxList]
+        weightList = [0.5, 1.0, 2.5]
+        refCoadd = afwImage.MaskedImageF(self.coaddBBox)
+        refWeightMap = afwImage.ImageD(self.coaddBBox)
+        refOverlapBBoxList = [
+            coaddUtils.addToCoadd(refCoadd, refWeightMap, maskedImage, self.badPixelMask, weight)
+            for maskedImage, weight in zip(maskedImageList, weightList)
+        ]
+        goodPixelSpansList = [coaddUtils.GoodPixelSpans(maskedImage.mask, self.badPixelMask)
+                              for maskedImage in maskedImageList]
+
+        for numThreads in (1, 3):
+            with self.subTest(numThreads=numThreads):
+                coaddUtils.setNumThreads(numThreads)
+                try:
+                    coadd = afwImage.MaskedImageF(self.coaddBBox)
+                    weightMap = afwImage.ImageD(self.coaddBBox)
+                    overlapBBoxList = [
+                        coaddUtils.addToCoadd(coadd, weightMap, maskedImage, goodPixelSpans, weight)
+                        for maskedImage, goodPixelSpans, weight
+                        in zip(maskedImageList, goodPixelSpansList, weightList)
+                    ]
+                finally:
+                    coaddUtils.setNumThreads(1)
+                self.assertEqual(overlapBBoxList, refOverlapBBoxList)
+                self.assertMaskedImagesEqual(coadd, refCoadd)
+                self.assertImagesEqual(weightMap, refWeightMap)
+
+        refCoaddImage = afwImage.ImageF(self.coaddBBox)
+        refImageWeightMap = afwImage.ImageF(self.coaddBBox)
+        coaddImage = afwImage.ImageF(self.coaddBBox)
+        imageWeightMap = afwImage.ImageF(self.coaddBBox)
+        for maskedImage, weight in zip(maskedImageList, weightList):
+            image = maskedImage.image.clone()
+            image.array[(maskedImage.mask.array & self.badPixelMask) != 0] = np.nan
+            coaddUtils.addToCoadd(refCoaddImage, refImageWeightMap, image, weight)
+            coaddUtils.addToCoadd(coaddImage, imageWeightMap, image, coaddUtils.GoodPixelSpans(image), weight)
+        self.assertImagesEqual(coaddImage, refCoaddImage)
+        self.assertImagesEqual(imageWeightMap, refImageWeightMap)
+
+    def testAssertions(self):
+        """Test that the spans must have the bounding box of the input"""
+        maskedImage = makeMaskedImage(self.rng, self.bboxList[0], self.badPixelMask)
+        otherMask = makeMaskedImage(self.rng, self.bboxList[1], self.badPixelMask).mask
+        otherSpans = coaddUtils.GoodPixelSpans(otherMask, self.badPixelMask)
+        coadd = afwImage.MaskedImageF(self.coaddBBox)
+        weightMap = afwImage.ImageD(self.coaddBBox)
+        with self.assertRaises(pexExcept.InvalidParameterError):
+            coaddUtils.addToCoadd(coadd, weightMap, maskedImage, otherSpans, 1.0)
+        with self.assertRaises(pexExcept.InvalidParameterError):
+            coaddUtils.copyGoodPixels(coadd, maskedImage, otherSpans)
+
+
+class MemoryTester(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
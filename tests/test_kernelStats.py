@@ -0,0 +1,216 @@
+# This file is part of coadd_utils.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Test the lsst.coadd.utils kernel counters
+"""
+import concurrent.futures
+import unittest
+
+import numpy as np
+
+import lsst.utils.tests
+import lsst.geom as geom
+import lsst.afw.image as afwImage
+import lsst.coadd.utils as coaddUtils
+
+
+class KernelStatsTestCase(lsst.utils.tests.TestCase):
+    """Test setKernelStatsEnabled, getKernelStats and resetKernelStats
+    """
+
+    def setUp(self):
+        rng = np.random.RandomState(12345)
+        self.coaddBBox = geom.Box2I(geom.Point2I(10, 20), geom.Extent2I(150, 201))
+        self.imageBBox = geom.Box2I(geom.Point2I(0, 5), geom.Extent2I(140, 180))
+        self.overlapBBox = geom.Box2I(self.coaddBBox)
+        self.overlapBBox.clip(self.imageBBox)
+        self.farBBox = geom.Box2I(geom.Point2I(1000, 1000), geom.Extent2I(10, 10))
+        self.badPixelMask = 0x1
+        self.maskedImage = afwImage.MaskedImageF(self.imageBBox)
+        shape = self.maskedImage.image.array.shape
+        self.maskedImage.image.array[:, :] = rng.normal(size=shape)
+        self.maskedImage.mask.array[:, :] = rng.randint(0, 4, size=shape)
+        self.maskedImage.variance.array[:, :] = rng.uniform(1, 2, size=shape)
+        overlapMask = self.maskedImage[self.overlapBBox].mask.array
+        self.numGoodPix = int(np.sum((overlapMask & self.badPixelMask) == 0))
+        coaddUtils.resetKernelStats()
+
+    def tearDown(self):
+        coaddUtils.setKernelStatsEnabled(False)
+        coaddUtils.resetKernelStats()
+        coaddUtils.setNumThreads(1)
+
+    def assertNoCalls(self):
+        for stats in coaddUtils.getKernelStats().values():
+            self.assertEqual(stats.numCalls, 0)
+            self.assertEqual(stats.numPixels, 0)
+            self.assertEqual(stats.seconds, 0)
+
+    def testEnable(self):
+        self.assertFalse(coaddUtils.getKernelStatsEnabled())
+        coaddUtils.setKernelStatsEnabled(True)
+        self.assertTrue(coaddUtils.getKernelStatsEnabled())
+        self.assertEqual(set(coaddUtils.getKernelStats()),
+                         {"addToCoadd", "copyGoodPixels", "setCoaddEdgeBits"})
+
+    def testDisabled(self):
+        coadd = afwImage.MaskedImageF(self.coaddBBox)
+        weightMap = afwImage.ImageD(self.coaddBBox)
+        coaddUtils.addToCoadd(coadd, weightMap, self.maskedImage, self.badPixelMask, 1.0)
+        coaddUtils.copyGoodPixels(coadd, self.maskedImage, self.badPixelMask)
+        coaddUtils.setCoaddEdgeBits(coadd.mask, weightMap)
+        self.assertNoCalls()
+
+    def testAddToCoadd(self):
+        coaddUtils.setKernelStatsEnabled(True)
+        coadd = afwImage.MaskedImageF(self.coaddBBox)
+        weightMap = afwImage.ImageD(self.coaddBBox)
+        coaddUtils.addToCoadd(coadd, weightMap, self.maskedImage, self.badPixelMask, 1.0)
+        farImage = afwImage.MaskedImageF(self.farBBox)
+        coaddUtils.addToCoadd(coadd, weightMap, farImage, self.badPixelMask, 1.0)
+
+        stats = coaddUtils.getKernelStats()["addToCoadd"]
+        numPix = self.overlapBBox.getArea()
+        self.assertEqual(stats.numCalls, 2)
+        self.assertEqual(stats.numEmptyCalls, 1)
+        self.assertEqual(stats.numPixels, numPix)
+        self.assertEqual(stats.numGoodPixels, self.numGoodPix)
+        self.assertEqual(stats.numRejectedPixels, numPix - self.numGoodPix)
+        # read the input (12 bytes/pixel); read and write the coadd (12) and weight map (8)
+        self.assertEqual(stats.numBytes, numPix * (12 + 2 * (12 + 8)))
+        self.assertGreater(stats.seconds, 0)
+        self.assertEqual(coaddUtils.getKernelStats()["copyGoodPixels"].numCalls, 0)
+
+    def testAddManyToCoadd(self):
+        """Test that addManyToCoadd is counted as one call of addToCoadd"""
+        coaddUtils.setKernelStatsEnabled(True)
+        coadd = afwImage.MaskedImageF(self.coaddBBox)
+        weightMap = afwImage.ImageD(self.coaddBBox)
+        farImage = afwImage.MaskedImageF(self.farBBox)
+        coaddUtils.addManyToCoadd(coadd, weightMap, [self.maskedImage, farImage, self.maskedImage],
+                                  self.badPixelMask, [1.0, 1.0, 2.0])
+        coaddUtils.addManyToCoadd(coadd, weightMap, [farImage], self.badPixelMask, [1.0])
+
+        stats = coaddUtils.getKernelStats()["addToCoadd"]
+        numPix = 2 * self.overlapBBox.getArea()
+        self.assertEqual(stats.numCalls, 2)
+        self.assertEqual(stats.numEmptyCalls, 1)
+        self.assertEqual(stats.numPixels, numPix)
+        self.assertEqual(stats.numGoodPixels, 2 * self.numGoodPix)
+        self.assertEqual(stats.numBytes, numPix * (12 + 2 * (12 + 8)))
+
+    def testAddToCoaddArrays(self):
+        coaddUtils.setKernelStatsEnabled(True)
+        coadd = afwImage.MaskedImageF(self.coaddBBox)
+        weightMap = afwImage.ImageD(self.coaddBBox)
+        x0, y0 = self.imageBBox.getMin()
+        coaddUtils.addToCoaddArrays(
+            coadd.image.array, coadd.mask.array, coadd.variance.array, weightMap.array,
+            self.coaddBBox.getMinX(), self.coaddBBox.getMinY(), self.maskedImage.image.array,
+            self.maskedImage.mask.array, self.maskedImage.variance.array, x0, y0, self.badPixelMask, 1.0)
+
+        stats = coaddUtils.getKernelStats()["addToCoadd"]
+        numPix = self.overlapBBox.getArea()
+        self.assertEqual(stats.numCalls, 1)
+        self.assertEqual(stats.numPixels, numPix)
+        self.assertEqual(stats.numGoodPixels, self.numGoodPix)
+        self.assertEqual(stats.numBytes, numPix * (12 + 2 * (12 + 8)))
+
+    def testGoodPixelSpans(self):
+        coaddUtils.setKernelStatsEnabled(True)
+        coadd = afwImage.MaskedImageF(self.coaddBBox)
+        weightMap = afwImage.ImageD(self.coaddBBox)
+        goodPixelSpans = coaddUtils.GoodPixelSpans(self.maskedImage.mask, self.badPixelMask)
+        coaddUtils.addToCoadd(coadd, weightMap, self.maskedImage, goodPixelSpans, 1.0)
+
+        stats = coaddUtils.getKernelStats()["addToCoadd"]
+        self.assertEqual(stats.numCalls, 1)
+        self.assertEqual(stats.numPixels, self.overlapBBox.getArea())
+        self.assertEqual(stats.numGoodPixels, self.numGoodPix)
+
+    def testCopyGoodPixels(self):
+        coaddUtils.setKernelStatsEnabled(True)
+        dest = afwImage.MaskedImageF(self.coaddBBox)
+        numGoodPix = coaddUtils.copyGoodPixels(dest, self.maskedImage, self.badPixelMask)
+        coaddUtils.copyGoodPixels(afwImage.MaskedImageF(self.farBBox), self.maskedImage, self.badPixelMask)
+
+        stats = coaddUtils.getKernelStats()["copyGoodPixels"]
+        numPix = self.overlapBBox.getArea()
+        self.assertEqual(stats.numCalls, 2)
+        self.assertEqual(stats.numEmptyCalls, 1)
+        self.assertEqual(stats.numPixels, numPix)
+        self.assertEqual(stats.numGoodPixels, numGoodPix)
+        self.assertEqual(stats.numBytes, numPix * 3 * 12)
+
+    def testSetCoaddEdgeBits(self):
+        coaddUtils.setKernelStatsEnabled(True)
+        weightMap = afwImage.ImageF(self.coaddBBox)
+        weightMap.array[:, ::3] = 1.5
+        coaddUtils.setCoaddEdgeBits(afwImage.Mask(self.coaddBBox), weightMap)
+
+        stats = coaddUtils.getKernelStats()["setCoaddEdgeBits"]
+        numPix = self.coaddBBox.getArea()
+        self.assertEqual(stats.numCalls, 1)
+        self.assertEqual(stats.numEmptyCalls, 0)
+        self.assertEqual(stats.numPixels, numPix)
+        self.assertEqual(stats.numGoodPixels, np.count_nonzero(weightMap.array))
+        self.assertEqual(stats.numBytes, numPix * (4 + 2 * 4))
+
+    def testThreads(self):
+        """Test that counts from kernel threads and Python threads are summed
+        """
+        coaddUtils.setKernelStatsEnabled(True)
+        coaddUtils.setNumThreads(3)
+        numCalls = 8
+
+        def copy():
+            dest = afwImage.MaskedImageF(self.coaddBBox)
+            return coaddUtils.copyGoodPixels(dest, self.maskedImage, self.badPixelMask)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(copy) for i in range(numCalls)]
+            numGoodPix = sum(future.result() for future in futures)
+
+        stats = coaddUtils.getKernelStats()["copyGoodPixels"]
+        self.assertEqual(stats.numCalls, numCalls)
+        self.assertEqual(stats.numPixels, numCalls * self.overlapBBox.getArea())
+        self.assertEqual(stats.numGoodPixels, numGoodPix)
+
+    def testReset(self):
+        coaddUtils.setKernelStatsEnabled(True)
+        coaddUtils.copyGoodPixels(afwImage.MaskedImageF(self.coaddBBox), self.maskedImage, self.badPixelMask)
+        self.assertEqual(coaddUtils.getKernelStats()["copyGoodPixels"].numCalls, 1)
+        coaddUtils.resetKernelStats()
+        self.assertNoCalls()
+        self.assertTrue(coaddUtils.getKernelStatsEnabled())
+
+
+class MemoryTester(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
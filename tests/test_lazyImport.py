@@ -0,0 +1,107 @@
+# This file is part of coadd_utils.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Test lazy importing of lsst.coadd.utils and lsst.coadd.utils.arrays
+"""
+import importlib
+import subprocess
+import sys
+import textwrap
+import unittest
+
+import lsst.utils.tests
+import lsst.coadd.utils as coaddUtils
+
+
+class LazyImportTestCase(lsst.utils.tests.TestCase):
+    """Test that importing the package does not import afw until needed
+    """
+
+    def runPython(self, code):
+        """Run code in a new Python process, failing if it raises
+        """
+        result = subprocess.run([sys.executable, "-c", textwrap.dedent(code)],
+                                capture_output=True, text=True)
+        self.assertEqual(result.returncode, 0, msg=result.stderr)
+
+    def testImportWithoutAfw(self):
+        self.runPython("""
+            import sys
+            import lsst.coadd.utils as coaddUtils
+            assert "lsst.afw.image" not in sys.modules
+            assert "lsst.coadd.utils._coaddUtilsLib" not in sys.modules
+            coaddUtils.setNumThreads(2)
+            assert "lsst.afw.image" not in sys.modules
+            coaddUtils.addToCoadd
+            assert "lsst.coadd.utils._coaddUtilsLib" in sys.modules
+        """)
+
+    def testArraysWithoutAfw(self):
+        self.runPython("""
+            import sys
+            import numpy as np
+            from lsst.coadd.utils.arrays import addToCoaddArrays
+            coadd = np.zeros((5, 6), dtype=np.float32)
+            weightMap = np.zeros((5, 6), dtype=np.float64)
+            image = np.ones((3, 4), dtype=np.float32)
+            addToCoaddArrays(coadd, weightMap, 0, 0, image, 1, 1, 0.5)
+            assert coadd.sum() == 6.0
+            assert not any(name.startswith("lsst.afw") for name in sys.modules)
+        """)
+
+    def testAttributes(self):
+        self.assertIs(coaddUtils.addToCoaddArrays, coaddUtils.arrays.addToCoaddArrays)
+        self.assertIs(coaddUtils.TiledCoadd, coaddUtils.tiledCoadd.TiledCoadd)
+        self.assertTrue(callable(coaddUtils.addToCoadd))
+        with self.assertRaises(AttributeError):
+            coaddUtils.noSuchName
+        for name in ("addToCoadd", "addToCoaddArrays", "TiledCoadd", "setNumThreads"):
+            self.assertIn(name, coaddUtils.__all__)
+            self.assertIn(name, dir(coaddUtils))
+
+    def testModuleNames(self):
+        """Test that the lazily imported names of each module are its __all__"""
+        for moduleName, names in coaddUtils._MODULE_NAMES.items():
+            with self.subTest(moduleName=moduleName):
+                module = importlib.import_module(moduleName, coaddUtils.__name__)
+                self.assertEqual(set(module.__all__), set(names))
+
+    def testStarImport(self):
+        namespace = {}
+        exec("from lsst.coadd.utils import *", namespace)
+        self.assertIs(namespace["addToCoadd"], coaddUtils.addToCoadd)
+        self.assertIs(namespace["CoaddAccumulator"], coaddUtils.CoaddAccumulator)
+        self.assertIs(namespace["getNumThreads"], coaddUtils.getNumThreads)
+        self.assertEqual(namespace["getNumThreads"](), 1)
+        self.assertNotIn("np", namespace)
+
+
+class MemoryTester(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -0,0 +1,218 @@
+# This file is part of coadd_utils.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Test lsst.coadd.utils.MemmapCoadd and the coadd checkpoint functions
+"""
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+import lsst.utils.tests
+import lsst.geom as geom
+import lsst.afw.image as afwImage
+import lsst.coadd.utils as coaddUtils
+
+from coaddTestUtils import makeRandomMaskedImage
+
+
+class MemmapCoaddTestCase(lsst.utils.tests.TestCase):
+    """Compare MemmapCoadd against an in-memory coadd made with addToCoadd
+    """
+
+    def setUp(self):
+        self.rng = np.random.RandomState(12345)
+        self.coaddBBox = geom.Box2I(geom.Point2I(5, 7), geom.Extent2I(50, 80))
+        self.bboxList = [
+            geom.Box2I(geom.Point2I(0, 0), geom.Extent2I(30, 40)),
+            geom.Box2I(geom.Point2I(20, 30), geom.Extent2I(60, 30)),
+            geom.Box2I(geom.Point2I(200, 300), geom.Extent2I(10, 10)),
+        ]
+        self.badPixelMask = 0x1
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def testAdd(self):
+        coadd = afwImage.MaskedImageF(self.coaddBBox)
+        weightMap = afwImage.ImageD(self.coaddBBox)
+        with coaddUtils.MemmapCoadd.create(self.directory.name, self.coaddBBox) as memmapCoadd:
+            self.assertEqual(memmapCoadd.getBBox(), self.coaddBBox)
+            for weight, bbox in enumerate(self.bboxList, 1):
+                maskedImage = makeRandomMaskedImage(self.rng, bbox)
+                overlapBBox = memmapCoadd.add(maskedImage, self.badPixelMask, weight)
+                refOverlapBBox = coaddUtils.addToCoadd(coadd, weightMap, maskedImage, self.badPixelMask,
+                                                       weight)
+                self.assertEqual(overlapBBox, refOverlapBBox)
+
+        readOnlyCoadd = coaddUtils.MemmapCoadd.open(self.directory.name, mode="r")
+        self.assertMaskedImagesEqual(readOnlyCoadd.readMaskedImage(), coadd)
+        self.assertImagesEqual(readOnlyCoadd.readWeightMap(), weightMap)
+
+        subBBox = geom.Box2I(geom.Point2I(10, 20), geom.Extent2I(15, 25))
+        self.assertMaskedImagesEqual(readOnlyCoadd.readMaskedImage(subBBox), coadd[subBBox])
+        self.assertImagesEqual(readOnlyCoadd.readWeightMap(subBBox), weightMap[subBBox])
+
+        with self.assertRaises(RuntimeError):
+            readOnlyCoadd.add(makeRandomMaskedImage(self.rng, self.coaddBBox), self.badPixelMask, 1.0)
+        with self.assertRaises(ValueError):
+            readOnlyCoadd.readWeightMap(self.bboxList[0])
+
+    def testRemove(self):
+        maskedImageList = [makeRandomMaskedImage(self.rng, bbox) for bbox in self.bboxList]
+        coadd = afwImage.MaskedImageF(self.coaddBBox)
+        weightMap = afwImage.ImageD(self.coaddBBox)
+        with coaddUtils.MemmapCoadd.create(self.directory.name, self.coaddBBox) as memmapCoadd:
+            for maskedImage in maskedImageList:
+                memmapCoadd.add(maskedImage, self.badPixelMask, 2.0)
+            overlapBBox = memmapCoadd.remove(maskedImageList[1], self.badPixelMask, 2.0)
+            refOverlapBBox = geom.Box2I(self.coaddBBox)
+            refOverlapBBox.clip(self.bboxList[1])
+            self.assertEqual(overlapBBox, refOverlapBBox)
+            for maskedImage in (maskedImageList[0], maskedImageList[2]):
+                coaddUtils.addToCoadd(coadd, weightMap, maskedImage, self.badPixelMask, 2.0)
+
+            self.assertFloatsAlmostEqual(memmapCoadd.readMaskedImage().image.array, coadd.image.array,
+                                         atol=1e-5)
+            self.assertFloatsAlmostEqual(memmapCoadd.readMaskedImage().variance.array,
+                                         coadd.variance.array, atol=1e-5)
+            self.assertImagesEqual(memmapCoadd.readWeightMap(), weightMap)
+
+        with self.assertRaises(RuntimeError):
+            coaddUtils.MemmapCoadd.open(self.directory.name, mode="r").remove(
+                maskedImageList[0], self.badPixelMask, 2.0)
+
+    def testPixelTypes(self):
+        memmapCoadd = coaddUtils.MemmapCoadd.create(self.directory.name, self.coaddBBox,
+                                                    coaddType=np.float64, weightType=np.float32)
+        self.assertIsInstance(memmapCoadd.readMaskedImage(), afwImage.MaskedImageD)
+        self.assertIsInstance(memmapCoadd.readWeightMap(), afwImage.ImageF)
+        with self.assertRaises(ValueError):
+            coaddUtils.MemmapCoadd.create(self.directory.name, self.coaddBBox, coaddType=np.int8)
+
+
+class CoaddCheckpointTestCase(lsst.utils.tests.TestCase):
+    """Test writeCoaddCheckpoint and readCoaddCheckpoint
+    """
+
+    def setUp(self):
+        rng = np.random.RandomState(12345)
+        self.coaddBBox = geom.Box2I(geom.Point2I(5, 7), geom.Extent2I(50, 80))
+        self.coadd = afwImage.MaskedImageD(self.coaddBBox)
+        self.coadd.image.array[:, :] = rng.normal(size=self.coadd.image.array.shape)
+        self.coadd.mask.array[:, :] = rng.randint(0, 4, size=self.coadd.mask.array.shape)
+        self.coadd.variance.array[:, :] = rng.uniform(1, 2, size=self.coadd.variance.array.shape)
+        self.weightMap = afwImage.ImageF(self.coaddBBox)
+        self.weightMap.array[:, :] = rng.uniform(0, 3, size=self.weightMap.array.shape)
+        self.tempDir = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.tempDir.name, "checkpoint")
+
+    def tearDown(self):
+        self.tempDir.cleanup()
+
+    def testRoundTrip(self):
+        metadata = {"inputs": [3, 1, 4]}
+        coaddUtils.writeCoaddCheckpoint(self.directory, self.coadd, self.weightMap, metadata=metadata)
+        checkpoint = coaddUtils.readCoaddCheckpoint(self.directory)
+        self.assertIsInstance(checkpoint.coadd, afwImage.MaskedImageD)
+        self.assertIsInstance(checkpoint.weightMap, afwImage.ImageF)
+        self.assertMaskedImagesEqual(checkpoint.coadd, self.coadd)
+        self.assertImagesEqual(checkpoint.weightMap, self.weightMap)
+        self.assertEqual(checkpoint.metadata, metadata)
+
+        # a checkpoint is a MemmapCoadd, which may be updated in place
+        with coaddUtils.MemmapCoadd.open(self.directory) as memmapCoadd:
+            self.assertMaskedImagesEqual(memmapCoadd.readMaskedImage(), self.coadd)
+
+    def testCompression(self):
+        coaddUtils.writeCoaddCheckpoint(self.directory, self.coadd, self.weightMap, metadata={"n": 1},
+                                        compression="zlib")
+        checkpoint = coaddUtils.readCoaddCheckpoint(self.directory)
+        self.assertIsInstance(checkpoint.coadd, afwImage.MaskedImageD)
+        self.assertMaskedImagesEqual(checkpoint.coadd, self.coadd)
+        self.assertImagesEqual(checkpoint.weightMap, self.weightMap)
+        self.assertEqual(checkpoint.metadata, {"n": 1})
+        with self.assertRaises(ValueError):
+            coaddUtils.MemmapCoadd.open(self.directory)
+        with self.assertRaises(ValueError):
+            coaddUtils.writeCoaddCheckpoint(self.directory, self.coadd, self.weightMap, compression="lzma")
+
+    def testReplace(self):
+        coaddUtils.writeCoaddCheckpoint(self.directory, self.coadd, self.weightMap)
+        self.assertEqual(coaddUtils.readCoaddCheckpoint(self.directory).metadata, {})
+        self.coadd.image.array += 1
+        coaddUtils.writeCoaddCheckpoint(self.directory, self.coadd, self.weightMap, metadata={"n": 2})
+        checkpoint = coaddUtils.readCoaddCheckpoint(self.directory)
+        self.assertMaskedImagesEqual(checkpoint.coadd, self.coadd)
+        self.assertEqual(checkpoint.metadata, {"n": 2})
+        self.assertEqual(os.listdir(self.tempDir.name), ["checkpoint"])
+
+        # an interrupted replacement leaves the previous checkpoint readable
+        os.rename(self.directory, f"{self.directory}.old")
+        self.assertEqual(coaddUtils.readCoaddCheckpoint(self.directory).metadata, {"n": 2})
+
+    def testMaskPlanes(self):
+        """Test that mask bits are read with the planes they were written with
+        """
+        badBit = afwImage.Mask.getPlaneBitMask("BAD")
+        satBit = afwImage.Mask.getPlaneBitMask("SAT")
+        self.coadd.mask.array[:, :] &= badBit | satBit
+        for compression in (None, "zlib"):
+            with self.subTest(compression=compression):
+                coaddUtils.writeCoaddCheckpoint(self.directory, self.coadd, self.weightMap,
+                                                compression=compression)
+                # pretend the checkpoint was written with BAD and SAT swapped
+                headerPath = os.path.join(self.directory, coaddUtils.MemmapCoadd.HEADER_NAME)
+                with open(headerPath) as f:
+                    header = json.load(f)
+                maskPlanes = header["maskPlanes"]
+                maskPlanes["BAD"], maskPlanes["SAT"] = maskPlanes["SAT"], maskPlanes["BAD"]
+                with open(headerPath, "w") as f:
+                    json.dump(header, f)
+
+                checkpoint = coaddUtils.readCoaddCheckpoint(self.directory)
+                mask = self.coadd.mask.array
+                expectedMask = np.where(mask & badBit, satBit, 0) | np.where(mask & satBit, badBit, 0)
+                np.testing.assert_array_equal(checkpoint.coadd.mask.array, expectedMask)
+                self.assertEqual(checkpoint.coadd.mask.getMaskPlaneDict(),
+                                 self.coadd.mask.getMaskPlaneDict())
+
+    def testErrors(self):
+        with self.assertRaises(ValueError):
+            coaddUtils.writeCoaddCheckpoint(self.directory, self.coadd,
+                                            afwImage.ImageF(geom.Box2I(self.coaddBBox.getMin(),
+                                                                       geom.Extent2I(10, 10))))
+
+
+class MemoryTester(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -0,0 +1,173 @@
+# This file is part of coadd_utils.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Test multithreaded execution of the lsst.coadd.utils kernels
+"""
+import concurrent.futures
+import unittest
+
+import numpy as np
+
+import lsst.utils.tests
+import lsst.geom as geom
+import lsst.afw.image as afwImage
+import lsst.coadd.utils as coaddUtils
+
+from coaddTestUtils import makeRandomMaskedImage
+
+
+class ParallelTestCase(lsst.utils.tests.TestCase):
+    """Test that the kernels give identical results for any number of threads
+    """
+
+    def setUp(self):
+        self.rng = np.random.RandomState(12345)
+        self.coaddBBox = geom.Box2I(geom.Point2I(10, 20), geom.Extent2I(150, 501))
+        self.imageBBox = geom.Box2I(geom.Point2I(0, 5), geom.Extent2I(140, 480))
+        self.badPixelMask = 0x1
+        self.nThreadsList = (1, 2, 3, 7)
+
+    def tearDown(self):
+        coaddUtils.setNumThreads(1)
+
+    def testNumThreads(self):
+        """Test setNumThreads and getNumThreads"""
+        self.assertEqual(coaddUtils.getNumThreads(), 1)
+        coaddUtils.setNumThreads(4)
+        self.assertEqual(coaddUtils.getNumThreads(), 4)
+        coaddUtils.setNumThreads(0)
+        self.assertGreaterEqual(coaddUtils.getNumThreads(), 1)
+        with self.assertRaises(Exception):
+            coaddUtils.setNumThreads(-1)
+
+    def testAddToCoadd(self):
+        """Test addToCoadd and addManyToCoadd"""
+        maskedImageList = [makeRandomMaskedImage(self.rng, self.imageBBox) for i in range(3)]
+        weightList = [0.5, 1.0, 2.0]
+
+        results = []
+        for nThreads in self.nThreadsList:
+            coaddUtils.setNumThreads(nThreads)
+            coadd = afwImage.MaskedImageF(self.coaddBBox)
+            weightMap = afwImage.ImageD(self.coaddBBox)
+            overlapBBox = coaddUtils.addToCoadd(coadd, weightMap, maskedImageList[0], self.badPixelMask,
+                                                weightList[0])
+            self.assertEqual(overlapBBox, geom.Box2I(geom.Point2I(10, 20), geom.Point2I(139, 484)))
+            coaddUtils.addManyToCoadd(coadd, weightMap, maskedImageList, self.badPixelMask, weightList)
+            results.append((coadd, weightMap))
+
+        refCoadd, refWeightMap = results[0]
+        for coadd, weightMap in results[1:]:
+            self.assertMaskedImagesEqual(coadd, refCoadd)
+            self.assertImagesEqual(weightMap, refWeightMap)
+
+    def testCopyGoodPixels(self):
+        """Test copyGoodPixels"""
+        srcImage = makeRandomMaskedImage(self.rng, self.imageBBox)
+        refNumGoodPix = None
+        refDestImage = None
+        for nThreads in self.nThreadsList:
+            coaddUtils.setNumThreads(nThreads)
+            destImage = afwImage.MaskedImageF(self.coaddBBox)
+            numGoodPix = coaddUtils.copyGoodPixels(destImage, srcImage, self.badPixelMask)
+            if refDestImage is None:
+                refNumGoodPix, refDestImage = numGoodPix, destImage
+            else:
+                self.assertEqual(numGoodPix, refNumGoodPix)
+                self.assertMaskedImagesEqual(destImage, refDestImage)
+
+    def testSetCoaddEdgeBits(self):
+        """Test setCoaddEdgeBits"""
+        weightMap = afwImage.ImageF(self.coaddBBox)
+        weightMap.array[:, :] = self.rng.randint(0, 3, size=weightMap.array.shape)
+        refCoaddMask = None
+        for nThreads in self.nThreadsList:
+            coaddUtils.setNumThreads(nThreads)
+            coaddMask = afwImage.Mask(self.coaddBBox)
+            coaddUtils.setCoaddEdgeBits(coaddMask, weightMap)
+            if refCoaddMask is None:
+                refCoaddMask = coaddMask
+            else:
+                self.assertMasksEqual(coaddMask, refCoaddMask)
+
+    def testPythonThreads(self):
+        """Test concurrent calls from Python threads on disjoint subimages of one coadd"""
+        maskedImage = makeRandomMaskedImage(self.rng, self.imageBBox)
+        weight = 0.7
+
+        refCoadd = afwImage.MaskedImageF(self.coaddBBox)
+        refWeightMap = afwImage.ImageD(self.coaddBBox)
+        coaddUtils.addToCoadd(refCoadd, refWeightMap, maskedImage, self.badPixelMask, weight)
+
+        coadd = afwImage.MaskedImageF(self.coaddBBox)
+        weightMap = afwImage.ImageD(self.coaddBBox)
+        bandHeight = 50
+        bandList = []
+        for y0 in range(self.coaddBBox.getBeginY(), self.coaddBBox.getEndY(), bandHeight):
+            bandBBox = geom.Box2I(geom.Point2I(self.coaddBBox.getMinX(), y0),
+                                  geom.Extent2I(self.coaddBBox.getWidth(), bandHeight))
+            bandBBox.clip(self.coaddBBox)
+            bandList.append((coadd[bandBBox], weightMap[bandBBox]))
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(coaddUtils.addToCoadd, coaddBand, weightMapBand, maskedImage,
+                                       self.badPixelMask, weight)
+                       for coaddBand, weightMapBand in bandList]
+            for future in futures:
+                future.result()
+
+        self.assertMaskedImagesEqual(coadd, refCoadd)
+        self.assertImagesEqual(weightMap, refWeightMap)
+
+    def testPythonThreadsSharePool(self):
+        """Test concurrent threaded calls from Python threads while the number of threads changes"""
+        maskedImage = makeRandomMaskedImage(self.rng, self.imageBBox)
+        weight = 0.7
+
+        refCoadd = afwImage.MaskedImageF(self.coaddBBox)
+        refWeightMap = afwImage.ImageD(self.coaddBBox)
+        coaddUtils.addToCoadd(refCoadd, refWeightMap, maskedImage, self.badPixelMask, weight)
+
+        def addToNewCoadd(nThreads):
+            coadd = afwImage.MaskedImageF(self.coaddBBox)
+            weightMap = afwImage.ImageD(self.coaddBBox)
+            coaddUtils.setNumThreads(nThreads)
+            coaddUtils.addToCoadd(coadd, weightMap, maskedImage, self.badPixelMask, weight)
+            return coadd, weightMap
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=4) as executor:
+            results = list(executor.map(addToNewCoadd, [1 + i % 4 for i in range(16)]))
+        for coadd, weightMap in results:
+            self.assertMaskedImagesEqual(coadd, refCoadd)
+            self.assertImagesEqual(weightMap, refWeightMap)
+
+
+class MemoryTester(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
@@ -0,0 +1,155 @@
+# This file is part of coadd_utils.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Test lsst.coadd.utils.removeFromCoadd
+"""
+import unittest
+
+import numpy as np
+
+import lsst.utils.tests
+import lsst.geom as geom
+import lsst.afw.image as afwImage
+import lsst.pex.exceptions as pexExcept
+import lsst.coadd.utils as coaddUtils
+
+from coaddTestUtils import makeRandomMaskedImage
+
+
+class RemoveFromCoaddTestCase(lsst.utils.tests.TestCase):
+    """Test that removeFromCoadd undoes addToCoadd
+    """
+
+    def setUp(self):
+        self.rng = np.random.RandomState(13579)
+        self.coaddBBox = geom.Box2I(geom.Point2I(100, 200), geom.Extent2I(40, 50))
+        # extends beyond the coadd, fully inside the coadd, no overlap
+        self.bboxList = [
+            geom.Box2I(geom.Point2I(90, 210), geom.Extent2I(30, 60)),
+            geom.Box2I(geom.Point2I(110, 220), geom.Extent2I(20, 20)),
+            geom.Box2I(geom.Point2I(0, 0), geom.Extent2I(10, 10)),
+        ]
+        self.weightList = [2, 1, 3]
+        self.badPixelMask = 0x1
+
+    def testMaskedImage(self):
+        """Test that removing an input matches a coadd made without it"""
+        maskedImageList = [makeRandomMaskedImage(self.rng, bbox, afwImage.MaskedImageD)
+                           for bbox in self.bboxList]
+        for removeIndex in range(len(maskedImageList)):
+            with self.subTest(removeIndex=removeIndex):
+                coadd = afwImage.MaskedImageD(self.coaddBBox)
+                weightMap = afwImage.ImageI(self.coaddBBox)
+                refCoadd = afwImage.MaskedImageD(self.coaddBBox)
+                refWeightMap = afwImage.ImageI(self.coaddBBox)
+                for i, (maskedImage, weight) in enumerate(zip(maskedImageList, self.weightList)):
+                    coaddUtils.addToCoadd(coadd, weightMap, maskedImage, self.badPixelMask, weight)
+                    if i != removeIndex:
+                        coaddUtils.addToCoadd(refCoadd, refWeightMap, maskedImage, self.badPixelMask, weight)
+
+                overlapBBox = coaddUtils.removeFromCoadd(coadd, weightMap, maskedImageList[removeIndex],
+                                                         self.badPixelMask, self.weightList[removeIndex])
+                refOverlapBBox = geom.Box2I(self.coaddBBox)
+                refOverlapBBox.clip(self.bboxList[removeIndex])
+                self.assertEqual(overlapBBox, refOverlapBBox)
+                self.assertFloatsAlmostEqual(coadd.image.array, refCoadd.image.array, atol=1e-12)
+                self.assertFloatsAlmostEqual(coadd.variance.array, refCoadd.variance.array, atol=1e-5)
+                # integer weights are removed exactly
+                self.assertImagesEqual(weightMap, refWeightMap)
+                # the mask is not changed
+                self.assertTrue(np.all(coadd.mask.array & refCoadd.mask.array == refCoadd.mask.array))
+
+    def testImage(self):
+        """Test removeFromCoadd for Images, whose bad pixels are NaN"""
+        image = makeRandomMaskedImage(self.rng, self.bboxList[0]).image
+        image.array[::3, ::2] = np.nan
+        coadd = afwImage.ImageF(self.coaddBBox)
+        coadd.array[:, :] = self.rng.normal(size=coadd.array.shape)
+        weightMap = afwImage.ImageF(self.coaddBBox)
+        weightMap.array[:, :] = 2.0
+        refCoadd = afwImage.ImageF(coadd, deep=True)
+        refWeightMap = afwImage.ImageF(weightMap, deep=True)
+
+        coaddUtils.addToCoadd(coadd, weightMap, image, 0.5)
+        coaddUtils.removeFromCoadd(coadd, weightMap, image, 0.5)
+        self.assertFloatsAlmostEqual(coadd.array, refCoadd.array, atol=1e-6)
+        self.assertImagesEqual(weightMap, refWeightMap)
+
+    def testSaturatedWeightMap(self):
+        """Test that removing an input leaves saturated integer weights unchanged"""
+        maskedImage = makeRandomMaskedImage(self.rng, self.coaddBBox)
+        maskedImage.mask.array[:, :] = 0
+        maxWeight = np.iinfo(np.uint16).max
+        coadd = afwImage.MaskedImageF(self.coaddBBox)
+        weightMap = afwImage.ImageU(self.coaddBBox)
+        weightMap.array[:, :] = 10
+        # adding 3 saturates these rows
+        weightMap.array[:5, :] = maxWeight - 1
+        coaddUtils.addToCoadd(coadd, weightMap, maskedImage, self.badPixelMask, 3)
+        np.testing.assert_array_equal(weightMap.array[:5, :], maxWeight)
+
+        coaddUtils.removeFromCoadd(coadd, weightMap, maskedImage, self.badPixelMask, 3)
+        np.testing.assert_array_equal(weightMap.array[:5, :], maxWeight)
+        np.testing.assert_array_equal(weightMap.array[5:, :], 10)
+
+        # nor may the weight wrap around below zero
+        coaddUtils.removeFromCoadd(coadd, weightMap, maskedImage, self.badPixelMask, 30)
+        np.testing.assert_array_equal(weightMap.array[5:, :], 0)
+
+    def testSaturatedSignedWeightMap(self):
+        """Test that the minimum of a signed weight map is saturated, like the maximum"""
+        maskedImage = makeRandomMaskedImage(self.rng, self.coaddBBox)
+        maskedImage.mask.array[:, :] = 0
+        minWeight = np.iinfo(np.int32).min
+        coadd = afwImage.MaskedImageF(self.coaddBBox)
+        weightMap = afwImage.ImageI(self.coaddBBox)
+        weightMap.array[:, :] = 10
+        # removing 3 saturates these rows at the minimum
+        weightMap.array[:5, :] = minWeight + 1
+        coaddUtils.removeFromCoadd(coadd, weightMap, maskedImage, self.badPixelMask, 3)
+        np.testing.assert_array_equal(weightMap.array[:5, :], minWeight)
+        np.testing.assert_array_equal(weightMap.array[5:, :], 7)
+
+        coaddUtils.addToCoadd(coadd, weightMap, maskedImage, self.badPixelMask, 3)
+        np.testing.assert_array_equal(weightMap.array[:5, :], minWeight)
+        np.testing.assert_array_equal(weightMap.array[5:, :], 10)
+        self.assertEqual(coaddUtils.countSaturatedWeights(weightMap), weightMap.array[:5, :].size)
+
+    def testAssertions(self):
+        """Test that the coadd and weight map must have the same bbox"""
+        maskedImage = makeRandomMaskedImage(self.rng, self.bboxList[0])
+        coadd = afwImage.MaskedImageF(self.coaddBBox)
+        weightMap = afwImage.ImageD(geom.Box2I(self.coaddBBox.getMin(), geom.Extent2I(10, 10)))
+        with self.assertRaises(pexExcept.InvalidParameterError):
+            coaddUtils.removeFromCoadd(coadd, weightMap, maskedImage, self.badPixelMask, 1.0)
+
+
+class MemoryTester(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
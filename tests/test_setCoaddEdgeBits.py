@@ -29,6 +29,7 @@ import numpy as np
 import lsst.utils.tests
 import lsst.geom as geom
 import lsst.afw.image as afwImage
+import lsst.pex.exceptions as pexExcept
 import lsst.coadd.utils as coaddUtils
 
 
@@ -54,6 +55,56 @@ class SetCoaddEdgeBitsTestCase(lsst.utils.tests.TestCase):
         coaddUtils.setCoaddEdgeBits(coaddMask, depthMap)
         self.assertMasksEqual(coaddMask, refCoaddMask)
 
+    def testRules(self):
+        """Test setCoaddEdgeBits with rules on a weight map and count map
+        """
+        bbox = geom.Box2I(geom.Point2I(-3, 8), geom.Extent2I(50, 55))
+        rng = np.random.RandomState(12345)
+        weightMap = afwImage.ImageD(bbox)
+        weightMap.array[:, :] = rng.uniform(0, 3, size=weightMap.array.shape)
+        weightMap.array[:, ::4] = 0
+        countMap = afwImage.ImageI(bbox)
+        countMap.array[:, :] = rng.randint(0, 5, size=countMap.array.shape)
+
+        coaddMask = afwImage.Mask(bbox)
+        coaddMask.array[:, :] = rng.randint(0, 2, size=coaddMask.array.shape)
+        refCoaddMask = coaddMask.clone()
+        noData = afwImage.Mask.getPlaneBitMask("NO_DATA")
+        lowDepth = 0x100
+        fewInputs = 0x200
+        rules = [
+            coaddUtils.CoaddMaskRule(noData, 0),
+            coaddUtils.CoaddMaskRule(lowDepth, 1.5),
+            coaddUtils.CoaddMaskRule(fewInputs, 2, coaddUtils.CoaddMaskRule.COUNT),
+        ]
+        coaddUtils.setCoaddEdgeBits(coaddMask, weightMap, rules, countMap)
+
+        refCoaddMask.array[weightMap.array <= 0] |= noData
+        refCoaddMask.array[weightMap.array <= 1.5] |= lowDepth
+        refCoaddMask.array[countMap.array <= 2] |= fewInputs
+        self.assertMasksEqual(coaddMask, refCoaddMask)
+
+        # the rule for weight == 0 alone matches the function without rules
+        ruleCoaddMask = afwImage.Mask(bbox)
+        coaddUtils.setCoaddEdgeBits(ruleCoaddMask, weightMap, rules[:1])
+        edgeCoaddMask = afwImage.Mask(bbox)
+        coaddUtils.setCoaddEdgeBits(edgeCoaddMask, weightMap)
+        self.assertMasksEqual(ruleCoaddMask, edgeCoaddMask)
+
+    def testRuleAssertions(self):
+        """Test that setCoaddEdgeBits with rules rejects bad arguments
+        """
+        bbox = geom.Box2I(geom.Point2I(0, 0), geom.Extent2I(10, 12))
+        weightMap = afwImage.ImageF(bbox)
+        countRule = coaddUtils.CoaddMaskRule(0x1, 0, coaddUtils.CoaddMaskRule.COUNT)
+        with self.assertRaises(pexExcept.InvalidParameterError):
+            coaddUtils.setCoaddEdgeBits(afwImage.Mask(bbox), weightMap, [countRule])
+        with self.assertRaises(pexExcept.InvalidParameterError):
+            coaddUtils.setCoaddEdgeBits(afwImage.Mask(bbox), weightMap, [countRule],
+                                        afwImage.ImageI(geom.Extent2I(10, 11)))
+        with self.assertRaises(pexExcept.InvalidParameterError):
+            coaddUtils.setCoaddEdgeBits(afwImage.Mask(geom.Extent2I(10, 11)), weightMap, [])
+
 
 class MemoryTester(lsst.utils.tests.MemoryTestCase):
     pass
@@ -0,0 +1,152 @@
+# This file is part of coadd_utils.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Test lsst.coadd.utils.StatisticsAccumulator
+"""
+import unittest
+
+import numpy as np
+
+import lsst.utils.tests
+import lsst.geom as geom
+import lsst.afw.image as afwImage
+import lsst.coadd.utils as coaddUtils
+
+
+class StatisticsAccumulatorTestCase(lsst.utils.tests.TestCase):
+    """Compare StatisticsAccumulator against statistics of the full stack
+    """
+
+    def setUp(self):
+        self.rng = np.random.RandomState(12345)
+        self.bbox = geom.Box2I(geom.Point2I(10, 20), geom.Extent2I(30, 40))
+        self.badPixelMask = 0x1
+        self.maskedImageList = []
+        self.weightList = []
+        for i in range(30):
+            maskedImage = afwImage.MaskedImageF(self.bbox)
+            shape = maskedImage.image.array.shape
+            maskedImage.image.array[:, :] = self.rng.normal(size=shape)
+            maskedImage.mask.array[:, :] = self.rng.randint(0, 4, size=shape)
+            maskedImage.variance.array[:, :] = self.rng.uniform(1, 2, size=shape)
+            self.maskedImageList.append(maskedImage)
+            self.weightList.append(self.rng.uniform(0.5, 2))
+        # an outlier that a clip pass should reject
+        self.maskedImageList[3].image.array[5, 5] = 100
+        self.maskedImageList[3].mask.array[5, 5] = 0
+
+        self.data = np.array([mi.image.array for mi in self.maskedImageList], dtype=np.float64)
+        self.isGood = np.array([(mi.mask.array & self.badPixelMask) == 0 for mi in self.maskedImageList])
+
+    def makeAccumulator(self, **kwargs):
+        accumulator = coaddUtils.StatisticsAccumulator(self.bbox, badPixelMask=self.badPixelMask, **kwargs)
+        for maskedImage, weight in zip(self.maskedImageList, self.weightList):
+            accumulator.add(maskedImage, weight)
+        return accumulator
+
+    def referenceMeanStdDev(self, isGood):
+        weights = np.array(self.weightList)[:, np.newaxis, np.newaxis]*isGood
+        mean = (self.data*weights).sum(axis=0)/weights.sum(axis=0)
+        stdDev = np.sqrt((weights*(self.data - mean)**2).sum(axis=0)/weights.sum(axis=0))
+        return mean, stdDev
+
+    def testMean(self):
+        accumulator = self.makeAccumulator()
+        mean, stdDev = self.referenceMeanStdDev(self.isGood)
+        coadd = accumulator.makeMeanImage()
+        self.assertEqual(coadd.getBBox(), self.bbox)
+        self.assertFloatsAlmostEqual(coadd.image.array, mean, atol=1e-6)
+        self.assertFloatsAlmostEqual(accumulator.makeStdDevImage().array, stdDev, atol=1e-5)
+
+        weights = np.array(self.weightList)[:, np.newaxis, np.newaxis]*self.isGood
+        variances = np.array([mi.variance.array for mi in self.maskedImageList], dtype=np.float64)
+        refVariance = (variances*weights**2).sum(axis=0)/weights.sum(axis=0)**2
+        self.assertFloatsAlmostEqual(coadd.variance.array, refVariance, rtol=1e-6)
+        maskList = [np.where(good, mi.mask.array, 0) for mi, good in zip(self.maskedImageList, self.isGood)]
+        refMask = np.bitwise_or.reduce(np.array(maskList), axis=0)
+        np.testing.assert_array_equal(coadd.mask.array, refMask)
+
+    def testFloat64(self):
+        """Test that float64 moments match the reference to double precision"""
+        accumulator = self.makeAccumulator(dtype=np.float64)
+        mean, stdDev = self.referenceMeanStdDev(self.isGood)
+        self.assertFloatsAlmostEqual(accumulator.makeMeanImage().image.array, mean.astype(np.float32),
+                                     rtol=1e-7, atol=1e-7)
+        self.assertFloatsAlmostEqual(accumulator.makeStdDevImage().array, stdDev.astype(np.float32),
+                                     rtol=1e-7, atol=1e-7)
+        with self.assertRaises(ValueError):
+            coaddUtils.StatisticsAccumulator(self.bbox, dtype=np.int32)
+
+    def testClipPass(self):
+        accumulator = self.makeAccumulator()
+        mean, stdDev = self.referenceMeanStdDev(self.isGood)
+        accumulator.startClipPass()
+        self.assertEqual(accumulator.getPassIndex(), 1)
+        for maskedImage, weight in zip(self.maskedImageList, self.weightList):
+            accumulator.add(maskedImage, weight)
+
+        isGood = self.isGood & (np.abs(self.data - mean) <= 3*stdDev)
+        self.assertFalse(isGood[3, 5, 5])
+        clippedMean, _ = self.referenceMeanStdDev(isGood)
+        self.assertFloatsAlmostEqual(accumulator.makeMeanImage().image.array, clippedMean, atol=1e-6)
+
+    def testMedian(self):
+        """The median is exact while the reservoir holds every sample"""
+        accumulator = self.makeAccumulator(reservoirSize=len(self.maskedImageList))
+        median = np.nanmedian(np.where(self.isGood, self.data, np.nan), axis=0)
+        self.assertFloatsAlmostEqual(accumulator.makeMedianImage().image.array, median, atol=1e-6)
+
+        smallAccumulator = self.makeAccumulator(reservoirSize=5)
+        approxMedian = smallAccumulator.makeMedianImage().image.array
+        self.assertTrue(np.all(np.isfinite(approxMedian)))
+        self.assertLess(np.abs(approxMedian - median).mean(), 0.5)
+
+        with self.assertRaises(RuntimeError):
+            self.makeAccumulator().makeMedianImage()
+
+    def testNoData(self):
+        accumulator = coaddUtils.StatisticsAccumulator(self.bbox)
+        partialBBox = geom.Box2I(geom.Point2I(0, 0), geom.Extent2I(20, 30))
+        maskedImage = afwImage.MaskedImageF(partialBBox)
+        maskedImage.image.array[:, :] = 1
+        overlapBBox = accumulator.add(maskedImage)
+        self.assertEqual(overlapBBox, geom.Box2I(geom.Point2I(10, 20), geom.Point2I(19, 29)))
+
+        coadd = accumulator.makeMeanImage()
+        noData = afwImage.Mask.getPlaneBitMask("NO_DATA")
+        hasData = np.zeros(coadd.image.array.shape, dtype=bool)
+        hasData[:10, :10] = True
+        np.testing.assert_array_equal(coadd.image.array[hasData], 1)
+        self.assertTrue(np.all(np.isnan(coadd.image.array[~hasData])))
+        np.testing.assert_array_equal((coadd.mask.array & noData) != 0, ~hasData)
+
+
+class MemoryTester(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
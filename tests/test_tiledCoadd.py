@@ -0,0 +1,140 @@
+# This file is part of coadd_utils.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Test lsst.coadd.utils.TiledCoadd
+"""
+import unittest
+
+import numpy as np
+
+import lsst.utils.tests
+import lsst.geom as geom
+import lsst.afw.image as afwImage
+import lsst.coadd.utils as coaddUtils
+
+from coaddTestUtils import makeRandomMaskedImage
+
+
+class TiledCoaddTestCase(lsst.utils.tests.TestCase):
+    """Compare a TiledCoadd with a dense coadd built with addToCoadd
+    """
+
+    def setUp(self):
+        self.rng = np.random.RandomState(11235)
+        self.coaddBBox = geom.Box2I(geom.Point2I(5, 7), geom.Extent2I(100, 90))
+        self.tileSize = 32
+        self.badPixelMask = 0x1
+        # all near one corner, with one crossing tile boundaries and one outside the coadd
+        bboxList = [
+            geom.Box2I(geom.Point2I(0, 0), geom.Extent2I(30, 25)),
+            geom.Box2I(geom.Point2I(20, 30), geom.Extent2I(30, 20)),
+            geom.Box2I(geom.Point2I(500, 500), geom.Extent2I(10, 10)),
+        ]
+        self.maskedImageList = [makeRandomMaskedImage(self.rng, bbox) for bbox in bboxList]
+        self.weightList = [0.5, 1.0, 2.5]
+
+    def makeCoadds(self):
+        tiledCoadd = coaddUtils.TiledCoadd(self.coaddBBox, tileSize=self.tileSize)
+        coadd = afwImage.MaskedImageF(self.coaddBBox)
+        weightMap = afwImage.ImageD(self.coaddBBox)
+        for maskedImage, weight in zip(self.maskedImageList, self.weightList):
+            overlapBBox = tiledCoadd.add(maskedImage, self.badPixelMask, weight)
+            refOverlapBBox = coaddUtils.addToCoadd(coadd, weightMap, maskedImage, self.badPixelMask, weight)
+            self.assertEqual(overlapBBox, refOverlapBBox)
+        return tiledCoadd, coadd, weightMap
+
+    def testAdd(self):
+        """Test that only overlapped tiles are allocated and the dense result matches addToCoadd"""
+        tiledCoadd, refCoadd, refWeightMap = self.makeCoadds()
+        self.assertEqual(tiledCoadd.getBBox(), self.coaddBBox)
+        self.assertEqual(tiledCoadd.tileSize, self.tileSize)
+        # the inputs overlap tiles [0, 1] x [0, 1] of a 4 x 3 grid
+        tileBBoxes = tiledCoadd.tileBBoxes
+        self.assertEqual(len(tileBBoxes), 4)
+        for tileBBox in tileBBoxes:
+            self.assertTrue(self.coaddBBox.contains(tileBBox))
+            self.assertEqual(tileBBox.getDimensions(), geom.Extent2I(self.tileSize, self.tileSize))
+
+        coadd, weightMap = tiledCoadd.makeDense()
+        self.assertMaskedImagesEqual(coadd, refCoadd)
+        self.assertImagesEqual(weightMap, refWeightMap)
+
+    def testFinalize(self):
+        """Test that finalize matches finalizeCoadd on the dense coadd"""
+        tiledCoadd, unnormalizedCoadd, refWeightMap = self.makeCoadds()
+        for fillNaN in (False, True):
+            with self.subTest(fillNaN=fillNaN):
+                refCoadd = unnormalizedCoadd.clone()
+                coaddUtils.finalizeCoadd(refCoadd, refWeightMap, fillNaN)
+                coadd, weightMap = tiledCoadd.finalize(fillNaN)
+                self.assertMaskedImagesEqual(coadd, refCoadd)
+                self.assertImagesEqual(weightMap, refWeightMap)
+        # finalize does not modify the tiles
+        coadd, weightMap = tiledCoadd.makeDense()
+        self.assertMaskedImagesEqual(coadd, unnormalizedCoadd)
+
+    def testEdgeTiles(self):
+        """Test tiles at the maximum edges, which are cut to fit the coadd"""
+        tiledCoadd = coaddUtils.TiledCoadd(self.coaddBBox, tileSize=self.tileSize)
+        bbox = geom.Box2I(geom.Point2I(102, 80), geom.Extent2I(30, 30))
+        maskedImage = makeRandomMaskedImage(self.rng, bbox)
+        tiledCoadd.add(maskedImage, self.badPixelMask, 1.0)
+        self.assertEqual(tiledCoadd.tileBBoxes,
+                         [geom.Box2I(geom.Point2I(5 + 3*self.tileSize, 7 + 2*self.tileSize),
+                                     geom.Point2I(self.coaddBBox.getMaxX(), self.coaddBBox.getMaxY()))])
+        refCoadd = afwImage.MaskedImageF(self.coaddBBox)
+        refWeightMap = afwImage.ImageD(self.coaddBBox)
+        coaddUtils.addToCoadd(refCoadd, refWeightMap, maskedImage, self.badPixelMask, 1.0)
+        coadd, weightMap = tiledCoadd.makeDense()
+        self.assertMaskedImagesEqual(coadd, refCoadd)
+        self.assertImagesEqual(weightMap, refWeightMap)
+
+    def testRemove(self):
+        """Test that remove matches removeFromCoadd on the dense coadd"""
+        tiledCoadd, refCoadd, refWeightMap = self.makeCoadds()
+        tiledCoadd.remove(self.maskedImageList[1], self.badPixelMask, self.weightList[1])
+        coaddUtils.removeFromCoadd(refCoadd, refWeightMap, self.maskedImageList[1], self.badPixelMask,
+                                   self.weightList[1])
+        coadd, weightMap = tiledCoadd.makeDense()
+        self.assertEqual(len(tiledCoadd.tileBBoxes), 4)
+        self.assertMaskedImagesEqual(coadd, refCoadd)
+        self.assertImagesEqual(weightMap, refWeightMap)
+
+    def testErrors(self):
+        with self.assertRaises(ValueError):
+            coaddUtils.TiledCoadd(self.coaddBBox, tileSize=0)
+        with self.assertRaises(ValueError):
+            coaddUtils.TiledCoadd(self.coaddBBox, coaddType=np.int32)
+        with self.assertRaises(ValueError):
+            coaddUtils.TiledCoadd(self.coaddBBox, weightType=np.int8)
+
+
+class MemoryTester(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()
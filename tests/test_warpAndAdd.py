@@ -0,0 +1,117 @@
+# This file is part of coadd_utils.
+#
+# Developed for the LSST Data Management System.
+# This product includes software developed by the LSST Project
+# (https://www.lsst.org).
+# See the COPYRIGHT file at the top-level directory of this distribution
+# for details of code ownership.
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Test lsst.coadd.utils.warpAndAddToCoadd
+"""
+import unittest
+
+import numpy as np
+
+import lsst.utils.tests
+import lsst.geom as geom
+import lsst.afw.geom as afwGeom
+import lsst.afw.image as afwImage
+import lsst.afw.math as afwMath
+import lsst.coadd.utils as coaddUtils
+
+
+class WarpAndAddToCoaddTestCase(lsst.utils.tests.TestCase):
+    """Compare warpAndAddToCoadd with warping the whole input then adding it
+    """
+
+    def setUp(self):
+        rng = np.random.RandomState(12345)
+        crval = geom.SpherePoint(45, 30, geom.degrees)
+        inputBBox = geom.Box2I(geom.Point2I(-20, 10), geom.Extent2I(90, 110))
+        maskedImage = afwImage.MaskedImageF(inputBBox)
+        shape = maskedImage.image.array.shape
+        maskedImage.image.array[:, :] = rng.normal(size=shape)
+        maskedImage.mask.array[:, :] = rng.randint(0, 4, size=shape)
+        maskedImage.variance.array[:, :] = rng.uniform(1, 2, size=shape)
+        inputWcs = afwGeom.makeSkyWcs(
+            crpix=geom.Point2D(30, 60), crval=crval,
+            cdMatrix=afwGeom.makeCdMatrix(scale=0.2*geom.arcseconds, orientation=10*geom.degrees),
+        )
+        self.exposure = afwImage.ExposureF(maskedImage, inputWcs)
+
+        self.coaddBBox = geom.Box2I(geom.Point2I(0, 0), geom.Extent2I(120, 100))
+        self.coaddWcs = afwGeom.makeSkyWcs(
+            crpix=geom.Point2D(50, 40), crval=crval,
+            cdMatrix=afwGeom.makeCdMatrix(scale=0.21*geom.arcseconds),
+        )
+        self.badPixelMask = 0x1
+        self.weight = 0.7
+        self.warpingControl = afwMath.WarpingControl("lanczos3")
+
+    def makeRefCoadd(self):
+        """Warp the whole exposure to the coadd bbox and add it
+        """
+        coadd = afwImage.MaskedImageF(self.coaddBBox)
+        weightMap = afwImage.ImageD(self.coaddBBox)
+        warp = afwImage.MaskedImageF(self.coaddBBox)
+        srcToCoadd = afwGeom.makeWcsPairTransform(self.exposure.getWcs(), self.coaddWcs)
+        afwMath.warpImage(warp, self.exposure.maskedImage, srcToCoadd, self.warpingControl)
+        badPixelMask = self.badPixelMask | afwImage.Mask.getPlaneBitMask("NO_DATA")
+        coaddUtils.addToCoadd(coadd, weightMap, warp, badPixelMask, self.weight)
+        return coadd, weightMap
+
+    def testMatchesFullWarp(self):
+        refCoadd, refWeightMap = self.makeRefCoadd()
+        self.assertGreater(np.count_nonzero(refWeightMap.array), 1000)
+        for bandHeight in (1, 7, 32, 1000):
+            coadd = afwImage.MaskedImageF(self.coaddBBox)
+            weightMap = afwImage.ImageD(self.coaddBBox)
+            overlapBBox = coaddUtils.warpAndAddToCoadd(coadd, weightMap, self.coaddWcs, self.exposure,
+                                                       self.badPixelMask, self.weight,
+                                                       warpingControl=self.warpingControl,
+                                                       bandHeight=bandHeight)
+            self.assertTrue(self.coaddBBox.contains(overlapBBox))
+            self.assertMaskedImagesEqual(coadd, refCoadd)
+            self.assertImagesEqual(weightMap, refWeightMap)
+
+    def testNoOverlap(self):
+        farBBox = geom.Box2I(geom.Point2I(5000, 5000), geom.Extent2I(10, 10))
+        coadd = afwImage.MaskedImageF(farBBox)
+        weightMap = afwImage.ImageD(farBBox)
+        overlapBBox = coaddUtils.warpAndAddToCoadd(coadd, weightMap, self.coaddWcs, self.exposure,
+                                                   self.badPixelMask, self.weight)
+        self.assertTrue(overlapBBox.isEmpty())
+        self.assertEqual(np.count_nonzero(weightMap.array), 0)
+
+    def testBandHeight(self):
+        coadd = afwImage.MaskedImageF(self.coaddBBox)
+        weightMap = afwImage.ImageD(self.coaddBBox)
+        with self.assertRaises(ValueError):
+            coaddUtils.warpAndAddToCoadd(coadd, weightMap, self.coaddWcs, self.exposure,
+                                         self.badPixelMask, self.weight, bandHeight=0)
+
+
+class MemoryTester(lsst.utils.tests.MemoryTestCase):
+    pass
+
+
+def setup_module(module):
+    lsst.utils.tests.init()
+
+
+if __name__ == "__main__":
+    lsst.utils.tests.init()
+    unittest.main()